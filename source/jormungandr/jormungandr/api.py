@@ -40,7 +40,8 @@ from jormungandr.modules_loader import ModulesLoader
 import ujson
 import logging
 from jormungandr.new_relic import record_custom_parameter
-from jormungandr.utils import content_is_too_large
+from jormungandr.utils import content_is_too_large, get_content_limit
+from jormungandr.json_stream import should_be_streamed, make_streamed_json_response
 from jormungandr.authentication import get_user, get_token, get_app_name, get_used_coverages
 from jormungandr._version import __version__
 import six
@@ -59,6 +60,8 @@ def output_jsonp(data, code, headers=None):
 @rest_api.representation("text/json")
 @rest_api.representation("application/json")
 def output_json(data, code, headers=None):
+    if should_be_streamed(data):
+        return make_streamed_json_response(data, code, headers, content_limit=get_response_content_limit())
     resp = make_response(ujson.dumps(data), code)
     resp.headers.extend(headers or {})
     return resp
@@ -83,6 +86,14 @@ def access_log(response, *args, **kwargs):
     return response
 
 
+def get_response_content_limit():
+    limits = [
+        get_content_limit(i_manager.instances.get(name), request.endpoint) for name in get_used_coverages()
+    ]
+    limits = [limit for limit in limits if limit is not None]
+    return min(limits) if limits else None
+
+
 @app.after_request
 def check_content_size(response):
     coverage_names = get_used_coverages()
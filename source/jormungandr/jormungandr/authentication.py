@@ -42,6 +42,7 @@ import base64
 from navitiacommon.models import User, Instance, Key
 from jormungandr import cache, memory_cache, app as current_app
 from jormungandr.utils import can_connect_to_database
+from jormungandr.authorization_snapshot import authorization_snapshot
 import six
 
 
@@ -128,14 +129,37 @@ def can_read_user():
     return True
 
 
+def is_authorization_snapshot_usable():
+    """
+    The refresh of the authorization snapshot is started if due, the current snapshot is used meanwhile
+    """
+    return authorization_snapshot.is_enabled() and authorization_snapshot.update()
+
+
+def has_access(region, api, abort, user):
+    """
+    Check the Authorization of the current user for this region and this API.
+    If abort is True, the request is aborted with the appropriate HTTP code.
+    """
+    if user and is_authorization_snapshot_usable():
+        return check_access(
+            region,
+            api,
+            abort,
+            user,
+            authorization_snapshot.get_instance(region),
+            lambda instance: authorization_snapshot.has_access(user, instance, api),
+        )
+    return cached_has_access(region, api, abort, user)
+
+
 @memory_cache.memoize(
     current_app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 30)
 )
 @cache.memoize(current_app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 300))
-def has_access(region, api, abort, user):
+def cached_has_access(region, api, abort, user):
     """
-    Check the Authorization of the current user for this region and this API.
-    If abort is True, the request is aborted with the appropriate HTTP code.
+    Check the Authorization of the current user for this region and this API, using the database.
     Warning: Please this function is cached therefore it should not be
     dependent of the request context, so keep it as a pure function.
     """
@@ -162,25 +186,41 @@ def has_access(region, api, abort, user):
         g.can_connect_to_database = False
         return True
 
-    if not model_instance:
+    return check_access(
+        region, api, abort, user, model_instance, lambda instance: user.has_access(instance.id, api)
+    )
+
+
+def check_access(region, api, abort, user, instance, is_authorized):
+    """
+    :param instance: the instance of the region, None if it doesn't exist
+    :param is_authorized: function telling if the user is explicitly authorized to use the api on the instance
+    """
+    if not instance:
         if abort:
             raise RegionNotFound(region)
         return False
 
-    if (model_instance.is_free and user.have_access_to_free_instances) or user.has_access(
-        model_instance.id, api
-    ):
+    if (instance.is_free and user.have_access_to_free_instances) or is_authorized(instance):
         return True
     else:
         if abort:
-            context = 'User has no permission to access this api {} or instance {}'.format(
-                api, model_instance.id
-            )
+            context = 'User has no permission to access this api {} or instance {}'.format(api, instance.id)
             abort_request(user=user, context=context)
         else:
             return False
 
 
+def get_user_from_token(token):
+    if is_authorization_snapshot_usable():
+        user = authorization_snapshot.get_user(token, datetime.datetime.now())
+        if not user:
+            user = get_unkown_user()
+            logging.getLogger(__name__).warning('Invalid token : {}'.format(token[0:10]))
+        return user
+    return cache_get_user(token)
+
+
 @memory_cache.memoize(
     current_app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 30)
 )
@@ -227,18 +267,31 @@ def cache_get_key(token):
     return key
 
 
-@memory_cache.memoize(
-    current_app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 30)
-)
-@cache.memoize(current_app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 300))
 def get_all_available_instances_names(user, exclude_backend=None):
     """
     get the list of instances that a user can use (for the autocomplete apis)
     if Jormungandr has no authentication set (or no database), the user can use all the instances
-    else we use the jormungandr db to fetch the list (based on the user's authorization)
+    else we use the authorization snapshot or the jormungandr db to fetch the list (based on the user's
+    authorization)
 
     Note: only users with access to free instances can use global /places
     """
+    if user and user.have_access_to_free_instances and is_authorization_snapshot_usable():
+        from jormungandr import i_manager
+
+        return [
+            name
+            for name in authorization_snapshot.get_all_available_instances_names(user, exclude_backend)
+            if name in i_manager.instances
+        ]
+    return cached_get_all_available_instances_names(user, exclude_backend)
+
+
+@memory_cache.memoize(
+    current_app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 30)
+)
+@cache.memoize(current_app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_AUTHENTICATION'), 300))
+def cached_get_all_available_instances_names(user, exclude_backend=None):
     from jormungandr import i_manager
 
     if current_app.config.get('PUBLIC', False) or current_app.config.get('DISABLE_DATABASE', False):
@@ -281,7 +334,7 @@ def get_user(token, abort_if_no_token=True):
             else:  # for public one we allow unknown user
                 g.user = get_unkown_user()
         else:
-            g.user = cache_get_user(token)
+            g.user = get_user_from_token(token)
             if hasattr(g.user, 'login') and g.user.login == "unknown_user":
                 flask_restful.abort(
                     401,
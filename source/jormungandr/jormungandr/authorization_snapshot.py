@@ -0,0 +1,374 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+from collections import namedtuple
+import logging
+import os
+import socket
+import threading
+import time
+
+import kombu
+from sqlalchemy.orm import joinedload, noload
+
+from jormungandr import app
+from navitiacommon.models import db, User, Instance, Key, Api, Authorization, EndPoint
+
+# an instance as seen by the authorization
+InstanceEntry = namedtuple('InstanceEntry', ['id', 'name', 'is_free', 'autocomplete_backend'])
+# a key of a user, valid until the day before valid_until, or forever if valid_until is None
+TokenEntry = namedtuple('TokenEntry', ['user_id', 'valid_until'])
+
+USER_EVENTS = {'create_user', 'update_user', 'delete_user'}
+END_POINT_EVENTS = {'create_end_point', 'update_end_point', 'delete_end_point'}
+
+
+class AuthorizationTables(object):
+    """
+    The compact tables of a snapshot:
+     - instances: instance name -> InstanceEntry
+     - api_bits: api name -> the bit of the api in the bitsets
+     - users: user id -> User
+     - tokens: token -> TokenEntry
+     - authorizations: user id -> {instance id: bitset of the authorized apis}
+    """
+
+    __slots__ = ('instances', 'api_bits', 'api_bits_by_id', 'users', 'tokens', 'authorizations')
+
+    def __init__(self, instances, apis):
+        """
+        :param instances: rows of (id, name, is_free, autocomplete_backend)
+        :param apis: rows of (id, name)
+        """
+        self.instances = {}
+        for row in instances:
+            instance = InstanceEntry(*row)
+            self.instances[instance.name] = instance
+        self.api_bits = {}
+        self.api_bits_by_id = {}
+        for api_id, api_name in apis:
+            self.api_bits[api_name] = self.api_bits_by_id[api_id] = 1 << len(self.api_bits)
+        self.users = {}
+        self.tokens = {}
+        self.authorizations = {}
+
+    def add_users(self, users, keys, authorizations):
+        for user in users:
+            self.users[user.id] = user
+        for token, user_id, valid_until in keys:
+            self.tokens[token] = TokenEntry(user_id, valid_until)
+        for user_id, instance_id, api_id in authorizations:
+            bitsets = self.authorizations.setdefault(user_id, {})
+            bitsets[instance_id] = bitsets.get(instance_id, 0) | self.api_bits_by_id.get(api_id, 0)
+
+    def copy(self):
+        """
+        the users can be updated in the copy while the requests use the original tables
+        """
+        tables = AuthorizationTables([], [])
+        tables.instances = self.instances
+        tables.api_bits = self.api_bits
+        tables.api_bits_by_id = self.api_bits_by_id
+        tables.users = dict(self.users)
+        tables.tokens = dict(self.tokens)
+        tables.authorizations = dict(self.authorizations)
+        return tables
+
+    def remove_users(self, user_ids):
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            self.users.pop(user_id, None)
+            self.authorizations.pop(user_id, None)
+        for token in [t for t, entry in self.tokens.items() if entry.user_id in user_ids]:
+            del self.tokens[token]
+
+
+class AuthorizationSnapshot(object):
+    """
+    In-process copy of the authorizations of the tyr database, to authenticate the requests without any db round
+    trip.
+
+    The snapshot is loaded in bulk and fully reloaded every AUTHORIZATION_SNAPSHOT_RELOAD_PERIOD seconds, that's
+    how the changes of keys and authorizations (for which tyr doesn't publish any event) are taken into account.
+    In between, the users and end points events published by tyr are applied incrementally: the users concerned by
+    an event are reloaded.
+    The loads and the polls of the events are done in a thread, with its own app context, started by the requests
+    when they are due: neither psycopg2 nor the broker connection block the greenlets of the requests, which use
+    the current snapshot in the meantime. The new tables replace the current ones once they are complete.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._tables = None
+        self._next_load = 0
+        self._reload_needed = False
+        # (end point name, login) of the users to reload
+        self._outdated_users = set()
+        self._connection = None
+        self._events_queue = None
+        self._next_events_poll = 0
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+    @staticmethod
+    def is_enabled():
+        return (
+            app.config.get(str('AUTHORIZATION_SNAPSHOT'), False)
+            and not app.config.get(str('PUBLIC'), False)
+            and not app.config.get(str('DISABLE_DATABASE'), False)
+        )
+
+    def update(self):
+        """
+        Start the refresh of the snapshot if it is due, without waiting for it
+
+        :return: True if the snapshot can be used
+        """
+        now = time.time()
+        if (
+            self._reload_needed
+            or now >= self._next_load
+            or self._outdated_users
+            or now >= self._next_events_poll
+        ):
+            self._start_refresh()
+        return self._tables is not None
+
+    def _start_refresh(self):
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh, name=str('authorization_snapshot'))
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+
+    def _refresh(self):
+        try:
+            with app.app_context():
+                now = time.time()
+                self._poll_events(now)
+                if self._reload_needed or now >= self._next_load:
+                    self._load(now)
+                elif self._outdated_users and self._tables is not None:
+                    self._update_users()
+        except Exception as e:
+            self.logger.exception('impossible to refresh the authorization snapshot (error: {})'.format(e))
+
+    # Note: the queries are isolated in the methods below to be mocked in the tests
+
+    @staticmethod
+    def _query_instances():
+        return (
+            db.session.query(Instance.id, Instance.name, Instance.is_free, Instance.autocomplete_backend)
+            .filter(Instance.discarded == False)
+            .all()
+        )
+
+    @staticmethod
+    def _query_apis():
+        return db.session.query(Api.id, Api.name).order_by(Api.id).all()
+
+    @staticmethod
+    def _query_users(end_point=None, logins=None):
+        query = User.query.options(joinedload('end_point'), joinedload('billing_plan'), noload('*'))
+        if logins is not None:
+            query = query.join(EndPoint).filter(EndPoint.name == end_point, User.login.in_(logins))
+        return query.all()
+
+    @staticmethod
+    def _query_keys(user_ids=None):
+        query = db.session.query(Key.token, Key.user_id, Key.valid_until)
+        if user_ids is not None:
+            query = query.filter(Key.user_id.in_(user_ids))
+        return query.all()
+
+    @staticmethod
+    def _query_authorizations(user_ids=None):
+        query = db.session.query(Authorization.user_id, Authorization.instance_id, Authorization.api_id)
+        if user_ids is not None:
+            query = query.filter(Authorization.user_id.in_(user_ids))
+        return query.all()
+
+    def _load(self, now):
+        self._next_load = now + app.config.get(str('AUTHORIZATION_SNAPSHOT_RELOAD_PERIOD'), 300)
+        self._reload_needed = False
+        try:
+            tables = AuthorizationTables(self._query_instances(), self._query_apis())
+            tables.add_users(self._query_users(), self._query_keys(), self._query_authorizations())
+        except Exception as e:
+            # the previous snapshot, if any, is kept until the next reload
+            self.logger.exception('impossible to load the authorization snapshot (error: {})'.format(e))
+            return
+        self.logger.info(
+            'authorization snapshot loaded: {} users, {} tokens'.format(len(tables.users), len(tables.tokens))
+        )
+        self._tables = tables
+
+    def _update_users(self):
+        outdated_users, self._outdated_users = self._outdated_users, set()
+        tables = self._tables.copy()
+        try:
+            users = []
+            for end_point, logins in self._group_by_end_point(outdated_users).items():
+                users.extend(self._query_users(end_point, logins))
+            user_ids = [u.id for u in users]
+            keys, authorizations = [], []
+            if user_ids:
+                keys = self._query_keys(user_ids)
+                authorizations = self._query_authorizations(user_ids)
+        except Exception as e:
+            self.logger.exception('impossible to update the authorization snapshot (error: {})'.format(e))
+            self._reload_needed = True
+            return
+        # the deleted users and the previous logins of the renamed users are also removed
+        updated_user_ids = set(user_ids)
+        tables.remove_users(
+            [
+                u.id
+                for u in tables.users.values()
+                if u.id in updated_user_ids or (u.end_point.name, u.login) in outdated_users
+            ]
+        )
+        tables.add_users(users, keys, authorizations)
+        self._tables = tables
+
+    @staticmethod
+    def _group_by_end_point(users):
+        res = {}
+        for end_point, login in users:
+            res.setdefault(end_point, []).append(login)
+        return res
+
+    def _get_events_queue(self):
+        if self._events_queue is not None:
+            return self._events_queue
+        broker_url = app.config.get(str('AUTHORIZATION_SNAPSHOT_BROKER_URL'))
+        if not broker_url:
+            return None
+        self._connection = kombu.Connection(
+            broker_url, connect_timeout=app.config.get(str('AUTHORIZATION_SNAPSHOT_BROKER_TIMEOUT'), 1)
+        )
+        exchange = kombu.Exchange(
+            app.config.get(str('AUTHORIZATION_SNAPSHOT_EXCHANGE_NAME'), 'tyr_event_exchange'),
+            type='direct',
+            durable=True,
+        )
+        # a queue by worker, each worker has its own snapshot
+        queue = kombu.Queue(
+            'jormungandr_authorization_{}_{}'.format(socket.gethostname(), os.getpid()),
+            exchange=exchange,
+            routing_key='',
+            exclusive=True,
+            auto_delete=True,
+        )
+        self._events_queue = self._connection.SimpleQueue(queue)
+        # the events published while the queue didn't exist are lost
+        self._reload_needed = True
+        return self._events_queue
+
+    def _close_events_queue(self):
+        try:
+            if self._connection is not None:
+                self._connection.release()
+        except Exception:
+            pass
+        self._connection = None
+        self._events_queue = None
+
+    def _poll_events(self, now):
+        if now < self._next_events_poll:
+            return
+        self._next_events_poll = now + app.config.get(str('AUTHORIZATION_SNAPSHOT_EVENTS_POLL_PERIOD'), 5)
+        try:
+            queue = self._get_events_queue()
+            if queue is None:
+                return
+            while True:
+                try:
+                    message = queue.get_nowait()
+                except queue.Empty:
+                    return
+                self.on_event(message.payload)
+                message.ack()
+        except Exception as e:
+            self.logger.warning('impossible to poll the tyr events (error: {})'.format(e))
+            self._close_events_queue()
+            # don't slow down the requests while the broker is unavailable
+            self._next_events_poll = now + app.config.get(str('AUTHORIZATION_SNAPSHOT_RELOAD_PERIOD'), 300)
+
+    def on_event(self, event):
+        name = event.get('event')
+        data = event.get('data') or {}
+        if name in USER_EVENTS:
+            end_point = (data.get('origin') or {}).get('name')
+            for login in (data.get('username'), data.get('last_username')):
+                if login:
+                    self._outdated_users.add((end_point, login))
+        elif name in END_POINT_EVENTS:
+            self._reload_needed = True
+
+    def get_user(self, token, now):
+        """
+        :return: the User of a valid token, None otherwise (same as User.get_from_token)
+        """
+        tables = self._tables
+        entry = tables.tokens.get(token)
+        if entry is None or (entry.valid_until is not None and entry.valid_until <= now.date()):
+            return None
+        return tables.users.get(entry.user_id)
+
+    def get_instance(self, name):
+        return self._tables.instances.get(name)
+
+    def has_access(self, user, instance, api):
+        """
+        same as User.has_access
+        """
+        if user.is_super_user:
+            return True
+        tables = self._tables
+        api_bit = tables.api_bits.get(api, 0)
+        return bool(tables.authorizations.get(user.id, {}).get(instance.id, 0) & api_bit)
+
+    def get_all_available_instances_names(self, user, exclude_backend=None):
+        """
+        same as User.get_all_available_instances
+        """
+        tables = self._tables
+        instances = tables.instances.values()
+        if exclude_backend:
+            instances = [i for i in instances if i.autocomplete_backend != exclude_backend]
+        if user.is_super_user:
+            return [i.name for i in instances]
+        authorizations = tables.authorizations.get(user.id, {})
+        with_free_instances = user.type == 'with_free_instances'
+        return [i.name for i in instances if i.id in authorizations or (with_free_instances and i.is_free)]
+
+
+authorization_snapshot = AuthorizationSnapshot()
@@ -0,0 +1,228 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+"""
+Serialization of the values stored in redis by CustomRedisCache
+
+A serialized value is made of a header and a payload:
+
+    b'#' | format version (1 byte) | codec id (1 byte) | compression id (1 byte) | payload
+
+The header allows to change the codec or the compression of the cache without flushing redis: a value that
+cannot be read (unknown version, codec or compression) is seen as a cache miss.
+
+The values are stored under keys prefixed by KEY_NAMESPACE: the workers using another format (like the
+pickle of the previous versions, during a rolling deploy) don't read the values of each other.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+from collections import namedtuple
+import logging
+import struct
+
+try:
+    import cPickle as pickle
+except ImportError:  # pragma: no cover
+    import pickle  # type: ignore
+
+from google.protobuf.message import Message
+from google.protobuf import symbol_database
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b'#'
+FORMAT_VERSION = b'\x01'
+HEADER_SIZE = 4
+KEY_NAMESPACE = 'codecs_v{}:'.format(ord(FORMAT_VERSION))
+
+NO_COMPRESSION = b'-'
+
+
+class PickleCodec(object):
+    id = b'p'
+
+    def accepts(self, value):
+        return True
+
+    def dumps(self, value):
+        return pickle.dumps(value)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+class ProtobufCodec(object):
+    """
+    Serialize protobuf messages with SerializeToString, much faster and more compact than pickle.
+
+    The payload is the full name of the message type, a b'\\n' and the serialized message, the message type
+    is found in the protobuf symbol database (its module has necessarily been imported to build the value).
+    """
+
+    id = b'b'
+
+    def accepts(self, value):
+        return isinstance(value, Message)
+
+    def dumps(self, value):
+        return value.DESCRIPTOR.full_name.encode('ascii') + b'\n' + value.SerializeToString()
+
+    def loads(self, payload):
+        name, _, data = payload.partition(b'\n')
+        message = symbol_database.Default().GetSymbol(name.decode('ascii'))()
+        message.ParseFromString(data)
+        return message
+
+
+# a value cached by jormungandr.caching and the time until which it is fresh, after that it is stale and should be
+# refreshed
+CachedValue = namedtuple('CachedValue', ['value', 'fresh_until'])
+
+
+class CachedProtobufCodec(object):
+    """
+    Serialize a CachedValue of a protobuf message without pickle: the payload is the fresh_until timestamp
+    (8 bytes) followed by the payload of ProtobufCodec
+    """
+
+    id = b'c'
+    _timestamp = struct.Struct(str('!d'))
+
+    def __init__(self):
+        self._protobuf_codec = ProtobufCodec()
+
+    def accepts(self, value):
+        return isinstance(value, CachedValue) and self._protobuf_codec.accepts(value.value)
+
+    def dumps(self, value):
+        return self._timestamp.pack(value.fresh_until) + self._protobuf_codec.dumps(value.value)
+
+    def loads(self, payload):
+        size = self._timestamp.size
+        (fresh_until,) = self._timestamp.unpack(payload[:size])
+        return CachedValue(self._protobuf_codec.loads(payload[size:]), fresh_until)
+
+
+class Lz4Compressor(object):
+    id = b'l'
+
+    @staticmethod
+    def is_available():
+        return lz4_frame is not None
+
+    def compress(self, data):
+        return lz4_frame.compress(data)
+
+    def decompress(self, data):
+        return lz4_frame.decompress(data)
+
+
+class ZstdCompressor(object):
+    id = b'z'
+
+    @staticmethod
+    def is_available():
+        return zstandard is not None
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor()
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+COMPRESSORS = {'lz4': Lz4Compressor, 'zstd': ZstdCompressor}
+
+
+class CacheSerializer(object):
+    """
+    Dump and load the values of the cache with the first codec accepting them
+
+    :param codecs: codecs tried in order when dumping a value, the last one should accept everything
+    :param compression: name of the compression ('lz4' or 'zstd') of the payloads, None to deactivate it
+    :param compression_threshold: size in bytes above which a payload is compressed
+    """
+
+    def __init__(self, codecs=None, compression=None, compression_threshold=1024):
+        self.codecs = codecs or [ProtobufCodec(), CachedProtobufCodec(), PickleCodec()]
+        self._codecs_by_id = {codec.id: codec for codec in self.codecs}
+        self.compressor = None
+        if compression:
+            compressor_class = COMPRESSORS.get(compression)
+            if compressor_class is None:
+                raise ValueError('unknown cache compression: {}'.format(compression))
+            if not compressor_class.is_available():
+                raise RuntimeError('no {} module found'.format(compression))
+            self.compressor = compressor_class()
+        # we always know how to read the compressions that are installed
+        self._compressors_by_id = {c.id: c() for c in COMPRESSORS.values() if c.is_available()}
+        self.compression_threshold = compression_threshold
+        self.logger = logging.getLogger(__name__)
+
+    def dumps(self, value):
+        codec = next(c for c in self.codecs if c.accepts(value))
+        payload = codec.dumps(value)
+        compression_id = NO_COMPRESSION
+        if self.compressor is not None and len(payload) > self.compression_threshold:
+            payload = self.compressor.compress(payload)
+            compression_id = self.compressor.id
+        return MAGIC + FORMAT_VERSION + codec.id + compression_id + payload
+
+    def loads(self, data):
+        """
+        Load a value dumped by dumps, None if it cannot be read
+        """
+        header, payload = data[:HEADER_SIZE], data[HEADER_SIZE:]
+        version, codec_id, compression_id = header[1:2], header[2:3], header[3:4]
+        codec = self._codecs_by_id.get(codec_id)
+        if version != FORMAT_VERSION or codec is None:
+            return None
+        compressor = None
+        if compression_id != NO_COMPRESSION:
+            compressor = self._compressors_by_id.get(compression_id)
+            if compressor is None:
+                return None
+        try:
+            if compressor is not None:
+                payload = compressor.decompress(payload)
+            return codec.loads(payload)
+        except Exception as e:
+            self.logger.warning('impossible to load a value from the cache (error: {})'.format(e))
+            return None
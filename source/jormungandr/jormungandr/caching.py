@@ -0,0 +1,221 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import functools
+import hashlib
+import logging
+import time
+
+import flask
+import gevent
+from gevent.event import AsyncResult
+
+from jormungandr import app, cache
+from jormungandr.cache_codecs import CachedValue
+from jormungandr.exceptions import TechnicalError
+from jormungandr.lru_cache import LruCache
+from jormungandr.utils import copy_flask_request_context, copy_context_in_greenlet_stack
+
+
+def is_cache_enabled():
+    return app.config[str('CACHE_CONFIGURATION')].get(str('CACHE_TYPE'), 'null') != 'null'
+
+
+class CoalescingMemoizedFunction(object):
+    """
+    Cache the results of a function in two tiers: an in-process LRU cache in front of the shared cache (redis).
+
+    Concurrent calls with the same arguments are coalesced: on a cache miss, only the first greenlet calls the
+    function, the others wait for its result (and get its exception, if any).
+
+    Once its timeout is reached, a value is still served during stale_timeout seconds, while a single greenlet
+    refreshes it in background.
+
+    The in-process tier keeps a value at most local_timeout seconds, to see the updates of the shared cache.
+
+    Like Flask-Caching's memoize, a None result is not cached.
+    """
+
+    def __init__(self, f, timeout, stale_timeout=None, local_timeout=None):
+        self.f = f
+        self.timeout = timeout
+        self._stale_timeout = stale_timeout
+        self.local_timeout = local_timeout
+        self.name = '{}.{}'.format(f.__module__, getattr(f, '__qualname__', f.__name__))
+        self._local_cache = None
+        # cache key -> AsyncResult of the greenlet computing the value
+        self._in_flight = {}
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def stale_timeout(self):
+        if self._stale_timeout is not None:
+            return self._stale_timeout
+        return app.config.get(str('CACHE_STALE_WHILE_REVALIDATE_S'), 0)
+
+    @property
+    def local_cache(self):
+        size = app.config.get(str('LOCAL_CACHE_SIZE'), 0)
+        if size <= 0:
+            return None
+        if self._local_cache is None:
+            self._local_cache = LruCache(max_size=size)
+        return self._local_cache
+
+    @property
+    def wait_timeout(self):
+        return app.config.get(str('CACHE_COALESCED_CALL_WAIT_TIMEOUT_S'), 10)
+
+    def _local_ttl(self, ttl):
+        if self.local_timeout is None:
+            return ttl
+        return min(ttl, self.local_timeout)
+
+    def make_cache_key(self, args, kwargs):
+        arguments = repr((args, sorted(kwargs.items()))).encode('utf-8', 'backslashreplace')
+        return 'coalesced:{}:{}'.format(self.name, hashlib.md5(arguments).hexdigest())
+
+    def __call__(self, *args, **kwargs):
+        if not is_cache_enabled():
+            return self._compute(None, args, kwargs)
+
+        key = self.make_cache_key(args, kwargs)
+        cached = self._get(key)
+        if cached is None:
+            return self._compute(key, args, kwargs)
+
+        if cached.fresh_until <= time.time():
+            self._refresh_in_background(key, args, kwargs)
+        return cached.value
+
+    def _get(self, key):
+        local_cache = self.local_cache
+        if local_cache is not None:
+            cached = local_cache.get(key)
+            if cached is not None:
+                return cached
+        try:
+            cached = cache.get(key)
+        except Exception as e:
+            # a dead redis should only make us slower
+            self.logger.warning('impossible to read the cache for {} (error: {})'.format(self.name, e))
+            return None
+        if not isinstance(cached, CachedValue):
+            return None
+        if local_cache is not None:
+            local_cache.set(
+                key, cached, ttl=self._local_ttl(cached.fresh_until + self.stale_timeout - time.time())
+            )
+        return cached
+
+    def _set(self, key, value):
+        cached = CachedValue(value, time.time() + self.timeout)
+        ttl = self.timeout + self.stale_timeout
+        local_cache = self.local_cache
+        if local_cache is not None:
+            local_cache.set(key, cached, ttl=self._local_ttl(ttl))
+        try:
+            cache.set(key, cached, timeout=ttl)
+        except Exception as e:
+            self.logger.warning('impossible to write the cache for {} (error: {})'.format(self.name, e))
+
+    def _compute(self, key, args, kwargs):
+        in_flight_key = key or self.make_cache_key(args, kwargs)
+        result = self._in_flight.get(in_flight_key)
+        if result is not None:
+            # someone is already computing this value, we wait for it
+            try:
+                return result.get(timeout=self.wait_timeout)
+            except gevent.Timeout:
+                self.logger.warning(
+                    'the coalesced call to {} is too long, the function is called again'.format(self.name)
+                )
+                return self.f(*args, **kwargs)
+
+        result = AsyncResult()
+        self._in_flight[in_flight_key] = result
+        try:
+            value = self.f(*args, **kwargs)
+            if key is not None and value is not None:
+                self._set(key, value)
+            result.set(value)
+            return value
+        except Exception as e:
+            result.set_exception(e)
+            raise
+        finally:
+            if not result.ready():
+                # the greenlet has been killed (GreenletExit) or interrupted by a gevent.Timeout: they are only
+                # meant for this greenlet, the others get an error instead
+                result.set_exception(TechnicalError('the call to {} has been interrupted'.format(self.name)))
+            self._in_flight.pop(in_flight_key, None)
+
+    def _refresh_in_background(self, key, args, kwargs):
+        if key in self._in_flight:
+            return
+        reqctx = copy_flask_request_context() if flask.has_request_context() else None
+
+        def refresh():
+            try:
+                if reqctx is None:
+                    self._compute(key, args, kwargs)
+                else:
+                    with copy_context_in_greenlet_stack(reqctx):
+                        self._compute(key, args, kwargs)
+            except Exception as e:
+                # the stale value is served until the end of its stale period
+                self.logger.warning('impossible to refresh the cache of {} (error: {})'.format(self.name, e))
+
+        gevent.spawn(refresh)
+
+
+def coalescing_memoize(timeout, stale_timeout=None, local_timeout=None):
+    """
+    Decorator caching the results of a function or a method with a CoalescingMemoizedFunction
+
+    :param timeout: time in seconds during which a result is fresh
+    :param stale_timeout: time in seconds during which an expired result is still served while being refreshed,
+                          CACHE_STALE_WHILE_REVALIDATE_S by default
+    :param local_timeout: max time in seconds during which a result is kept in the in-process tier, timeout by
+                          default
+    """
+
+    def decorator(f):
+        memoized = CoalescingMemoizedFunction(f, timeout, stale_timeout, local_timeout)
+
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            return memoized(*args, **kwargs)
+
+        decorated_function.uncached = f
+        decorated_function.memoized = memoized
+        return decorated_function
+
+    return decorator
@@ -69,7 +69,7 @@ class RedisCache(CustomRedisCache):
         }
 
 
-# Taken from flask caching without any change except the usage of our own RedisCache class
+# Taken from flask caching without any change except the usage of our own RedisCache class and its compression
 def redis(app, config, args, kwargs):
     try:
         from redis import from_url as redis_from_url
@@ -91,6 +91,11 @@ def redis(app, config, args, kwargs):
     if key_prefix:
         kwargs['key_prefix'] = key_prefix
 
+    compression = config.get('CACHE_REDIS_COMPRESSION')
+    if compression:
+        kwargs['compression'] = compression
+        kwargs['compression_threshold'] = config.get('CACHE_REDIS_COMPRESSION_THRESHOLD', 1024)
+
     db_number = config.get('CACHE_REDIS_DB')
     if db_number:
         kwargs['db'] = db_number
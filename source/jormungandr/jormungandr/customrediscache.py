@@ -1,10 +1,6 @@
 from flask_caching._compat import integer_types, string_types
 from flask_caching.backends.base import BaseCache, iteritems_wrapper
-
-try:
-    import cPickle as pickle
-except ImportError:  # pragma: no cover
-    import pickle  # type: ignore
+from jormungandr.cache_codecs import CacheSerializer, MAGIC, KEY_NAMESPACE
 
 
 class CustomRedisCache(BaseCache):
@@ -25,6 +21,8 @@ class CustomRedisCache(BaseCache):
                             specified on :meth:`~BaseCache.set`. A timeout of
                             0 indicates that the cache never expires.
     :param key_prefix: A prefix that should be added to all keys.
+    :param compression: compression ('lz4' or 'zstd') of the big values, None to deactivate it.
+    :param compression_threshold: size in bytes above which a value is compressed.
 
     Any additional keyword arguments will be passed to ``redis.Redis``.
     """
@@ -38,9 +36,12 @@ class CustomRedisCache(BaseCache):
         db=0,
         default_timeout=300,
         key_prefix=None,
+        compression=None,
+        compression_threshold=1024,
         **kwargs
     ):
         super(CustomRedisCache, self).__init__(default_timeout)
+        self.serializer = CacheSerializer(compression=compression, compression_threshold=compression_threshold)
         if write_client is None:
             raise ValueError("CustomRedisCache host parameter may not be None")
         self._write_client = self._get_client(host=write_client, port=port, password=password, db=db, **kwargs)
@@ -50,7 +51,8 @@ class CustomRedisCache(BaseCache):
         else:
             self._read_client = self._get_client(host=read_client, port=port, password=password, db=db, **kwargs)
 
-        self.key_prefix = key_prefix or ""
+        # the namespace of the format is part of the prefix, so the values are only read by the workers using it
+        self.key_prefix = (key_prefix or "") + KEY_NAMESPACE
 
     def _get_client(self, host, port, password, db, **kwargs):
         if isinstance(host, string_types):
@@ -73,12 +75,12 @@ class CustomRedisCache(BaseCache):
 
     def dump_object(self, value):
         """Dumps an object into a string for redis.  By default it serializes
-        integers as regular string and pickle dumps everything else.
+        integers as regular string (to be usable by incr/decr) and everything else with the serializer.
         """
         t = type(value)
         if t in integer_types:
             return str(value).encode("ascii")
-        return b"!" + pickle.dumps(value)
+        return self.serializer.dumps(value)
 
     def load_object(self, value):
         """The reversal of :meth:`dump_object`.  This might be called with
@@ -86,11 +88,8 @@ class CustomRedisCache(BaseCache):
         """
         if value is None:
             return None
-        if value.startswith(b"!"):
-            try:
-                return pickle.loads(value[1:])
-            except pickle.PickleError:
-                return None
+        if value.startswith(MAGIC):
+            return self.serializer.loads(value)
         try:
             return int(value)
         except ValueError:
@@ -15,6 +15,9 @@ INSTANCES_DIR = os.getenv('JORMUNGANDR_INSTANCES_DIR', '/etc/jormungandr.d')
 
 
 INSTANCE_TIMEOUT = float(os.getenv('JORMUNGANDR_INSTANCE_TIMEOUT_S', 10))
+# Time budget in seconds of a /journeys computation, shared by its calls to kraken and to the street network
+# services. When it is exhausted, the outstanding calls are cancelled. 0 for no budget
+JOURNEYS_REQUEST_BUDGET_S = float(os.getenv('JORMUNGANDR_JOURNEYS_REQUEST_BUDGET_S', 0))
 PLACE_FAST_TIMEOUT = float(os.getenv('JORMUNGANDR_PLACE_FAST_TIMEOUT_S', 1))
 
 # Patern that matches Jormungandr configuration files
@@ -42,6 +45,23 @@ RIDESHARING_GREENLET_POOL_SIZE = int(os.getenv('JORMUNGANDR_RIDESHARING_GREENLET
 # disable authentication
 PUBLIC = boolean(os.getenv('JORMUNGANDR_IS_PUBLIC', True))
 
+# authenticate the requests with an in-process snapshot of the users' authorizations instead of the database
+AUTHORIZATION_SNAPSHOT = boolean(os.getenv('JORMUNGANDR_AUTHORIZATION_SNAPSHOT', False))
+# period (in seconds) of the full reload of the snapshot, the changes of keys and authorizations are taken into
+# account at this pace
+AUTHORIZATION_SNAPSHOT_RELOAD_PERIOD = int(os.getenv('JORMUNGANDR_AUTHORIZATION_SNAPSHOT_RELOAD_PERIOD', 300))
+# broker on which tyr publishes its users and end points events, to update the snapshot in between the reloads
+AUTHORIZATION_SNAPSHOT_BROKER_URL = os.getenv('JORMUNGANDR_AUTHORIZATION_SNAPSHOT_BROKER_URL', None)
+AUTHORIZATION_SNAPSHOT_EXCHANGE_NAME = os.getenv(
+    'JORMUNGANDR_AUTHORIZATION_SNAPSHOT_EXCHANGE_NAME', 'tyr_event_exchange'
+)
+# connection timeout (in seconds) to the broker
+AUTHORIZATION_SNAPSHOT_BROKER_TIMEOUT = float(os.getenv('JORMUNGANDR_AUTHORIZATION_SNAPSHOT_BROKER_TIMEOUT', 1))
+# period (in seconds) at which the events are polled
+AUTHORIZATION_SNAPSHOT_EVENTS_POLL_PERIOD = float(
+    os.getenv('JORMUNGANDR_AUTHORIZATION_SNAPSHOT_EVENTS_POLL_PERIOD', 5)
+)
+
 # message returned on authentication request
 HTTP_BASIC_AUTH_REALM = os.getenv('JORMUNGANDR_HTTP_BASIC_AUTH_REALM', 'Token Required')
 
@@ -116,6 +136,14 @@ STAT_CONNECTION_TIMEOUT = float(
 STAT_CIRCUIT_BREAKER_MAX_FAIL = int(os.getenv('JORMUNGANDR_STAT_CIRCUIT_BREAKER_MAX_FAIL', 5))
 # the circuit breaker retries after this timeout (in seconds)
 STAT_CIRCUIT_BREAKER_TIMEOUT_S = int(os.getenv('JORMUNGANDR_STAT_CIRCUIT_BREAKER_TIMEOUT_S', 60))
+# build and publish the stats in a background worker instead of in the request
+STAT_ASYNC_PUBLISH = boolean(os.getenv('JORMUNGANDR_STAT_ASYNC_PUBLISH', False))
+# max number of stats waiting for the background worker, the new stats are dropped when it is reached
+STAT_QUEUE_SIZE = int(os.getenv('JORMUNGANDR_STAT_QUEUE_SIZE', 1000))
+# max total size of the stats waiting for the background worker, a stat counts for 1 plus its number of sections
+STAT_QUEUE_MAX_SIZE = int(os.getenv('JORMUNGANDR_STAT_QUEUE_MAX_SIZE', 100000))
+# max number of stats published by the background worker in a batch
+STAT_BATCH_SIZE = int(os.getenv('JORMUNGANDR_STAT_BATCH_SIZE', 50))
 
 # Cache configuration, see https://pythonhosted.org/Flask-Caching/ for more information
 default_cache = {
@@ -140,6 +168,88 @@ MEMORY_CACHE_CONFIGURATION = (
     json.loads(os.getenv('JORMUNGANDR_MEMORY_CACHE_CONFIGURATION', '{}')) or default_memory_cache
 )
 
+# Max number of ids (found or not) kept in the local cache of each instance, used to find the coverage of an
+# object when no coverage is given. 0 to deactivate it
+HAS_ID_CACHE_SIZE = int(os.getenv('JORMUNGANDR_HAS_ID_CACHE_SIZE', 10000))
+
+# The json responses having a collection of at least this number of items are encoded and sent by chunks,
+# 0 to deactivate it
+JSON_STREAMING_MIN_ITEMS = int(os.getenv('JORMUNGANDR_JSON_STREAMING_MIN_ITEMS', 1000))
+
+# Max number of results of external calls (timeo, siri, bss...) kept in memory in front of the cache, 0 to
+# deactivate this local cache
+LOCAL_CACHE_SIZE = int(os.getenv('JORMUNGANDR_LOCAL_CACHE_SIZE', 1000))
+
+# Time in seconds during which an expired result of an external call is still served while it is refreshed in
+# background, 0 to deactivate it
+CACHE_STALE_WHILE_REVALIDATE_S = int(os.getenv('JORMUNGANDR_CACHE_STALE_WHILE_REVALIDATE_S', 0))
+
+# Max time in seconds a call waits for the result of the same call made concurrently by another greenlet, after
+# that it calls the external service itself
+CACHE_COALESCED_CALL_WAIT_TIMEOUT_S = float(os.getenv('JORMUNGANDR_CACHE_COALESCED_CALL_WAIT_TIMEOUT_S', 10))
+
+# Max number of keep-alive connections kept per host by the http client of each connector (valhalla, here,
+# timeo, bss...)
+HTTP_CLIENT_POOL_MAXSIZE = int(os.getenv('JORMUNGANDR_HTTP_CLIENT_POOL_MAXSIZE', 10))
+# Pool size of specific connectors, ex: {"valhalla": 50, "here": 20}
+HTTP_CLIENT_POOL_MAXSIZE_BY_CONNECTOR = json.loads(
+    os.getenv('JORMUNGANDR_HTTP_CLIENT_POOL_MAXSIZE_BY_CONNECTOR', '{}')
+)
+# Max number of hosts whose connections are kept by the http client of each connector
+HTTP_CLIENT_POOL_CONNECTIONS = int(os.getenv('JORMUNGANDR_HTTP_CLIENT_POOL_CONNECTIONS', 10))
+# Number of hosts of specific connectors, the ridesharing client is shared by all the ridesharing services
+HTTP_CLIENT_POOL_CONNECTIONS_BY_CONNECTOR = json.loads(
+    os.getenv('JORMUNGANDR_HTTP_CLIENT_POOL_CONNECTIONS_BY_CONNECTOR', '{"ridesharing": 100}')
+)
+# Send a newrelic event for each call of the connectors (connection reuse, time to headers, transfer time)
+HTTP_CLIENT_REPORT_CALLS = boolean(os.getenv('JORMUNGANDR_HTTP_CLIENT_REPORT_CALLS', False))
+
+# Time in seconds during which the fallback durations computed by a street network service are shared between
+# the requests, by id or class of service, ex: {"asgard": 600, "geovelo": 3600}. 0 not to cache them
+ROUTING_MATRIX_CACHE_TTL_BY_BACKEND = json.loads(
+    os.getenv('JORMUNGANDR_ROUTING_MATRIX_CACHE_TTL_BY_BACKEND', '{}')
+)
+# Same for the services not in ROUTING_MATRIX_CACHE_TTL_BY_BACKEND
+ROUTING_MATRIX_CACHE_DEFAULT_TTL_S = int(os.getenv('JORMUNGANDR_ROUTING_MATRIX_CACHE_DEFAULT_TTL_S', 0))
+# Size in meters of the cells of the grid on which the places are quantized: the places in the same cell share
+# their fallback durations
+ROUTING_MATRIX_CACHE_GRID_SIZE_M = float(os.getenv('JORMUNGANDR_ROUTING_MATRIX_CACHE_GRID_SIZE_M', 20))
+# Max number of fallback durations kept in memory in front of the cache
+ROUTING_MATRIX_CACHE_LOCAL_SIZE = int(os.getenv('JORMUNGANDR_ROUTING_MATRIX_CACHE_LOCAL_SIZE', 100000))
+
+# Max number of walking paths of transfers (and stop points with their access points) kept in the transfer store
+# of each instance and shared by the requests until the next data publication, 0 to deactivate it
+TRANSFER_PATH_CACHE_SIZE = int(os.getenv('JORMUNGANDR_TRANSFER_PATH_CACHE_SIZE', 10000))
+
+# Directory where the transfer stores are saved, one file per instance and publication date, so the transfers
+# computed by a worker are loaded by the others and after a restart. The stores are only in memory if not set
+TRANSFER_PATH_STORE_DIR = os.getenv('JORMUNGANDR_TRANSFER_PATH_STORE_DIR', None)
+
+# Learn, by coverage and fallback mode, the ratio between the street network durations and the crowfly distances
+# of the candidates of the fallbacks, and don't send to the street network the candidates that can't be reached
+ADAPTIVE_CROWFLY_PRUNING = boolean(os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING', False))
+# Only learn and report the candidates that would have been pruned (to newrelic), without pruning them
+ADAPTIVE_CROWFLY_PRUNING_DRY_RUN = boolean(os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING_DRY_RUN', False))
+# Fallback modes whose candidates are pruned
+ADAPTIVE_CROWFLY_PRUNING_MODES = json.loads(
+    os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING_MODES', '["bike", "car"]')
+)
+# Number of matrix outcomes needed before pruning, and number of them kept by coverage and mode
+ADAPTIVE_CROWFLY_PRUNING_MIN_SAMPLES = int(os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING_MIN_SAMPLES', 1000))
+ADAPTIVE_CROWFLY_PRUNING_MAX_SAMPLES = int(os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING_MAX_SAMPLES', 10000))
+# A candidate is pruned if it can't be reached even with the ratio of this quantile of the outcomes
+ADAPTIVE_CROWFLY_PRUNING_QUANTILE = float(os.getenv('JORMUNGANDR_ADAPTIVE_CROWFLY_PRUNING_QUANTILE', 0.01))
+
+# Find the stop points around the places of the journeys in an index of the stop points loaded from kraken for
+# each new data publication, instead of calling kraken
+STOP_POINT_INDEX = boolean(os.getenv('JORMUNGANDR_STOP_POINT_INDEX', False))
+# Depth of the stop points in the index, 3 to have their access points
+STOP_POINT_INDEX_DEPTH = int(os.getenv('JORMUNGANDR_STOP_POINT_INDEX_DEPTH', 2))
+# Number of stop points by ptref call when loading the index
+STOP_POINT_INDEX_PAGE_SIZE = int(os.getenv('JORMUNGANDR_STOP_POINT_INDEX_PAGE_SIZE', 1000))
+# Size in meters of the cells of the grid of the index
+STOP_POINT_INDEX_CELL_SIZE_M = float(os.getenv('JORMUNGANDR_STOP_POINT_INDEX_CELL_SIZE_M', 1000))
+
 # List of enabled modules
 MODULES = {
     'v1': {  # API v1 of Navitia
@@ -248,6 +358,17 @@ ZMQ_DEFAULT_SOCKET_TYPE = os.getenv('JORMUNGANDR_ZMQ_DEFAULT_SOCKET_TYPE', 'pers
 ZMQ_SOCKET_TTL_SECONDS = float(os.getenv('JORMUNGANDR_ZMQ_SOCKET_TTL_SECONDS', 10))
 ASGARD_ZMQ_SOCKET_TTL_SECONDS = float(os.getenv('JORMUNGANDR_ASGARD_ZMQ_SOCKET_TTL_SECONDS', 10))
 
+# In multiplexed mode, the requests to a kraken (or asgard) are pipelined on a few shared DEALER sockets instead
+# of checking out a REQ socket per request
+# The replies are matched with a request id frame sent before the REQ delimiter: the broker in front of the kraken
+# workers (or the load balancer in front of asgard) must send back this frame unchanged, as kraken's LoadBalancer
+# does (see tests/multiplexed_channel_tests.py)
+ZMQ_MULTIPLEXED_CHANNEL = boolean(os.getenv('JORMUNGANDR_ZMQ_MULTIPLEXED_CHANNEL', False))
+# Number of long-lived DEALER sockets opened per kraken (or asgard) in multiplexed mode
+ZMQ_NB_CHANNELS = int(os.getenv('JORMUNGANDR_ZMQ_NB_CHANNELS', 2))
+# Max number of requests waiting for a reply at the same time per kraken (or asgard) in multiplexed mode
+ZMQ_MAX_IN_FLIGHT_REQUESTS = int(os.getenv('JORMUNGANDR_ZMQ_MAX_IN_FLIGHT_REQUESTS', 64))
+
 
 # Variable used only when deploying on aws
 ASGARD_ZMQ_SOCKET = os.getenv('JORMUNGANDR_ASGARD_ZMQ_SOCKET')
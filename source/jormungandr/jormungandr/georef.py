@@ -185,6 +185,20 @@ class Kraken(object):
         result = self.instance.send_and_receive(req, request_id=request_id)
         return result.stop_points
 
+    def get_stop_points_from_uris(self, uris, request_id, depth=0):
+        """
+        The stop points of all the uris in a single ptref call
+        """
+        req = request_pb2.Request()
+        req.requested_api = type_pb2.PTREFERENTIAL
+        req.ptref.requested_type = type_pb2.STOP_POINT
+        req.ptref.count = max(len(uris), 100)
+        req.ptref.start_page = 0
+        req.ptref.depth = depth
+        req.ptref.filter = ' or '.join('stop_point.uri = {uri}'.format(uri=uri) for uri in uris)
+        result = self.instance.send_and_receive(req, request_id=request_id)
+        return result.stop_points
+
     def get_odt_stop_points(self, coord, request_id):
         req = request_pb2.Request()
         req.requested_api = type_pb2.odt_stop_points
@@ -0,0 +1,170 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+"""
+HTTP clients of the connectors to the external services
+
+Instead of a new connection (and TLS handshake) for each call like requests.get does, each connector uses
+a requests.Session keeping a pool of keep-alive connections per host. The sessions are shared by all the
+instances of a connector, and by the greenlets: urllib3's pools are safe to use concurrently once the socket
+module is monkey patched by gevent.
+
+Since a session is shared by the calls made for all the coverages and users, its cookies are blocked: they would
+be sent back with the calls of the others.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import logging
+import threading
+import time
+
+import requests
+from six.moves import http_cookiejar
+from six.moves.urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+from jormungandr import app, new_relic
+
+# connector name -> HttpClient
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class BlockAllCookiesPolicy(http_cookiejar.DefaultCookiePolicy):
+    """
+    The cookies set by the responses are never stored, and thus never sent with the next calls
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class HttpClient(object):
+    """
+    A pooled http client, with the same get/post/request functions as the requests module
+
+    :param name: name of the connector, used to report the calls
+    :param pool_maxsize: max number of keep-alive connections kept per host, more connections are opened if
+                         needed but they are closed after their call
+    :param pool_connections: max number of hosts whose pools are kept
+    """
+
+    def __init__(self, name, pool_maxsize=10, pool_connections=10):
+        self.name = name
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        self.session.cookies.set_policy(BlockAllCookiesPolicy())
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.logger = logging.getLogger(__name__)
+
+    def _nb_connections(self, url):
+        """
+        Number of connections opened to the host of url, by all its pools (they are also keyed by the TLS
+        parameters of the calls)
+        """
+        try:
+            parsed_url = urlparse(url)
+            scheme = parsed_url.scheme.lower()
+            host = (parsed_url.hostname or '').lower()
+            port = parsed_url.port or {'http': 80, 'https': 443}.get(scheme)
+            pools = self.adapter.poolmanager.pools
+            nb_connections = 0
+            for key in pools.keys():
+                if (key.key_scheme, key.key_host, key.key_port) != (scheme, host, port):
+                    continue
+                pool = pools.get(key)
+                if pool is not None:
+                    nb_connections += pool.num_connections
+            return nb_connections
+        except Exception:
+            return None
+
+    def request(self, method, url, **kwargs):
+        nb_connections = self._nb_connections(url)
+        start = time.time()
+        response = self.session.request(method, url, **kwargs)
+        # the content is read to know the transfer time, it would be read by the connector anyway
+        response.content
+        self._report_call(method, url, response, time.time() - start, nb_connections)
+        return response
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def _report_call(self, method, url, response, duration, nb_connections_before):
+        # approximated when several greenlets call the same host: one of them may have opened the connection
+        nb_connections = self._nb_connections(url)
+        new_connection = None
+        if nb_connections is not None and nb_connections_before is not None:
+            new_connection = nb_connections > nb_connections_before
+        # elapsed: from the sending of the request to the parsing of the headers (connection and TLS included)
+        headers_duration = response.elapsed.total_seconds()
+        params = {
+            'connector': self.name,
+            'method': method,
+            'host': urlparse(url).netloc,
+            'status_code': response.status_code,
+            'new_connection': new_connection,
+            'headers_duration': headers_duration,
+            'transfer_duration': max(duration - headers_duration, 0),
+            'duration': duration,
+        }
+        self.logger.debug('http call: {}'.format(params))
+        if app.config.get(str('HTTP_CLIENT_REPORT_CALLS')):
+            new_relic.record_custom_event('http_call', params)
+
+    def close(self):
+        self.session.close()
+
+
+def get_http_client(name):
+    """
+    The http client shared by all the instances of the connector `name`
+
+    Its pool size is HTTP_CLIENT_POOL_MAXSIZE, or HTTP_CLIENT_POOL_MAXSIZE_BY_CONNECTOR[name] if defined, and
+    its number of hosts HTTP_CLIENT_POOL_CONNECTIONS, or HTTP_CLIENT_POOL_CONNECTIONS_BY_CONNECTOR[name]
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                pool_maxsize = app.config.get(str('HTTP_CLIENT_POOL_MAXSIZE_BY_CONNECTOR'), {}).get(
+                    name, app.config.get(str('HTTP_CLIENT_POOL_MAXSIZE'), 10)
+                )
+                pool_connections = app.config.get(str('HTTP_CLIENT_POOL_CONNECTIONS_BY_CONNECTOR'), {}).get(
+                    name, app.config.get(str('HTTP_CLIENT_POOL_CONNECTIONS'), 10)
+                )
+                client = _clients[name] = HttpClient(
+                    name, pool_maxsize=pool_maxsize, pool_connections=pool_connections
+                )
+    return client
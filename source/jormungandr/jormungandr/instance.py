@@ -49,8 +49,12 @@ import logging
 from jormungandr.exceptions import DeadSocketException
 from navitiacommon import models
 from importlib import import_module
-from jormungandr import cache, memory_cache, app, global_autocomplete
+from jormungandr import app, global_autocomplete
+from jormungandr.caching import coalescing_memoize
+from jormungandr.transfer_store import TransferStore
+from jormungandr.stop_point_index import StopPointIndex
 from shapely import wkt, geometry
+from shapely.prepared import prep
 from shapely.geos import PredicateError, ReadingError, TopologicalError
 from flask import g
 import flask
@@ -70,6 +74,7 @@ from jormungandr.utils import (
     read_origin_destination_data,
     read_stop_points_attractivities,
     str_to_time_stamp,
+    get_remaining_time,
 )
 from jormungandr import pt_planners_manager, transient_socket
 import os
@@ -146,6 +151,7 @@ def parse_and_get_olympics_forbidden_uris(dict_olympics_forbidden_uris):
 
 class Instance(transient_socket.TransientSocket):
     name = None  # type: Text
+    prepared_geom = None
 
     def __init__(
         self,
@@ -175,16 +181,27 @@ class Instance(transient_socket.TransientSocket):
             zmq_context=context,
             zmq_socket=zmq_socket,
             socket_ttl=app.config.get(str('ZMQ_SOCKET_TTL_SECONDS'), 10),
+            multiplexed=app.config.get(str('ZMQ_MULTIPLEXED_CHANNEL'), False),
+            max_in_flight_requests=app.config.get(str('ZMQ_MAX_IN_FLIGHT_REQUESTS'), 64),
+            nb_channels=app.config.get(str('ZMQ_NB_CHANNELS'), 2),
         )
 
         self.geom = None
         self.geojson = None
+        # callbacks called with the instance each time a new publication date is received
+        self.publication_date_listeners = []
         self.socket_path = zmq_socket
         self._scenario = None
         self._scenario_name = None
         self.lock = Lock()
         self.context = context
         self.name = name
+        # walking paths of the transfers, computed once per publication date
+        self.transfer_store = TransferStore(name)
+        self.publication_date_listeners.append(self.transfer_store.update_publication_date)
+        # stop points indexed to find the stop points nearby without calling kraken
+        self.stop_point_index = StopPointIndex(name)
+        self.publication_date_listeners.append(self.stop_point_index.update_publication_date)
         self.timezone = None  # timezone will be fetched from the kraken
         self.publication_date = -1
         self.is_initialized = False  # kraken hasn't been called yet we don't have geom nor timezone
@@ -357,8 +374,10 @@ class Instance(transient_socket.TransientSocket):
     def __repr__(self):
         return 'instance.{}'.format(self.name)
 
-    @memory_cache.memoize(app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_PARAMS'), 30))
-    @cache.memoize(app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_PARAMS'), 300))
+    @coalescing_memoize(
+        app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_PARAMS'), 300),
+        local_timeout=app.config[str('MEMORY_CACHE_CONFIGURATION')].get(str('TIMEOUT_PARAMS'), 30),
+    )
     def _get_models(self):
         if app.config['DISABLE_DATABASE']:
             return None
@@ -828,6 +847,7 @@ class Instance(transient_socket.TransientSocket):
             raise DeadSocketException(self.name, self.socket_path)
 
     def _send_and_receive(self, request, timeout=app.config.get('INSTANCE_TIMEOUT', 10), quiet=False, **kwargs):
+        timeout = get_remaining_time(timeout)
         deadline = datetime.utcnow() + timedelta(milliseconds=timeout * 1000)
         request.deadline = deadline.strftime('%Y%m%dT%H%M%S,%f')
 
@@ -856,21 +876,12 @@ class Instance(transient_socket.TransientSocket):
         req.place_uri.uri = id_
         return self.send_and_receive(req, timeout=app.config.get(str('PLACE_FAST_TIMEOUT'), 1))
 
-    def has_id(self, id_):
-        """
-        Does this instance has this id
-        """
-        try:
-            return len(self.get_id(id_).places) > 0
-        except DeadSocketException:
-            return False
-
     def has_coord(self, lon, lat):
         return self.has_point(geometry.Point(lon, lat))
 
     def has_point(self, p):
         try:
-            return self.geom and self.geom.contains(p)
+            return self.geom and (self.prepared_geom or self.geom).contains(p)
         except DeadSocketException:
             return False
         except PredicateError:
@@ -926,6 +937,9 @@ class Instance(transient_socket.TransientSocket):
                     self.geom = None
                 self.timezone = response.metadatas.timezone
                 self._update_geojson()
+                self._update_prepared_geom()
+            for listener in self.publication_date_listeners:
+                listener(self)
         set_request_instance_timezone(self)
 
     def _update_geojson(self):
@@ -937,26 +951,29 @@ class Instance(transient_socket.TransientSocket):
         geom = self.geom.simplify(tolerance=0.01)
         self.geojson = geometry.mapping(geom)
 
+    def _update_prepared_geom(self):
+        """prepare the shape to speed up the repeated point-in-polygon tests"""
+        if not self.geom or not self.geom.is_valid:
+            self.prepared_geom = None
+            return
+        self.prepared_geom = prep(self.geom)
+
     def init(self):
         """
         Get and store variables of the instance.
-        Returns True if we need to clear the cache, False otherwise.
+        The instance is updated by the call, a new publication date is notified to the publication_date_listeners.
         """
-        pub_date = self.publication_date
         req = request_pb2.Request()
         req.requested_api = type_pb2.METADATAS
         request_id = "instance_init"
         try:
             # we use _send_and_receive to avoid the circuit breaker, we don't want fast fail on init :)
-            resp = self._send_and_receive(req, request_id=request_id, timeout=1, quiet=True)
             # the instance is automatically updated on a call
-            if self.publication_date != pub_date:
-                return True
+            self._send_and_receive(req, request_id=request_id, timeout=1, quiet=True)
         except DeadSocketException:
             # we don't do anything on error, a new session will be established to an available kraken on
-            # the next request. We don't want to purge all our cache for a small error.
+            # the next request.
             logging.getLogger(__name__).debug('timeout on init for %s', self.name)
-        return False
 
     def _get_street_network(self, mode, request):
         if app.config[str('DISABLE_DATABASE')]:
@@ -33,6 +33,8 @@ from __future__ import absolute_import, print_function, unicode_literals, divisi
 from flask import json
 
 from shapely import geometry
+from shapely.strtree import STRtree
+from shapely.geometry.base import BaseGeometry
 from zmq import green as zmq
 from navitiacommon import type_pb2, request_pb2
 import glob
@@ -41,8 +43,12 @@ from jormungandr.protobuf_to_dict import protobuf_to_dict
 from jormungandr.exceptions import ApiNotFound, RegionNotFound, DeadSocketException, InvalidArguments
 from jormungandr.authentication import abort_request, can_read_user
 from jormungandr import authentication, cache, memory_cache, app
+from jormungandr.lru_cache import LruCache
+from jormungandr.utils import copy_flask_request_context, copy_context_in_greenlet_stack
 from jormungandr.instance import Instance
 import gevent
+import gevent.pool
+import flask
 import os
 
 
@@ -79,6 +85,35 @@ def choose_best_instance(instances):
     return best
 
 
+class CoverageIndex(object):
+    """
+    Spatial index of the coverage geometries of the instances
+
+    An STRtree on the geometries gives the instances whose bounding box contains a point, the point is then tested
+    against the prepared geometries of these candidates only.
+    """
+
+    def __init__(self, instances):
+        self._instances = [i for i in instances if i.geom is not None]
+        self._tree = STRtree([i.geom for i in self._instances]) if self._instances else None
+        self._instances_by_geom_id = {id(i.geom): i for i in self._instances}
+
+    def query(self, point):
+        """
+        :return: the instances containing the point
+        """
+        if self._tree is None:
+            return []
+        candidates = []
+        for item in self._tree.query(point):
+            # shapely < 2.0 returns the indexed geometries while shapely >= 2.0 returns their indexes
+            if isinstance(item, BaseGeometry):
+                candidates.append(self._instances_by_geom_id[id(item)])
+            else:
+                candidates.append(self._instances[int(item)])
+        return [i for i in candidates if i.has_point(point)]
+
+
 class InstanceManager(object):
     """
     Handle the different Kraken instances
@@ -101,6 +136,9 @@ class InstanceManager(object):
         self.instances = {}
         self.context = zmq.Context()
         self.is_ready = False  # type: bool
+        self._coverage_index = CoverageIndex([])
+        # by instance name, a local cache of the ids found (or not) in the instance
+        self._id_caches = {}
 
     def __repr__(self):
         return '<InstanceManager>'
@@ -130,8 +168,17 @@ class InstanceManager(object):
             resp_content_limit_endpoints_whitelist=config.get('resp_content_limit_endpoints_whitelist', None),
         )
 
+        instance.publication_date_listeners.append(self._update_coverage_index)
+        instance.publication_date_listeners.append(self._clear_id_cache)
         self.instances[instance.name] = instance
 
+    def _update_coverage_index(self, instance=None):
+        """
+        rebuild the coverage index, called each time the geometry of an instance changes
+        """
+        logging.getLogger(__name__).debug('updating the coverage index')
+        self._coverage_index = CoverageIndex(list(self.instances.values()))
+
     def initialization(self):
         """
         Load  configuration from ini file providing files paths to:
@@ -139,6 +186,8 @@ class InstanceManager(object):
             - zmq socket
         """
         self.instances.clear()
+        self._coverage_index = CoverageIndex([])
+        self._id_caches = {}
         for key, value in os.environ.items():
             if key.startswith('JORMUNGANDR_INSTANCE_'):
                 logging.getLogger(__name__).info("Initialisation, reading: %s", key)
@@ -158,17 +207,22 @@ class InstanceManager(object):
         if self.start_ping:
             gevent.spawn(self.thread_ping)
 
-    def _clear_cache(self):
-        logging.getLogger(__name__).info('clear cache')
-        try:
-            cache.delete_memoized(self._exists_id_in_instance)
-        except:
-            # if there is an error with cache, flask want to access to the app, this will fail at startup
-            # with a "working outside of application context"
-            # redis timeout also raise an exception: redis.exceptions.TimeoutError
-            # each backend has it's own exceptions, so we catch everything :(
-            logger = logging.getLogger(__name__)
-            logger.exception('there seem to be some kind of problems with the cache')
+    def _get_id_cache(self, instance):
+        id_cache = self._id_caches.get(instance.name)
+        if id_cache is None:
+            id_cache = LruCache(
+                max_size=app.config.get(str('HAS_ID_CACHE_SIZE'), 10000),
+                ttl=app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_PTOBJECTS'), None),
+            )
+            self._id_caches[instance.name] = id_cache
+        return id_cache
+
+    def _clear_id_cache(self, instance):
+        """
+        the ids of an instance may have changed with its new publication date
+        """
+        logging.getLogger(__name__).info('clear id cache of %s', instance.name)
+        self._get_id_cache(instance).clear()
 
     def get_instance_scenario_name(self, instance_name, override_scenario):
         if override_scenario:
@@ -189,11 +243,8 @@ class InstanceManager(object):
         if not hasattr(scenario, api) or not callable(getattr(scenario, api)):
             raise ApiNotFound(api)
 
-        publication_date = instance.publication_date
         api_func = getattr(scenario, api)
         resp = api_func(arguments, instance)
-        if instance.publication_date != publication_date:
-            self._clear_cache()
         return resp
 
     def init_kraken_instances(self):
@@ -201,17 +252,11 @@ class InstanceManager(object):
         Call all kraken instances (as found in the instances dir) and store it's metadata
         """
         futures = []
-        purge_cache_needed = False
         for instance in self.instances.values():
             if not instance.is_initialized:
                 futures.append(gevent.spawn(instance.init))
 
         gevent.wait(futures)
-        for future in futures:
-            # we check if an instance needs the cache to be purged
-            if future.get():
-                self._clear_cache()
-                break
 
     def thread_ping(self, timer=10):
         """
@@ -254,22 +299,66 @@ class InstanceManager(object):
         return self._all_keys_of_id_in_instances(instances, object_id)
 
     def _all_keys_of_id_in_instances(self, instances, object_id):
-        valid_instances = []
+        """
+        The ids are first looked up in the local cache of each instance (that also remembers the ids an instance
+        doesn't have), the remaining instances are asked in parallel
+        """
+        exists_by_instance = {}
+        instances_to_ask = []
         for instance in instances:
-            if self._exists_id_in_instance(instance, object_id):
-                valid_instances.append(instance)
+            exists = self._get_id_cache(instance).get(object_id)
+            if exists is None:
+                instances_to_ask.append(instance)
+            else:
+                exists_by_instance[instance.name] = exists
+
+        if instances_to_ask:
+            reqctx = copy_flask_request_context() if flask.has_request_context() else None
+
+            def exists_id(instance):
+                try:
+                    return instance, self._exists_id_in_instance(instance, object_id, instance.publication_date)
+                except DeadSocketException:
+                    # we don't know if the instance has the id, the answer must not be cached
+                    logging.getLogger(__name__).info(
+                        'unable to know if %s has the id %s, the instance is dead', instance.name, object_id
+                    )
+                    return instance, None
+
+            def worker(instance):
+                if reqctx is None:
+                    return exists_id(instance)
+                with copy_context_in_greenlet_stack(reqctx):
+                    return exists_id(instance)
+
+            pool = gevent.pool.Pool(app.config.get(str('GREENLET_POOL_SIZE'), 10))
+            futures = [pool.spawn(worker, instance) for instance in instances_to_ask]
+            for future in gevent.iwait(futures):
+                instance, exists = future.get()
+                if exists is not None:
+                    exists = bool(exists)
+                    self._get_id_cache(instance).set(object_id, exists)
+                exists_by_instance[instance.name] = exists
+
+        valid_instances = [i for i in instances if exists_by_instance.get(i.name)]
         if not valid_instances:
             raise RegionNotFound(object_id=object_id)
-
         return valid_instances
 
     @cache.memoize(app.config[str('CACHE_CONFIGURATION')].get(str('TIMEOUT_PTOBJECTS'), None))
-    def _exists_id_in_instance(self, instance, object_id):
-        return instance.has_id(object_id)
+    def _exists_id_in_instance(self, instance, object_id, publication_date):
+        """
+        publication_date is part of the cache key, so the entries of the previous data are no more used once a new
+        data is published
+
+        A DeadSocketException is raised when kraken doesn't answer, so that a timeout isn't cached as an unknown id
+        """
+        return len(instance.get_id(object_id).places) > 0
 
     def _all_keys_of_coord_in_instances(self, instances, lon, lat):
         p = geometry.Point(lon, lat)
-        valid_instances = [i for i in instances if i.has_point(p)]
+        matching_instances = {i.name for i in self._coverage_index.query(p)}
+        valid_instances = [i for i in instances if i.name in matching_instances]
         logging.getLogger(__name__).debug(
             "_all_keys_of_coord_in_instances(self, {}, {}) returns {}".format(lon, lat, instances)
         )
@@ -367,6 +456,13 @@ class InstanceManager(object):
             else:
                 return result
 
+        if authentication.is_authorization_snapshot_usable():
+            return [
+                name
+                for name in authentication.authorization_snapshot.get_all_available_instances_names(user)
+                if name in self.instances
+            ]
+
         bdd_instances = user.get_all_available_instances()
         for bdd_instance in bdd_instances:
             if bdd_instance.name in self.instances:
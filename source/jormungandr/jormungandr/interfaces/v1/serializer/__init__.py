@@ -33,6 +33,10 @@ from flask_restful.utils import unpack
 
 from .api import LinesSerializer
 from .api import DisruptionsSerializer
+from .compiled import compile_serializers
+
+# all the serializers of the api are defined, they can be compiled
+compile_serializers()
 
 
 class serialize_with(object):
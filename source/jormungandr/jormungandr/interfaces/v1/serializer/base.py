@@ -47,18 +47,27 @@ class PbField(Field):
     """
 
     def as_getter(self, serializer_field_name, serializer_cls):
-        op = operator.attrgetter(self.attr or serializer_field_name)
+        attr = self.attr or serializer_field_name
+        op = operator.attrgetter(attr)
+
+        if self.display_none:
+            return lambda obj: None if obj is None else op(obj)
+
+        # descriptors of the messages where HasField throws an exception (if the field is repeated...)
+        without_presence = set()
 
         def getter(obj):
             if obj is None:
                 return None
+            if obj.DESCRIPTOR in without_presence:
+                return op(obj)
             try:
-                if self.display_none or obj.HasField(self.attr or serializer_field_name):
+                if obj.HasField(attr):
                     return op(obj)
                 else:
                     return None
             except ValueError:
-                # HasField throw an exception if the field is repeated...
+                without_presence.add(obj.DESCRIPTOR)
                 return op(obj)
 
         return getter
@@ -88,11 +97,11 @@ class NestedPbField(PbField):
     """
 
     def as_getter(self, serializer_field_name, serializer_cls):
-        attr = self.attr or serializer_field_name
+        path = (self.attr or serializer_field_name).split('.')
 
         def getter(obj):
             cur_obj = obj
-            for f in attr.split('.'):
+            for f in path:
                 if not cur_obj.HasField(f):
                     return None
                 cur_obj = getattr(cur_obj, f)
@@ -101,6 +110,16 @@ class NestedPbField(PbField):
         return getter
 
 
+def _get_enum_values(enums, descriptor, field_name):
+    """
+    values_by_number of the enum field of a message descriptor, cached in `enums`
+    """
+    values = enums.get(descriptor)
+    if values is None:
+        values = enums[descriptor] = descriptor.fields_by_name[field_name].enum_type.values_by_number
+    return values
+
+
 class NullableDictSerializer(serpy.Serializer):
     @classmethod
     def default_getter(cls, attr):
@@ -124,12 +143,13 @@ class EnumField(jsonschema.Field):
         super(EnumField, self).__init__(schema_type=schema_type, schema_metadata=schema_metadata, **kwargs)
 
     def as_getter(self, serializer_field_name, serializer_cls):
+        attr = self.attr or serializer_field_name
+        enums = {}
+
         def getter(val):
-            attr = self.attr or serializer_field_name
             if val is None or not val.HasField(attr):
                 return None
-            enum = val.DESCRIPTOR.fields_by_name[attr].enum_type.values_by_number
-            return enum[getattr(val, attr)].name
+            return _get_enum_values(enums, val.DESCRIPTOR, attr)[getattr(val, attr)].name
 
         return getter
 
@@ -159,11 +179,14 @@ class NestedEnumField(EnumField):
     """
 
     def as_getter(self, serializer_field_name, serializer_cls):
+        path = (self.attr or serializer_field_name).split('.')
+        enum_field = path[-1]
+        path = path[:-1]
+        enums = {}
+
         def getter(val):
-            attr = self.attr or serializer_field_name
-            enum_field = attr.split('.')[-1]
             cur_obj = val
-            for f in attr.split('.')[:-1]:
+            for f in path:
                 if not cur_obj.HasField(f):
                     return None
 
@@ -173,7 +196,7 @@ class NestedEnumField(EnumField):
 
             if not cur_obj.HasField(enum_field):
                 return None
-            enum = cur_obj.DESCRIPTOR.fields_by_name[enum_field].enum_type.values_by_number
+            enum = _get_enum_values(enums, cur_obj.DESCRIPTOR, enum_field)
             ret_value = enum[getattr(cur_obj, enum_field)].name
             return ret_value
 
@@ -187,12 +210,13 @@ class EnumListField(EnumField):
     def __init__(self, pb_type=None, **kwargs):
         super(EnumListField, self).__init__(pb_type, **kwargs)
         self.many = True
+        self._enums = {}
 
     def as_getter(self, serializer_field_name, serializer_cls):
         return lambda x: x
 
     def to_value(self, obj):
-        enum = obj.DESCRIPTOR.fields_by_name[self.attr].enum_type.values_by_number
+        enum = _get_enum_values(self._enums, obj.DESCRIPTOR, self.attr)
         return [enum[value].name.lower() for value in getattr(obj, self.attr)]
 
 
@@ -0,0 +1,131 @@
+#  Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+"""
+Compilation of the serializers
+
+serpy serializes an object by looping on the compiled fields of its serializer and checking, for each
+field, whether it needs the serializer, a call, a conversion... These checks only depend on the serializer
+class, so we generate once, for each serializer class, a specialized `_serialize` with the loop unrolled,
+the branches resolved and the getters and converters bound to local names.
+The output is exactly the same as serpy's.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+from contextlib import contextmanager
+import serpy
+
+_serpy_serialize = serpy.Serializer._serialize
+
+# the serializer classes whose `_serialize` has been compiled
+_compiled_classes = set()
+
+
+def _make_serialize_function(serializer_cls):
+    compiled_fields = serializer_cls._compiled_fields
+    namespace = {'compiled_fields': compiled_fields, 'serpy_serialize': _serpy_serialize}
+    lines = [
+        'def _serialize(self, instance, fields):',
+        # an uncompiled subclass inheriting this function falls back to serpy
+        '    if fields is not compiled_fields:',
+        '        return serpy_serialize(self, instance, fields)',
+        '    v = {}',
+    ]
+    for i, (name, getter, to_value, call, required, pass_self, display_none) in enumerate(compiled_fields):
+        namespace['name_{}'.format(i)] = name
+        namespace['getter_{}'.format(i)] = getter
+        namespace['to_value_{}'.format(i)] = to_value
+        if pass_self:
+            lines.append('    result = getter_{}(self, instance)'.format(i))
+        else:
+            lines.append('    result = getter_{}(instance)'.format(i))
+            conversions = []
+            if call:
+                conversions.append('result = result()')
+            if to_value:
+                conversions.append('result = to_value_{}(result)'.format(i))
+            if conversions and required:
+                lines.extend('    ' + c for c in conversions)
+            elif conversions:
+                lines.append('    if result is not None:')
+                lines.extend('        ' + c for c in conversions)
+        if display_none:
+            lines.append('    v[name_{}] = result'.format(i))
+        else:
+            lines.append('    if result is not None and result != []:')
+            lines.append('        v[name_{}] = result'.format(i))
+    lines.append('    return v')
+
+    code = compile('\n'.join(lines), '<compiled {}._serialize>'.format(serializer_cls.__name__), 'exec')
+    exec(code, namespace)
+    return namespace['_serialize']
+
+
+def compile_serializer(serializer_cls):
+    """
+    Replace the `_serialize` of a serializer class by a specialized function
+
+    Classes defining their own `_serialize` are left untouched.
+    """
+    for cls in serializer_cls.__mro__:
+        if cls is serpy.Serializer or cls in _compiled_classes:
+            break
+        if '_serialize' in cls.__dict__:
+            return False
+    serializer_cls._serialize = _make_serialize_function(serializer_cls)
+    _compiled_classes.add(serializer_cls)
+    return True
+
+
+def compile_serializers(base=serpy.Serializer):
+    """
+    Compile all the already defined subclasses of `base`
+    """
+    nb_compiled = 0
+    to_visit = list(base.__subclasses__())
+    while to_visit:
+        cls = to_visit.pop()
+        to_visit.extend(cls.__subclasses__())
+        if cls not in _compiled_classes and compile_serializer(cls):
+            nb_compiled += 1
+    return nb_compiled
+
+
+@contextmanager
+def serpy_serialization():
+    """
+    Use the original serpy `_serialize` in the block, only useful to compare both implementations
+    """
+    compiled = {cls: cls.__dict__['_serialize'] for cls in _compiled_classes}
+    for cls in compiled:
+        del cls._serialize
+    try:
+        yield
+    finally:
+        for cls, serialize in compiled.items():
+            cls._serialize = serialize
@@ -0,0 +1,90 @@
+#  Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import serpy
+
+from jormungandr.interfaces.v1.serializer import api
+from jormungandr.interfaces.v1.serializer.compiled import compile_serializer, serpy_serialization
+from jormungandr.interfaces.v1.test.serializer_benchmark import make_journeys_response, serialize_journeys
+
+
+class ItemSerializer(serpy.DictSerializer):
+    id = serpy.StrField()
+    value = serpy.IntField(required=False, display_none=False)
+    label = serpy.Field(display_none=True)
+    lazy = serpy.Field(call=True, required=False)
+    double = serpy.MethodField()
+
+    def get_double(self, obj):
+        return obj['value'] * 2 if obj.get('value') is not None else None
+
+
+class ItemsSerializer(serpy.DictSerializer):
+    items = ItemSerializer(many=True, display_none=False)
+
+
+ITEMS = {
+    'items': [
+        {'id': 1, 'value': '2', 'label': None, 'lazy': lambda: 'lazy'},
+        {'id': 2, 'value': None, 'label': 'b', 'lazy': None},
+    ]
+}
+
+
+def compiled_serializer_test():
+    with serpy_serialization():
+        expected = ItemsSerializer(ITEMS).data
+    assert compile_serializer(ItemSerializer)
+    assert compile_serializer(ItemsSerializer)
+    assert ItemsSerializer(ITEMS).data == expected
+    assert ItemsSerializer({'items': []}).data == {}
+
+
+def uncompiled_subclass_test():
+    compile_serializer(ItemSerializer)
+
+    class SubItemSerializer(ItemSerializer):
+        extra = serpy.Field(attr='id')
+
+    # the subclass inherits the compiled function of its parent, it must not use its fields
+    assert SubItemSerializer(ITEMS['items'][0]).data['extra'] == 1
+
+
+def compiled_journeys_serializer_test():
+    # the serializers of the api are compiled at import
+    assert '_serialize' in api.JourneysSerializer.__dict__
+    response = make_journeys_response(nb_journeys=3, nb_stop_times=5, nb_coords=10)
+    compiled = serialize_journeys(response)
+    with serpy_serialization():
+        expected = serialize_journeys(response)
+    assert compiled == expected
+    assert len(compiled['journeys']) == 3
+    assert len(compiled['journeys'][0]['sections'][1]['stop_date_times']) == 5
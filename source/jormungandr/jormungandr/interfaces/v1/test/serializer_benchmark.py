@@ -0,0 +1,148 @@
+#  Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+"""
+Benchmark of the serialization of a /journeys response, compiled serializers vs serpy
+
+    python -m jormungandr.interfaces.v1.test.serializer_benchmark
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import timeit
+
+import pytz
+from flask import g
+
+from navitiacommon import response_pb2, type_pb2
+from jormungandr import app
+from jormungandr.interfaces.v1.serializer import api
+from jormungandr.interfaces.v1.serializer.compiled import serpy_serialization
+
+START = 1672567200  # 20230101T100000
+
+
+def _fill_stop_point(pt_object, i):
+    pt_object.embedded_type = type_pb2.STOP_POINT
+    pt_object.uri = 'stop_point:{}'.format(i)
+    pt_object.name = 'stop point {}'.format(i)
+    pt_object.stop_point.uri = pt_object.uri
+    pt_object.stop_point.name = pt_object.name
+    pt_object.stop_point.coord.lon = 2.3 + i * 0.001
+    pt_object.stop_point.coord.lat = 48.8 + i * 0.001
+
+
+def _add_coords(coords, nb):
+    for i in range(nb):
+        coord = coords.add()
+        coord.lon = 2.3 + i * 0.0001
+        coord.lat = 48.8 + i * 0.0001
+
+
+def _add_street_network_section(journey, begin, nb_coords):
+    section = journey.sections.add()
+    section.id = 'section_{}'.format(len(journey.sections))
+    section.type = response_pb2.STREET_NETWORK
+    section.duration = 300
+    section.begin_date_time = begin
+    section.end_date_time = begin + 300
+    section.length = 400
+    section.street_network.mode = response_pb2.Walking
+    _add_coords(section.street_network.coordinates, nb_coords)
+    _fill_stop_point(section.origin, 0)
+    _fill_stop_point(section.destination, 1)
+    return section
+
+
+def _add_public_transport_section(journey, begin, nb_stop_times, nb_coords):
+    section = journey.sections.add()
+    section.id = 'section_{}'.format(len(journey.sections))
+    section.type = response_pb2.PUBLIC_TRANSPORT
+    section.duration = nb_stop_times * 120
+    section.begin_date_time = begin
+    section.end_date_time = begin + section.duration
+    section.length = nb_stop_times * 500
+    section.uris.line = 'line:1'
+    section.uris.route = 'route:1'
+    section.uris.vehicle_journey = 'vehicle_journey:1'
+    section.pt_display_informations.name = 'line 1'
+    section.pt_display_informations.code = '1'
+    section.pt_display_informations.physical_mode = 'Metro'
+    section.pt_display_informations.direction = 'terminus'
+    _fill_stop_point(section.origin, 1)
+    _fill_stop_point(section.destination, nb_stop_times)
+    for i in range(nb_stop_times):
+        stop_date_time = section.stop_date_times.add()
+        stop_date_time.departure_date_time = begin + i * 120
+        stop_date_time.arrival_date_time = begin + i * 120
+        stop_date_time.base_departure_date_time = begin + i * 120
+        stop_date_time.base_arrival_date_time = begin + i * 120
+        stop_date_time.stop_point.uri = 'stop_point:{}'.format(i)
+        stop_date_time.stop_point.name = 'stop point {}'.format(i)
+        stop_date_time.stop_point.coord.lon = 2.3 + i * 0.001
+        stop_date_time.stop_point.coord.lat = 48.8 + i * 0.001
+    _add_coords(section.shape, nb_coords)
+    return section
+
+
+def make_journeys_response(nb_journeys=20, nb_stop_times=30, nb_coords=200):
+    response = response_pb2.Response()
+    for i in range(nb_journeys):
+        begin = START + i * 600
+        journey = response.journeys.add()
+        journey.type = 'best'
+        journey.tags.append('walking')
+        journey.nb_transfers = 0
+        journey.departure_date_time = begin
+        journey.requested_date_time = START
+        _add_street_network_section(journey, begin, nb_coords)
+        pt_section = _add_public_transport_section(journey, begin + 300, nb_stop_times, nb_coords)
+        _add_street_network_section(journey, pt_section.end_date_time, nb_coords)
+        journey.arrival_date_time = journey.sections[-1].end_date_time
+        journey.duration = journey.arrival_date_time - begin
+        journey.durations.total = journey.duration
+        journey.durations.walking = 600
+    return response
+
+
+def serialize_journeys(response):
+    with app.test_request_context():
+        g.timezone = pytz.timezone('Europe/Paris')
+        return api.JourneysSerializer(response).data
+
+
+def benchmark(number=20):
+    response = make_journeys_response()
+    compiled = timeit.timeit(lambda: serialize_journeys(response), number=number) / number
+    with serpy_serialization():
+        serpy = timeit.timeit(lambda: serialize_journeys(response), number=number) / number
+    return compiled, serpy
+
+
+if __name__ == '__main__':
+    compiled, serpy = benchmark()
+    print('serpy: {:.1f}ms, compiled: {:.1f}ms ({:.0%})'.format(serpy * 1000, compiled * 1000, compiled / serpy))
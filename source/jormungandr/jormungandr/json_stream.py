@@ -0,0 +1,133 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+"""
+Incremental encoding of the json responses
+
+A big response (ex: /vehicle_journeys with a large count) is encoded item by item of its collections and sent
+by chunks, instead of being encoded in one string as big as the response.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import logging
+from flask import abort
+import six
+import ujson
+
+from jormungandr import app, new_relic
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# sent at the end of a streamed response whose encoding failed once its status had been sent: the body is not a
+# valid json and the marker tells why
+ENCODING_ERROR_MARKER = b'\n{"error": {"id": "technical_error", "message": "the response is incomplete"}}'
+
+
+def _iter_json_parts(data):
+    """
+    The json of data in several strings, the lists at its first level are encoded item by item
+
+    the concatenation of the parts is exactly ujson.dumps(data)
+    """
+    if not isinstance(data, dict):
+        yield ujson.dumps(data)
+        return
+    yield '{'
+    for i, (key, value) in enumerate(six.iteritems(data)):
+        prefix = ',' if i else ''
+        if isinstance(value, (list, tuple)):
+            yield prefix + ujson.dumps(six.text_type(key)) + ':['
+            for j, item in enumerate(value):
+                yield ujson.dumps(item) if j == 0 else ',' + ujson.dumps(item)
+            yield ']'
+        else:
+            yield prefix + ujson.dumps(six.text_type(key)) + ':' + ujson.dumps(value)
+    yield '}'
+
+
+def iter_json_chunks(data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    The json of data as chunks of bytes of about chunk_size
+    """
+    parts = []
+    size = 0
+    for part in _iter_json_parts(data):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def should_be_streamed(data):
+    """
+    Only the responses with a big collection are streamed
+    """
+    min_items = app.config.get(str('JSON_STREAMING_MIN_ITEMS'), 0)
+    if not min_items or not isinstance(data, dict):
+        return False
+    return any(isinstance(v, (list, tuple)) and len(v) >= min_items for v in six.itervalues(data))
+
+
+def _iter_chunks_with_error_marker(first_chunk, chunks):
+    yield first_chunk
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception:
+        logging.getLogger(__name__).exception('error while encoding a streamed response')
+        new_relic.record_exception()
+        yield ENCODING_ERROR_MARKER
+
+
+def make_streamed_json_response(data, code, headers=None, content_limit=None):
+    """
+    Build a response sending the json of data by chunks
+
+    With a content limit, the response is first encoded without being kept to know its size: the request is
+    aborted (413) as soon as the limit is exceeded, without encoding the rest of the response.
+
+    The first chunk is encoded before the response is sent, an error there gives the usual error response. A
+    later error can't change the status anymore, the body is then terminated by ENCODING_ERROR_MARKER.
+    """
+    size = None
+    if content_limit is not None:
+        size = 0
+        for chunk in iter_json_chunks(data):
+            size += len(chunk)
+            if size > content_limit:
+                abort(413)
+    chunks = iter_json_chunks(data)
+    first_chunk = next(chunks, b'')
+    resp = app.response_class(_iter_chunks_with_error_marker(first_chunk, chunks), status=code)
+    if size is not None:
+        resp.content_length = size
+    resp.headers.extend(headers or {})
+    return resp
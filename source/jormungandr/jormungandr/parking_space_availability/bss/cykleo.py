@@ -29,7 +29,8 @@
 # https://groups.google.com/d/forum/navitia
 # www.navitia.io
 from __future__ import absolute_import, print_function, unicode_literals, division
-from jormungandr import cache, app
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
 import pybreaker
 import logging
 import json
@@ -37,7 +38,8 @@ import requests as requests
 from jormungandr.ptref import FeedPublisher
 from jormungandr.parking_space_availability.bss.stands import Stands, StandsStatus
 from jormungandr.parking_space_availability.bss.common_bss_provider import CommonBssProvider, BssProxyError
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
+from jormungandr.http_client import get_http_client
 
 
 DEFAULT_CYKLEO_FEED_PUBLISHER = {'id': 'cykleo', 'name': 'cykleo', 'license': 'Private', 'url': 'www.cykleo.fr'}
@@ -93,6 +95,7 @@ class CykleoProvider(CommonBssProvider):
         self.password = password
         self.operators = [o.lower() for o in operators]
         self.timeout = timeout
+        self.http_client = get_http_client('cykleo')
         self.breaker = pybreaker.CircuitBreaker(
             fail_max=kwargs.get('circuit_breaker_max_fail', app.config['CIRCUIT_BREAKER_MAX_CYKLEO_FAIL']),
             reset_timeout=kwargs.get(
@@ -103,7 +106,11 @@ class CykleoProvider(CommonBssProvider):
 
     def service_caller(self, method, url, headers, data=None, params=None):
         try:
-            kwargs = {"timeout": self.timeout, "verify": self.verify_certificate, "headers": headers}
+            kwargs = {
+                "timeout": get_remaining_time(self.timeout),
+                "verify": self.verify_certificate,
+                "headers": headers,
+            }
             if data:
                 kwargs.update({"data": data})
             if params:
@@ -125,7 +132,7 @@ class CykleoProvider(CommonBssProvider):
             logging.getLogger(__name__).exception('cykleo error : {}'.format(str(e)))
             raise BssProxyError(str(e))
 
-    @cache.memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_CYKLEO_JETON'), 10 * 60))
+    @coalescing_memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_CYKLEO_JETON'), 10 * 60))
     def get_access_token(self):
         headers = {"Content-Type": "application/json", "Accept": "application/json"}
         data = {"username": self.username, "password": self.password, "sphere": "VLS"}
@@ -133,7 +140,10 @@ class CykleoProvider(CommonBssProvider):
             data.update({"serviceId": self.service_id})
 
         response = self.service_caller(
-            method=requests.post, url='{}/bo/auth'.format(self.url), headers=headers, data=json.dumps(data)
+            method=self.http_client.post,
+            url='{}/bo/auth'.format(self.url),
+            headers=headers,
+            data=json.dumps(data),
         )
         if not response:
             return None
@@ -144,13 +154,13 @@ class CykleoProvider(CommonBssProvider):
             return None
         return access_token
 
-    @cache.memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_CYKLEO'), 30))
+    @coalescing_memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_CYKLEO'), 30))
     def _call_webservice(self):
         access_token = self.get_access_token()
         headers = {'Authorization': 'Bearer {}'.format(access_token)}
         params = None if self.organization_id is None else {'organization_id': self.organization_id}
         data = self.service_caller(
-            method=requests.get,
+            method=self.http_client.get,
             url='{}/bo/stations/availability'.format(self.url),
             headers=headers,
             params=params,
@@ -34,12 +34,14 @@ import logging
 import pybreaker
 import requests as requests
 
-from jormungandr import cache, app
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
 from jormungandr.parking_space_availability.bss.common_bss_provider import CommonBssProvider, BssProxyError
 from jormungandr.parking_space_availability.bss.stands import Stands, StandsStatus
 from jormungandr.ptref import FeedPublisher
 import datetime
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
+from jormungandr.http_client import get_http_client
 
 DEFAULT_JCDECAUX_FEED_PUBLISHER = {
     'id': 'jcdecaux',
@@ -72,6 +74,7 @@ class JcdecauxProvider(CommonBssProvider):
         reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config['CIRCUIT_BREAKER_JCDECAUX_TIMEOUT_S']
         )
+        self.http_client = get_http_client('jcdecaux')
         self.breaker = pybreaker.CircuitBreaker(fail_max=fail_max, reset_timeout=reset_timeout)
         self._feed_publisher = FeedPublisher(**feed_publisher) if feed_publisher else None
         self._data = {}
@@ -85,11 +88,13 @@ class JcdecauxProvider(CommonBssProvider):
             and properties.get('network', '').lower() == self.network
         )
 
-    @cache.memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_JCDECAUX'), 30))
+    @coalescing_memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_JCDECAUX'), 30))
     def _call_webservice(self):
         try:
             data = self.breaker.call(
-                requests.get, self.WS_URL_TEMPLATE.format(self.contract, self.api_key), timeout=self.timeout
+                self.http_client.get,
+                self.WS_URL_TEMPLATE.format(self.contract, self.api_key),
+                timeout=get_remaining_time(self.timeout),
             )
             stands = {}
             for s in data.json():
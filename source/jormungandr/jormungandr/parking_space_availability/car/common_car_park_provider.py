@@ -37,6 +37,8 @@ import requests as requests
 from jormungandr import cache, app, new_relic
 from jormungandr.parking_space_availability import AbstractParkingPlacesProvider
 from jormungandr.ptref import FeedPublisher
+from jormungandr.http_client import get_http_client
+from jormungandr.utils import get_remaining_time
 
 from abc import abstractmethod
 
@@ -55,6 +57,7 @@ class CommonCarParkProvider(AbstractParkingPlacesProvider):
         self.reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config.get(str('CIRCUIT_BREAKER_CAR_PARK_TIMEOUT_S'), 60)
         )
+        self.http_client = get_http_client('car_park')
         self.breaker = pybreaker.CircuitBreaker(fail_max=self.fail_max, reset_timeout=self.reset_timeout)
         self.log = logging.LoggerAdapter(logging.getLogger(__name__), extra={'dataset': self.dataset})
 
@@ -90,7 +93,11 @@ class CommonCarParkProvider(AbstractParkingPlacesProvider):
             else:
                 headers = None
             data = self.breaker.call(
-                requests.get, url=request_url, headers=headers, timeout=self.timeout, verify=self.verify
+                self.http_client.get,
+                url=request_url,
+                headers=headers,
+                timeout=get_remaining_time(self.timeout),
+                verify=self.verify,
             )
             json_data = data.json()
             self.record_call("OK")
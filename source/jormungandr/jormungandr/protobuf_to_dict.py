@@ -64,9 +64,64 @@ def enum_label_name(field, value):
     return field.enum_type.values_by_number[int(value)].name
 
 
+# converter of each message type, by (message descriptor, use_enum_labels)
+_converters = {}
+
+
+def _make_field_converter(field, use_enum_labels):
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        type_callable = _get_converter(field.message_type, use_enum_labels)
+    elif use_enum_labels and field.type == FieldDescriptor.TYPE_ENUM:
+        labels = {v.number: v.name for v in field.enum_type.values}
+        type_callable = lambda value: labels[int(value)]
+    elif field.type in TYPE_CALLABLE_MAP:
+        type_callable = TYPE_CALLABLE_MAP[field.type]
+    else:
+        raise TypeError(
+            "Field %s.%s has unrecognised type id %d" % (field.containing_type.name, field.name, field.type)
+        )
+    if field.label == FieldDescriptor.LABEL_REPEATED:
+        type_callable = repeated(type_callable)
+    return type_callable
+
+
+def _make_converter(use_enum_labels):
+    # the converters of the fields are built the first time the field is met, this way the recursive
+    # messages are handled and we don't pay for the fields that are never set
+    field_converters = {}
+
+    def convert(pb):
+        result_dict = {}
+        for field, value in pb.ListFields():
+            field_converter = field_converters.get(field)
+            if field_converter is None:
+                field_converter = field_converters[field] = _make_field_converter(field, use_enum_labels)
+            result_dict[field.name] = field_converter(value)
+        return result_dict
+
+    return convert
+
+
+def _get_converter(descriptor, use_enum_labels):
+    key = (descriptor, use_enum_labels)
+    converter = _converters.get(key)
+    if converter is None:
+        converter = _converters[key] = _make_converter(use_enum_labels)
+    return converter
+
+
 def protobuf_to_dict(pb, type_callable_map=TYPE_CALLABLE_MAP, use_enum_labels=False):
+    if type_callable_map is TYPE_CALLABLE_MAP:
+        return _get_converter(pb.DESCRIPTOR, use_enum_labels)(pb)
+    return _generic_protobuf_to_dict(pb, type_callable_map, use_enum_labels)
+
+
+def _generic_protobuf_to_dict(pb, type_callable_map, use_enum_labels):
+    """
+    conversion with a custom type_callable_map, the converters are not cached
+    """
     # recursion!
-    type_callable_map[FieldDescriptor.TYPE_MESSAGE] = lambda pb: protobuf_to_dict(
+    type_callable_map[FieldDescriptor.TYPE_MESSAGE] = lambda pb: _generic_protobuf_to_dict(
         pb, type_callable_map, use_enum_labels
     )
     result_dict = {}
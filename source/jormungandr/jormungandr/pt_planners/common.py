@@ -39,6 +39,7 @@ import six
 from jormungandr import app
 from jormungandr.transient_socket import TransientSocket
 from jormungandr.exceptions import DeadSocketException
+from jormungandr.utils import get_remaining_time
 from navitiacommon import response_pb2, request_pb2, type_pb2
 
 
@@ -57,7 +58,13 @@ class ZmqSocket(TransientSocket):
             socket_ttl = float('inf')
 
         super(ZmqSocket, self).__init__(
-            name=name, zmq_context=zmq_context, zmq_socket=zmq_socket, socket_ttl=socket_ttl
+            name=name,
+            zmq_context=zmq_context,
+            zmq_socket=zmq_socket,
+            socket_ttl=socket_ttl,
+            multiplexed=app.config.get(str('ZMQ_MULTIPLEXED_CHANNEL'), False),
+            max_in_flight_requests=app.config.get(str('ZMQ_MAX_IN_FLIGHT_REQUESTS'), 64),
+            nb_channels=app.config.get(str('ZMQ_NB_CHANNELS'), 2),
         )
         self.timeout = timeout
         self.breaker = pybreaker.CircuitBreaker(
@@ -66,7 +73,8 @@ class ZmqSocket(TransientSocket):
         )
 
     def _send_and_receive(self, request, quiet=False, **kwargs):
-        deadline = datetime.utcnow() + timedelta(milliseconds=self.timeout * 1000)
+        timeout = get_remaining_time(self.timeout)
+        deadline = datetime.utcnow() + timedelta(milliseconds=timeout * 1000)
         request.deadline = deadline.strftime('%Y%m%dT%H%M%S,%f')
 
         if 'request_id' in kwargs and kwargs['request_id']:
@@ -80,7 +88,7 @@ class ZmqSocket(TransientSocket):
                     request.request_id = kwargs['flask_request_id']
 
         pb = self.call(
-            request.SerializeToString(), self.timeout, debug_cb=lambda: six.text_type(request), quiet=quiet
+            request.SerializeToString(), timeout, debug_cb=lambda: six.text_type(request), quiet=quiet
         )
         resp = response_pb2.Response()
         resp.ParseFromString(pb)
@@ -99,6 +107,7 @@ class ZmqSocket(TransientSocket):
         for socket in self._sockets:
             socket.setsockopt(zmq.LINGER, 0)
             socket.close()
+        self.close_channels()
 
     @staticmethod
     def is_zmq_socket():
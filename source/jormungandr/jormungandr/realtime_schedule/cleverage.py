@@ -36,7 +36,8 @@ import pytz
 import requests as requests
 from jormungandr import cache, app
 from jormungandr.schedule import RealTimePassage
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
+from jormungandr.http_client import get_http_client
 from datetime import datetime
 import six
 
@@ -85,6 +86,7 @@ class Cleverage(RealtimeProxy):
         reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config.get(str('CIRCUIT_BREAKER_CLEVERAGE_TIMEOUT_S'), 60)
         )
+        self.http_client = get_http_client('cleverage')
         self.breaker = pybreaker.CircuitBreaker(fail_max=fail_max, reset_timeout=reset_timeout)
         self.timezone = pytz.timezone(timezone)
 
@@ -106,7 +108,9 @@ class Cleverage(RealtimeProxy):
         """
         logging.getLogger(__name__).debug('Cleverage RT service , call url : {}'.format(url))
         try:
-            return self.breaker.call(requests.get, url, timeout=self.timeout, headers=self.service_args)
+            return self.breaker.call(
+                self.http_client.get, url, timeout=get_remaining_time(self.timeout), headers=self.service_args
+            )
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error(
                 'Cleverage RT service dead, using base schedule (error: {}'.format(e)
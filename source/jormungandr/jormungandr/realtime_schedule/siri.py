@@ -33,10 +33,12 @@ from __future__ import absolute_import, print_function, unicode_literals, divisi
 import logging
 import pybreaker
 import requests as requests
-from jormungandr import cache, app
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
 from jormungandr.realtime_schedule.realtime_proxy import RealtimeProxy, RealtimeProxyError, floor_datetime
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
 from jormungandr.schedule import RealTimePassage
+from jormungandr.http_client import get_http_client
 import xml.etree.ElementTree as et
 import aniso8601
 from datetime import datetime
@@ -154,6 +156,7 @@ class Siri(RealtimeProxy):
         reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config.get(str('CIRCUIT_BREAKER_SIRI_TIMEOUT_S'), 60)
         )
+        self.http_client = get_http_client('siri')
         self.breaker = pybreaker.CircuitBreaker(fail_max=fail_max, reset_timeout=reset_timeout)
         # A step is applied on from_datetime to discretize calls and allow caching them
         self.from_datetime_step = kwargs.get(
@@ -261,7 +264,7 @@ class Siri(RealtimeProxy):
 
         return next_passages
 
-    @cache.memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_SIRI'), 60))
+    @coalescing_memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_SIRI'), 60))
     def _call_siri(self, request):
         encoded_request = request.encode('utf-8', 'backslashreplace')
         headers = {"Content-Type": "text/xml; charset=UTF-8", "Content-Length": str(len(encoded_request))}
@@ -269,12 +272,12 @@ class Siri(RealtimeProxy):
         logging.getLogger(__name__).debug('siri RT service, post at {}: {}'.format(self.service_url, request))
         try:
             return self.breaker.call(
-                requests.post,
+                self.http_client.post,
                 url=self.service_url,
                 headers=headers,
                 data=encoded_request,
                 verify=False,
-                timeout=self.timeout,
+                timeout=get_remaining_time(self.timeout),
             )
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error('siri RT service dead, using base schedule (error: {}'.format(e))
@@ -30,7 +30,7 @@
 # www.navitia.io
 from __future__ import absolute_import, print_function, division
 from jormungandr.realtime_schedule.realtime_proxy import RealtimeProxy, RealtimeProxyError
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
 import logging
 import pybreaker
 import pytz
@@ -78,7 +78,7 @@ class SiriLite(RealtimeProxy):
     def _call(self, url):
         self.log.debug('sirilite RT service, call url: {}'.format(url))
         try:
-            return self.breaker.call(requests.get, url, timeout=self.timeout)
+            return self.breaker.call(requests.get, url, timeout=get_remaining_time(self.timeout))
         except pybreaker.CircuitBreakerError as e:
             self.log.error('sirilite RT service dead, using base schedule (error: {}'.format(e))
             raise RealtimeProxyError('circuit breaker open')
@@ -33,7 +33,7 @@ import itertools
 
 from jormungandr.realtime_schedule.realtime_proxy import RealtimeProxy, RealtimeProxyError
 from jormungandr.schedule import RealTimePassage
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
 import xml.etree.ElementTree as et
 import pytz
 import logging
@@ -128,6 +128,8 @@ class Synthese(RealtimeProxy):
                 redis_db=redis_db,
                 redis_password=redis_password,
                 redis_namespace=redis_namespace,
+                lock_free=kwargs.get('rate_limit_lock_free', False),
+                reservation_size=kwargs.get('rate_limit_reservation_size', 1),
             )
 
     def __repr__(self):
@@ -149,7 +151,7 @@ class Synthese(RealtimeProxy):
         try:
             if not self.rate_limiter.acquire(self.rt_system_id, block=False):
                 raise RealtimeProxyError('maximum rate reached')
-            return self.breaker.call(requests.get, url, timeout=self.timeout)
+            return self.breaker.call(requests.get, url, timeout=get_remaining_time(self.timeout))
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error(
                 'Synthese RT service dead, using base schedule (error: {}'.format(e)
@@ -30,13 +30,15 @@
 # www.navitia.io
 from __future__ import absolute_import, print_function, division
 from jormungandr.realtime_schedule.realtime_proxy import RealtimeProxy, RealtimeProxyError
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
 import logging
 import pybreaker
 import pytz
 import requests as requests
-from jormungandr import cache, app
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
 from jormungandr.schedule import RealTimePassage
+from jormungandr.http_client import get_http_client
 import aniso8601
 import six
 
@@ -76,6 +78,7 @@ class Sytral(RealtimeProxy):
         reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config.get(str('CIRCUIT_BREAKER_SYTRAL_TIMEOUT_S'), 60)
         )
+        self.http_client = get_http_client('sytral')
         self.breaker = pybreaker.CircuitBreaker(fail_max=fail_max, reset_timeout=reset_timeout)
 
     def __repr__(self):
@@ -111,7 +114,7 @@ class Sytral(RealtimeProxy):
     def _is_valid_direction(self, direction_uri, passage_direction_uri):
         return direction_uri == passage_direction_uri
 
-    @cache.memoize(app.config['CACHE_CONFIGURATION'].get('TIMEOUT_SYTRAL', 30))
+    @coalescing_memoize(app.config['CACHE_CONFIGURATION'].get('TIMEOUT_SYTRAL', 30))
     def _call(self, params):
         """
         http call to sytralRT
@@ -121,7 +124,12 @@ class Sytral(RealtimeProxy):
             extra={'rt_system_id': six.text_type(self.rt_system_id)},
         )
         try:
-            return self.breaker.call(requests.get, url=self.service_url, params=params, timeout=self.timeout)
+            return self.breaker.call(
+                self.http_client.get,
+                url=self.service_url,
+                params=params,
+                timeout=get_remaining_time(self.timeout),
+            )
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error(
                 'systralRT service dead, using base schedule (error: {}'.format(e),
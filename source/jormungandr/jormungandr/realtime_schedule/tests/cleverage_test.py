@@ -391,7 +391,7 @@ def next_passage_for_route_point_test(mock_good_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='stop_tutu')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = cleverage.next_passage_for_route_point(route_point)
 
         assert len(passages) == 2
@@ -418,7 +418,7 @@ def next_passage_for_route_point_local_timezone_test(mock_good_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='stop_tutu')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = cleverage.next_passage_for_route_point(route_point)
 
         assert len(passages) == 2
@@ -442,7 +442,7 @@ def next_passage_for_empty_response_test(mock_empty_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='stop_tutu')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = cleverage.next_passage_for_route_point(route_point)
 
         assert passages is None
@@ -461,7 +461,7 @@ def next_passage_for_missing_line_response_test(mock_missing_line_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='stop_tutu')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = cleverage.next_passage_for_route_point(route_point)
 
         assert passages is None
@@ -480,7 +480,7 @@ def next_passage_with_theoric_time_response_test(mock_theoric_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='stop_tutu')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = cleverage.next_passage_for_route_point(route_point)
 
         assert len(passages) == 2
@@ -403,7 +403,7 @@ def next_passage_for_route_point_test(mock_good_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.sytral.Sytral._get_direction',
             lambda Sytral, **kwargs: Direction("3341", "Piscine Chambéry"),
@@ -431,7 +431,7 @@ def next_passage_for_route_point_with_direction_type_test(mock_direction_type_is
 
     route_point = MockRoutePoint(line_code='05', stop_id='42', direction_type='forward')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.sytral.Sytral._get_direction',
             lambda Sytral, **kwargs: Direction("3341", "Piscine Chambéry"),
@@ -455,7 +455,7 @@ def next_passage_for_empty_response_test(mock_empty_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = sytral.next_passage_for_route_point(route_point)
 
         assert passages is None
@@ -472,7 +472,7 @@ def next_passage_for_no_departures_response_test(mock_no_departure_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = sytral.next_passage_for_route_point(route_point)
 
         assert passages == []
@@ -494,7 +494,7 @@ def next_passage_for_missing_line_response_test(mock_missing_line_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = sytral.next_passage_for_route_point(route_point)
 
         assert passages == []
@@ -516,7 +516,7 @@ def next_passage_with_theoric_time_response_test(mock_theoric_response):
 
     route_point = MockRoutePoint(line_code='05', stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.sytral.Sytral._get_direction',
             lambda Sytral, **kwargs: Direction("3341", "Piscine Chambéry"),
@@ -552,7 +552,7 @@ def next_passage_for_route_point_multiline_test(mock_multiline_response):
 
     route_point = MockRoutePoint(line_code=['05A', '05B'], stop_id='42')
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.sytral.Sytral._get_direction',
             lambda Sytral, **kwargs: Direction("3341", "Piscine Chambéry"),
@@ -579,7 +579,7 @@ def next_passage_for_route_point_multi_stop_point_id_test(mock_multi_stop_point_
 
     route_point = MockRoutePoint(line_code='05', stop_id=['42', '43'])
 
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.sytral.Sytral._get_direction',
             lambda Sytral, **kwargs: Direction("3341", "Piscine Chambéry"),
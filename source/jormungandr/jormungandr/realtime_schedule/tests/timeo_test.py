@@ -528,7 +528,7 @@ def next_passage_for_route_point_test():
 
     route_point = MockRoutePoint(route_id='route_tata', line_id='line_toto', stop_id='stop_tutu')
     # we mock the http call to return the hard coded mock_response
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         with mock.patch(
             'jormungandr.realtime_schedule.timeo.Timeo._get_direction',
             lambda timeo, **kwargs: Direction("StopPoint_Bob", "A direction"),
@@ -560,7 +560,7 @@ def next_passage_for_route_point_timeo_failure_test():
     )
 
     route_point = MockRoutePoint(route_id='route_tata', line_id='line_toto', stop_id='stop_tutu')
-    with mock.patch('requests.get', mock_requests.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_requests.get):
         passages = timeo.next_passage_for_route_point(route_point, current_dt=_dt("02:02"))
 
         assert passages is None
@@ -596,7 +596,7 @@ def timeo_circuit_breaker_test():
             raise Exception('test error')
 
     m = Mocker()
-    with mock.patch('requests.get', m.get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', m.get):
         with raises(RealtimeProxyError):
             timeo._call_timeo('http://bob.com')
         assert good_response == timeo._call_timeo('http://bob.com')
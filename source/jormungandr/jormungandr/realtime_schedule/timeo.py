@@ -33,12 +33,14 @@ import logging
 import pybreaker
 import pytz
 import requests as requests
-from jormungandr import cache, app
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
 from jormungandr.realtime_schedule.realtime_proxy import RealtimeProxy, RealtimeProxyError, floor_datetime
 from jormungandr.schedule import RealTimePassage
 from datetime import datetime, time
 from navitiacommon.ratelimit import RateLimiter, FakeRateLimiter
-from jormungandr.utils import PY3
+from jormungandr.utils import PY3, get_remaining_time
+from jormungandr.http_client import get_http_client
 import six
 
 
@@ -93,6 +95,7 @@ class Timeo(RealtimeProxy):
         reset_timeout = kwargs.get(
             'circuit_breaker_reset_timeout', app.config.get(str('CIRCUIT_BREAKER_TIMEO_TIMEOUT_S'), 60)
         )
+        self.http_client = get_http_client('timeo')
         self.breaker = pybreaker.CircuitBreaker(fail_max=fail_max, reset_timeout=reset_timeout)
         # A step is applied on from_datetime to discretize calls and allow caching them
         self.from_datetime_step = kwargs.get(
@@ -112,6 +115,8 @@ class Timeo(RealtimeProxy):
                 redis_db=kwargs.get('redis_db', 0),
                 redis_password=kwargs.get('redis_password'),
                 redis_namespace=kwargs.get('redis_namespace', 'jormungandr.rate_limiter'),
+                lock_free=kwargs.get('rate_limit_lock_free', False),
+                reservation_size=kwargs.get('rate_limit_reservation_size', 1),
             )
         else:
             self.rate_limiter = FakeRateLimiter()
@@ -133,7 +138,7 @@ class Timeo(RealtimeProxy):
     def _is_valid_direction(self, direction_uri, passage_direction_uri):
         return direction_uri == passage_direction_uri
 
-    @cache.memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_TIMEO'), 60))
+    @coalescing_memoize(app.config.get(str('CACHE_CONFIGURATION'), {}).get(str('TIMEOUT_TIMEO'), 60))
     def _call_timeo(self, url):
         """
         http call to timeo
@@ -145,7 +150,9 @@ class Timeo(RealtimeProxy):
         try:
             if not self.rate_limiter.acquire(self.rt_system_id, block=False):
                 return None
-            return self.breaker.call(requests.get, url, timeout=self.timeout, verify=self.verify)
+            return self.breaker.call(
+                self.http_client.get, url, timeout=get_remaining_time(self.timeout), verify=self.verify
+            )
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error(
                 'Timeo RT service dead, using base schedule (error: {}'.format(e),
@@ -325,6 +325,7 @@ class Distributed(object):
         if request['_transfer_path'] is True:
             for journey in journeys_to_complete:
                 transfer_pool.async_compute_transfer(journey.pt_journeys.sections)
+            transfer_pool.compute_transfers()
 
         wait_and_complete_pt_journey(
             requested_orig_obj=context.requested_orig_obj,
@@ -0,0 +1,187 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+from collections import deque
+from navitiacommon import response_pb2
+from jormungandr import app, new_relic
+import logging
+
+# the quantile is computed again each time this number of outcomes are recorded
+QUANTILE_REFRESH_PERIOD = 100
+
+
+class CrowflyReachability(object):
+    """
+    Learn how far the candidates of the fallbacks can be reached
+
+    For each coverage and mode, the outcomes of the routing matrices are recorded as the ratio between the
+    duration of the street network and the crowfly duration of the reached places. A low quantile of those ratios
+    gives an optimistic duration of the candidates returned by the crowfly: the candidates which can't be reached
+    within the max duration even with it are not sent to the street network.
+
+    Once the candidates are pruned, the outcomes only concern the kept ones, which are the nearest and usually have
+    higher ratios: the quantile would drift upward and prune more and more candidates. It is thus capped by the
+    quantile learned before the pruning started.
+    """
+
+    def __init__(self):
+        # (coverage, mode) -> last ratios recorded
+        self._ratios = {}
+        # (coverage, mode) -> number of ratios recorded since the quantile has been computed
+        self._nb_new_ratios = {}
+        # (coverage, mode) -> quantile of the ratios, None if there isn't enough ratios
+        self._min_ratios = {}
+        # (coverage, mode) -> quantile of the ratios recorded without pruning, the max of the min ratio
+        self._max_min_ratios = {}
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def is_learning(mode):
+        return (
+            app.config.get(str('ADAPTIVE_CROWFLY_PRUNING'), False)
+            or app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_DRY_RUN'), False)
+        ) and mode in app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_MODES'), [])
+
+    @staticmethod
+    def is_pruning(mode):
+        return (
+            app.config.get(str('ADAPTIVE_CROWFLY_PRUNING'), False)
+            and not app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_DRY_RUN'), False)
+            and mode in app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_MODES'), [])
+        )
+
+    def get_min_ratio(self, coverage, mode):
+        """
+        return: the quantile of the ratios of the coverage and the mode, None if not enough outcomes are recorded
+        """
+        return self._min_ratios.get((coverage, mode))
+
+    def _update_min_ratio(self, key, is_pruned):
+        """
+        :param is_pruned: True if the last ratios only concern the candidates kept by the pruning
+        """
+        ratios = self._ratios[key]
+        if len(ratios) < app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_MIN_SAMPLES'), 1000):
+            self._min_ratios[key] = None
+            return
+        sorted_ratios = sorted(ratios)
+        quantile = app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_QUANTILE'), 0.01)
+        min_ratio = sorted_ratios[int(quantile * (len(sorted_ratios) - 1))]
+        max_min_ratio = self._max_min_ratios.get(key)
+        if is_pruned and max_min_ratio is not None:
+            min_ratio = min(min_ratio, max_min_ratio)
+        else:
+            self._max_min_ratios[key] = min_ratio
+        self._min_ratios[key] = min_ratio
+        self._nb_new_ratios[key] = 0
+
+    @staticmethod
+    def _is_prunable(place, min_ratio, speed, max_duration):
+        # we don't know where the access points are
+        if place.HasField(str('stop_point')) and place.stop_point.access_points:
+            return False
+        return place.distance * min_ratio > speed * max_duration
+
+    def prune(self, coverage, mode, places, speed, max_duration):
+        """
+        :param places: candidates returned by the crowfly, with their distance
+        return: the candidates that can be reached
+        """
+        if not self.is_pruning(mode):
+            return places
+        min_ratio = self.get_min_ratio(coverage, mode)
+        if min_ratio is None:
+            return places
+        kept = [p for p in places if not self._is_prunable(p, min_ratio, speed, max_duration)]
+        new_relic.record_custom_event(
+            'crowfly_pruning',
+            {
+                'coverage': coverage,
+                'mode': mode,
+                'min_ratio': min_ratio,
+                'nb_candidates': len(places),
+                'nb_pruned': len(places) - len(kept),
+            },
+        )
+        return kept
+
+    def record(self, coverage, mode, places, routing_elements, speed, max_duration):
+        """
+        Record the outcomes of a routing matrix and report the reached places that would have been pruned
+
+        :param places: places of the matrix, in the same order as routing_elements
+        """
+        if not self.is_learning(mode) or not speed:
+            return
+        key = (coverage, mode)
+        ratios = self._ratios.get(key)
+        if ratios is None:
+            ratios = self._ratios[key] = deque(
+                maxlen=app.config.get(str('ADAPTIVE_CROWFLY_PRUNING_MAX_SAMPLES'), 10000)
+            )
+            self._nb_new_ratios[key] = 0
+        min_ratio = self.get_min_ratio(coverage, mode)
+
+        nb_places = 0
+        nb_reached = 0
+        nb_wrongly_pruned = 0
+        for place, element in zip(places, routing_elements):
+            # only the places returned by the crowfly have a distance
+            if not place.distance:
+                continue
+            nb_places += 1
+            if element.routing_status != response_pb2.reached:
+                continue
+            nb_reached += 1
+            if min_ratio is not None and self._is_prunable(place, min_ratio, speed, max_duration):
+                nb_wrongly_pruned += 1
+            ratios.append(element.duration * speed / place.distance)
+            self._nb_new_ratios[key] += 1
+
+        if self._min_ratios.get(key) is None or self._nb_new_ratios[key] >= QUANTILE_REFRESH_PERIOD:
+            self._update_min_ratio(key, is_pruned=min_ratio is not None and self.is_pruning(mode))
+
+        if nb_places:
+            new_relic.record_custom_event(
+                'crowfly_reachability',
+                {
+                    'coverage': coverage,
+                    'mode': mode,
+                    'nb_places': nb_places,
+                    'nb_reached': nb_reached,
+                    'nb_wrongly_pruned': nb_wrongly_pruned,
+                },
+            )
+            if nb_wrongly_pruned:
+                self.logger.debug(
+                    '%s places reached by %s in %s would have been pruned', nb_wrongly_pruned, mode, coverage
+                )
+
+
+crowfly_reachability = CrowflyReachability()
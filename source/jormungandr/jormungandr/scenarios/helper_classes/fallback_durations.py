@@ -33,8 +33,12 @@ import jormungandr.street_network.utils
 from navitiacommon import response_pb2
 from collections import namedtuple, defaultdict
 from math import sqrt
+import functools
+import numpy as np
 from .helper_utils import get_max_fallback_duration
+from .crowfly_reachability import crowfly_reachability
 from jormungandr.street_network.street_network import StreetNetworkPathType
+from jormungandr.street_network.routing_matrix_cache import routing_matrix_cache
 from jormungandr import new_relic
 from jormungandr.fallback_modes import FallbackModes
 import logging
@@ -62,6 +66,148 @@ DurationElement = namedtuple(
 AccessMapElement = namedtuple('AccessMapElement', ['stop_point_uri', 'access_point'])
 
 
+class FallbackDurationColumns(object):
+    """
+    Columnar storage of the fallback durations of a mode.
+
+    Instead of a dict of 'stop_point uri' vs DurationElement, every field of DurationElement is stored in its own
+    list, one row by stop point. The rows are filled in bulk from the routing matrix, and a DurationElement is only
+    built when a single stop point is looked up (ex. when the fallback of a pt journey is computed).
+    """
+
+    __slots__ = (
+        'uris',
+        'durations',
+        'statuses',
+        'car_parks',
+        'car_park_crowfly_durations',
+        'via_pt_accesses',
+        'via_poi_accesses',
+        '_rows',
+    )
+
+    def __init__(self):
+        self.uris = []
+        self.durations = []
+        self.statuses = []
+        self.car_parks = []
+        self.car_park_crowfly_durations = []
+        self.via_pt_accesses = []
+        self.via_poi_accesses = []
+        # stop_point uri vs its row
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __contains__(self, uri):
+        return uri in self._rows
+
+    def __iter__(self):
+        return iter(self.uris)
+
+    def __getitem__(self, uri):
+        return self._get_element(self._rows[uri])
+
+    def _get_element(self, row):
+        return DurationElement(
+            self.durations[row],
+            self.statuses[row],
+            self.car_parks[row],
+            self.car_park_crowfly_durations[row],
+            self.via_pt_accesses[row],
+            self.via_poi_accesses[row],
+        )
+
+    def get(self, uri, default=None):
+        row = self._rows.get(uri)
+        return default if row is None else self._get_element(row)
+
+    def get_duration(self, uri, default=None):
+        row = self._rows.get(uri)
+        return default if row is None else self.durations[row]
+
+    def items(self):
+        return ((uri, self._get_element(row)) for row, uri in enumerate(self.uris))
+
+    def get_durations(self):
+        """
+        :return: a dict of 'stop_point uri' vs 'duration', as expected by the pt planners
+        """
+        return dict(zip(self.uris, self.durations))
+
+    def add(
+        self,
+        uri,
+        duration,
+        status,
+        car_park=None,
+        car_park_crowfly_duration=0,
+        via_pt_access=None,
+        via_poi_access=None,
+    ):
+        """
+        Add a row for the stop point, an existing row is only replaced by a strictly smaller duration
+        """
+        row = self._rows.get(uri)
+        if row is None:
+            self._rows[uri] = len(self.uris)
+            self.uris.append(uri)
+            self.durations.append(duration)
+            self.statuses.append(status)
+            self.car_parks.append(car_park)
+            self.car_park_crowfly_durations.append(car_park_crowfly_duration)
+            self.via_pt_accesses.append(via_pt_access)
+            self.via_poi_accesses.append(via_poi_access)
+        elif duration < self.durations[row]:
+            self.durations[row] = duration
+            self.statuses[row] = status
+            self.car_parks[row] = car_park
+            self.car_park_crowfly_durations[row] = car_park_crowfly_duration
+            self.via_pt_accesses[row] = via_pt_access
+            self.via_poi_accesses[row] = via_poi_access
+
+    def extend(
+        self,
+        uris,
+        durations,
+        statuses,
+        car_parks=None,
+        car_park_crowfly_durations=None,
+        via_pt_accesses=None,
+        via_poi_accesses=None,
+    ):
+        """
+        Add the rows in bulk, the omitted columns are filled with their default value
+        """
+        nb_rows = len(uris)
+        car_parks = car_parks or [None] * nb_rows
+        car_park_crowfly_durations = car_park_crowfly_durations or [0] * nb_rows
+        via_pt_accesses = via_pt_accesses or [None] * nb_rows
+        via_poi_accesses = via_poi_accesses or [None] * nb_rows
+        if six.viewkeys(self._rows).isdisjoint(uris) and nb_rows == len(set(uris)):
+            first_row = len(self.uris)
+            self._rows.update(zip(uris, range(first_row, first_row + nb_rows)))
+            self.uris.extend(uris)
+            self.durations.extend(durations)
+            self.statuses.extend(statuses)
+            self.car_parks.extend(car_parks)
+            self.car_park_crowfly_durations.extend(car_park_crowfly_durations)
+            self.via_pt_accesses.extend(via_pt_accesses)
+            self.via_poi_accesses.extend(via_poi_accesses)
+            return
+        for row in zip(
+            uris,
+            durations,
+            statuses,
+            car_parks,
+            car_park_crowfly_durations,
+            via_pt_accesses,
+            via_poi_accesses,
+        ):
+            self.add(*row)
+
+
 class FallbackDurations:
     """
     A "fallback durations" is a dict of 'stop_points uri' vs 'access duration' calculated from a given departure place
@@ -127,26 +273,62 @@ class FallbackDurations:
     def _get_manhattan_duration(self, distance, speed):
         return int((distance * sqrt(2)) / speed)
 
+    def _call_routing_matrix(self, get_routing_matrix, origins, destinations):
+        try:
+            return get_routing_matrix(
+                self._instance,
+                origins,
+                destinations,
+                self._mode,
+                self._max_duration_to_pt,
+                self._request,
+                self._request_id,
+                **self._speed_switcher
+            )
+        except GeoveloTechnicalError as e:
+            logging.getLogger(__name__).exception('')
+            raise StreetNetworkException(response_pb2.Error.service_unavailable, e.data["message"])
+        except Exception as e:
+            self._logger.exception("Exception':{}".format(str(e)))
+            return None
+
     @new_relic.distributedEvent("routing_matrix", "street_network")
     def _get_street_network_routing_matrix(self, origins, destinations):
         with timed_logger(self._logger, 'routing_matrix_calling_external_service', self._request_id):
-            try:
-                return self._streetnetwork_service.get_street_network_routing_matrix(
-                    self._instance,
-                    origins,
-                    destinations,
-                    self._mode,
-                    self._max_duration_to_pt,
-                    self._request,
-                    self._request_id,
-                    **self._speed_switcher
-                )
-            except GeoveloTechnicalError as e:
-                logging.getLogger(__name__).exception('')
-                raise StreetNetworkException(response_pb2.Error.service_unavailable, e.data["message"])
-            except Exception as e:
-                self._logger.exception("Exception':{}".format(str(e)))
-                return None
+            return self._call_routing_matrix(
+                functools.partial(
+                    routing_matrix_cache.get_street_network_routing_matrix, self._streetnetwork_service
+                ),
+                origins,
+                destinations,
+            )
+
+    @new_relic.distributedEvent("many_to_many_routing_matrix", "street_network")
+    def _get_many_to_many_routing_matrix(self, origins, destinations):
+        with timed_logger(self._logger, 'routing_matrix_calling_external_service', self._request_id):
+            return self._call_routing_matrix(
+                self._streetnetwork_service.get_many_to_many_routing_matrix, origins, destinations
+            )
+
+    def _get_routing_matrices_by_center(self, centers_isochrone, places_isochrone):
+        """
+        Compute the routing matrices of all the centers (the access points of a poi) in a single n-m matrix
+
+        :return: a list of 1-n (or n-1) routing matrices, one by center
+        """
+        origins, destinations = self._determine_origins_and_destinations(centers_isochrone, places_isochrone)
+        rows = self._get_many_to_many_routing_matrix(self._streetnetwork_service, origins, destinations)
+        result = []
+        for index in range(len(centers_isochrone)):
+            sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+            if rows is not None:
+                if self._direct_path_type == StreetNetworkPathType.BEGINNING_FALLBACK:
+                    routing_response = rows[index]
+                else:
+                    routing_response = [row[index] for row in rows]
+                sn_routing_matrix.rows.add().routing_response.extend(routing_response)
+            result.append(sn_routing_matrix)
+        return result
 
     def _retrieve_access_points(self, stop_point, access_points_map, places_isochrone):
         if self._direct_path_type == StreetNetworkPathType.BEGINNING_FALLBACK:
@@ -165,21 +347,6 @@ class FallbackDurations:
 
             access_points_map[ap.uri].append(AccessMapElement(stop_point.uri, pt_object_ap))
 
-    def _update_fb_durations(self, fb_durations, stop_point, duration, resp):
-        if duration < self._max_duration_to_pt:
-            fb_durations[stop_point.uri] = DurationElement(duration, resp.routing_status, None, 0, None, None)
-
-    def _update_fb_durations_from_access_point(
-        self, fb_durations, access_point, duration, resp, access_points_map
-    ):
-        for element in access_points_map[access_point.uri]:
-            sp_uri, ap = element
-            current_duration = fb_durations[sp_uri].duration if sp_uri in fb_durations else float('inf')
-            if (duration + ap.access_point.traversal_time) < min(current_duration, self._max_duration_to_pt):
-                fb_durations[sp_uri] = DurationElement(
-                    duration + ap.access_point.traversal_time, resp.routing_status, None, 0, ap, None
-                )
-
     def _update_free_access_with_free_radius(self, free_access, proximities_by_crowfly):
         free_radius_distance = None
         if self._direct_path_type == StreetNetworkPathType.BEGINNING_FALLBACK:
@@ -230,26 +397,18 @@ class FallbackDurations:
 
     def _fill_fallback_durations_with_free_access(self, fallback_durations, all_free_access):
         # Since we have already places that have free access, we add them into the result
-        from collections import deque
-
-        deque(
-            (
-                fallback_durations.update({uri: DurationElement(0, response_pb2.reached, None, 0, None, None)})
-                for uri in all_free_access
-            ),
-            maxlen=1,
-        )
+        uris = list(all_free_access)
+        fallback_durations.extend(uris, [0] * len(uris), [response_pb2.reached] * len(uris))
 
     def _fill_fallback_durations_with_manhattan(self, fallback_durations, places_isochrone):
-        for sp in places_isochrone:
-            fallback_durations[sp.uri] = DurationElement(
-                self._get_manhattan_duration(sp.distance, self._speed_switcher.get(self._mode)),
-                response_pb2.reached,
-                None,
-                0,
-                None,
-                None,
-            )
+        durations = self._get_manhattan_durations(
+            self._get_distances(places_isochrone), self._speed_switcher.get(self._mode)
+        )
+        fallback_durations.extend(
+            [sp.uri for sp in places_isochrone],
+            durations.tolist(),
+            [response_pb2.reached] * len(places_isochrone),
+        )
 
     def _determine_origins_and_destinations(self, centers_isochrone, places_isochrone):
         if self._direct_path_type == StreetNetworkPathType.BEGINNING_FALLBACK:
@@ -262,59 +421,129 @@ class FallbackDurations:
         return origins, destinations
 
     @staticmethod
-    def _get_reached_routing_response(sn_routing_matrix):
+    def _get_distances(places):
+        return np.fromiter((p.distance for p in places), dtype=np.float64, count=len(places))
+
+    @staticmethod
+    def _get_manhattan_durations(distances, speed):
+        return (distances * sqrt(2) / speed).astype(np.int64)
+
+    def _get_places_durations(self, sn_routing_matrix, places_isochrone):
+        """
+        Read the routing matrix as arrays, which are arranged in the same order of places_isochrone
+
+        :return: (durations, statuses, reachable)
+                 - durations: the duration given by the matrix, or the manhattan duration if not reached
+                 - statuses: the routing_status of every place
+                 - reachable: whether the place is not unreached
+        """
+        routing_response = sn_routing_matrix.rows[0].routing_response
+        nb_places = min(len(routing_response), len(places_isochrone))
+        statuses = np.fromiter(
+            (r.routing_status for r in routing_response), dtype=np.int32, count=len(routing_response)
+        )[:nb_places]
+        durations = np.fromiter(
+            (r.duration for r in routing_response), dtype=np.int64, count=len(routing_response)
+        )[:nb_places]
+        manhattan_durations = self._get_manhattan_durations(
+            self._get_distances(places_isochrone[:nb_places]), self._speed_switcher.get(self._mode)
+        )
+        durations = np.where(statuses == response_pb2.reached, durations, manhattan_durations)
+        return durations, statuses, statuses != response_pb2.unreached
+
+    def _select_best_candidates(self, candidate_durations, candidate_places, candidate_targets, reachable):
         """
-        Get a list of (pos ,r) only if the place is not unreached...
-        pos is the position of the response in the isochrone array
+        A stop point may be reached through several candidates (its access points, the car parks nearby...)
+
+        :param candidate_durations: the duration to reach the stop point through the candidate
+        :param candidate_places: the index in places_isochrone of the place the candidate goes through
+        :param candidate_targets: the index of the stop point reached by the candidate
+        :param reachable: whether the places of places_isochrone are reachable
+        :return: the indexes of the fastest candidate of every stop point whose duration is smaller than the
+                 max_duration_to_pt. Since the sort is stable, the first candidate wins in case of a tie.
         """
-        return (
-            (idx, r)
-            for idx, r in enumerate(sn_routing_matrix.rows[0].routing_response)
-            if r.routing_status != response_pb2.unreached
+        selected = np.flatnonzero(reachable[candidate_places] & (candidate_durations < self._max_duration_to_pt))
+        selected = selected[np.lexsort((candidate_durations[selected], candidate_targets[selected]))]
+        _, first_of_target = np.unique(candidate_targets[selected], return_index=True)
+        return selected[first_of_target]
+
+    @staticmethod
+    def _get_target_indexes(target_uris, targets_by_uri):
+        return np.fromiter(
+            (targets_by_uri.setdefault(uri, len(targets_by_uri)) for uri in target_uris),
+            dtype=np.int64,
+            count=len(target_uris),
         )
 
     def _update_fallback_durations_for_car_park(self, sn_routing_matrix, places_isochrone, fallback_durations):
-        routing_response = self._get_reached_routing_response(sn_routing_matrix)
-        # the element in routing_response are ranged in the same order of element in places_isochrones
-        for idx, r in routing_response:
-            car_park = places_isochrone[idx]
-            duration = self._get_duration(r, car_park)
-            # if the mode is car, we need to find where to park the car :)
-            for sp_nearby in car_park.stop_points_nearby:
-                duration_to_stop_point = self._get_manhattan_duration(
-                    sp_nearby.distance, self._speed_switcher.get('walking')
-                )
-                durations_sum = duration + duration_to_stop_point + self._request.get('_car_park_duration')
-                if durations_sum < min(
-                    self._max_duration_to_pt,
-                    fallback_durations.get(
-                        sp_nearby.uri, DurationElement(float('inf'), None, None, None, None, None)
-                    ).duration,
-                ):
-                    fallback_durations[sp_nearby.uri] = DurationElement(
-                        durations_sum, response_pb2.reached, car_park, duration_to_stop_point, None, None
-                    )
+        durations, _, reachable = self._get_places_durations(sn_routing_matrix, places_isochrone)
+        # if the mode is car, we need to find where to park the car :)
+        # a candidate is a stop point nearby a car park, the car park being at the index candidate_places in
+        # places_isochrone
+        candidate_places = []
+        candidate_stop_points = []
+        for idx, car_park in enumerate(places_isochrone[: len(durations)]):
+            candidate_places.extend([idx] * len(car_park.stop_points_nearby))
+            candidate_stop_points.extend(car_park.stop_points_nearby)
+        if not candidate_places:
+            return
+        candidate_places = np.array(candidate_places, dtype=np.int64)
+        candidate_uris = [sp_nearby.uri for sp_nearby in candidate_stop_points]
+        candidate_targets = self._get_target_indexes(candidate_uris, {})
+        durations_to_stop_point = self._get_manhattan_durations(
+            self._get_distances(candidate_stop_points), self._speed_switcher.get('walking')
+        )
+        durations_sum = (
+            durations[candidate_places] + durations_to_stop_point + self._request.get('_car_park_duration')
+        )
+
+        best = self._select_best_candidates(durations_sum, candidate_places, candidate_targets, reachable)
+        fallback_durations.extend(
+            [candidate_uris[i] for i in best],
+            durations_sum[best].tolist(),
+            [response_pb2.reached] * len(best),
+            car_parks=[places_isochrone[i] for i in candidate_places[best]],
+            car_park_crowfly_durations=durations_to_stop_point[best].tolist(),
+        )
 
     def _update_fallback_durations_for_stop_points_and_access_points(
         self, sn_routing_matrix, places_isochrone, access_points_map, fallback_durations
     ):
-        def is_stop_point(pt_object):
-            return isinstance(pt_object, type_pb2.PtObject) and pt_object.embedded_type == type_pb2.STOP_POINT
-
-        def is_access_point(pt_object):
-            return isinstance(pt_object, type_pb2.PtObject) and pt_object.embedded_type == type_pb2.ACCESS_POINT
-
-        routing_response = self._get_reached_routing_response(sn_routing_matrix)
-        for idx, r in routing_response:
-            pt_object = places_isochrone[idx]
-            duration = self._get_duration(r, pt_object)
+        durations, statuses, reachable = self._get_places_durations(sn_routing_matrix, places_isochrone)
+        # a candidate is a stop point reached either directly or through one of its access points, the stop point or
+        # the access point being at the index candidate_places in places_isochrone
+        candidate_places = []
+        candidate_uris = []
+        traversal_times = []
+        via_pt_accesses = []
+        for idx, pt_object in enumerate(places_isochrone[: len(durations)]):
             # in this case, the pt_object can be either a stop point or an access point
-            if is_stop_point(pt_object):
-                self._update_fb_durations(fallback_durations, pt_object, duration, r)
-            elif is_access_point(pt_object):
-                self._update_fb_durations_from_access_point(
-                    fallback_durations, pt_object, duration, r, access_points_map
-                )
+            if not isinstance(pt_object, type_pb2.PtObject):
+                continue
+            if pt_object.embedded_type == type_pb2.STOP_POINT:
+                candidate_places.append(idx)
+                candidate_uris.append(pt_object.uri)
+                traversal_times.append(0)
+                via_pt_accesses.append(None)
+            elif pt_object.embedded_type == type_pb2.ACCESS_POINT:
+                for sp_uri, ap in access_points_map[pt_object.uri]:
+                    candidate_places.append(idx)
+                    candidate_uris.append(sp_uri)
+                    traversal_times.append(ap.access_point.traversal_time)
+                    via_pt_accesses.append(ap)
+        if not candidate_places:
+            return
+        candidate_places = np.array(candidate_places, dtype=np.int64)
+        candidate_targets = self._get_target_indexes(candidate_uris, {})
+        candidate_durations = durations[candidate_places] + np.array(traversal_times, dtype=np.int64)
+
+        best = self._select_best_candidates(candidate_durations, candidate_places, candidate_targets, reachable)
+        fallback_durations.extend(
+            [candidate_uris[i] for i in best],
+            candidate_durations[best].tolist(),
+            statuses[candidate_places[best]].tolist(),
+            via_pt_accesses=[via_pt_accesses[i] for i in best],
+        )
 
     def _determine_centers_isochrone(self):
         result = []
@@ -354,34 +583,45 @@ class FallbackDurations:
         )
 
         centers_isochrone = self._determine_centers_isochrone()
+        sn_routing_matrices = [None] * len(centers_isochrone)
+        if (
+            len(centers_isochrone) > 1
+            and places_isochrone
+            and self._max_duration_to_pt != 0
+            and self._streetnetwork_service.handles_many_to_many_matrix
+        ):
+            sn_routing_matrices = self._get_routing_matrices_by_center(centers_isochrone, places_isochrone)
         result = []
-        for center_isochrone in centers_isochrone:
+        for center_isochrone, sn_routing_matrix in zip(centers_isochrone, sn_routing_matrices):
             result.append(
                 self.build_fallback_duration(
-                    center_isochrone, all_free_access, places_isochrone, access_points_map
+                    center_isochrone, all_free_access, places_isochrone, access_points_map, sn_routing_matrix
                 )
             )
         if len(result) == 1:
             return result[0]
         else:
-            fallback_duration = dict()
+            fallback_duration = FallbackDurationColumns()
             for place_isochrone in stop_points:
                 best_duration = float("inf")
                 best_element = None
+                best_index = None
                 for index, fallback in enumerate(result):
                     element = fallback.get(place_isochrone.uri)
                     if element and element.duration < best_duration:
                         best_duration = element.duration
-                        best_element = DurationElement(
-                            element.duration,
-                            element.status,
-                            element.car_park,
-                            element.car_park_crowfly_duration,
-                            element.via_pt_access,
-                            centers_isochrone[index],
-                        )
+                        best_element = element
+                        best_index = index
                 if best_element:
-                    fallback_duration[place_isochrone.uri] = best_element
+                    fallback_duration.add(
+                        place_isochrone.uri,
+                        best_element.duration,
+                        best_element.status,
+                        best_element.car_park,
+                        best_element.car_park_crowfly_duration,
+                        best_element.via_pt_access,
+                        centers_isochrone[best_index],
+                    )
             return fallback_duration
 
     def _async_request(self):
@@ -390,11 +630,16 @@ class FallbackDurations:
     def wait_and_get(self):
         return self._value.wait_and_get() if self._value else None
 
-    def build_fallback_duration(self, center_isochrone, all_free_access, places_isochrone, access_points_map):
+    def build_fallback_duration(
+        self, center_isochrone, all_free_access, places_isochrone, access_points_map, sn_routing_matrix=None
+    ):
+        """
+        :param sn_routing_matrix: the routing matrix of the center if it is already computed
+        """
         logger = logging.getLogger(__name__)
 
-        # the final result to be returned, which is a map of stop_points.uri vs DurationElement
-        fallback_durations = defaultdict(lambda: DurationElement(float('inf'), None, None, 0, None, None))
+        # the final result to be returned, which is a columnar map of stop_points.uri vs DurationElement
+        fallback_durations = FallbackDurationColumns()
 
         # Since we have already places that have free access, we add them into the fallback_durations
         self._fill_fallback_durations_with_free_access(fallback_durations, all_free_access)
@@ -415,9 +660,10 @@ class FallbackDurations:
         # sn_routing_matrix: a list of response_pb2.RoutingElement, which is arranged in the same order of requested
         # places
         # Each response_pb2.RoutingElement contains the duration and routing_status
-        sn_routing_matrix = self._get_street_network_routing_matrix(
-            self._streetnetwork_service, origins, destinations
-        )
+        if sn_routing_matrix is None:
+            sn_routing_matrix = self._get_street_network_routing_matrix(
+                self._streetnetwork_service, origins, destinations
+            )
 
         # In case where none of places in isochrone are reachable, we consider that something went awry in the
         # computation, thus we fill the fallback_duration with manhattan distance for every requested place and
@@ -431,6 +677,15 @@ class FallbackDurations:
             self._fill_fallback_durations_with_manhattan(fallback_durations, places_isochrone)
             return fallback_durations
 
+        crowfly_reachability.record(
+            self._instance.name,
+            self._mode,
+            places_isochrone,
+            sn_routing_matrix.rows[0].routing_response,
+            self._speed_switcher.get(self._mode),
+            self._max_duration_to_pt,
+        )
+
         # sn_routing_matrix is not None
         if self._mode == FallbackModes.car.name:
             # note that when requested mode is car, places in the isochrone are car parks
@@ -530,23 +785,20 @@ class FallbackDurationsPool(dict):
 
     def get_best_fallback_durations(self, main_mode):
         main_fb = self.wait_and_get(main_mode)
-        res = {}
+        res = main_fb.get_durations()
         overriding_modes = self._overriding_mode_map.get(main_mode, [])
         overriding_fbs = [
             (mode, self.wait_and_get(mode)) for mode in overriding_modes if self.wait_and_get(mode)
         ]
 
-        for uri, duration_item in six.iteritems(main_fb):
-            duration = duration_item.duration
-            # if the duration of the main_mode is strictly smaller than all other mode, we keep the uri in the final res
-            # else the fallback duration is replaced by the smallest duration among all modes.
-            mode_durations = [(main_mode, duration)] + [
-                (mode, fb.get(uri).duration) for mode, fb in overriding_fbs if fb.get(uri)
-            ]
-            best_mode, best_duration = min(mode_durations, key=lambda o: o[1])
-            if best_mode != main_mode:
-                self._overrided_uri_map[main_mode][uri] = best_mode
-            res[uri] = best_duration
+        # if the duration of the main_mode is strictly smaller than all other mode, we keep the uri in the final res
+        # else the fallback duration is replaced by the smallest duration among all modes.
+        for mode, fb in overriding_fbs:
+            for uri, duration in zip(fb.uris, fb.durations):
+                best_duration = res.get(uri)
+                if best_duration is not None and duration < best_duration:
+                    self._overrided_uri_map[main_mode][uri] = mode
+                    res[uri] = duration
         return res
 
     def get_real_mode(self, main_mode, uri):
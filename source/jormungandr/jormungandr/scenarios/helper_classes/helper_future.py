@@ -27,9 +27,13 @@
 # https://groups.google.com/d/forum/navitia
 # www.navitia.io
 from __future__ import absolute_import
+import logging
+import time
 import gevent
 import gevent.pool
 from jormungandr import app
+from jormungandr.exceptions import TechnicalError
+from jormungandr.utils import deadline_scope, request_budget
 from contextlib import contextmanager
 
 # Using abc.ABCMeta in a way it is compatible both with Python 2.7 and Python 3.x
@@ -43,9 +47,18 @@ use concurrent.futures ) by
 1. creating a new future class of future and implementing methods 'get_future' and 'wait_and_get'
 2. creating a new PoolManager and implementing __enter__ and __exit__ which allows all created future to be run
    (the way to do cleaning depends on the library of future to use)
+
+A FutureManager can carry a budget: the futures it creates run with its deadline, and the backends they call
+use get_remaining_time() to bound their own timeout. When leaving the scope of an exhausted budget, the
+outstanding futures are killed instead of being waited for.
 """
 
 
+def _run_with_deadline(deadline, fun, *args, **kwargs):
+    with deadline_scope(deadline):
+        return fun(*args, **kwargs)
+
+
 class _AbstractFuture(ABC):  # type: ignore
     @abc.abstractmethod
     def get_future(self):
@@ -67,14 +80,18 @@ class _AbstractPoolManager(ABC):  # type: ignore
 
 
 class _GeventFuture(_AbstractFuture):
-    def __init__(self, pool, fun, *args, **kwargs):
-        self._future = pool.spawn(fun, *args, **kwargs)
+    def __init__(self, pool, deadline, fun, *args, **kwargs):
+        self._future = pool.spawn(_run_with_deadline, deadline, fun, *args, **kwargs)
 
     def get_future(self):
         return self._future
 
     def wait_and_get(self):
-        return self._future.get()
+        value = self._future.get()
+        if isinstance(value, gevent.GreenletExit):
+            # the future has been killed when leaving the scope of its exhausted budget
+            raise TechnicalError('the request budget is exhausted')
+        return value
 
 
 class _GeventPoolManager(_AbstractPoolManager):
@@ -84,12 +101,13 @@ class _GeventPoolManager(_AbstractPoolManager):
         else:
             self._pool = gevent.pool.Pool(8)  # Set a pool size default value if it is not specified
         self.is_within_context = False
+        self.deadline = None
 
     def create_future(self, fun, *args, **kwargs):
         assert (
             self.is_within_context
         ), "You are trying to create a Greenlet outside of it's context. Your FutureManager is already out of scope"
-        return _GeventFuture(self._pool, fun, *args, **kwargs)
+        return _GeventFuture(self._pool, self.deadline, fun, *args, **kwargs)
 
     def clean_futures(self):
         """
@@ -97,16 +115,30 @@ class _GeventPoolManager(_AbstractPoolManager):
 
         We do this to prevent the programme from being blocked in case where some un-started futures may hold threading
         locks. If we leave the scope without starting these futures, they may hold locks forever.
+
+        Once the budget is exhausted, the outstanding futures are killed (this raises GreenletExit in them,
+        their locks are released by their finally clauses).
         """
-        self._pool.join()
+        remaining_time = None if self.deadline is None else max(self.deadline - time.time(), 0)
+        self._pool.join(timeout=remaining_time)
+        if len(self._pool):
+            logging.getLogger(__name__).warning(
+                'request budget exhausted, killing {} outstanding futures'.format(len(self._pool))
+            )
+            self._pool.kill()
         self.is_within_context = False
 
 
 @contextmanager
-def FutureManager(greenlet_pool_size=None):
+def FutureManager(greenlet_pool_size=None, timeout=None):
+    """
+    :param timeout: budget in seconds of the futures, the budget of the current greenlet is used if None
+    """
     m = _GeventPoolManager(greenlet_pool_size)
-    m.is_within_context = True
-    try:
-        yield m
-    finally:
-        m.clean_futures()
+    with request_budget(timeout) as deadline:
+        m.deadline = deadline
+        m.is_within_context = True
+        try:
+            yield m
+        finally:
+            m.clean_futures()
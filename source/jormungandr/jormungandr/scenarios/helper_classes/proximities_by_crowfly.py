@@ -30,6 +30,7 @@ from __future__ import absolute_import
 
 import jormungandr.street_network.utils
 from .helper_utils import get_max_fallback_duration, timed_logger
+from .crowfly_reachability import crowfly_reachability
 from jormungandr import utils, new_relic, fallback_modes as fm
 import logging
 from navitiacommon import type_pb2
@@ -72,6 +73,8 @@ class ProximitiesByCrowfly:
         self._forbidden_uris = utils.get_poi_params(request['forbidden_uris[]'])
         self._allowed_id = utils.get_poi_params(request['allowed_id[]'])
         self._pt_planner = self._instance.get_pt_planner(request['_pt_planner'])
+        # the stop point index is loaded from kraken
+        self._is_kraken = (request['_pt_planner'] or self._instance.default_pt_planner) == 'kraken'
         self._async_request()
 
     @new_relic.distributedEvent("get_crowfly", "street_network")
@@ -92,6 +95,18 @@ class ProximitiesByCrowfly:
                 **self._speed_switcher
             )
 
+    def _get_stop_points_nearby_from_index(self, coord):
+        """
+        the stop points nearby found in the stop point index of the instance, None if it can't answer
+        like kraken, the forbidden uris are only applied to the filtered requests
+        """
+        if not self._is_kraken or self._object_type != type_pb2.STOP_POINT or self._filter is not None:
+            return None
+        speed = self._speed_switcher.get(self._mode, self._speed_switcher.get('walking'))
+        return self._instance.stop_point_index.get_stop_points_nearby(
+            self._instance.publication_date, coord, speed * self._max_duration, self._max_nb_crowfly, self._depth
+        )
+
     def _do_request(self):
         logger = logging.getLogger(__name__)
 
@@ -106,12 +121,23 @@ class ProximitiesByCrowfly:
 
         coord = utils.get_pt_object_coord(self._requested_place_obj)
         if coord.lat and coord.lon:
-            crow_fly = self._get_crow_fly(self._instance.georef)
+            crow_fly = self._get_stop_points_nearby_from_index(coord)
+            if crow_fly is None:
+                crow_fly = self._get_crow_fly(self._instance.georef)
 
             if self._mode == fm.FallbackModes.car.name:
                 # pick up only parkings with park_ride = yes
                 crow_fly = jormungandr.street_network.utils.pick_up_park_ride_car_park(crow_fly)
 
+            # the candidates that can't be reached are not sent to the street network
+            crow_fly = crowfly_reachability.prune(
+                self._instance.name,
+                self._mode,
+                crow_fly,
+                self._speed_switcher.get(self._mode),
+                self._max_duration,
+            )
+
             logger.debug(
                 "finish proximities by crowfly from %s in %s", self._requested_place_obj.uri, self._mode
             )
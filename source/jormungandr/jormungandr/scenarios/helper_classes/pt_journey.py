@@ -159,7 +159,7 @@ class PtJourney:
 
         self._logger.debug("requesting public transport journey with dep_mode: %s", mode)
 
-        fallback_durations = {k: v.duration for k, v in fallback_duration_status.items()}
+        fallback_durations = fallback_duration_status.get_durations()
 
         if not fallback_durations or not self._request.get('max_duration', 0):
             return None
@@ -28,6 +28,7 @@
 # www.navitia.io
 from __future__ import absolute_import
 from jormungandr import utils, new_relic
+import jormungandr.street_network.utils
 from jormungandr.street_network.street_network import StreetNetworkPathType
 import logging
 from .helper_utils import (
@@ -48,6 +49,9 @@ from collections import namedtuple
 
 Dp_element = namedtuple("Dp_element", "origin, destination, response")
 
+# max duration of the routing matrix ranking the direct paths when the request doesn't limit it
+MAX_DURATION = 24 * 60 * 60
+
 
 class StreetNetworkPath:
     """
@@ -140,20 +144,76 @@ class StreetNetworkPath:
         self.make_poi_access_points(StreetNetworkPathType.ENDING_FALLBACK, resp_direct_path)
         return resp_direct_path.response
 
+    def _rank_pairs_by_matrix(self, origins, destinations):
+        """
+        Rank the (origin, destination) pairs by their duration in a n-m routing matrix, so that only the best
+        pair is routed
+
+        :return: the ranked pairs, the unreached ones being last, or None if the matrix cannot be computed
+        """
+        speed_switcher = jormungandr.street_network.utils.make_speed_switcher(self._request)
+        max_duration = self._request.get('max_{}_direct_path_duration'.format(self._mode)) or MAX_DURATION
+        try:
+            rows = self._streetnetwork_service.get_many_to_many_routing_matrix(
+                self._instance,
+                origins,
+                destinations,
+                self._mode,
+                max_duration,
+                self._request,
+                self._request_id,
+                **speed_switcher
+            )
+        except Exception as e:
+            self._logger.warning('impossible to rank the direct paths with a routing matrix: {}'.format(e))
+            return None
+        if rows is None:
+            return None
+
+        def sort_key(pair_element):
+            _, r = pair_element
+            if r.routing_status == response_pb2.reached:
+                return 0, r.duration
+            return 1, 0
+
+        pair_elements = (
+            ((origin, destination), r)
+            for origin, row in zip(origins, rows)
+            for destination, r in zip(destinations, row)
+        )
+        return [pair for pair, _ in sorted(pair_elements, key=sort_key)]
+
+    def _direct_path_with_fp_of(self, origin, destination):
+        return self._streetnetwork_service.direct_path_with_fp(
+            self._instance,
+            self._mode,
+            origin,
+            destination,
+            self._fallback_extremity,
+            self._request,
+            self._path_type,
+            self._request_id,
+        )
+
     def build_direct_path(self):
+        origins = list(self.get_pt_objects(self._orig_obj))
+        destinations = list(self.get_pt_objects(self._dest_obj))
+
+        if len(origins) * len(destinations) > 1:
+            # with the access points of pois, the pairs are routed by increasing duration in the matrix and the
+            # first valid direct path is kept
+            ranked_pairs = self._rank_pairs_by_matrix(origins, destinations)
+            if ranked_pairs is not None:
+                for origin, destination in ranked_pairs:
+                    response = self._direct_path_with_fp_of(origin, destination)
+                    if is_valid_direct_path(response):
+                        return self.finalize_direct_path(Dp_element(origin, destination, response))
+                return self.finalize_direct_path(None)
+
         best_direct_path = None
-        for origin in self.get_pt_objects(self._orig_obj):
-            for destination in self.get_pt_objects(self._dest_obj):
-                response = self._streetnetwork_service.direct_path_with_fp(
-                    self._instance,
-                    self._mode,
-                    origin,
-                    destination,
-                    self._fallback_extremity,
-                    self._request,
-                    self._path_type,
-                    self._request_id,
-                )
+        for origin in origins:
+            for destination in destinations:
+                response = self._direct_path_with_fp_of(origin, destination)
                 if not is_valid_direct_path(response):
                     continue
                 if not best_direct_path:
@@ -0,0 +1,160 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr import app
+from jormungandr.scenarios.helper_classes.crowfly_reachability import CrowflyReachability
+
+SPEED = 4.0
+MAX_DURATION = 1000
+
+
+@pytest.fixture
+def pruning(mocker):
+    mocker.patch.dict(
+        app.config,
+        {
+            'ADAPTIVE_CROWFLY_PRUNING': True,
+            'ADAPTIVE_CROWFLY_PRUNING_DRY_RUN': False,
+            'ADAPTIVE_CROWFLY_PRUNING_MODES': ['bike'],
+            'ADAPTIVE_CROWFLY_PRUNING_MIN_SAMPLES': 10,
+            'ADAPTIVE_CROWFLY_PRUNING_MAX_SAMPLES': 100,
+            'ADAPTIVE_CROWFLY_PRUNING_QUANTILE': 0.1,
+        },
+    )
+
+
+def make_place(uri, distance):
+    return type_pb2.PtObject(uri=uri, distance=distance, embedded_type=type_pb2.STOP_POINT)
+
+
+def make_element(duration, status=response_pb2.reached):
+    return response_pb2.RoutingElement(duration=duration, routing_status=status)
+
+
+def learn(reachability, ratio, nb=10, mode='bike'):
+    """
+    record places reached with the given ratio between their duration and their crowfly duration
+    """
+    places = [make_place('sp{}'.format(i), 100 * (i + 1)) for i in range(nb)]
+    elements = [make_element(int(p.distance * ratio / SPEED)) for p in places]
+    reachability.record('bob', mode, places, elements, SPEED, MAX_DURATION)
+
+
+def no_pruning_before_enough_outcomes_test(pruning):
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0, nb=9)
+    assert reachability.get_min_ratio('bob', 'bike') is None
+
+    places = [make_place('far', 3900)]
+    assert reachability.prune('bob', 'bike', places, SPEED, MAX_DURATION) == places
+
+
+def prune_unreachable_candidates_test(pruning):
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+    assert reachability.get_min_ratio('bob', 'bike') == pytest.approx(2.0, rel=0.01)
+
+    # the crowfly radius is 4000m, the candidates farther than 2000m can't be reached
+    near, far = make_place('near', 1500), make_place('far', 2500)
+    assert reachability.prune('bob', 'bike', [near, far], SPEED, MAX_DURATION) == [near]
+
+
+def candidates_with_access_points_kept_test(pruning):
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+
+    far = make_place('far', 2500)
+    far.stop_point.access_points.add(uri='ap')
+    assert reachability.prune('bob', 'bike', [far], SPEED, MAX_DURATION) == [far]
+
+
+def outcomes_by_coverage_and_mode_test(pruning, mocker):
+    mocker.patch.dict(app.config, {'ADAPTIVE_CROWFLY_PRUNING_MODES': ['bike', 'car']})
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+    learn(reachability, 1.2, mode='car')
+
+    assert reachability.get_min_ratio('bob', 'bike') == pytest.approx(2.0, rel=0.01)
+    assert reachability.get_min_ratio('bob', 'car') == pytest.approx(1.2, rel=0.01)
+    assert reachability.get_min_ratio('bobette', 'bike') is None
+
+
+def unreached_places_not_learned_test(pruning):
+    reachability = CrowflyReachability()
+    places = [make_place('sp{}'.format(i), 1000) for i in range(10)]
+    elements = [make_element(0, response_pb2.unreached) for _ in places]
+    reachability.record('bob', 'bike', places, elements, SPEED, MAX_DURATION)
+    assert reachability.get_min_ratio('bob', 'bike') is None
+
+
+def dry_run_test(pruning, mocker):
+    mocker.patch.dict(app.config, {'ADAPTIVE_CROWFLY_PRUNING_DRY_RUN': True})
+    record_custom_event = mocker.patch('jormungandr.new_relic.record_custom_event')
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+
+    places = [make_place('far', 2500)]
+    assert reachability.prune('bob', 'bike', places, SPEED, MAX_DURATION) == places
+
+    # the place is reached (faster than expected), it would have been wrongly pruned
+    reachability.record('bob', 'bike', places, [make_element(900)], SPEED, MAX_DURATION)
+    event, params = record_custom_event.call_args[0]
+    assert event == 'crowfly_reachability'
+    assert params['nb_wrongly_pruned'] == 1
+
+
+def mode_not_pruned_test(pruning):
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0, mode='walking')
+    assert reachability.get_min_ratio('bob', 'walking') is None
+
+
+def min_ratio_capped_once_pruning_test(pruning):
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+
+    # only the nearest candidates are kept, the ratios of their outcomes are higher
+    learn(reachability, 3.0, nb=100)
+    assert reachability.get_min_ratio('bob', 'bike') == pytest.approx(2.0, rel=0.01)
+
+    learn(reachability, 1.5, nb=100)
+    assert reachability.get_min_ratio('bob', 'bike') == pytest.approx(1.5, rel=0.01)
+
+
+def min_ratio_not_capped_without_pruning_test(pruning, mocker):
+    mocker.patch.dict(app.config, {'ADAPTIVE_CROWFLY_PRUNING_DRY_RUN': True})
+    reachability = CrowflyReachability()
+    learn(reachability, 2.0)
+
+    learn(reachability, 3.0, nb=100)
+    assert reachability.get_min_ratio('bob', 'bike') == pytest.approx(3.0, rel=0.01)
@@ -0,0 +1,180 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+from collections import defaultdict
+from math import sqrt
+
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr.scenarios.helper_classes.fallback_durations import (
+    AccessMapElement,
+    DurationElement,
+    FallbackDurationColumns,
+    FallbackDurations,
+    FallbackDurationsPool,
+)
+
+SPEEDS = {'walking': 1.0, 'bike': 4.0, 'car': 10.0, 'bss': 4.0}
+
+
+class FakeFutureManager(object):
+    def create_future(self, fun):
+        return None
+
+
+class FakeInstance(object):
+    name = 'bob'
+
+    def get_street_network(self, mode, request):
+        return None
+
+
+class FakeFuture(object):
+    def __init__(self, value):
+        self._value = value
+
+    def wait_and_get(self):
+        return self._value
+
+
+def make_fallback_durations(mode, max_duration=1000):
+    request = {'_car_park_duration': 20, '_access_points': True}
+    return FallbackDurations(
+        FakeFutureManager(),
+        FakeInstance(),
+        type_pb2.PtObject(uri='origin', embedded_type=type_pb2.ADDRESS),
+        mode,
+        None,
+        None,
+        max_duration,
+        request,
+        SPEEDS,
+        'request_id',
+    )
+
+
+def make_matrix(elements):
+    matrix = response_pb2.StreetNetworkRoutingMatrix()
+    row = matrix.rows.add()
+    for duration, status in elements:
+        row.routing_response.add(duration=duration, routing_status=status)
+    return matrix
+
+
+def make_access_point(uri, traversal_time):
+    ap = type_pb2.AccessPoint(uri=uri, traversal_time=traversal_time)
+    return type_pb2.PtObject(uri=uri, embedded_type=type_pb2.ACCESS_POINT, access_point=ap)
+
+
+def columns_test():
+    columns = FallbackDurationColumns()
+    columns.extend(['sp1', 'sp2'], [10, 20], [response_pb2.reached, response_pb2.unknown])
+    assert len(columns) == 2
+    assert columns['sp2'] == DurationElement(20, response_pb2.unknown, None, 0, None, None)
+    assert columns.get('sp3') is None
+    assert 'sp1' in columns and 'sp3' not in columns
+
+    # an existing row is only replaced by a strictly smaller duration
+    columns.extend(['sp1', 'sp3'], [10, 30], [response_pb2.unknown, response_pb2.reached])
+    columns.add('sp2', 15, response_pb2.reached, via_pt_access='ap')
+    assert columns.get_durations() == {'sp1': 10, 'sp2': 15, 'sp3': 30}
+    assert columns['sp1'].status == response_pb2.reached
+    assert columns['sp2'] == DurationElement(15, response_pb2.reached, None, 0, 'ap', None)
+    assert list(columns) == ['sp1', 'sp2', 'sp3']
+
+
+def fallback_durations_stop_points_and_access_points_test():
+    fallback_durations = make_fallback_durations('bike')
+    sp1 = type_pb2.PtObject(uri='sp1', embedded_type=type_pb2.STOP_POINT, distance=100)
+    sp2 = type_pb2.PtObject(uri='sp2', embedded_type=type_pb2.STOP_POINT, distance=400)
+    sp3 = type_pb2.PtObject(uri='sp3', embedded_type=type_pb2.STOP_POINT, distance=2000)
+    ap1, ap2, ap3 = make_access_point('ap1', 10), make_access_point('ap2', 5), make_access_point('ap3', 5)
+    access_points_map = defaultdict(list)
+    # sp4 and sp5 are reached through their access points, ap1 is shared by both
+    for sp_uri, ap in (('sp4', ap1), ('sp4', ap2), ('sp5', ap1), ('sp5', ap3)):
+        access_points_map[ap.uri].append(AccessMapElement(sp_uri, ap))
+    places_isochrone = [sp1, sp2, sp3, ap1, ap2, ap3]
+    matrix = make_matrix(
+        [
+            (50, response_pb2.reached),
+            (0, response_pb2.unknown),
+            (1500, response_pb2.reached),
+            (60, response_pb2.reached),
+            (100, response_pb2.reached),
+            (30, response_pb2.unreached),
+        ]
+    )
+
+    res = fallback_durations.build_fallback_duration(None, {'sp0'}, places_isochrone, access_points_map, matrix)
+
+    assert res.get_durations() == {'sp0': 0, 'sp1': 50, 'sp2': int(400 * sqrt(2) / 4.0), 'sp4': 70, 'sp5': 70}
+    assert res['sp2'].status == response_pb2.unknown
+    assert res['sp4'] == DurationElement(70, response_pb2.reached, None, 0, ap1, None)
+    assert res['sp5'].via_pt_access == ap1
+
+
+def fallback_durations_car_park_test():
+    fallback_durations = make_fallback_durations('car')
+    car_park1 = type_pb2.PtObject(uri='cp1', embedded_type=type_pb2.POI, distance=1000)
+    car_park1.stop_points_nearby.add(uri='sp1', distance=100)
+    car_park1.stop_points_nearby.add(uri='sp2', distance=300)
+    car_park2 = type_pb2.PtObject(uri='cp2', embedded_type=type_pb2.POI, distance=1000)
+    car_park2.stop_points_nearby.add(uri='sp2', distance=50)
+    car_park2.stop_points_nearby.add(uri='sp0', distance=50)
+    matrix = make_matrix([(200, response_pb2.reached), (300, response_pb2.reached)])
+
+    res = fallback_durations.build_fallback_duration(None, {'sp0'}, [car_park1, car_park2], None, matrix)
+
+    walking1, walking2 = int(100 * sqrt(2)), int(50 * sqrt(2))
+    assert res.get_durations() == {'sp0': 0, 'sp1': 200 + walking1 + 20, 'sp2': 300 + walking2 + 20}
+    assert res['sp1'] == DurationElement(
+        200 + walking1 + 20, response_pb2.reached, car_park1, walking1, None, None
+    )
+    assert res['sp2'].car_park == car_park2
+
+
+def best_fallback_durations_test():
+    request = dict(
+        ('{}_speed'.format(mode), 1.0) for mode in ('walking', 'bike', 'car', 'car_no_park', 'bss', 'taxi')
+    )
+    request['origin_mode'] = ['bss', 'walking']
+    pool = FallbackDurationsPool(None, None, None, [], None, None, {}, request, 'request_id')
+
+    bss = FallbackDurationColumns()
+    bss.extend(['sp1', 'sp2', 'sp3'], [100, 200, 300], [response_pb2.reached] * 3)
+    walking = FallbackDurationColumns()
+    walking.extend(['sp2', 'sp3', 'sp4'], [150, 300, 10], [response_pb2.reached] * 3)
+    pool._modes = {'bss', 'walking'}
+    pool._value = {'bss': FakeFuture(bss), 'walking': FakeFuture(walking)}
+
+    # the walking durations only replace the strictly greater bss durations of the same stop points
+    assert pool.get_best_fallback_durations('bss') == {'sp1': 100, 'sp2': 150, 'sp3': 300}
+    assert pool.get_real_mode('bss', 'sp2') == 'walking'
+    assert pool.get_real_mode('bss', 'sp3') == 'bss'
@@ -0,0 +1,88 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import gevent
+import pytest
+
+from jormungandr.exceptions import TechnicalError
+from jormungandr.scenarios.helper_classes.helper_future import FutureManager
+from jormungandr.utils import get_deadline, get_remaining_time, request_budget
+
+
+def future_manager_without_budget_test():
+    with FutureManager() as future_manager:
+        future = future_manager.create_future(get_remaining_time, 10)
+        assert future.wait_and_get() == 10
+    assert get_deadline() is None
+
+
+def future_manager_budget_test():
+    with FutureManager(timeout=1) as future_manager:
+        deadline = get_deadline()
+        assert deadline is not None
+        # the futures share the budget of the manager
+        assert future_manager.create_future(get_deadline).wait_and_get() == deadline
+        assert future_manager.create_future(get_remaining_time, 10).wait_and_get() <= 1
+        # a smaller timeout is kept
+        assert future_manager.create_future(get_remaining_time, 0.5).wait_and_get() == 0.5
+    assert get_deadline() is None
+
+
+def request_budget_narrowing_test():
+    with request_budget(1) as request_deadline:
+        # an inner budget cannot extend the request's budget
+        with FutureManager(timeout=10) as future_manager:
+            assert future_manager.create_future(get_deadline).wait_and_get() == request_deadline
+        with FutureManager() as future_manager:
+            assert future_manager.create_future(get_deadline).wait_and_get() == request_deadline
+        with request_budget(0.1) as deadline:
+            assert deadline < request_deadline
+        assert get_deadline() == request_deadline
+
+
+def future_manager_budget_exhausted_test():
+    finished = []
+
+    def slow_call():
+        gevent.sleep(10)
+        finished.append(True)
+
+    with FutureManager(timeout=0.1) as future_manager:
+        future = future_manager.create_future(slow_call)
+    # the outstanding future has been cancelled when leaving the scope
+    assert future.get_future().ready()
+    assert finished == []
+    with pytest.raises(TechnicalError):
+        future.wait_and_get()
+
+    with FutureManager(timeout=0.1):
+        gevent.sleep(0.2)
+        # the budget is exhausted, the calls will fail fast
+        assert get_remaining_time(10) == 0.01
@@ -0,0 +1,132 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr.scenarios.helper_classes.streetnetwork_path import StreetNetworkPath
+from jormungandr.street_network.street_network import StreetNetworkPathType
+
+REQUEST = {
+    '_poi_access_points': True,
+    'walking_speed': 1.12,
+    'bike_speed': 3.3,
+    'car_speed': 11.1,
+    'car_no_park_speed': 11.1,
+    'bss_speed': 3.3,
+    'taxi_speed': 11.1,
+    'max_walking_direct_path_duration': 3600,
+}
+
+
+class FakeFutureManager(object):
+    def create_future(self, fun, *args, **kwargs):
+        return None
+
+
+class FakeStreetNetworkService(object):
+    """
+    The durations in the matrix are the sum of the indexes of the access points, the direct paths are invalid
+    for the pairs in `invalid_pairs`
+    """
+
+    def __init__(self, rows=True, invalid_pairs=()):
+        self.rows = rows
+        self.invalid_pairs = invalid_pairs
+        self.direct_path_calls = []
+
+    def get_many_to_many_routing_matrix(
+        self, instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
+    ):
+        if not self.rows:
+            return None
+        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+        for o in origins:
+            row = sn_routing_matrix.rows.add()
+            for d in destinations:
+                row.routing_response.add(
+                    duration=int(o.uri[-1]) + int(d.uri[-1]), routing_status=response_pb2.reached
+                )
+        return [list(row.routing_response) for row in sn_routing_matrix.rows]
+
+    def direct_path_with_fp(self, instance, mode, origin, destination, *args):
+        self.direct_path_calls.append((origin.uri, destination.uri))
+        resp = response_pb2.Response()
+        if (origin.uri, destination.uri) not in self.invalid_pairs:
+            journey = resp.journeys.add()
+            journey.durations.total = int(origin.uri[-1]) + int(destination.uri[-1])
+            journey.sections.add()
+        return resp
+
+
+def make_poi(uri, nb_access_points):
+    pt_object = type_pb2.PtObject(uri=uri, embedded_type=type_pb2.POI)
+    pt_object.poi.uri = uri
+    for i in range(nb_access_points):
+        child = pt_object.poi.children.add()
+        child.uri = '{}:access_point:{}'.format(uri, i + 1)
+    return pt_object
+
+
+def build_direct_path(service, mocker):
+    mocker.patch.object(StreetNetworkPath, 'finalize_direct_path', side_effect=lambda dp: dp)
+    path = StreetNetworkPath(
+        FakeFutureManager(),
+        None,
+        service,
+        make_poi('poi:stadium', 3),
+        make_poi('poi:mall', 2),
+        'walking',
+        None,
+        REQUEST,
+        StreetNetworkPathType.DIRECT,
+        'request_id',
+    )
+    return path.build_direct_path()
+
+
+def only_the_best_pair_is_routed_test(mocker):
+    service = FakeStreetNetworkService()
+    dp = build_direct_path(service, mocker)
+    assert (dp.origin.uri, dp.destination.uri) == ('poi:stadium:access_point:1', 'poi:mall:access_point:1')
+    assert service.direct_path_calls == [('poi:stadium:access_point:1', 'poi:mall:access_point:1')]
+
+
+def next_pair_when_the_best_one_is_invalid_test(mocker):
+    service = FakeStreetNetworkService(invalid_pairs=[('poi:stadium:access_point:1', 'poi:mall:access_point:1')])
+    dp = build_direct_path(service, mocker)
+    assert len(service.direct_path_calls) == 2
+    assert dp.response.journeys[0].durations.total == 3
+
+
+def all_pairs_without_matrix_test(mocker):
+    service = FakeStreetNetworkService(rows=False)
+    dp = build_direct_path(service, mocker)
+    assert len(service.direct_path_calls) == 6
+    assert (dp.origin.uri, dp.destination.uri) == ('poi:stadium:access_point:1', 'poi:mall:access_point:1')
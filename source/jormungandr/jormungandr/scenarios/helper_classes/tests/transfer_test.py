@@ -0,0 +1,257 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr import app
+from jormungandr.scenarios.helper_classes.helper_future import FutureManager
+from jormungandr.scenarios.helper_classes.transfer import TransferPool
+from jormungandr.street_network.tests.streetnetwork_test_utils import make_pt_object
+from jormungandr.transfer_store import TransferStore
+
+REQUEST = {'walking_speed': 1.12, '_asgard_language': 'english_us'}
+
+
+class FakeStreetNetworkService(object):
+    """
+    The durations in the matrix are the longitudes of the access points * 100, the matrices with a destination
+    in failing_destinations are incomplete
+    """
+
+    handles_many_to_many_matrix = True
+
+    def __init__(self):
+        self.direct_paths = []
+        self.matrices = []
+        self.failing_destinations = set()
+
+    def direct_path_with_fp(self, instance, mode, origin, destination, *args):
+        self.direct_paths.append((origin.uri, destination.uri))
+        resp = response_pb2.Response()
+        section = resp.journeys.add().sections.add()
+        section.street_network.coordinates.add(lon=1.0, lat=1.0)
+        section.street_network.path_items.add(name='rue bob')
+        return resp
+
+    def get_many_to_many_routing_matrix(
+        self, instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
+    ):
+        self.matrices.append(([o.uri for o in origins], [d.uri for d in destinations]))
+        if any(d.uri in self.failing_destinations for d in destinations):
+            return None
+        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+        for o in origins:
+            row = sn_routing_matrix.rows.add()
+            for d in destinations:
+                ap = o if o.embedded_type == type_pb2.ACCESS_POINT else d
+                row.routing_response.add(
+                    duration=int(ap.access_point.coord.lon * 100), routing_status=response_pb2.reached
+                )
+        return [list(row.routing_response) for row in sn_routing_matrix.rows]
+
+
+class FakeGeoref(object):
+    def __init__(self, stop_points):
+        self.stop_points = stop_points
+        self.calls = []
+
+    def get_stop_points_from_uris(self, uris, request_id, depth=0):
+        self.calls.append(uris)
+        return [sp for sp in self.stop_points if sp.uri in uris]
+
+
+class FakeInstance(object):
+    name = 'bob'
+
+    def __init__(self, stop_points=()):
+        self.publication_date = 1
+        self.street_network = FakeStreetNetworkService()
+        self.georef = FakeGeoref(stop_points)
+        self.transfer_store = TransferStore(self.name)
+
+    def get_street_network(self, mode, request):
+        return self.street_network
+
+
+def make_stop_point(uri, exits=()):
+    stop_point = type_pb2.StopPoint(uri=uri, label=uri)
+    for ap_uri, lon in exits:
+        ap = stop_point.access_points.add(uri=ap_uri, name=ap_uri, is_exit=True, traversal_time=10)
+        ap.coord.lon = lon
+        ap.coord.lat = 1.0
+    return stop_point
+
+
+def make_journey_sections(origin_uri, destination_uri, prev_mode, next_mode):
+    journey = response_pb2.Journey()
+    s = journey.sections.add(type=response_pb2.PUBLIC_TRANSPORT)
+    s.pt_display_informations.uris.physical_mode = prev_mode
+    s = journey.sections.add(type=response_pb2.TRANSFER, duration=300)
+    s.origin.CopyFrom(make_pt_object(type_pb2.STOP_POINT, 1.0, 1.0, origin_uri))
+    s.destination.CopyFrom(make_pt_object(type_pb2.STOP_POINT, 1.1, 1.0, destination_uri))
+    journey.sections.add(type=response_pb2.WAITING)
+    s = journey.sections.add(type=response_pb2.PUBLIC_TRANSPORT)
+    s.pt_display_informations.uris.physical_mode = next_mode
+    return journey.sections
+
+
+@pytest.fixture
+def transfer_store(mocker):
+    mocker.patch.dict(app.config, {'TRANSFER_PATH_CACHE_SIZE': 100, 'TRANSFER_PATH_STORE_DIR': None})
+
+
+def compute_transfers(instance, journeys_sections):
+    with FutureManager() as future_manager:
+        pool = TransferPool(future_manager, instance, REQUEST, 'request_id')
+        for sections in journeys_sections:
+            pool.async_compute_transfer(sections)
+        pool.compute_transfers()
+        for sections in journeys_sections:
+            pool.wait_and_complete(sections[1])
+
+
+def transfer_shared_by_journeys_test(transfer_store):
+    instance = FakeInstance()
+    journeys_sections = [
+        make_journey_sections('sp1', 'sp2', 'physical_mode:Bus', 'physical_mode:Tramway') for _ in range(3)
+    ]
+    compute_transfers(instance, journeys_sections)
+
+    assert instance.street_network.direct_paths == [('sp1', 'sp2')]
+    for sections in journeys_sections:
+        assert sections[1].street_network.path_items[0].name == 'rue bob'
+        # the coord of the destination is added once
+        assert len(sections[1].street_network.coordinates) == 2
+
+
+def access_point_transfers_in_batch_test(transfer_store):
+    instance = FakeInstance(
+        [
+            make_stop_point('sp1', exits=[('ap1:far', 0.5), ('ap1:near', 0.1)]),
+            make_stop_point('sp3', exits=[('ap3', 0.2)]),
+        ]
+    )
+    journeys_sections = [
+        make_journey_sections('sp1', 'sp2', 'physical_mode:Metro', 'physical_mode:Bus'),
+        make_journey_sections('sp3', 'sp4', 'physical_mode:Metro', 'physical_mode:Bus'),
+        make_journey_sections('sp5', 'sp6', 'physical_mode:Metro', 'physical_mode:Bus'),
+    ]
+    compute_transfers(instance, journeys_sections)
+
+    # a single call to get the access points of all the stop points
+    assert instance.georef.calls == [['sp1', 'sp3', 'sp5']]
+    # only sp1 has several exits: a single matrix
+    assert instance.street_network.matrices == [(['ap1:far', 'ap1:near'], ['sp2'])]
+    assert sorted(instance.street_network.direct_paths) == [('ap1:near', 'sp2'), ('ap3', 'sp4')]
+    assert journeys_sections[0][1].vias[0].uri == 'ap1:near'
+    assert journeys_sections[0][1].street_network.path_items[0].via_uri == 'ap1:near'
+    # sp5 has no access point
+    assert not journeys_sections[2][1].HasField(str('street_network'))
+
+
+def access_point_transfers_matrix_by_transfer_test(transfer_store):
+    instance = FakeInstance(
+        [
+            make_stop_point('sp1', exits=[('ap1:far', 0.5), ('ap1:near', 0.1)]),
+            make_stop_point('sp3', exits=[('ap3:far', 0.4), ('ap3:near', 0.2)]),
+        ]
+    )
+    instance.street_network.handles_many_to_many_matrix = False
+    journeys_sections = [
+        make_journey_sections('sp1', 'sp2', 'physical_mode:Metro', 'physical_mode:Bus'),
+        make_journey_sections('sp3', 'sp4', 'physical_mode:Metro', 'physical_mode:Bus'),
+    ]
+    compute_transfers(instance, journeys_sections)
+
+    # the transfers aren't merged in a n-m matrix
+    assert sorted(instance.street_network.matrices) == [
+        (['ap1:far', 'ap1:near'], ['sp2']),
+        (['ap3:far', 'ap3:near'], ['sp4']),
+    ]
+    assert sorted(instance.street_network.direct_paths) == [('ap1:near', 'sp2'), ('ap3:near', 'sp4')]
+
+
+def access_point_transfers_failing_matrix_test(transfer_store):
+    instance = FakeInstance(
+        [
+            make_stop_point('sp1', exits=[('ap1:far', 0.5), ('ap1:near', 0.1)]),
+            make_stop_point('sp3', exits=[('ap3:far', 0.4), ('ap3:near', 0.2)]),
+        ]
+    )
+    instance.street_network.failing_destinations = {'sp2'}
+    journeys_sections = [
+        make_journey_sections('sp1', 'sp2', 'physical_mode:Metro', 'physical_mode:Bus'),
+        make_journey_sections('sp3', 'sp4', 'physical_mode:Metro', 'physical_mode:Bus'),
+    ]
+    compute_transfers(instance, journeys_sections)
+
+    # the n-m matrix is incomplete, a matrix is computed by transfer
+    assert instance.street_network.matrices[0] == (
+        ['ap1:far', 'ap1:near', 'ap3:far', 'ap3:near'],
+        ['sp2', 'sp4'],
+    )
+    assert sorted(instance.street_network.matrices[1:]) == [
+        (['ap1:far', 'ap1:near'], ['sp2']),
+        (['ap3:far', 'ap3:near'], ['sp4']),
+    ]
+    # only the transfer whose matrix fails has no path
+    assert instance.street_network.direct_paths == [('ap3:near', 'sp4')]
+    assert not journeys_sections[0][1].HasField(str('street_network'))
+    assert journeys_sections[1][1].vias[0].uri == 'ap3:near'
+
+
+def access_points_stored_test(transfer_store):
+    instance = FakeInstance([make_stop_point('sp1', exits=[('ap1', 0.1)])])
+
+    compute_transfers(
+        instance, [make_journey_sections('sp1', 'sp2', 'physical_mode:Metro', 'physical_mode:Bus')]
+    )
+    # another transfer from the same stop points
+    sections = make_journey_sections('sp1', 'sp3', 'physical_mode:Metro', 'physical_mode:Bus')
+    compute_transfers(instance, [sections])
+
+    assert instance.georef.calls == [['sp1']]
+    assert instance.street_network.direct_paths == [('ap1', 'sp2'), ('ap1', 'sp3')]
+    assert sections[1].vias[0].uri == 'ap1'
+
+
+def transfers_stored_until_next_publication_test(transfer_store):
+    instance = FakeInstance()
+
+    compute_transfers(instance, [make_journey_sections('sp1', 'sp2', 'physical_mode:Bus', 'physical_mode:Bus')])
+    sections = make_journey_sections('sp1', 'sp2', 'physical_mode:Bus', 'physical_mode:Bus')
+    compute_transfers(instance, [sections])
+    assert instance.street_network.direct_paths == [('sp1', 'sp2')]
+    assert sections[1].street_network.path_items[0].name == 'rue bob'
+
+    instance.publication_date = 2
+    compute_transfers(instance, [make_journey_sections('sp1', 'sp2', 'physical_mode:Bus', 'physical_mode:Bus')])
+    assert len(instance.street_network.direct_paths) == 2
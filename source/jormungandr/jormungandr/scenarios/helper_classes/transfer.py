@@ -27,13 +27,16 @@
 # https://groups.google.com/d/forum/navitia
 # www.navitia.io
 from __future__ import absolute_import, print_function, unicode_literals, division
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from navitiacommon import response_pb2, type_pb2
 import itertools
 import logging
+import gevent
+from jormungandr.street_network.routing_matrix_cache import make_profile
 from jormungandr.street_network.street_network import StreetNetworkPathType
-from jormungandr.utils import PeriodExtremity
+from jormungandr.utils import PeriodExtremity, deadline_scope, get_deadline
 from jormungandr.fallback_modes import FallbackModes
+from jormungandr.transfer_store import make_transfer_key
 from jormungandr.scenarios.helper_classes.helper_utils import (
     prepend_first_coord,
     append_last_coord,
@@ -75,8 +78,23 @@ ACCESS_POINTS_TRANSFER = set(
 
 TransferResult = namedtuple('TransferResult', ['direct_path', 'origin', 'destination'])
 
+# a transfer section to complete and the physical modes of the sections around it
+TransferToCompute = namedtuple('TransferToCompute', ['section', 'prev_section_mode', 'next_section_mode'])
+
 
 class TransferPool(object):
+    """
+    Compute the walking paths of the transfers of the journeys
+
+    The transfers of all the journeys are registered with async_compute_transfer, then computed together by
+    compute_transfers:
+      - a transfer shared by several journeys is computed once
+      - the access points of all the stop points are requested to kraken in a single call
+      - the best access points are chosen with a single routing matrix
+    The transfers and the access points are then kept in the transfer store of the instance until the next
+    publication, the next requests don't call the street network for them.
+    """
+
     def __init__(
         self,
         future_manager,
@@ -88,8 +106,15 @@ class TransferPool(object):
         self._instance = instance
         self._request = request
         self._request_id = request_id
+        self._transfer_store = instance.transfer_store
+        # the results are stored only if the data haven't changed
+        self._publication_date = instance.publication_date
         self._streetnetwork_service = self._instance.get_street_network(FallbackModes.walking.name, request)
+        # section key -> TransferToCompute, for the transfers registered but not computed yet
+        self._transfers_to_compute = OrderedDict()
         self._transfers_future = dict()
+        # section key -> TransferResult, for the transfers found in the store
+        self._stored_transfers = dict()
         self._logger = logging.getLogger(__name__)
 
     def _make_sub_request_id(self, origin_uri, destination_uri):
@@ -113,6 +138,9 @@ class TransferPool(object):
             return None
 
     def async_compute_transfer(self, journey_sections):
+        """
+        Register the transfers of a journey, they are computed by compute_transfers
+        """
         for index, section in enumerate(journey_sections[1:-2], start=1):
             if section.type != response_pb2.TRANSFER:
                 continue
@@ -129,71 +157,112 @@ class TransferPool(object):
             next_section_mode = self.get_physical_mode(next_section)
 
             section_key = self._get_section_key(section)
-            if section_key in self._transfers_future:
+            if (
+                section_key in self._transfers_to_compute
+                or section_key in self._transfers_future
+                or section_key in self._stored_transfers
+            ):
                 continue
 
-            if (prev_section_mode, next_section_mode) in NO_ACCESS_POINTS_TRANSFER:
-                self._transfers_future[section_key] = self._aysnc_no_access_point_transfer(section)
-            elif (prev_section_mode, next_section_mode) in ACCESS_POINTS_TRANSFER:
-                self._transfers_future[section_key] = self._aysnc_access_point_transfer(
+            if (prev_section_mode, next_section_mode) in NO_ACCESS_POINTS_TRANSFER or (
+                prev_section_mode,
+                next_section_mode,
+            ) in ACCESS_POINTS_TRANSFER:
+                self._transfers_to_compute[section_key] = TransferToCompute(
                     section, prev_section_mode, next_section_mode
                 )
+
+    def _make_store_key(self, transfer):
+        walking_speed = self._request.get('walking_speed')
+        return make_transfer_key(
+            make_profile(FallbackModes.walking.name, self._request, walking_speed),
+            self._request.get('_asgard_language'),
+            self._get_section_key(transfer.section),
+            transfer.prev_section_mode,
+            transfer.next_section_mode,
+        )
+
+    def compute_transfers(self):
+        """
+        Launch the computation of the transfers registered by async_compute_transfer
+        """
+        transfers, self._transfers_to_compute = self._transfers_to_compute, OrderedDict()
+
+        transfers_with_access_points = OrderedDict()
+        for section_key, transfer in transfers.items():
+            stored = self._transfer_store.get_transfer(self._publication_date, self._make_store_key(transfer))
+            if stored is not None:
+                self._stored_transfers[section_key] = TransferResult(*stored)
+            elif (transfer.prev_section_mode, transfer.next_section_mode) in NO_ACCESS_POINTS_TRANSFER:
+                self._transfers_future[section_key] = self._future_manager.create_future(
+                    self._do_transfer, transfer, transfer.section.origin, transfer.section.destination
+                )
             else:
-                continue
+                transfers_with_access_points[section_key] = transfer
+
+        if not transfers_with_access_points:
+            return
 
-    def _do_no_access_point_transfer(self, section):
-        sub_request_id = self._make_sub_request_id(section.origin.uri, section.destination.uri)
+        # the extremities of the transfers through access points are chosen together
+        extremities_future = self._future_manager.create_future(
+            self._get_access_point_transfers_extremities, transfers_with_access_points
+        )
+        for section_key, transfer in transfers_with_access_points.items():
+            self._transfers_future[section_key] = self._future_manager.create_future(
+                self._do_access_point_transfer, section_key, transfer, extremities_future
+            )
 
+    def _do_transfer(self, transfer, origin, destination):
+        section = transfer.section
+        sub_request_id = self._make_sub_request_id(origin.uri, destination.uri)
         direct_path_type = StreetNetworkPathType.DIRECT
         extremity = PeriodExtremity(section.end_date_time, False)
         direct_path = self._streetnetwork_service.direct_path_with_fp(
             self._instance,
             FallbackModes.walking.name,
-            section.origin,
-            section.destination,
+            origin,
+            destination,
             extremity,
             self._request,
             direct_path_type,
             sub_request_id,
         )
-
         if direct_path and direct_path.journeys:
-            return TransferResult(direct_path, section.origin, section.destination)
-
+            self._transfer_store.set_transfer(
+                self._publication_date, self._make_store_key(transfer), direct_path, origin, destination
+            )
+            return TransferResult(direct_path, origin, destination)
         return None
 
-    def _aysnc_no_access_point_transfer(self, section):
-        return self._future_manager.create_future(self._do_no_access_point_transfer, section)
-
-    def _get_access_points(self, stop_point_uri, access_point_filter=lambda x: x):
-        sub_request_id = "{}_transfer_start_{}".format(self._request_id, stop_point_uri)
-        stop_points = self._instance.georef.get_stop_points_from_uri(stop_point_uri, sub_request_id, depth=3)
-        if not stop_points:
+    def _do_access_point_transfer(self, section_key, transfer, extremities_future):
+        extremities = extremities_future.wait_and_get()
+        if not extremities or section_key not in extremities:
             return None
+        origin, destination = extremities[section_key]
+        return self._do_transfer(transfer, origin, destination)
 
-        return [
-            type_pb2.PtObject(name=ap.name, uri=ap.uri, embedded_type=type_pb2.ACCESS_POINT, access_point=ap)
-            for ap in stop_points[0].access_points
-            if access_point_filter(ap)
-        ]
-
-    def get_underlying_access_points(self, section, prev_section_mode, next_section_mode):
+    @staticmethod
+    def _get_underlying_stop_point_uri(section, prev_section_mode):
         """
-        find out based on with extremity of the section the access points are calculated and request the georef for
-        access_points of the underlying stop_point
-        return: access_points
+        the stop point whose access points are used: the origin of the transfer when we get out of a train, its
+        destination when we get in a train
         """
         if prev_section_mode in ACCESS_POINTS_PHYSICAL_MODES:
-            return self._get_access_points(
-                section.origin.uri, access_point_filter=lambda access_point: access_point.is_exit
-            )
+            return section.origin.uri
+        return section.destination.uri
 
-        if next_section_mode in ACCESS_POINTS_PHYSICAL_MODES:
-            return self._get_access_points(
-                section.destination.uri, access_point_filter=lambda access_point: access_point.is_entrance
-            )
-
-        return None
+    @staticmethod
+    def get_underlying_access_points(stop_point, prev_section_mode):
+        """
+        the exits of the stop point when we get out of a train, its entrances when we get in a train
+        return: access_points
+        """
+        is_usable = 'is_exit' if prev_section_mode in ACCESS_POINTS_PHYSICAL_MODES else 'is_entrance'
+        return [
+            type_pb2.PtObject(name=ap.name, uri=ap.uri, embedded_type=type_pb2.ACCESS_POINT, access_point=ap)
+            for ap in stop_point.access_points
+            if getattr(ap, is_usable)
+        ]
 
     @staticmethod
     def determinate_matrix_entry(section, access_points, prev_section_mode, next_section_mode):
@@ -220,92 +289,189 @@ class TransferPool(object):
         return origin, destination
 
     @staticmethod
-    def determinate_the_best_access_point(routing_matrix, access_points):
+    def determinate_the_best_access_point(durations, access_points, max_duration):
         """
         determinate the best access point
+        :param durations: access point uri -> RoutingElement from or to the access point
         return: access_point
         """
-        # since the matrix is not really a matrix(NxM) but a single row(1xN)...
         best_access_point = None
         best_duration = float('inf')
-        for i, ap in enumerate(access_points):
-            if routing_matrix.rows[0].routing_response[i].routing_status != response_pb2.reached:
+        for ap in access_points:
+            element = durations.get(ap.uri)
+            if element is None or element.routing_status != response_pb2.reached:
+                continue
+            if element.duration > max_duration:
                 continue
-            total_duration = routing_matrix.rows[0].routing_response[i].duration + ap.access_point.traversal_time
+            total_duration = element.duration + ap.access_point.traversal_time
             if total_duration < best_duration:
                 best_duration = total_duration
                 best_access_point = ap
 
         return best_access_point
 
-    def _get_transfer_result(self, section, origin, destination):
-        sub_request_id = self._make_sub_request_id(origin.uri, destination.uri)
-        direct_path_type = StreetNetworkPathType.DIRECT
-        extremity = PeriodExtremity(section.end_date_time, False)
-        direct_path = self._streetnetwork_service.direct_path_with_fp(
-            self._instance,
-            FallbackModes.walking.name,
-            origin,
-            destination,
-            extremity,
-            self._request,
-            direct_path_type,
-            sub_request_id,
+    def _get_access_points_by_stop_point(self, transfers):
+        uris = sorted(
+            {self._get_underlying_stop_point_uri(t.section, t.prev_section_mode) for t in transfers.values()}
         )
-        if direct_path and direct_path.journeys:
-            return TransferResult(direct_path, origin, destination)
-        return None
+        stop_points = {}
+        for uri in uris:
+            stop_point = self._transfer_store.get_stop_point(self._publication_date, uri)
+            if stop_point is not None:
+                stop_points[uri] = stop_point
+        missing_uris = [uri for uri in uris if uri not in stop_points]
+        if not missing_uris:
+            return stop_points
+
+        sub_request_id = "{}_transfer_access_points".format(self._request_id)
+        found = {
+            sp.uri: sp
+            for sp in self._instance.georef.get_stop_points_from_uris(missing_uris, sub_request_id, depth=3)
+        }
+        for uri in missing_uris:
+            # the stop points without access points are stored too, they won't be requested again
+            stop_point = found.get(uri)
+            access_points = stop_point.access_points if stop_point is not None else []
+            self._transfer_store.set_stop_point(self._publication_date, uri, access_points)
+            if stop_point is not None:
+                stop_points[uri] = stop_point
+        return stop_points
+
+    def _get_access_point_transfers_extremities(self, transfers):
+        """
+        Choose the access points of all the transfers
 
-    def _do_access_point_transfer(self, section, prev_section_mode, next_section_mode):
-        access_points = self.get_underlying_access_points(section, prev_section_mode, next_section_mode)
-        # if no access points are found for this stop point, which is supposed to have access points
-        # we do nothing about the transfer path
-        if not access_points:
-            return None
+        The access points of all the stop points are requested in a single call, then the durations from (or to)
+        all the access points are computed in a single routing matrix if the street network service handles n-m
+        matrices, in a matrix by transfer otherwise
 
-        origins, destinations = self.determinate_matrix_entry(
-            section, access_points, prev_section_mode, next_section_mode
-        )
+        return: section key -> (origin, destination) of the walking path of the transfer
+        """
+        try:
+            stop_points = self._get_access_points_by_stop_point(transfers)
+        except Exception:
+            self._logger.exception("impossible to get the access points of the transfers")
+            return {}
+
+        extremities = {}
+        # section key -> (access points, origins, destinations), for the transfers needing a matrix
+        transfers_matrix_entries = {}
+        for section_key, transfer in transfers.items():
+            section, prev_section_mode, next_section_mode = transfer
+            stop_point = stop_points.get(self._get_underlying_stop_point_uri(section, prev_section_mode))
+            # if no access points are found for this stop point, which is supposed to have access points
+            # we do nothing about the transfer path
+            if stop_point is None:
+                continue
+            access_points = self.get_underlying_access_points(stop_point, prev_section_mode)
+            if not access_points:
+                continue
 
-        if len(origins) > 1 and len(destinations) > 1:
-            self._logger.error(
-                "Error occurred when computing transfer path both origin's and destination's sizes are larger than 1"
+            origins, destinations = self.determinate_matrix_entry(
+                section, access_points, prev_section_mode, next_section_mode
             )
-            return None
+            if len(origins) > 1 and len(destinations) > 1:
+                self._logger.error(
+                    "Error occurred when computing transfer path both origin's and destination's sizes are "
+                    "larger than 1"
+                )
+                continue
+            if len(origins) == 1 and len(destinations) == 1:
+                extremities[section_key] = (origins[0], destinations[0])
+                continue
+            transfers_matrix_entries[section_key] = (access_points, origins, destinations)
+
+        if not transfers_matrix_entries:
+            return extremities
+
+        matrix = None
+        if self._streetnetwork_service.handles_many_to_many_matrix and len(transfers_matrix_entries) > 1:
+            # a single matrix between all the origins and all the destinations of the transfers
+            matrix = self._get_transfers_matrix(transfers, transfers_matrix_entries)
+        if matrix is None:
+            # otherwise, or if it fails, a matrix by transfer computed concurrently: a failing matrix only
+            # concerns its transfer
+            matrix = self._get_matrix_by_transfer(transfers, transfers_matrix_entries)
+
+        for section_key, (access_points, origins, destinations) in transfers_matrix_entries.items():
+            section, prev_section_mode, next_section_mode = transfers[section_key]
+            # now it's time to find the best combo
+            # (stop_point -> access_points or access_points -> stop_point)
+            if prev_section_mode in ACCESS_POINTS_PHYSICAL_MODES:
+                durations = {o.uri: matrix.get((o.uri, destinations[0].uri)) for o in origins}
+            else:
+                durations = {d.uri: matrix.get((origins[0].uri, d.uri)) for d in destinations}
+            best_access_point = self.determinate_the_best_access_point(
+                durations, access_points, section.duration * 3
+            )
+            if best_access_point is None:
+                self._logger.warning("no access points is reachable in transfer path computation")
+                continue
+            extremities[section_key] = self.determinate_direct_path_entry(
+                section, best_access_point, prev_section_mode, next_section_mode
+            )
+        return extremities
 
-        if len(origins) == 1 and len(destinations) == 1:
-            return self._get_transfer_result(section, origins[0], destinations[0])
+    def _get_transfers_matrix(self, transfers, transfers_matrix_entries):
+        """
+        The walking durations between all the origins and all the destinations of the given transfers
 
+        return: (origin uri, destination uri) -> response_pb2.RoutingElement, None if the matrix can't be computed
+        """
+        matrix_origins = OrderedDict()
+        matrix_destinations = OrderedDict()
+        for _, origins, destinations in transfers_matrix_entries.values():
+            matrix_origins.update((o.uri, o) for o in origins)
+            matrix_destinations.update((d.uri, d) for d in destinations)
+        max_duration = max(transfers[k].section.duration * 3 for k in transfers_matrix_entries)
         sub_request_id = "{}_transfer_matrix".format(self._request_id)
-        routing_matrix = self._streetnetwork_service.get_street_network_routing_matrix(
-            self._instance,
-            origins,
-            destinations,
-            FallbackModes.walking.name,
-            section.duration * 3,
-            self._request,
-            sub_request_id,
-        )
-
-        if all(
-            matrix.routing_status == response_pb2.unreached for matrix in routing_matrix.rows[0].routing_response
-        ):
-            logging.getLogger(__name__).warning("no access points is reachable in transfer path computation")
+        try:
+            rows = self._streetnetwork_service.get_many_to_many_routing_matrix(
+                self._instance,
+                list(matrix_origins.values()),
+                list(matrix_destinations.values()),
+                FallbackModes.walking.name,
+                max_duration,
+                self._request,
+                sub_request_id,
+            )
+        except Exception:
+            self._logger.exception("impossible to compute the routing matrix of the transfers")
             return None
+        if rows is None:
+            self._logger.warning("incomplete routing matrix in transfer path computation")
+            return None
+        return {
+            (origin_uri, destination_uri): element
+            for origin_uri, row in zip(matrix_origins, rows)
+            for destination_uri, element in zip(matrix_destinations, row)
+        }
 
-        # now it's time to find the best combo
-        # (stop_point -> access_points or access_points -> stop_point)
-        best_access_point = self.determinate_the_best_access_point(routing_matrix, access_points)
+    def _get_transfers_matrix_with_deadline(self, deadline, transfers, transfers_matrix_entries):
+        with deadline_scope(deadline):
+            return self._get_transfers_matrix(transfers, transfers_matrix_entries)
 
-        origin, destination = self.determinate_direct_path_entry(
-            section, best_access_point, prev_section_mode, next_section_mode
-        )
-        return self._get_transfer_result(section, origin, destination)
+    def _get_matrix_by_transfer(self, transfers, transfers_matrix_entries):
+        """
+        The walking durations of each transfer, in its own 1-n or n-1 matrix
 
-    def _aysnc_access_point_transfer(self, section, prev_section_mode, next_section_mode):
-        return self._future_manager.create_future(
-            self._do_access_point_transfer, section, prev_section_mode, next_section_mode
-        )
+        return: (origin uri, destination uri) -> response_pb2.RoutingElement, without the durations of the
+                transfers whose matrix can't be computed
+        """
+        deadline = get_deadline()
+        greenlets = [
+            gevent.spawn(self._get_transfers_matrix_with_deadline, deadline, transfers, {section_key: entry})
+            for section_key, entry in transfers_matrix_entries.items()
+        ]
+        try:
+            gevent.joinall(greenlets)
+        finally:
+            gevent.killall(greenlets)
+        matrix = {}
+        for greenlet in greenlets:
+            if greenlet.value:
+                matrix.update(greenlet.value)
+        return matrix
 
     @staticmethod
     def _get_section_key(section):
@@ -329,16 +495,24 @@ class TransferPool(object):
         if TransferPool._is_access_point(pt_object):
             section.vias.add().CopyFrom(pt_object.access_point)
 
-    def wait_and_complete(self, section):
-        future = self._transfers_future.get(self._get_section_key(section))
+    def _get_transfer_result(self, section_key):
+        if section_key in self._transfers_to_compute:
+            self.compute_transfers()
+        if section_key in self._stored_transfers:
+            return self._stored_transfers[section_key]
+        future = self._transfers_future.get(section_key)
         if future is None:
-            return
+            return None
+        return future.wait_and_get()
 
-        transfer_result = future.wait_and_get()
+    def wait_and_complete(self, section):
+        transfer_result = self._get_transfer_result(self._get_section_key(section))
         if not self._is_valid(transfer_result):
             return
 
-        transfer_direct_path = transfer_result.direct_path
+        # the transfer result is shared by the sections (and the requests) with the same transfer
+        transfer_direct_path = response_pb2.Response()
+        transfer_direct_path.CopyFrom(transfer_result.direct_path)
 
         if transfer_result.origin and transfer_result.destination:
             prepend_first_coord(transfer_direct_path, transfer_result.origin)
@@ -0,0 +1,159 @@
+# coding=utf-8
+
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+import navitiacommon.response_pb2 as response_pb2
+
+ODT_ADDITIONAL_INFORMATIONS = frozenset(
+    (response_pb2.ODT_WITH_ZONE, response_pb2.ODT_WITH_STOP_POINT, response_pb2.ODT_WITH_STOP_TIME)
+)
+FALLBACK_SECTION_TYPES = frozenset((response_pb2.STREET_NETWORK, response_pb2.CROW_FLY))
+NON_TRANSPORT_SECTION_TYPES = frozenset(
+    (response_pb2.STREET_NETWORK, response_pb2.TRANSFER, response_pb2.WAITING, response_pb2.CROW_FLY)
+)
+NON_FALLBACK_SECTION_TYPES = frozenset(
+    (response_pb2.PUBLIC_TRANSPORT, response_pb2.WAITING, response_pb2.boarding, response_pb2.landing)
+)
+
+
+class JourneyFeatures(object):
+    """
+    Values derived from the sections of a journey, computed in a single pass over its sections
+
+    The filters and the qualifier functions accept the features in place of the journey: the attributes of the
+    journey used by the criteria are copied.
+    The features are only valid as long as the sections of the journey are not modified.
+    """
+
+    __slots__ = (
+        'journey',
+        'nb_transfers',
+        'arrival_date_time',
+        'departure_date_time',
+        'duration',
+        # duration of the street network and crow fly sections
+        'fallback_duration',
+        'start_fallback_duration',
+        'end_fallback_duration',
+        # duration of the street network, crow fly, transfer and waiting sections
+        'nontransport_duration',
+        # duration of all the sections but public transport, waiting, boarding and landing
+        'non_pt_duration',
+        'min_waiting',
+        'has_pt',
+        'has_odt',
+        'has_bss',
+        # modes of the street network and crow fly sections
+        'fallback_modes',
+        'first_section_type',
+        'first_section_mode',
+        'last_section_type',
+        'last_section_mode',
+    )
+
+    def __init__(self, journey):
+        self.journey = journey
+        self.nb_transfers = journey.nb_transfers
+        self.arrival_date_time = journey.arrival_date_time
+        self.departure_date_time = journey.departure_date_time
+        self.duration = journey.duration
+
+        fallback_duration = nontransport_duration = non_pt_duration = 0
+        start_fallback_duration = end_fallback_duration = min_waiting = None
+        has_pt = has_odt = has_bss = False
+        fallback_modes = set()
+        section = None
+        for section in journey.sections:
+            section_type = section.type
+            duration = section.duration
+            if section_type == response_pb2.PUBLIC_TRANSPORT:
+                has_pt = True
+            elif section_type in FALLBACK_SECTION_TYPES:
+                fallback_duration += duration
+                if start_fallback_duration is None:
+                    start_fallback_duration = duration
+                end_fallback_duration = duration
+                fallback_modes.add(section.street_network.mode)
+            elif section_type == response_pb2.WAITING:
+                min_waiting = duration if min_waiting is None else min(min_waiting, duration)
+            elif section_type == response_pb2.BSS_RENT:
+                has_bss = True
+            if section_type in NON_TRANSPORT_SECTION_TYPES:
+                nontransport_duration += duration
+            if section_type not in NON_FALLBACK_SECTION_TYPES:
+                non_pt_duration += duration
+            if not has_odt:
+                has_odt = any(info in ODT_ADDITIONAL_INFORMATIONS for info in section.additional_informations)
+
+        self.fallback_duration = fallback_duration
+        self.start_fallback_duration = start_fallback_duration or 0
+        self.end_fallback_duration = end_fallback_duration or 0
+        self.nontransport_duration = nontransport_duration
+        self.non_pt_duration = non_pt_duration
+        self.min_waiting = min_waiting or 0
+        self.has_pt = has_pt
+        self.has_odt = has_odt
+        self.has_bss = has_bss
+        self.fallback_modes = frozenset(fallback_modes)
+
+        self.first_section_type = self.first_section_mode = None
+        self.last_section_type = self.last_section_mode = None
+        if section is not None:
+            first_section = journey.sections[0]
+            self.first_section_type = first_section.type
+            self.first_section_mode = first_section.street_network.mode
+            self.last_section_type = section.type
+            self.last_section_mode = section.street_network.mode
+
+
+def get_journey_features(journey):
+    """
+    :param journey: a journey or its features
+    """
+    if isinstance(journey, JourneyFeatures):
+        return journey
+    return JourneyFeatures(journey)
+
+
+class JourneyFeaturesCache(object):
+    """
+    Features of the journeys, computed once per journey
+
+    It must not outlive a modification of the sections of the journeys (typically by finalise_journeys).
+    """
+
+    def __init__(self):
+        # the features keep a reference to their journey, so that its id cannot be reused
+        self._features = {}
+
+    def get(self, journey):
+        features = self._features.get(id(journey))
+        if features is None:
+            features = self._features[id(journey)] = get_journey_features(journey)
+        return features
@@ -30,6 +30,7 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 import logging
 import itertools
+import collections
 import datetime
 import abc
 import six
@@ -45,6 +46,7 @@ from jormungandr.utils import (
 )
 from jormungandr.fallback_modes import FallbackModes
 from jormungandr.scenarios.qualifier import get_ASAP_journey
+from jormungandr.scenarios.journey_features import get_journey_features, JourneyFeaturesCache
 
 
 def delete_journeys(responses, request):
@@ -405,14 +407,16 @@ class FilterTooLongDirectPath(SingleJourneyFilter):
         return max_duration > journey.duration
 
 
-def get_best_pt_journey_connections(journeys, request):
+def get_best_pt_journey_connections(journeys, request, features=None):
     """
     Returns the nb of connection of the best pt_journey
     Returns None if journeys empty
     """
     if not journeys:
         return None
-    best = get_ASAP_journey((j for j in journeys if 'non_pt' not in j.tags), request)
+    if features is None:
+        features = JourneyFeaturesCache()
+    best = get_ASAP_journey((features.get(j) for j in journeys if 'non_pt' not in j.tags), request)
     return get_nb_connections(best) if best else None
 
 
@@ -427,7 +431,7 @@ def get_min_waiting(journey):
     """
     Returns min waiting time in a journey
     """
-    return portable_min((s.duration for s in journey.sections if s.type == response_pb2.WAITING), default=0)
+    return get_journey_features(journey).min_waiting
 
 
 def is_walk_after_parking(journey, idx_section):
@@ -545,28 +549,15 @@ def shared_section_generator(journey):
 
 
 def fallback_duration(journey):
-    duration = 0
-    for section in journey.sections:
-        if section.type in (response_pb2.STREET_NETWORK, response_pb2.CROW_FLY):
-            duration += section.duration
-
-    return duration
+    return get_journey_features(journey).fallback_duration
 
 
 def end_fallback_duration(journey):
-    for section in reversed(journey.sections):
-        if section.type in (response_pb2.STREET_NETWORK, response_pb2.CROW_FLY):
-            return section.duration
-
-    return 0
+    return get_journey_features(journey).end_fallback_duration
 
 
 def start_fallback_duration(journey):
-    for section in journey.sections:
-        if section.type in (response_pb2.STREET_NETWORK, response_pb2.CROW_FLY):
-            return section.duration
-
-    return 0
+    return get_journey_features(journey).start_fallback_duration
 
 
 def _debug_journey(journey):
@@ -640,39 +631,41 @@ def get_all_journeys(responses):
     return (j for r in responses if r is not None for j in r.journeys)
 
 
-def apply_final_journey_filters(response_list, instance, request):
+def apply_final_journey_filters(response_list, instance, request, features=None):
     """
     Final pass: Filter by side effect the list of pb responses's journeys
 
     Nota: All filters below are applied only once, after all calls to kraken are done
+
+    :param features: JourneyFeaturesCache of the journeys, if they have already been computed
     """
     is_debug = request.get('debug', False)
     journey_generator = get_qualified_journeys
     if is_debug:
         journey_generator = get_all_journeys
+    if features is None:
+        features = JourneyFeaturesCache()
 
     # we remove similar journeys (same lines and same succession of stop_points)
     final_line_filter = get_or_default(request, '_final_line_filter', False)
     if final_line_filter:
         journeys = journey_generator(response_list)
-        journey_pairs_pool = itertools.combinations(journeys, 2)
-        _filter_similar_line_journeys(journey_pairs_pool, request)
+        _filter_similar_line_journeys(JourneyPairs(journeys, features=features), request)
 
     # we filter journeys having "shared sections" (same succession of stop_points + custom rules)
     no_shared_section = get_or_default(request, 'no_shared_section', False)
     if no_shared_section:
         journeys = journey_generator(response_list)
-        journey_pairs_pool = itertools.combinations(journeys, 2)
-        filter_shared_sections_journeys(journey_pairs_pool, request)
+        filter_shared_sections_journeys(JourneyPairs(journeys, features=features), request)
 
     filter_odt = get_or_default(request, '_filter_odt_journeys', False)
     if filter_odt:
         journeys = journey_generator(response_list)
-        filter_odt_journeys(journeys, request)
+        filter_odt_journeys(journeys, request, features)
 
     # we filter journeys having too much connections compared to minimum
     journeys = journey_generator(response_list)
-    _filter_too_much_connections(journeys, instance, request)
+    _filter_too_much_connections(journeys, instance, request, features)
 
     origin_mode = get_or_default(request, 'origin_mode', [])
     if origin_mode == ['car']:
@@ -742,8 +735,7 @@ def apply_final_journey_filters_post_finalize(response_list, request):
     final_line_filter = get_or_default(request, '_final_line_filter', False)
     if final_line_filter:
         journeys = journey_generator(response_list)
-        journey_pairs_pool = itertools.combinations(journeys, 2)
-        _filter_similar_line_and_crowfly_journeys(journey_pairs_pool, request)
+        _filter_similar_line_and_crowfly_journeys(JourneyPairs(journeys), request)
 
 
 def get_journey_extremity_pt_section(journey, criteria):
@@ -891,15 +883,16 @@ def filter_olympics_journeys(responses, request):
         filter_olympics_journeys_v2(responses, request)
 
 
-def replace_bss_tag(journeys):
+def replace_bss_tag(journeys, features=None):
     """
     replace the bss tag by walking, if there's no bss section in the journey
     """
+    if features is None:
+        features = JourneyFeaturesCache()
     for j in journeys:
         if not j.tags or "bss" not in j.tags:
             continue
-        has_bss = any((s.type == response_pb2.BSS_RENT for s in j.sections))
-        if has_bss:
+        if features.get(j).has_bss:
             continue
         j.tags.remove("bss")
         j.tags.append("walking")
@@ -926,11 +919,11 @@ def filter_detailed_journeys(responses, request):
 
     [f_wrapped(j) for j in journeys]
 
-    it1, it2 = itertools.tee(journey_generator(responses))
-    journey_pairs_pool = itertools.product(it1, it2)
-    filter_similar_vj_journeys(journey_pairs_pool, request)
+    features = JourneyFeaturesCache()
+    journeys = list(journey_generator(responses))
+    filter_similar_vj_journeys(JourneyPairs(journeys, journeys, features), request)
 
-    replace_bss_tag(journey_generator(responses))
+    replace_bss_tag(journey_generator(responses), features)
 
     filter_olympics_journeys(responses, request)
 
@@ -951,7 +944,7 @@ def _get_worst_similar(j1, j2, request):
             (and traveler presumes he can do it walking too, as the practical case is 0s fallback)
     """
 
-    def get_mode_rank_crow_fly(section):
+    def get_mode_rank_crow_fly(mode):
         mode_rank = {
             response_pb2.Car: 0,
             response_pb2.Taxi: 1,
@@ -959,28 +952,27 @@ def _get_worst_similar(j1, j2, request):
             response_pb2.Bss: 3,
             response_pb2.Walking: 4,
         }
-        return mode_rank.get(section.street_network.mode)
+        return mode_rank.get(mode)
 
-    def is_fallback_crow_fly(section):
-        return section.type == response_pb2.CROW_FLY
+    def is_fallback_crow_fly(section_type):
+        return section_type == response_pb2.CROW_FLY
 
-    for idx in [0, -1]:
-        s1 = j1.sections[idx]
-        s2 = j2.sections[idx]
-        if (
-            is_fallback_crow_fly(s1)
-            and is_fallback_crow_fly(s2)
-            and s1.street_network.mode != s2.street_network.mode
-        ):
-            return j1 if get_mode_rank_crow_fly(s1) < get_mode_rank_crow_fly(s2) else j2
+    f1 = get_journey_features(j1)
+    f2 = get_journey_features(j2)
+    for s1, s2 in [
+        ((f1.first_section_type, f1.first_section_mode), (f2.first_section_type, f2.first_section_mode)),
+        ((f1.last_section_type, f1.last_section_mode), (f2.last_section_type, f2.last_section_mode)),
+    ]:
+        if is_fallback_crow_fly(s1[0]) and is_fallback_crow_fly(s2[0]) and s1[1] != s2[1]:
+            return j1 if get_mode_rank_crow_fly(s1[1]) < get_mode_rank_crow_fly(s2[1]) else j2
 
     if request.get('clockwise', True):
 
         # we dont want to arrive a few seconds earlier if it means walking more
         # so we consider that arriving 1s earlier is better if we walk at most 1s more
         # hence we compare arrival_time + walking_time instead of just arrival time
-        j1_penalized_arrival = j1.arrival_date_time + end_fallback_duration(j1)
-        j2_penalized_arrival = j2.arrival_date_time + end_fallback_duration(j2)
+        j1_penalized_arrival = f1.arrival_date_time + f1.end_fallback_duration
+        j2_penalized_arrival = f2.arrival_date_time + f2.end_fallback_duration
         if j1_penalized_arrival != j2_penalized_arrival:
             return j1 if j1_penalized_arrival > j2_penalized_arrival else j2
 
@@ -989,51 +981,55 @@ def _get_worst_similar(j1, j2, request):
         # we dont want to depart a few seconds later if it means walking more
         # so we consider that departing 1s later is better if we walk at most 1s more
         # hence we compare departure_time - walking_time instead of just departure time
-        j1_penalized_departure = j1.departure_date_time - start_fallback_duration(j1)
-        j2_penalized_departure = j2.departure_date_time - start_fallback_duration(j2)
+        j1_penalized_departure = f1.departure_date_time - f1.start_fallback_duration
+        j2_penalized_departure = f2.departure_date_time - f2.start_fallback_duration
         if j1_penalized_departure != j2_penalized_departure:
             return j1 if j1_penalized_departure < j2_penalized_departure else j2
     else:
 
-        j1_penalized_departure = j1.departure_date_time - start_fallback_duration(j1)
-        j2_penalized_departure = j2.departure_date_time - start_fallback_duration(j2)
+        j1_penalized_departure = f1.departure_date_time - f1.start_fallback_duration
+        j2_penalized_departure = f2.departure_date_time - f2.start_fallback_duration
         if j1_penalized_departure != j2_penalized_departure:
             return j1 if j1_penalized_departure < j2_penalized_departure else j2
 
         # departure times are the same, let's look at arrival times
-        j1_penalized_arrival = j1.arrival_date_time + end_fallback_duration(j1)
-        j2_penalized_arrival = j2.arrival_date_time + end_fallback_duration(j2)
+        j1_penalized_arrival = f1.arrival_date_time + f1.end_fallback_duration
+        j2_penalized_arrival = f2.arrival_date_time + f2.end_fallback_duration
         if j1_penalized_arrival != j2_penalized_arrival:
             return j1 if j1_penalized_arrival > j2_penalized_arrival else j2
 
-    if j1.duration != j2.duration:
-        return j1 if j1.duration > j2.duration else j2
+    if f1.duration != f2.duration:
+        return j1 if f1.duration > f2.duration else j2
 
-    if fallback_duration(j1) != fallback_duration(j2):
-        return j1 if fallback_duration(j1) > fallback_duration(j2) else j2
+    if f1.fallback_duration != f2.fallback_duration:
+        return j1 if f1.fallback_duration > f2.fallback_duration else j2
 
-    if get_nb_connections(j1) != get_nb_connections(j2):
-        return j1 if get_nb_connections(j1) > get_nb_connections(j2) else j2
+    if get_nb_connections(f1) != get_nb_connections(f2):
+        return j1 if get_nb_connections(f1) > get_nb_connections(f2) else j2
 
-    if get_min_waiting(j1) != get_min_waiting(j2):
-        return j1 if get_min_waiting(j1) < get_min_waiting(j2) else j2
+    if f1.min_waiting != f2.min_waiting:
+        return j1 if f1.min_waiting < f2.min_waiting else j2
 
-    def get_mode_rank(section):
+    def get_mode_rank(mode):
         mode_rank = {response_pb2.Car: 0, response_pb2.Bike: 1, response_pb2.Walking: 3, response_pb2.Bss: 4}
-        return mode_rank.get(section.street_network.mode)
+        return mode_rank.get(mode)
 
-    def is_fallback(section):
-        return section.type == response_pb2.CROW_FLY or section.type != response_pb2.STREET_NETWORK
+    def is_fallback(section_type):
+        return section_type == response_pb2.CROW_FLY or section_type != response_pb2.STREET_NETWORK
 
-    s1 = j1.sections[0]
-    s2 = j2.sections[0]
-    if is_fallback(s1) and is_fallback(s2) and s1.street_network.mode != s2.street_network.mode:
-        return j1 if get_mode_rank(s1) > get_mode_rank(s2) else j2
+    if (
+        is_fallback(f1.first_section_type)
+        and is_fallback(f2.first_section_type)
+        and f1.first_section_mode != f2.first_section_mode
+    ):
+        return j1 if get_mode_rank(f1.first_section_mode) > get_mode_rank(f2.first_section_mode) else j2
 
-    s1 = j1.sections[-1]
-    s2 = j2.sections[-1]
-    if is_fallback(s1) and is_fallback(s2) and s1.street_network.mode != s2.street_network.mode:
-        return j1 if get_mode_rank(s1) > get_mode_rank(s2) else j2
+    if (
+        is_fallback(f1.last_section_type)
+        and is_fallback(f2.last_section_type)
+        and f1.last_section_mode != f2.last_section_mode
+    ):
+        return j1 if get_mode_rank(f1.last_section_mode) > get_mode_rank(f2.last_section_mode) else j2
 
     return j2
 
@@ -1056,15 +1052,91 @@ def filter_shared_sections_journeys(journey_pairs_pool, request):
     _filter_similar_journeys(journey_pairs_pool, request, shared_section_generator)
 
 
+class JourneyPairs(object):
+    """
+    Pairs of journeys to compare, as itertools.combinations(journeys, 2) or, if other_journeys is given,
+    itertools.product(journeys, other_journeys)
+
+    Unlike a plain pool of pairs, it lets _filter_similar_journeys index the journeys by signature and only
+    visit the pairs of journeys with the same signature, in the same order.
+    The features of the journeys can be given, to share them with the other filters.
+    """
+
+    def __init__(self, journeys, other_journeys=None, features=None):
+        self.journeys = list(journeys)
+        self.other_journeys = None if other_journeys is None else list(other_journeys)
+        self.features = features
+
+    def __iter__(self):
+        if self.other_journeys is None:
+            return itertools.combinations(self.journeys, 2)
+        return itertools.product(self.journeys, self.other_journeys)
+
+
+class SimilarJourneysIndex(object):
+    """
+    Signatures of the journeys, computed once per journey and per generator
+
+    The signature of a journey for a generator is the tuple of the values yielded by the generator, 2 journeys
+    are similar for the generator (see scenarios.utils.compare) if they have the same signature.
+    """
+
+    def __init__(self, similar_journey_generators):
+        self.similar_journey_generators = similar_journey_generators
+        # the journey is kept with its signatures, so that its id cannot be reused
+        self._signatures = {}
+
+    def get_signatures(self, journey):
+        journey_and_signatures = self._signatures.get(id(journey))
+        if journey_and_signatures is None:
+            signatures = tuple(tuple(generator(journey)) for generator in self.similar_journey_generators)
+            journey_and_signatures = self._signatures[id(journey)] = (journey, signatures)
+        return journey_and_signatures[1]
+
+    def are_similar(self, j1, j2):
+        return any(s1 == s2 for s1, s2 in zip(self.get_signatures(j1), self.get_signatures(j2)))
+
+    def get_similar_pairs(self, journey_pairs):
+        """
+        The pairs of similar journeys among the JourneyPairs, in the order of the JourneyPairs
+        """
+        journeys = journey_pairs.journeys
+        is_product = journey_pairs.other_journeys is not None
+        other_journeys = journey_pairs.other_journeys if is_product else journeys
+
+        buckets = [collections.defaultdict(list) for _ in self.similar_journey_generators]
+        for idx, journey in enumerate(other_journeys):
+            for bucket, signature in zip(buckets, self.get_signatures(journey)):
+                bucket[signature].append(idx)
+
+        for idx, journey in enumerate(journeys):
+            similar_idx = set()
+            for bucket, signature in zip(buckets, self.get_signatures(journey)):
+                similar_idx.update(bucket.get(signature, ()))
+            # the combinations only pair a journey with the next ones
+            first_idx = 0 if is_product else idx + 1
+            for other_idx in sorted(i for i in similar_idx if i >= first_idx):
+                yield journey, other_journeys[other_idx]
+
+
 def _filter_similar_journeys(journey_pairs_pool, request, *similar_journey_generators):
     """
     Compare journeys 2 by 2.
     The given generator tells which part of journeys are compared.
     In case of similar journeys, the function '_get_worst_similar_vjs' decides which one to delete.
+
+    If the pool is a JourneyPairs, only the journeys with the same signature are compared.
     """
 
     logger = logging.getLogger(__name__)
     is_debug = request.get('debug', False)
+    index = SimilarJourneysIndex(similar_journey_generators)
+    features = None
+    if isinstance(journey_pairs_pool, JourneyPairs):
+        features = journey_pairs_pool.features
+        journey_pairs_pool = index.get_similar_pairs(journey_pairs_pool)
+    if features is None:
+        features = JourneyFeaturesCache()
     for j1, j2 in journey_pairs_pool:
         if j1 is j2:
             continue
@@ -1075,9 +1147,9 @@ def _filter_similar_journeys(journey_pairs_pool, request, *similar_journey_gener
         if request.get('_keep_olympics_journeys') and is_olympics(j1) or is_olympics(j2):
             continue
 
-        if any(compare(j1, j2, generator) for generator in similar_journey_generators):
+        if index.are_similar(j1, j2):
             # After comparison, if the 2 journeys are similar, the worst one must be eliminated
-            worst = _get_worst_similar(j1, j2, request)
+            worst = _get_worst_similar(features.get(j1), features.get(j2), request).journey
             logger.debug(
                 "the journeys {}, {} are similar, we delete {}".format(
                     j1.internal_id, j2.internal_id, worst.internal_id
@@ -1092,24 +1164,26 @@ def _filter_similar_journeys(journey_pairs_pool, request, *similar_journey_gener
             )
 
 
-def filter_odt_journeys(journeys, request):
+def filter_odt_journeys(journeys, request, features=None):
     clockwise = request.get('clockwise', True)
     debug = request.get('debug', False)
     journeys_list = [j for j in journeys]
+    if features is None:
+        features = JourneyFeaturesCache()
     if clockwise:
-        return _filter_odt_journeys_clockwise(journeys_list, debug)
+        return _filter_odt_journeys_clockwise(journeys_list, debug, features)
     else:
-        return _filter_odt_journeys_counter_clockwise(journeys_list, debug)
+        return _filter_odt_journeys_counter_clockwise(journeys_list, debug, features)
 
 
-def _filter_odt_journeys_clockwise(journeys, debug):
+def _filter_odt_journeys_clockwise(journeys, debug, features):
     """
     eliminates a journey that uses On Demand Transport if there is a public transport journey
     that arrive earlier
     """
     # let's find the earliest arrival time among public transport journeys
     earliest_arrival_pt_journey = portable_min(
-        (j for j in journeys if _contains_pt_section(j) and not _contains_odt(j)),
+        (j for j in journeys if _contains_pt_section(features.get(j)) and not _contains_odt(features.get(j))),
         key=lambda j: j.arrival_date_time,
         default=None,
     )
@@ -1120,7 +1194,10 @@ def _filter_odt_journeys_clockwise(journeys, debug):
 
     # let's mark as dead all odt journeys that arrives after earliest_arrival_pt_journey
     for journey in journeys:
-        if _contains_odt(journey) and journey.arrival_date_time >= earliest_arrival_pt_journey.arrival_date_time:
+        if (
+            _contains_odt(features.get(journey))
+            and journey.arrival_date_time >= earliest_arrival_pt_journey.arrival_date_time
+        ):
             mark_as_dead(
                 journey,
                 debug,
@@ -1128,14 +1205,14 @@ def _filter_odt_journeys_clockwise(journeys, debug):
             )
 
 
-def _filter_odt_journeys_counter_clockwise(journeys, debug):
+def _filter_odt_journeys_counter_clockwise(journeys, debug, features):
     """
     eliminates a journey that uses On Demand Transport if there is a public transport journey
     that depart later
     """
     # let's find the latest departure time among public transport journeys
     latest_departure_pt_journey = portable_min(
-        (j for j in journeys if _contains_pt_section(j) and not _contains_odt(j)),
+        (j for j in journeys if _contains_pt_section(features.get(j)) and not _contains_odt(features.get(j))),
         key=lambda j: -1 * j.departure_date_time,
         default=None,
     )
@@ -1147,7 +1224,7 @@ def _filter_odt_journeys_counter_clockwise(journeys, debug):
     # let's mark as dead all odt journeys that depart before latest_departure_pt_journey
     for journey in journeys:
         if (
-            _contains_odt(journey)
+            _contains_odt(features.get(journey))
             and journey.departure_date_time <= latest_departure_pt_journey.departure_date_time
         ):
             mark_as_dead(
@@ -1158,22 +1235,14 @@ def _filter_odt_journeys_counter_clockwise(journeys, debug):
 
 
 def _contains_pt_section(journey):
-    return any(section.type == response_pb2.PUBLIC_TRANSPORT for section in journey.sections)
+    return get_journey_features(journey).has_pt
 
 
 def _contains_odt(journey):
-    for section in journey.sections:
-        for info in section.additional_informations:
-            if info in (
-                response_pb2.ODT_WITH_ZONE,
-                response_pb2.ODT_WITH_STOP_POINT,
-                response_pb2.ODT_WITH_STOP_TIME,
-            ):
-                return True
-    return False
+    return get_journey_features(journey).has_odt
 
 
-def _filter_too_much_connections(journeys, instance, request):
+def _filter_too_much_connections(journeys, instance, request, features=None):
     """
     eliminates journeys with a number of connections strictly superior to the
     the number of connections of the best pt_journey + _max_additional_connections
@@ -1185,7 +1254,7 @@ def _filter_too_much_connections(journeys, instance, request):
     import itertools
 
     it1, it2 = itertools.tee(journeys, 2)
-    best_pt_journey_connections = get_best_pt_journey_connections(it1, request)
+    best_pt_journey_connections = get_best_pt_journey_connections(it1, request, features)
     is_debug = request.get('debug', False)
     if best_pt_journey_connections is not None:
         max_connections_allowed = max_additional_connections + best_pt_journey_connections
@@ -35,6 +35,7 @@ import logging
 from flask_restful import abort
 from flask import g
 from jormungandr.scenarios import simple, journey_filter, helpers
+from jormungandr.scenarios.journey_features import JourneyFeatures, JourneyFeaturesCache
 from jormungandr.scenarios.utils import (
     journey_sorter,
     change_ids,
@@ -45,7 +46,6 @@ from jormungandr.scenarios.utils import (
     get_pseudo_duration,
     mode_weight,
     switch_back_to_ridesharing,
-    nCr,
     updated_common_journey_request_with_default,
 )
 from navitiacommon import type_pb2, response_pb2, request_pb2
@@ -83,6 +83,7 @@ from jormungandr.utils import (
     json_address_from_uri,
     is_olympic_site,
     entrypoint_uri_refocus,
+    request_budget,
 )
 from jormungandr.error import generate_error
 from jormungandr.utils import Coords
@@ -92,7 +93,7 @@ import gevent, gevent.pool
 from jormungandr import app
 from jormungandr.autocomplete.geocodejson import GeocodeJson
 from jormungandr import global_autocomplete
-from jormungandr.new_relic import record_custom_parameter
+from jormungandr.new_relic import record_custom_parameter, record_custom_event
 from jormungandr import fallback_modes
 
 from six.moves import filter
@@ -105,6 +106,7 @@ JOURNEY_TYPES_TO_RETAIN = ['best', 'comfort', 'non_pt_walk', 'non_pt_bike', 'non
 STREET_NETWORK_MODE_TO_RETAIN = {response_pb2.Ridesharing, response_pb2.Car, response_pb2.Bike, response_pb2.Bss}
 TEMPLATE_MSG_UNKNOWN_OBJECT = "The entry point: {} is not valid"
 SPECIAL_EVENT = "special_event"
+CULLING_JOURNEYS_MAX_EXPLORED_NODES = 100000
 
 
 def get_kraken_calls(request):
@@ -588,91 +590,246 @@ def _build_selected_sections_matrix(sections_set, candidates_pool):
     return np.array(selected_sections_matrix)
 
 
-def _get_sorted_solutions_indexes(selected_sections_matrix, nb_journeys_to_find, idx_of_jrny_must_keep):
+def _get_best_solution_indexes_by_enumeration(
+    selected_sections_matrix, nb_journeys_to_find, idx_of_jrny_must_keep, costs
+):
     """
-    The entry is a 2D array where its lines are journeys, its columns are (non) chosen sections
-    """
-    logger = logging.getLogger(__name__)
-    """
-    Get a matrix which illustrate all possible non ordered combinations of t elements from n elements where n >= t with
-    their indexes.
-
-    Let's say we'd like to find all combinations of 2 elements from a set of 3.
-
-    selected_journeys_matrix will be like:
-
-    [[0,1]
-     [0,2]
-     [1,2]]
-    """
-    # Allocation of memory
-    shape = (nCr(selected_sections_matrix.shape[0], nb_journeys_to_find), nb_journeys_to_find)
-    selected_journeys_matrix = np.empty(shape, dtype=np.uint16)
+    Enumerate all the combinations of journeys containing the must-keep journeys, in the order of gen_all_combin,
+    and keep the first one with the best score (nb of uncovered sections, nb of sections, sum of costs).
 
-    def f(pair):
-        i, c = pair
-        selected_journeys_matrix[i] = c
+    The combinations are scored one by one instead of being materialized, the computation time is still
+    proportional to nCr(n, k): this is only the reference of _get_best_solution_indexes.
 
-    collections.deque(
-        map(f, zip(range(shape[0]), gen_all_combin(selected_sections_matrix.shape[0], nb_journeys_to_find))),
-        maxlen=0,
-    )
-    """
-    We should cut out those combinations that don't contain must-keep journeys
+    :return: the sorted list of the indexes of the selected journeys
     """
+    nb_journeys, nb_sections = selected_sections_matrix.shape
+    if nb_journeys <= nb_journeys_to_find:
+        return list(range(nb_journeys))
+
+    must_keep = set(idx_of_jrny_must_keep)
+    best_score, best_selection = None, None
+    for combination in gen_all_combin(nb_journeys, nb_journeys_to_find):
+        if not must_keep.issubset(combination):
+            continue
+        nb_sections_by_section = np.sum(selected_sections_matrix[combination], axis=0)
+        score = (
+            nb_sections - int(np.count_nonzero(nb_sections_by_section)),
+            int(np.sum(nb_sections_by_section)),
+            sum(costs[j] for j in combination),
+        )
+        if best_score is None or score < best_score:
+            best_score, best_selection = score, list(combination)
+    return best_selection
 
-    def _contains(idx_selected_jrny):
-        return set(idx_selected_jrny).issuperset(idx_of_jrny_must_keep)
 
-    selected_journeys_matrix = selected_journeys_matrix[
-        np.apply_along_axis(_contains, 1, selected_journeys_matrix)
-    ]
+def _popcount(bitset):
+    return bin(bitset).count('1')
 
-    selection_matrix = np.zeros((selected_journeys_matrix.shape[0], selected_sections_matrix.shape[0]))
 
+def _cumulative_sums(values):
     """
-    Given  selected_journeys_matrix:
-    [[0,1]
-     [0,2]
-     [1,2]]
-
-    selection_matrix will be like:
-    [[1,1,0], -> the first one and the second are chosen, etc...
-     [1,0,1],
-     [0,1,1]]
+    >>> _cumulative_sums([1, 2, 3])
+    [0, 1, 3, 6]
     """
-    # http://stackoverflow.com/questions/20103779/index-2d-numpy-array-by-a-2d-array-of-indices-without-loops
-    selection_matrix[np.arange(selected_journeys_matrix.shape[0])[:, None], selected_journeys_matrix] = 1
-
-    res_pool = np.dot(selection_matrix, selected_sections_matrix)
-
+    sums = [0]
+    for v in values:
+        sums.append(sums[-1] + v)
+    return sums
+
+
+def _get_best_solution_indexes(
+    selected_sections_matrix,
+    nb_journeys_to_find,
+    idx_of_jrny_must_keep,
+    costs,
+    max_nb_explored_nodes=CULLING_JOURNEYS_MAX_EXPLORED_NODES,
+):
     """
-    Get number of sections(or tranfers) for every solution
+    Find the same solution as _get_best_solution_indexes_by_enumeration without going through all the nCr(n, k)
+    combinations.
+
+    A solution is scored by (nb of uncovered sections, nb of sections, sum of costs), the lower the better.
+
+    The combinations are explored by a depth-first branch-and-bound where the sections covered by a journey are
+    stored as a bitset. A branch is cut as soon as a lower bound of its score cannot beat the best solution found so
+    far. Journeys are explored from the last one to the first one, excluding before including, which visits the
+    combinations in the same (colexicographic) order as gen_all_combin: among solutions with the same score, the
+    first one in this order is kept, like before.
+
+    :param selected_sections_matrix: 2D array where lines are journeys and columns are (non) chosen sections
+    :param nb_journeys_to_find: number of journeys to select
+    :param idx_of_jrny_must_keep: indexes of journeys that must be part of the solution
+    :param costs: cost of each journey, used to break ties
+    :param max_nb_explored_nodes: the exploration is stopped after this number of nodes in pathological cases, the
+                                  best solution found so far is then returned, which may not be the optimal one
+    :return: the sorted list of the indexes of the selected journeys
     """
-    nb_sections = np.sum(res_pool, axis=1)
+    logger = logging.getLogger(__name__)
+
+    nb_journeys, nb_sections = selected_sections_matrix.shape
+    if nb_journeys <= nb_journeys_to_find:
+        return list(range(nb_journeys))
+
+    masks = [sum(1 << int(i) for i in np.flatnonzero(row)) for row in selected_sections_matrix]
+    weights = [int(w) for w in np.sum(selected_sections_matrix, axis=1)]
+    costs = list(costs)
+    must_keep = set(idx_of_jrny_must_keep)
 
     """
-    integrity shows at which point a solution(chosen journeys) covers sections.
-    0 means a solution covers all sections
-    1 means a solutions covers almost all sections but 1 is missing
-    2 means 2 sections are missing
-    .... etc
+    Everything that doesn't depend on the sections already covered is computed once for each prefix [0, i] of
+    journeys: the must-keep journeys of the prefix, the union of the sections of its free journeys and the
+    cumulative sums of its free journeys' weights and costs, sorted increasingly.
     """
-    integrity = res_pool.shape[1] - np.array([np.count_nonzero(r) for r in res_pool])
+    nb_must_keep_until = [0] * (nb_journeys + 1)
+    forced_until = [[]]
+    union_free_until = [0]
+    weights_free_until = [[0]]
+    costs_free_until = [[0]]
+    for i in range(nb_journeys):
+        free = [j for j in range(i + 1) if j not in must_keep]
+        nb_must_keep_until[i + 1] = nb_must_keep_until[i] + (i in must_keep)
+        forced_until.append(forced_until[i] + [i] if i in must_keep else forced_until[i])
+        union_free_until.append(union_free_until[i] | (0 if i in must_keep else masks[i]))
+        weights_free_until.append(_cumulative_sums(sorted(weights[j] for j in free)))
+        costs_free_until.append(_cumulative_sums(sorted(costs[j] for j in free)))
+
+    def _score(selection):
+        covered = 0
+        for j in selection:
+            covered |= masks[j]
+        return (
+            nb_sections - _popcount(covered),
+            sum(weights[j] for j in selection),
+            sum(costs[j] for j in selection),
+        )
 
     """
-    We want to find the solutions covers as many sections as possible which has less sections(less transfer to do)
+    A greedy solution, improved by swapping journeys while it gets better, gives a first bound to cut branches early.
+    It is not kept as a solution: in case of a tie, the solution found by the exploration is preferred since it
+    comes first in the order of gen_all_combin.
     """
-    the_best_idx = np.lexsort((nb_sections, integrity))[0]  # sort by integrity then by nb_sections
+    initial_selection = list(must_keep)
+    while len(initial_selection) < nb_journeys_to_find:
+        initial_selection.append(
+            min(
+                (j for j in range(nb_journeys) if j not in initial_selection),
+                key=lambda j: _score(initial_selection + [j]),
+            )
+        )
+    initial_score = _score(initial_selection)
+    improved = True
+    while improved:
+        improved = False
+        for pos, i in enumerate(initial_selection):
+            if i in must_keep:
+                continue
+            for j in range(nb_journeys):
+                if j in initial_selection:
+                    continue
+                candidate = initial_selection[:pos] + [j] + initial_selection[pos + 1 :]
+                candidate_score = _score(candidate)
+                if candidate_score < initial_score:
+                    initial_selection, initial_score, improved = candidate, candidate_score, True
+                    break
+            if improved:
+                break
 
-    best_indexes = np.where(
-        np.logical_and(nb_sections == nb_sections[the_best_idx], integrity == integrity[the_best_idx])
-    )[0]
+    best = {'score': initial_score, 'selection': None, 'nb_explored_nodes': 0}
 
-    logger.debug("Best Itegrity: {0}".format(integrity[the_best_idx]))
-    logger.debug("Best Nb sections: {0}".format(nb_sections[the_best_idx]))
+    def _lower_bound(last, nb_to_pick, covered, nb_selected_sections, cost):
+        """
+        lower bound of the score of any solution completed with nb_to_pick journeys among [0, last]
+        """
+        forced = forced_until[last + 1]
+        nb_free_to_pick = nb_to_pick - len(forced)
+
+        for j in forced:
+            covered |= masks[j]
+            nb_selected_sections += weights[j]
+            cost += costs[j]
+
+        free = [j for j in range(last + 1) if j not in must_keep]
+        gains = [_popcount(masks[j] & ~covered) for j in free]
+        max_gain = min(
+            sum(sorted(gains, reverse=True)[:nb_free_to_pick]), _popcount(union_free_until[last + 1] & ~covered)
+        )
+        lower_bound_uncovered = nb_sections - _popcount(covered) - max_gain
+        lower_bound_nb_sections = nb_selected_sections + weights_free_until[last + 1][nb_free_to_pick]
+
+        lower_bound_cost = cost + costs_free_until[last + 1][nb_free_to_pick]
+
+        best_uncovered, best_nb_sections, _ = best['score']
+        if lower_bound_uncovered == best_uncovered:
+            """
+            The nb of sections only matters for the solutions covering as many sections as the best one.
+            The nb of sections of a solution is the nb of covered sections plus the nb of sections covered more
+            than once, so for these solutions it is at least nb_sections - best_uncovered plus the overlaps
+            already made plus the smallest overlaps the remaining journeys would make with the covered sections.
+            """
+            overlaps = [weights[j] - g for j, g in zip(free, gains)]
+            min_nb_sections = nb_sections - best_uncovered + nb_selected_sections - _popcount(covered)
+            lower_bound_nb_sections = max(
+                lower_bound_nb_sections, min_nb_sections + sum(sorted(overlaps)[:nb_free_to_pick])
+            )
 
-    return best_indexes, selection_matrix
+            if lower_bound_nb_sections == best_nb_sections:
+                """
+                Likewise, the cost only matters for the solutions having as few sections as the best one: a
+                journey whose overlap exceeds the remaining slack cannot be part of them.
+                """
+                slack = best_nb_sections - min_nb_sections
+                eligible_costs = sorted(costs[j] for j, o in zip(free, overlaps) if o <= slack)
+                if len(eligible_costs) < nb_free_to_pick:
+                    lower_bound_nb_sections += 1
+                else:
+                    lower_bound_cost = max(lower_bound_cost, cost + sum(eligible_costs[:nb_free_to_pick]))
+
+        return lower_bound_uncovered, lower_bound_nb_sections, lower_bound_cost
+
+    def _explore(i, selection, covered, nb_selected_sections, cost):
+        best['nb_explored_nodes'] += 1
+        if best['nb_explored_nodes'] > max_nb_explored_nodes:
+            return
+        nb_to_pick = nb_journeys_to_find - len(selection)
+        # not enough journeys left, or too many must-keep journeys left
+        if i + 1 < nb_to_pick or nb_must_keep_until[i + 1] > nb_to_pick:
+            return
+        if nb_to_pick == 0:
+            score = (nb_sections - _popcount(covered), nb_selected_sections, cost)
+            if score < best['score'] or (score == best['score'] and best['selection'] is None):
+                best['score'] = score
+                best['selection'] = sorted(selection)
+            return
+        lower_bound = _lower_bound(i, nb_to_pick, covered, nb_selected_sections, cost)
+        if lower_bound > best['score'] or (lower_bound == best['score'] and best['selection'] is not None):
+            return
+
+        if i not in must_keep:
+            _explore(i - 1, selection, covered, nb_selected_sections, cost)
+        selection.append(i)
+        _explore(i - 1, selection, covered | masks[i], nb_selected_sections + weights[i], cost + costs[i])
+        selection.pop()
+
+    _explore(nb_journeys - 1, [], 0, 0, 0)
+
+    logger.debug("Best Itegrity: {0}".format(best['score'][0]))
+    logger.debug("Best Nb sections: {0}".format(best['score'][1]))
+
+    if best['nb_explored_nodes'] > max_nb_explored_nodes:
+        logger.warning(
+            'culling journeys: exploration stopped after {} nodes, {} journeys to find among {}, '
+            'keeping the best solution found so far'.format(
+                max_nb_explored_nodes, nb_journeys_to_find, nb_journeys
+            )
+        )
+        record_custom_event(
+            'culling_journeys_budget_exceeded',
+            {'nb_journeys': nb_journeys, 'nb_journeys_to_find': nb_journeys_to_find, 'nb_sections': nb_sections},
+        )
+    if best['selection'] is None:
+        # nothing better than the initial solution was found
+        return sorted(initial_selection)
+    return best['selection']
 
 
 def culling_journeys(resp, request):
@@ -825,37 +982,23 @@ def culling_journeys(resp, request):
     """
     selected_sections_matrix = _build_selected_sections_matrix(sections_set, candidates_pool)
 
-    best_indexes, selection_matrix = _get_sorted_solutions_indexes(
-        selected_sections_matrix, max_nb_journeys, idx_of_jrnys_must_keep
-    )
-
-    logger.debug("Nb best solutions: {0}".format(best_indexes.shape[0]))
-
-    the_best_index = best_indexes[0]
-
-    logger.debug("Trying to find the best of best")
     """
-    Let's find the best of best :)
+    Among the solutions covering as many sections as possible with as few sections as possible, we keep the one
+    whose journeys have the smallest sum of pseudo durations
     """
-    # If there're several solutions which have the same score of integrity and nb_sections
-    if best_indexes.shape[0] != 1:
-        requested_dt = request['datetime']
-        is_clockwise = request.get('clockwise', True)
-
-        def combinations_sorter(v):
-            # Hoping to find We sort the solution by the sum of journeys' pseudo duration
-            return np.sum(
-                (
-                    get_pseudo_duration(jrny, requested_dt, is_clockwise)
-                    for jrny in np.array(candidates_pool)[np.where(selection_matrix[v, :])]
-                )
-            )
+    requested_dt = request['datetime']
+    is_clockwise = request.get('clockwise', True)
+    pseudo_durations = [get_pseudo_duration(jrny, requested_dt, is_clockwise) for jrny in candidates_pool]
 
-        the_best_index = min(best_indexes, key=combinations_sorter)
+    selected_indexes = _get_best_solution_indexes(
+        selected_sections_matrix, max_nb_journeys, idx_of_jrnys_must_keep, pseudo_durations
+    )
 
     logger.debug('Removing non selected journeys')
-    for jrny in candidates_pool[np.where(selection_matrix[the_best_index, :] == 0)]:
-        journey_filter.mark_as_dead(jrny, is_debug, 'Filtered by max_nb_journeys')
+    selected = set(selected_indexes)
+    for idx, jrny in enumerate(candidates_pool):
+        if idx not in selected:
+            journey_filter.mark_as_dead(jrny, is_debug, 'Filtered by max_nb_journeys')
 
     journey_filter.delete_journeys((resp,), request)
 
@@ -1013,16 +1156,18 @@ def type_journeys(resp, req):
         ("non_pt_car", trip_carac([non_pt_journey, has_car], [best_crit])),
     ]
 
+    # the sections are walked once, the constraints and the criteria are applied on the features
+    journeys_features = [JourneyFeatures(j) for j in resp.journeys]
     for name, carac in trip_caracs:
-        sublist = list(filter(and_filters(carac.constraints), resp.journeys))
+        sublist = list(filter(and_filters(carac.constraints), journeys_features))
         best = min_from_criteria(sublist, carac.criteria)
         if best is not None:
-            best.type = name
+            best.journey.type = name
 
     # Finally, we want exactly one best, the ASAP one
-    best = get_ASAP_journey(resp.journeys, req)
+    best = get_ASAP_journey(journeys_features, req)
     if best is not None:
-        best.type = "best"
+        best.journey.type = "best"
 
 
 def merge_responses(responses, debug):
@@ -1188,35 +1333,34 @@ def aggregate_journeys(journeys):
     return aggregated_journeys, remaining_journeys
 
 
-def filter_journeys(responses, new_resp, instance, api_request):
+def filter_journeys(responses, new_resp, instance, api_request, features=None):
     # we filter unwanted journeys in the new response
-    # note that filter_journeys returns a generator which will be evaluated later
+    # note that filter_journeys returns a generator, the filters are applied when it is evaluated
     filtered_new_resp = journey_filter.filter_journeys(new_resp, instance, api_request)
 
-    # duplicate the generator
-    tmp1, tmp2 = itertools.tee(filtered_new_resp)
-    qualified_journeys = journey_filter.get_qualified_journeys(responses)
+    new_journeys = list(filtered_new_resp)
+    qualified_journeys = list(journey_filter.get_qualified_journeys(responses))
 
     # now we want to filter similar journeys in the new response which is done in 2 steps
     # In the first step, we compare journeys from the new response only , 2 by 2
     # hopefully, it may lead to some early return for the second step to improve the perf a little
     # In the second step, we compare the journeys from the new response with those that have been qualified
     # already in the former iterations
-    # note that the journey_pairs_pool is a list of 2-element tuple of journeys
-    journey_pairs_pool = itertools.chain(
-        # First step: compare journeys from the new response only
-        itertools.combinations(tmp1, 2),
-        # Second step:
-        # we use the itertools.product to create combinations between qualified journeys and new journeys
-        # Ex:
-        # new_journeys = [n_1, n_2]
-        # qualified_journeys = [q_1, q_2, q_3]
-        # itertools.product(new_journeys, qualified_journeys) gives combinations as follows:
-        # (n_1, q_1), (n_1, q_2),(n_1, q_3),(n_2, q_1),(n_2, q_2),(n_2, q_3)
-        itertools.product(tmp2, qualified_journeys),
-    )
+    # Only the journeys with the same signature are compared, see journey_filter.JourneyPairs
 
-    journey_filter.filter_similar_vj_journeys(journey_pairs_pool, api_request)
+    # First step: compare journeys from the new response only
+    journey_filter.filter_similar_vj_journeys(
+        journey_filter.JourneyPairs(new_journeys, features=features), api_request
+    )
+    # Second step: compare the new journeys with the qualified journeys
+    # Ex:
+    # new_journeys = [n_1, n_2]
+    # qualified_journeys = [q_1, q_2, q_3]
+    # the pairs are compared in this order:
+    # (n_1, q_1), (n_1, q_2),(n_1, q_3),(n_2, q_1),(n_2, q_2),(n_2, q_3)
+    journey_filter.filter_similar_vj_journeys(
+        journey_filter.JourneyPairs(new_journeys, qualified_journeys, features), api_request
+    )
 
 
 def isochrone_common(isochrone, request, instance, journey_req):
@@ -1390,6 +1534,9 @@ class Scenario(simple.Scenario):
             min_nb_journeys = 1
 
         responses = []
+        # the features of the journeys are computed once, when the responses of kraken are merged, and are
+        # valid until the journeys are finalised
+        journey_features = JourneyFeaturesCache()
         nb_try = 0
         nb_qualified_journeys = 0
         nb_previously_qualified_journeys = 0
@@ -1441,7 +1588,7 @@ class Scenario(simple.Scenario):
 
             request = self.create_next_kraken_request(request, new_resp)
 
-            filter_journeys(responses, new_resp, instance, api_request)
+            filter_journeys(responses, new_resp, instance, api_request, journey_features)
 
             responses.extend(new_resp)  # we keep the error for building the response
 
@@ -1464,7 +1611,7 @@ class Scenario(simple.Scenario):
 
         logger.debug('nb of call kraken: %i', nb_try)
 
-        journey_filter.apply_final_journey_filters(responses, instance, api_request)
+        journey_filter.apply_final_journey_filters(responses, instance, api_request, journey_features)
 
         # Filter olympic site: Jira NAV-2130
         journey_filter.filter_olympic_site(
@@ -1582,8 +1729,9 @@ class Scenario(simple.Scenario):
     def __on_journeys(self, requested_type, request, instance):
         updated_request_with_default(request, instance)
 
-        # call to kraken
-        resp = self.fill_journeys(requested_type, request, instance)
+        # call to kraken, the whole computation shares the budget of the request
+        with request_budget(app.config.get(str('JOURNEYS_REQUEST_BUDGET_S')) or None):
+            resp = self.fill_journeys(requested_type, request, instance)
         return resp
 
     def journeys(self, request, instance):
@@ -1710,7 +1858,11 @@ class Scenario(simple.Scenario):
 
     @staticmethod
     def __get_best_for_criteria(journeys, criteria):
-        return min_from_criteria(filter(has_pt, journeys), [criteria, duration_crit, transfers_crit, nonTC_crit])
+        best = min_from_criteria(
+            filter(has_pt, (JourneyFeatures(j) for j in journeys)),
+            [criteria, duration_crit, transfers_crit, nonTC_crit],
+        )
+        return best.journey if best is not None else None
 
     def get_best(self, journeys, clockwise):
         if clockwise:
@@ -35,42 +35,23 @@ from functools import partial
 from datetime import datetime, timedelta
 import logging
 from six.moves import filter
+from jormungandr.scenarios.journey_features import get_journey_features
+
+# the journeys given to the predicates and the criteria can be their JourneyFeatures,
+# the sections are then not walked again
 
 
 # compute the duration to get to the transport plus the transfers duration
 def get_nontransport_duration(journey):
-    sections = journey.sections
-    current_duration = 0
-    for section in sections:
-        if (
-            section.type == response_pb2.STREET_NETWORK
-            or section.type == response_pb2.TRANSFER
-            or section.type == response_pb2.WAITING
-            or section.type == response_pb2.CROW_FLY
-        ):
-            current_duration += section.duration
-    return current_duration
+    return get_journey_features(journey).nontransport_duration
 
 
 def get_fallback_duration(journey):
-    sections = journey.sections
-    current_duration = 0
-    for section in sections:
-        if section.type not in (
-            response_pb2.PUBLIC_TRANSPORT,
-            response_pb2.WAITING,
-            response_pb2.boarding,
-            response_pb2.landing,
-        ):
-            current_duration += section.duration
-    return current_duration
+    return get_journey_features(journey).non_pt_duration
 
 
 def has_fall_back_mode(journey, mode):
-    return any(
-        s.type in [response_pb2.STREET_NETWORK, response_pb2.CROW_FLY] and s.street_network.mode == mode
-        for s in journey.sections
-    )
+    return mode in get_journey_features(journey).fallback_modes
 
 
 def has_car(journey):
@@ -94,7 +75,7 @@ def has_walk(journey):
 
 
 def has_bss(journey):
-    return any(s.type == response_pb2.BSS_RENT for s in journey.sections)
+    return get_journey_features(journey).has_bss
 
 
 def has_no_bss(journey):
@@ -103,8 +84,7 @@ def has_no_bss(journey):
 
 def non_pt_journey(journey):
     """check if the journey has not public transport section"""
-    has_pt = all(section.type != response_pb2.PUBLIC_TRANSPORT for section in journey.sections)
-    return has_pt
+    return not get_journey_features(journey).has_pt
 
 
 def has_pt(journey):
@@ -32,7 +32,8 @@ from __future__ import absolute_import, print_function, unicode_literals, divisi
 import abc
 import six
 from jormungandr import new_relic
-from jormungandr.utils import decode_polyline
+from jormungandr.utils import decode_polyline, get_remaining_time
+from jormungandr.http_client import get_http_client
 from navitiacommon import type_pb2
 from collections import namedtuple
 import pybreaker
@@ -68,6 +69,10 @@ class AbstractRidesharingService(object):
         """
         pass
 
+    @property
+    def http_client(self):
+        return get_http_client('ridesharing')
+
     def _call_service(self, params, headers={}, verify=True):
         """
         :param params: call parameters list
@@ -82,11 +87,11 @@ class AbstractRidesharingService(object):
 
         try:
             return self.breaker.call(
-                requests.get,
+                self.http_client.get,
                 url=self.service_url,
                 headers=headers,
                 params=params,
-                timeout=self.timeout,
+                timeout=get_remaining_time(self.timeout),
                 verify=verify,
             )
         except pybreaker.CircuitBreakerError as e:
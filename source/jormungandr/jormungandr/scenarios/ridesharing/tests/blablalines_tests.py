@@ -135,7 +135,7 @@ def get_ridesharing_service_test():
 
 
 def blablalines_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         blablalines = Blablalines(
             service_url='dummyUrl',
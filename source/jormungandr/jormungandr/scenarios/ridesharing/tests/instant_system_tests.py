@@ -237,7 +237,7 @@ def get_ridesharing_service_test():
 
 
 def instant_system_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         instant_system = InstantSystem(
             service_url='dummyUrl',
@@ -234,7 +234,7 @@ def get_ridesharing_service_test():
 
 
 def karos_service_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         karos = Karos(
             service_url='dummyUrl',
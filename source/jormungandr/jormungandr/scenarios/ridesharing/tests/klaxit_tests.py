@@ -159,7 +159,7 @@ def klaxit_service_config_test():
 
 
 def klaxit_service_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         klaxit = Klaxit(
             service_url='dummyUrl',
@@ -183,7 +183,7 @@ def get_ridesharing_service_test():
 
 
 def ouestgo_basic_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         ouestgo = Ouestgo(
             service_url='dummyUrl',
@@ -258,7 +258,7 @@ def test_request_journeys_should_raise_on_non_200():
 
 
 def ouestgo_status_test():
-    with mock.patch('requests.get', mock_get):
+    with mock.patch('jormungandr.http_client.HttpClient.get', mock_get):
 
         ouestgo = Ouestgo(
             service_url='dummyUrl',
@@ -33,6 +33,12 @@ from jormungandr.scenarios import journey_filter as jf
 from jormungandr.scenarios.utils import DepartureJourneySorter, ArrivalJourneySorter
 import navitiacommon.response_pb2 as response_pb2
 from jormungandr.scenarios.new_default import sort_journeys
+from jormungandr.scenarios.tests.journey_filter_benchmark import (
+    make_journeys_response,
+    filter_all_pairs,
+    filter_pairs_with_same_signature,
+    SIMILAR_JOURNEYS_FILTERS,
+)
 from jormungandr.utils import str_to_time_stamp
 import random
 import itertools
@@ -600,6 +606,38 @@ def test_similar_journeys_crowfly_rs():
     assert not jf.compare(journey1, journey2, jf.similar_journeys_vj_generator)
 
 
+def similar_journeys_with_same_signature_test():
+    """
+    only comparing the journeys with the same signature must delete the same journeys as comparing all the pairs
+    """
+    response = make_journeys_response(nb_journeys=300)
+    for filter_similar_journeys in SIMILAR_JOURNEYS_FILTERS:
+        all_pairs_response = deepcopy(response)
+        filter_all_pairs(all_pairs_response, filter_similar_journeys, {'debug': True})
+        same_signature_response = deepcopy(response)
+        filter_pairs_with_same_signature(same_signature_response, filter_similar_journeys, {'debug': True})
+
+        assert [list(j.tags) for j in all_pairs_response.journeys] == [
+            list(j.tags) for j in same_signature_response.journeys
+        ]
+        assert 0 < jf.nb_qualifed_journeys([same_signature_response]) < 300
+
+
+def similar_journeys_product_with_same_signature_test():
+    response = make_journeys_response(nb_journeys=50)
+    all_pairs_response = deepcopy(response)
+    it1, it2 = itertools.tee(jf.get_qualified_journeys([all_pairs_response]))
+    jf.filter_similar_vj_journeys(itertools.product(it1, it2), {})
+
+    same_signature_response = deepcopy(response)
+    journeys = list(jf.get_qualified_journeys([same_signature_response]))
+    jf.filter_similar_vj_journeys(jf.JourneyPairs(journeys, journeys), {})
+
+    assert [list(j.tags) for j in all_pairs_response.journeys] == [
+        list(j.tags) for j in same_signature_response.journeys
+    ]
+
+
 def test_departure_sort():
     """
     we want to sort by departure hour, then by duration
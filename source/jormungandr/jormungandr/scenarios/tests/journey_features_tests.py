@@ -0,0 +1,134 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+from jormungandr.scenarios import qualifier, journey_filter
+from jormungandr.scenarios.journey_features import JourneyFeatures, JourneyFeaturesCache, get_journey_features
+import navitiacommon.response_pb2 as response_pb2
+
+
+def _add_section(journey, section_type, duration, mode=None):
+    section = journey.sections.add()
+    section.type = section_type
+    section.duration = duration
+    if mode is not None:
+        section.street_network.mode = mode
+    return section
+
+
+def make_journey():
+    journey = response_pb2.Journey()
+    journey.departure_date_time = 1000
+    journey.arrival_date_time = 5000
+    journey.duration = 4000
+    journey.nb_transfers = 1
+    _add_section(journey, response_pb2.CROW_FLY, 100, response_pb2.Bike)
+    _add_section(journey, response_pb2.PUBLIC_TRANSPORT, 1000)
+    _add_section(journey, response_pb2.TRANSFER, 200)
+    _add_section(journey, response_pb2.WAITING, 300)
+    pt_section = _add_section(journey, response_pb2.PUBLIC_TRANSPORT, 1500)
+    pt_section.additional_informations.append(response_pb2.ODT_WITH_ZONE)
+    _add_section(journey, response_pb2.WAITING, 150)
+    _add_section(journey, response_pb2.STREET_NETWORK, 400, response_pb2.Walking)
+    return journey
+
+
+def journey_features_test():
+    journey = make_journey()
+    features = JourneyFeatures(journey)
+
+    assert features.journey is journey
+    assert features.nb_transfers == 1
+    assert features.arrival_date_time == 5000
+    assert features.departure_date_time == 1000
+    assert features.duration == 4000
+    assert features.fallback_duration == 500
+    assert features.start_fallback_duration == 100
+    assert features.end_fallback_duration == 400
+    assert features.nontransport_duration == 1150
+    assert features.non_pt_duration == 700
+    assert features.min_waiting == 150
+    assert features.has_pt
+    assert features.has_odt
+    assert not features.has_bss
+    assert features.fallback_modes == {response_pb2.Bike, response_pb2.Walking}
+    assert features.first_section_type == response_pb2.CROW_FLY
+    assert features.first_section_mode == response_pb2.Bike
+    assert features.last_section_type == response_pb2.STREET_NETWORK
+    assert features.last_section_mode == response_pb2.Walking
+
+
+def journey_features_without_section_test():
+    features = JourneyFeatures(response_pb2.Journey())
+
+    assert features.fallback_duration == 0
+    assert features.start_fallback_duration == 0
+    assert features.end_fallback_duration == 0
+    assert features.min_waiting == 0
+    assert not features.has_pt
+    assert features.fallback_modes == frozenset()
+    assert features.first_section_type is None
+    assert features.last_section_type is None
+
+
+def journey_features_cache_test():
+    journey = make_journey()
+    cache = JourneyFeaturesCache()
+
+    features = cache.get(journey)
+    assert cache.get(journey) is features
+    assert cache.get(features) is features
+    assert get_journey_features(features) is features
+
+
+def predicates_on_features_test():
+    """
+    the qualifier and the filters give the same results on a journey and on its features
+    """
+    journey = make_journey()
+    features = JourneyFeatures(journey)
+
+    for predicate in (
+        qualifier.has_car,
+        qualifier.has_bike,
+        qualifier.has_walk,
+        qualifier.has_bss,
+        qualifier.has_pt,
+        qualifier.non_pt_journey,
+        qualifier.get_fallback_duration,
+        qualifier.get_nontransport_duration,
+        journey_filter.fallback_duration,
+        journey_filter.get_min_waiting,
+        journey_filter.get_nb_connections,
+    ):
+        assert predicate(journey) == predicate(features)
+
+    other_journey = make_journey()
+    other_journey.arrival_date_time = 4000
+    best = qualifier.get_ASAP_journey([features, JourneyFeatures(other_journey)], {'clockwise': True})
+    assert best.journey is other_journey
@@ -0,0 +1,160 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+"""
+Benchmark of the filter of similar journeys, all the pairs of journeys vs the pairs with the same signature
+
+    python -m jormungandr.scenarios.tests.journey_filter_benchmark
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import copy
+import itertools
+import random
+import timeit
+
+from navitiacommon import response_pb2
+from jormungandr.scenarios import journey_filter
+
+START = 1672567200  # 20230101T100000
+
+SIMILAR_JOURNEYS_FILTERS = [
+    journey_filter.filter_similar_vj_journeys,
+    journey_filter._filter_similar_line_journeys,
+    journey_filter._filter_similar_line_and_crowfly_journeys,
+    journey_filter.filter_shared_sections_journeys,
+]
+
+
+def _add_fallback_section(journey, section_type, mode, begin, duration):
+    section = journey.sections.add()
+    section.type = section_type
+    section.street_network.mode = mode
+    section.duration = duration
+    section.begin_date_time = begin
+    section.end_date_time = begin + duration
+    return section.end_date_time
+
+
+def _add_public_transport_section(journey, line, vj, origin, destination, begin, duration):
+    section = journey.sections.add()
+    section.type = response_pb2.PUBLIC_TRANSPORT
+    section.pt_display_informations.uris.line = 'line:{}'.format(line)
+    section.pt_display_informations.uris.vehicle_journey = 'vehicle_journey:{}:{}'.format(line, vj)
+    section.origin.uri = 'stop_point:{}'.format(origin)
+    section.destination.uri = 'stop_point:{}'.format(destination)
+    section.duration = duration
+    section.begin_date_time = begin
+    section.end_date_time = begin + duration
+    return section.end_date_time
+
+
+def make_journeys_response(nb_journeys=300, seed=42):
+    """
+    Journeys of several kraken calls on a timeframe: few lines, vehicle journeys and fallback modes,
+    so that many journeys are similar
+    """
+    rand = random.Random(seed)
+    modes = [response_pb2.Walking, response_pb2.Walking, response_pb2.Bike, response_pb2.Bss, response_pb2.Car]
+    response = response_pb2.Response()
+    for i in range(nb_journeys):
+        journey = response.journeys.add()
+        journey.internal_id = 'journey_{}'.format(i)
+        journey.type = 'best'
+        mode = rand.choice(modes)
+        journey.tags.append('walking' if mode in (response_pb2.Walking, response_pb2.Bss) else 'bike')
+        begin = START + rand.randrange(0, 3600, 60)
+        journey.departure_date_time = begin
+        journey.requested_date_time = START
+
+        if rand.random() < 0.05:
+            # direct path
+            journey.tags.append('non_pt')
+            end = _add_fallback_section(
+                journey, response_pb2.STREET_NETWORK, mode, begin, rand.randrange(600, 3600)
+            )
+        else:
+            fallback_type = response_pb2.CROW_FLY if rand.random() < 0.2 else response_pb2.STREET_NETWORK
+            end = _add_fallback_section(journey, fallback_type, mode, begin, rand.randrange(0, 900, 60))
+            nb_pt_sections = rand.randint(1, 3)
+            stop_point = rand.randrange(5)
+            for _ in range(nb_pt_sections):
+                if len(journey.sections) > 1:
+                    end = _add_fallback_section(journey, response_pb2.TRANSFER, response_pb2.Walking, end, 120)
+                    journey.nb_transfers += 1
+                next_stop_point = rand.randrange(5, 10) if nb_pt_sections == 1 else rand.randrange(10)
+                end = _add_public_transport_section(
+                    journey,
+                    rand.randrange(4),
+                    rand.randrange(3),
+                    stop_point,
+                    next_stop_point,
+                    end,
+                    rand.randrange(300, 1800, 60),
+                )
+                stop_point = next_stop_point
+            end = _add_fallback_section(
+                journey, response_pb2.STREET_NETWORK, response_pb2.Walking, end, rand.randrange(0, 900, 60)
+            )
+
+        journey.arrival_date_time = end
+        journey.duration = end - begin
+    return response
+
+
+def filter_all_pairs(response, filter_similar_journeys, request):
+    journeys = list(journey_filter.get_qualified_journeys([response]))
+    filter_similar_journeys(itertools.combinations(journeys, 2), request)
+
+
+def filter_pairs_with_same_signature(response, filter_similar_journeys, request):
+    journeys = journey_filter.get_qualified_journeys([response])
+    filter_similar_journeys(journey_filter.JourneyPairs(journeys), request)
+
+
+def benchmark(number=5, nb_journeys=300):
+    response = make_journeys_response(nb_journeys)
+    res = []
+    for filter_similar_journeys in SIMILAR_JOURNEYS_FILTERS:
+        timings = []
+        for filter_pairs in (filter_all_pairs, filter_pairs_with_same_signature):
+            responses = [copy.deepcopy(response) for _ in range(number)]
+            it = iter(responses)
+            timing = timeit.timeit(lambda: filter_pairs(next(it), filter_similar_journeys, {}), number=number)
+            timings.append(timing / number)
+        res.append((filter_similar_journeys.__name__, timings[0], timings[1]))
+    return res
+
+
+if __name__ == '__main__':
+    for name, all_pairs, same_signature in benchmark():
+        print(
+            '{}: all pairs: {:.1f}ms, same signature: {:.1f}ms ({:.0%})'.format(
+                name, all_pairs * 1000, same_signature * 1000, same_signature / all_pairs
+            )
+        )
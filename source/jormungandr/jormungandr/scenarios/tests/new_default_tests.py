@@ -30,6 +30,10 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import copy
+import random
+import time
+
+import numpy as np
 
 import navitiacommon.response_pb2 as response_pb2
 import navitiacommon.type_pb2 as type_pb2
@@ -45,7 +49,7 @@ from jormungandr.scenarios.new_default import (
     SPECIAL_EVENT,
 )
 from jormungandr.instance import Instance
-from jormungandr.scenarios.utils import switch_back_to_ridesharing
+from jormungandr.scenarios.utils import switch_back_to_ridesharing, get_pseudo_duration
 from jormungandr.utils import make_origin_destination_key, str_to_time_stamp
 from werkzeug.exceptions import HTTPException
 import pytest
@@ -206,19 +210,197 @@ def build_candidate_pool_and_sections_set_test():
     assert [0, 0, 0, 1, 0, 0, 0, 1, 1, 0, 1] in selected_sections_matrix
 
 
-def get_sorted_solutions_indexes_test():
+def get_best_solution_indexes_test():
+    """
+    The branch-and-bound must find the same solution as the enumeration of all the combinations followed by the
+    tie-break on the pseudo durations
+    """
+    mocked_pb_response = build_mocked_response()
+    candidates_pool, sections_set, idx_jrny_must_keep = new_default._build_candidate_pool_and_sections_set(
+        mocked_pb_response.journeys
+    )
+    selected_sections_matrix = new_default._build_selected_sections_matrix(sections_set, candidates_pool)
+    costs = [get_pseudo_duration(jrny, 1444903200, True) for jrny in candidates_pool]
+
+    for nb_journeys_to_find in range(len(idx_jrny_must_keep), 12):
+        selected_indexes = new_default._get_best_solution_indexes(
+            selected_sections_matrix, nb_journeys_to_find, idx_jrny_must_keep, costs
+        )
+        assert selected_indexes == new_default._get_best_solution_indexes_by_enumeration(
+            selected_sections_matrix, nb_journeys_to_find, idx_jrny_must_keep, costs
+        )
+
+
+def get_best_solution_indexes_without_costs_test():
+    """
+    4 journeys are must-have, we'd like to select another 5 journeys: without costs to break the ties, the first
+    best solution in the order of the combinations is selected, like the enumeration does
+    """
     mocked_pb_response = build_mocked_response()
     candidates_pool, sections_set, idx_jrny_must_keep = new_default._build_candidate_pool_and_sections_set(
         mocked_pb_response.journeys
     )
     selected_sections_matrix = new_default._build_selected_sections_matrix(sections_set, candidates_pool)
-    # 4 journeys are must-have, we'd like to select another 5 journeys
-    best_indexes, selection_matrix = new_default._get_sorted_solutions_indexes(
-        selected_sections_matrix, (5 + 4), idx_jrny_must_keep
+    costs = [0] * len(candidates_pool)
+
+    selected_indexes = new_default._get_best_solution_indexes(
+        selected_sections_matrix, (5 + 4), idx_jrny_must_keep, costs
+    )
+    assert len(selected_indexes) == 9
+    assert set(idx_jrny_must_keep).issubset(selected_indexes)
+    assert selected_indexes == new_default._get_best_solution_indexes_by_enumeration(
+        selected_sections_matrix, (5 + 4), idx_jrny_must_keep, costs
     )
 
-    assert best_indexes.shape[0] == 33
-    assert all(selection_matrix[best_indexes[0]] == [0, 0, 1, 1, 0, 1, 0, 1, 1, 0, 0, 0, 0, 1, 1, 1, 1, 0, 0])
+
+def get_best_solution_indexes_random_matrices_test():
+    """
+    Compare the branch-and-bound to the enumeration on random matrices, ties included
+    """
+    rng = random.Random(42)
+    for _ in range(300):
+        nb_journeys = rng.randint(3, 11)
+        nb_journeys_to_find = rng.randint(1, nb_journeys - 1)
+        selected_sections_matrix = np.array(
+            [[int(rng.random() < 0.35) for _ in range(8)] for _ in range(nb_journeys)]
+        )
+        idx_jrny_must_keep = sorted(rng.sample(range(nb_journeys), rng.randint(0, min(nb_journeys_to_find, 3))))
+        costs = [rng.randint(0, 5) for _ in range(nb_journeys)]
+
+        selected_indexes = new_default._get_best_solution_indexes(
+            selected_sections_matrix, nb_journeys_to_find, idx_jrny_must_keep, costs
+        )
+        assert selected_indexes == new_default._get_best_solution_indexes_by_enumeration(
+            selected_sections_matrix, nb_journeys_to_find, idx_jrny_must_keep, costs
+        )
+
+
+def get_best_solution_indexes_budget_exceeded_test(mocker):
+    """
+    When the branch-and-bound runs out of its budget, the best solution found so far is kept
+    """
+    record_custom_event = mocker.patch('jormungandr.scenarios.new_default.record_custom_event')
+    enumeration = mocker.patch('jormungandr.scenarios.new_default._get_best_solution_indexes_by_enumeration')
+    mocked_pb_response = build_mocked_response()
+    candidates_pool, sections_set, idx_jrny_must_keep = new_default._build_candidate_pool_and_sections_set(
+        mocked_pb_response.journeys
+    )
+    selected_sections_matrix = new_default._build_selected_sections_matrix(sections_set, candidates_pool)
+    costs = [get_pseudo_duration(jrny, 1444903200, True) for jrny in candidates_pool]
+
+    selected_indexes = new_default._get_best_solution_indexes(
+        selected_sections_matrix, 9, idx_jrny_must_keep, costs, max_nb_explored_nodes=1
+    )
+    assert record_custom_event.call_count == 1
+    assert record_custom_event.call_args[0][0] == 'culling_journeys_budget_exceeded'
+    assert enumeration.call_count == 0
+    # the greedy solution, since nothing has been explored
+    assert len(selected_indexes) == 9
+    assert set(idx_jrny_must_keep).issubset(selected_indexes)
+    assert selected_indexes == sorted(selected_indexes)
+
+
+@pytest.mark.timeout(30)
+def get_best_solution_indexes_budget_exceeded_large_timeframe_test(mocker):
+    """
+    An over-budget search on a big timeframe returns quickly, the enumeration of nCr(60, 10) combinations is not
+    run instead
+    """
+    record_custom_event = mocker.patch('jormungandr.scenarios.new_default.record_custom_event')
+    enumeration = mocker.patch('jormungandr.scenarios.new_default._get_best_solution_indexes_by_enumeration')
+    response = _build_timeframe_response(nb_journeys=400, nb_distinct_journeys=60)
+    candidates_pool, sections_set, idx_jrny_must_keep = new_default._build_candidate_pool_and_sections_set(
+        response.journeys
+    )
+    selected_sections_matrix = new_default._build_selected_sections_matrix(sections_set, candidates_pool)
+    costs = [get_pseudo_duration(jrny, 1444903200, True) for jrny in candidates_pool]
+
+    start = time.time()
+    selected_indexes = new_default._get_best_solution_indexes(
+        selected_sections_matrix, 10, idx_jrny_must_keep, costs, max_nb_explored_nodes=100
+    )
+    assert time.time() - start < 5
+    assert record_custom_event.call_count == 1
+    assert enumeration.call_count == 0
+    assert len(selected_indexes) == 10
+    assert set(idx_jrny_must_keep).issubset(selected_indexes)
+
+
+def _build_timeframe_response(nb_journeys, nb_distinct_journeys, seed=42):
+    """
+    nb_journeys from the same origin to the same destination, nb_distinct_journeys distinct after aggregation
+    """
+    rng = random.Random(seed)
+    sequences = set()
+    while len(sequences) < nb_distinct_journeys:
+        sequences.add(
+            (rng.choice((0, 10)),)
+            + tuple(sorted(rng.sample(range(1, 10), rng.randint(1, 3))))
+            + (rng.choice((0, 10)),)
+        )
+    sequences = sorted(sequences)
+
+    response = response_pb2.Response()
+    for i in range(nb_journeys):
+        sections_idx = sequences[i % len(sequences)]
+        pb_j = response.journeys.add()
+        pb_j.arrival_date_time = 1444905000 + i * 60
+        pb_j.type = 'best' if i == 0 else 'rapid'
+        for idx in sections_idx:
+            section_type, network_mode, line_uri = SECTIONS_CHOICES[idx]
+            section = pb_j.sections.add()
+            section.type = section_type
+            if network_mode:
+                section.street_network.mode = network_mode
+            if line_uri:
+                section.uris.line = line_uri
+    return response
+
+
+def get_best_solution_indexes_timeframe_test(mocker):
+    """
+    On a response big enough for the enumeration to still be possible, the branch-and-bound finds the optimum
+    without exceeding its budget
+    """
+    record_custom_event = mocker.patch('jormungandr.scenarios.new_default.record_custom_event')
+    response = _build_timeframe_response(nb_journeys=24, nb_distinct_journeys=24)
+    candidates_pool, sections_set, idx_jrny_must_keep = new_default._build_candidate_pool_and_sections_set(
+        response.journeys
+    )
+    selected_sections_matrix = new_default._build_selected_sections_matrix(sections_set, candidates_pool)
+    costs = [get_pseudo_duration(jrny, 1444903200, True) for jrny in candidates_pool]
+
+    selected_indexes = new_default._get_best_solution_indexes(
+        selected_sections_matrix, 6, idx_jrny_must_keep, costs
+    )
+    assert record_custom_event.call_count == 0
+    assert selected_indexes == new_default._get_best_solution_indexes_by_enumeration(
+        selected_sections_matrix, 6, idx_jrny_must_keep, costs
+    )
+
+
+@pytest.mark.timeout(30)
+def culling_journeys_large_timeframe_test(mocker):
+    """
+    Benchmark of a big timeframe_duration: 400 journeys from the same origin to the same destination, 60 distinct
+    after aggregation. The enumeration would have to go through nCr(60, 10) = 7.5E+10 combinations.
+
+    The branch-and-bound is exact as long as it doesn't exceed its budget.
+    """
+    record_custom_event = mocker.patch('jormungandr.scenarios.new_default.record_custom_event')
+    response = _build_timeframe_response(nb_journeys=400, nb_distinct_journeys=60)
+
+    mocked_request = {'max_nb_journeys': 10, 'debug': False, 'datetime': 1444903200}
+    new_default.culling_journeys(response, mocked_request)
+    assert record_custom_event.call_count == 0
+    assert len(response.journeys) == 10
+    assert any(j.type == 'best' for j in response.journeys)
+
+    # all the lines are still covered
+    lines = {
+        s.uris.line for j in response.journeys for s in j.sections if s.type == response_pb2.PUBLIC_TRANSPORT
+    }
+    assert lines == {'uri_{}'.format(i) for i in range(1, 10)}
 
 
 def culling_journeys_1_test():
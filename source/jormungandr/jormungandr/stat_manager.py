@@ -37,9 +37,13 @@ import logging
 from jormungandr import app
 from jormungandr.authentication import get_user, get_token, get_app_name, get_used_coverages
 from jormungandr import utils
+from jormungandr.exceptions import TechnicalError
 import re
 from threading import Lock
+from collections import OrderedDict
 
+import gevent
+import gevent.queue
 import pytz
 import time
 import sys
@@ -115,6 +119,165 @@ def tz_str_to_utc_timestamp(dt_str, timezone):
     return utils.date_to_timestamp(dt.astimezone(pytz.utc))
 
 
+# what the stat reads of the journeys and their sections (see fill_journey and fill_section)
+JOURNEY_KEYS = (
+    'requested_date_time',
+    'departure_date_time',
+    'arrival_date_time',
+    'duration',
+    'nb_transfers',
+    'type',
+)
+SECTION_KEYS = ('departure_date_time', 'arrival_date_time', 'duration', 'mode', 'type')
+DISPLAY_INFORMATIONS_KEYS = ('code', 'network', 'physical_mode', 'commercial_mode')
+PLACE_KEYS = ('id', 'name', 'embedded_type', 'insee', 'level')
+# the objects of a place that can hold the coords and the administrative regions read by the stat
+PLACE_OBJECT_KEYS = (
+    'administrative_regions',
+    'administrative_region',
+    'stop_point',
+    'stop_area',
+    'address',
+    'poi',
+    'access_point',
+)
+
+
+def compact_dict(value, keys):
+    return OrderedDict((k, v) for k, v in value.items() if k in keys)
+
+
+def compact_place(place):
+    """
+    Copy of a place with only its ids, names, coords and administrative regions
+
+    The keys are kept in the same order, so that find_admin finds the same admin in the copy
+    """
+    if isinstance(place, (list, tuple)):
+        return [compact_place(p) for p in place]
+    if not hasattr(place, 'items'):
+        return place
+    compact = OrderedDict()
+    for key, value in place.items():
+        if key in PLACE_KEYS:
+            compact[key] = value
+        elif key == 'coord' and hasattr(value, 'items'):
+            compact[key] = compact_dict(value, ('lat', 'lon'))
+        elif key in PLACE_OBJECT_KEYS or key == place.get('embedded_type'):
+            compact[key] = compact_place(value)
+    return compact
+
+
+def compact_section(section):
+    compact = compact_dict(section, SECTION_KEYS)
+    for key in ('from', 'to'):
+        if key in section:
+            compact[key] = compact_place(section[key])
+    if 'links' in section:
+        compact['links'] = [compact_dict(link, ('type', 'id')) for link in section['links']]
+    if 'display_informations' in section:
+        compact['display_informations'] = compact_dict(
+            section['display_informations'], DISPLAY_INFORMATIONS_KEYS
+        )
+    return compact
+
+
+def compact_journey(journey):
+    compact = compact_dict(journey, JOURNEY_KEYS)
+    if 'sections' in journey:
+        compact['sections'] = [compact_section(section) for section in journey['sections']]
+    return compact
+
+
+class StatNotConfirmed(RuntimeError):
+    pass
+
+
+class StatContext(object):
+    """
+    Everything needed from the request to build its stat
+
+    It is captured at the end of the request, so that the stat can be built outside of the request context. Only
+    the few fields the stat reads are copied from the response, the response itself is not kept.
+    """
+
+    __slots__ = (
+        'start_time',
+        'end_time',
+        'user',
+        'token',
+        'app_name',
+        'endpoint',
+        'host_url',
+        'client',
+        'path',
+        'response_size',
+        'object_count',
+        'error',
+        'journeys',
+        'args',
+        'interpreted_parameters',
+        'coverages',
+        'timezone',
+    )
+
+    def __init__(self, start_time, call_result):
+        self.start_time = start_time
+        self.end_time = time.time()
+        # Note: for stat we don't want to abort if no token has been
+        # given (it's up to the authentication process)
+        self.token = get_token()
+        user = get_user(token=self.token, abort_if_no_token=False)
+        self.user = None
+        if user is not None:
+            end_point_name = user.end_point.name if user.end_point_id else None
+            self.user = (user.id, user.login, user.end_point_id, end_point_name)
+        self.app_name = get_app_name(self.token)
+        self.endpoint = request.endpoint
+        self.host_url = request.host_url
+        self.client = None
+        if request.remote_addr and not request.headers.getlist("X-Forwarded-For"):
+            self.client = request.remote_addr
+        elif request.headers.getlist("X-Forwarded-For"):
+            self.client = request.headers.getlist("X-Forwarded-For")[0]
+        self.path = request.path
+        self.args = OrderedDict((key, request.args.getlist(key)) for key in request.args)
+        self.interpreted_parameters = None
+        if hasattr(g, 'stat_interpreted_parameters'):
+            self.interpreted_parameters = dict(g.stat_interpreted_parameters)
+        self.coverages = list(get_used_coverages() or [])
+        self.timezone = getattr(g, 'timezone', None)
+
+        response = call_result[0]
+        self.response_size = sys.getsizeof(response)
+        self.object_count = None
+        if 'pagination' in response and response['pagination'] and 'items_on_page' in response['pagination']:
+            self.object_count = response['pagination']['items_on_page']
+        self.error = None
+        if 'error' in response and response['error']:
+            self.error = compact_dict(response['error'], ('id', 'message'))
+        self.journeys = None
+        # We do not save informations of journeys and sections for a request
+        # Isochron (parameter "&to" is absent for API Journeys )
+        if self.has_journeys() and 'journeys' in response and response['journeys']:
+            self.journeys = [compact_journey(journey) for journey in response['journeys']]
+
+    def has_journeys(self):
+        return 'journeys' in self.endpoint and 'to' in self.args
+
+    @property
+    def size(self):
+        """
+        a stat counts for 1, plus the number of its sections
+        """
+        return 1 + sum(len(journey.get('sections', [])) for journey in self.journeys or [])
+
+    def get_timezone(self):
+        if self.timezone is None:
+            raise TechnicalError("No timezone set for this API")
+        return self.timezone
+
+
 class StatManager(object):
     def __init__(self, auto_delete=False):
         self.connection = None
@@ -124,6 +287,23 @@ class StatManager(object):
         self.broker_url = app.config.get('BROKER_URL', None)
         self.exchange_name = app.config.get('EXCHANGE_NAME', None)
         self.connection_timeout = app.config.get('STAT_CONNECTION_TIMEOUT', 1)
+        # in async mode, the stats are captured in the request and built and published by a background worker
+        self.async_publish = app.config.get('STAT_ASYNC_PUBLISH', False)
+        self.batch_size = app.config.get('STAT_BATCH_SIZE', 50)
+        # the queue is bounded by its number of stats and by their total size (see StatContext.size)
+        self._queue = gevent.queue.Queue(maxsize=app.config.get('STAT_QUEUE_SIZE', 1000))
+        self.queue_max_size = app.config.get('STAT_QUEUE_MAX_SIZE', 100000)
+        self._queued_size = 0
+        self._worker = None
+        self.nb_published = 0
+        self.nb_failed = 0
+        self.nb_dropped = 0
+        self._nb_reported_dropped = 0
+        # publisher confirms of the background worker: delivery tag of the last message published on the channel,
+        # the ones of the current batch not confirmed yet and the number of its messages rejected by the broker
+        self._delivery_tag = 0
+        self._unconfirmed = set()
+        self._nb_rejected = 0
 
         if self.save_stat:
             try:
@@ -147,6 +327,14 @@ class StatManager(object):
         self.connection.ensure_connection(**retry_policy)
         self.exchange = kombu.Exchange(self.exchange_name, type="topic", auto_delete=auto_delete)
         self.producer = self.connection.Producer(exchange=self.exchange)
+        if self.async_publish:
+            # the background worker waits for the broker to confirm its publications, the requests don't.
+            # The confirms are handled by batch: the confirm_publish transport option would wait for each message.
+            channel = self.producer.channel
+            channel.confirm_select()
+            channel.events['basic_ack'].add(self._on_confirm)
+            channel.events['basic_nack'].add(self._on_reject)
+            self._delivery_tag = 0
 
     def manage_stat(self, start_time, call_result):
         """
@@ -156,81 +344,144 @@ class StatManager(object):
             return
 
         try:
-            self._manage_stat(start_time, call_result)
+            if self.async_publish:
+                self._enqueue_stat(StatContext(start_time, call_result))
+            else:
+                self._manage_stat(start_time, call_result)
         except Exception as e:
             # if stat are not working we don't want jormungandr to stop.
             logging.getLogger(__name__).exception('Error during stat management')
 
     def _manage_stat(self, start_time, call_result):
-        end_time = time.time()
-        stat_request = stat_pb2.StatRequest()
-        stat_request.request_duration = int((end_time - start_time) * 1000)  # In milliseconds
-        self.fill_request(stat_request, start_time, call_result)
-        self.fill_coverages(stat_request)
-        self.fill_parameters(stat_request)
-        self.fill_result(stat_request, call_result)
+        self._publish_stat(StatContext(start_time, call_result))
 
+    def _publish_stat(self, context):
+        stat_request = self.build_stat_request(context)
+        self._publish_with_retry(self.publish_request, stat_request.api, stat_request.SerializeToString())
+
+    def _publish_with_retry(self, publish, *args):
         retry = retrying.Retrying(
             stop_max_attempt_number=2,
             retry_on_exception=lambda e: not isinstance(e, pybreaker.CircuitBreakerError),
         )
-        retry.call(self.breaker.call, self.publish_request, stat_request.api, stat_request.SerializeToString())
+        retry.call(self.breaker.call, publish, *args)
+
+    def build_stat_request(self, context):
+        stat_request = stat_pb2.StatRequest()
+        stat_request.request_duration = int((context.end_time - context.start_time) * 1000)  # In milliseconds
+        self.fill_request(stat_request, context)
+        self.fill_coverages(stat_request, context)
+        self.fill_parameters(stat_request, context)
+        self.fill_result(stat_request, context)
+        return stat_request
+
+    def _enqueue_stat(self, context):
+        """
+        queue the stat for the background worker, the stat is dropped if the worker can't keep up
+        """
+        size = context.size
+        if self._queued_size + size > self.queue_max_size:
+            self.nb_dropped += 1
+            return
+        try:
+            self._queue.put_nowait((context, size))
+        except gevent.queue.Full:
+            self.nb_dropped += 1
+            return
+        self._queued_size += size
+        if self._worker is None or self._worker.dead:
+            self._worker = gevent.spawn(self._run)
+
+    def _run(self):
+        while True:
+            self.publish_pending_stats(block=True)
 
-    def fill_info_response(self, stat_info_response, call_result):
+    def publish_pending_stats(self, block=False):
+        """
+        build and publish a batch of the queued stats
+        :param block: wait for a stat if the queue is empty
+        :return: the number of stats handled
+        """
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except gevent.queue.Empty:
+            pass
+        self._queued_size -= sum(size for _, size in batch)
+
+        stats = []
+        for context, _ in batch:
+            try:
+                stat_request = self.build_stat_request(context)
+                stats.append((stat_request.api, stat_request.SerializeToString()))
+            except Exception:
+                self.nb_failed += 1
+                logging.getLogger(__name__).exception('Error during stat management')
+
+        if stats:
+            try:
+                self._publish_with_retry(self.publish_requests, stats)
+                self.nb_published += len(stats)
+            except Exception:
+                self.nb_failed += len(stats)
+                logging.getLogger(__name__).exception('Error during stat publication')
+
+        if self.nb_dropped != self._nb_reported_dropped:
+            logging.getLogger(__name__).warning(
+                'stat queue full, %s stats dropped (%s published, %s failed)',
+                self.nb_dropped - self._nb_reported_dropped,
+                self.nb_published,
+                self.nb_failed,
+            )
+            self._nb_reported_dropped = self.nb_dropped
+        return len(batch)
+
+    def fill_info_response(self, stat_info_response, context):
         """
         store data from response of all requests
         """
-        if (
-            'pagination' in call_result[0]
-            and call_result[0]['pagination']
-            and 'items_on_page' in call_result[0]['pagination']
-        ):
-            stat_info_response.object_count = call_result[0]['pagination']['items_on_page']
+        if context.object_count is not None:
+            stat_info_response.object_count = context.object_count
 
-    def fill_result(self, stat_request, call_result):
-        if 'error' in call_result[0] and call_result[0]['error']:
-            self.fill_error(stat_request, call_result[0]['error'])
+    def fill_result(self, stat_request, context):
+        if context.error:
+            self.fill_error(stat_request, context.error)
 
-        # We do not save informations of journeys and sections for a request
-        # Isochron (parameter "&to" is absent for API Journeys )
-        if 'journeys' in request.endpoint and 'to' in request.args:
-            self.fill_journeys(stat_request, call_result)
+        if context.has_journeys():
+            self.fill_journeys(stat_request, context)
 
-    def fill_request(self, stat_request, start_time, call_result):
+    def fill_request(self, stat_request, context):
         """
         fill stat requests message (protobuf)
         """
-        stat_request.request_date = int(start_time)
-        # Note: for stat we don't want to abort if no token has been
-        # given (it's up to the authentication process)
-        token = get_token()
-        user = get_user(token=token, abort_if_no_token=False)
-
-        if user is not None:
-            stat_request.user_id = user.id
-            stat_request.user_name = user.login
-            if user.end_point_id:
-                stat_request.end_point_id = user.end_point_id
-                stat_request.end_point_name = user.end_point.name
-        if token is not None:
-            stat_request.token = token
+        stat_request.request_date = int(context.start_time)
+
+        if context.user is not None:
+            user_id, login, end_point_id, end_point_name = context.user
+            stat_request.user_id = user_id
+            stat_request.user_name = login
+            if end_point_id:
+                stat_request.end_point_id = end_point_id
+                stat_request.end_point_name = end_point_name
+        if context.token is not None:
+            stat_request.token = context.token
         stat_request.application_id = -1
-        app_name = get_app_name(token)
-        if app_name:
-            stat_request.application_name = app_name
+        if context.app_name:
+            stat_request.application_name = context.app_name
         else:
             stat_request.application_name = ''
-        stat_request.api = request.endpoint
-        stat_request.host = request.host_url
-        if request.remote_addr and not request.headers.getlist("X-Forwarded-For"):
-            stat_request.client = request.remote_addr
-        elif request.headers.getlist("X-Forwarded-For"):
-            stat_request.client = request.headers.getlist("X-Forwarded-For")[0]
-        stat_request.path = request.path
+        stat_request.api = context.endpoint
+        stat_request.host = context.host_url
+        if context.client:
+            stat_request.client = context.client
+        stat_request.path = context.path
 
-        stat_request.response_size = sys.getsizeof(call_result[0])
+        stat_request.response_size = context.response_size
 
-        self.fill_info_response(stat_request.info_response, call_result)
+        self.fill_info_response(stat_request.info_response, context)
 
     def register_interpreted_parameters(self, args):
         """
@@ -238,16 +489,15 @@ class StatManager(object):
         """
         g.stat_interpreted_parameters = args
 
-    def fill_parameters(self, stat_request):
-        for key in request.args:
-            items = request.args.getlist(key)
+    def fill_parameters(self, stat_request, context):
+        for key, items in context.args.items():
             for value in items:
                 stat_parameter = stat_request.parameters.add()
                 stat_parameter.key = key
                 stat_parameter.value = six.text_type(value)
 
-        if hasattr(g, 'stat_interpreted_parameters'):
-            for item in g.stat_interpreted_parameters.items():
+        if context.interpreted_parameters is not None:
+            for item in context.interpreted_parameters.items():
                 if isinstance(item[1], list):
                     for value in item[1]:
                         stat_parameter = stat_request.interpreted_parameters.add()
@@ -278,10 +528,9 @@ class StatManager(object):
             else:
                 logging.getLogger(__name__).warning('impossible to parse: %s', elem)
 
-    def fill_coverages(self, stat_request):
-        coverages = get_used_coverages()
-        if coverages:
-            for coverage in coverages:
+    def fill_coverages(self, stat_request, context):
+        if context.coverages:
+            for coverage in context.coverages:
                 stat_coverage = stat_request.coverages.add()
                 stat_coverage.region_id = coverage
         else:
@@ -295,7 +544,7 @@ class StatManager(object):
         if 'message' in error:
             stat_error.message = error['message']
 
-    def fill_journey(self, stat_journey, resp_journey):
+    def fill_journey(self, stat_journey, resp_journey, tz):
         """
         Fill journey and all sections from resp_journey.
         resp_journey is a OrderedDict and contains information
@@ -303,7 +552,6 @@ class StatManager(object):
         """
         init_journey(stat_journey)
 
-        tz = utils.get_timezone()
         if 'requested_date_time' in resp_journey:
             stat_journey.requested_date_time = tz_str_to_utc_timestamp(resp_journey['requested_date_time'], tz)
 
@@ -359,20 +607,21 @@ class StatManager(object):
             if admin[2]:
                 stat_journey.last_pt_admin_name = admin[2]
 
-    def fill_journeys(self, stat_request, call_result):
+    def fill_journeys(self, stat_request, context):
         """
         Fill journeys and sections for each journey (datetimes are all UTC)
         """
+        interpreted_parameters = context.interpreted_parameters
         journey_request = stat_request.journey_request
-        if hasattr(g, 'stat_interpreted_parameters') and g.stat_interpreted_parameters['original_datetime']:
-            tz = utils.get_timezone()
-            dt = g.stat_interpreted_parameters['original_datetime']
+        if interpreted_parameters is not None and interpreted_parameters['original_datetime']:
+            tz = context.get_timezone()
+            dt = interpreted_parameters['original_datetime']
             if dt.tzinfo is None:
                 dt = tz.normalize(tz.localize(dt))
             journey_request.requested_date_time = utils.date_to_timestamp(dt.astimezone(pytz.utc))
-            journey_request.clockwise = g.stat_interpreted_parameters['clockwise']
-        if 'journeys' in call_result[0] and call_result[0]['journeys']:
-            first_journey = call_result[0]['journeys'][0]
+            journey_request.clockwise = interpreted_parameters['clockwise']
+        if context.journeys:
+            first_journey = context.journeys[0]
             origin = find_origin_admin(first_journey)
             if origin[0]:
                 journey_request.departure_admin = origin[0]
@@ -387,10 +636,11 @@ class StatManager(object):
                 journey_request.arrival_insee = destination[1]
             if destination[2]:
                 journey_request.arrival_admin_name = destination[2]
-            for resp_journey in call_result[0]['journeys']:
+            tz = context.get_timezone()
+            for resp_journey in context.journeys:
                 stat_journey = stat_request.journeys.add()
-                self.fill_journey(stat_journey, resp_journey)
-                self.fill_sections(stat_journey, resp_journey)
+                self.fill_journey(stat_journey, resp_journey, tz)
+                self.fill_sections(stat_journey, resp_journey, tz)
 
     def get_section_link(self, resp_section, link_type):
         result = ''
@@ -402,8 +652,7 @@ class StatManager(object):
 
         return result
 
-    def fill_section(self, stat_section, resp_section, previous_section):
-        tz = utils.get_timezone()
+    def fill_section(self, stat_section, resp_section, previous_section, tz):
         if 'departure_date_time' in resp_section:
             stat_section.departure_date_time = tz_str_to_utc_timestamp(resp_section['departure_date_time'], tz)
 
@@ -487,21 +736,35 @@ class StatManager(object):
         except ValueError as e:
             logging.getLogger(__name__).warning('Unable to parse coordinates: %s', six.text_type(e))
 
-    def fill_sections(self, stat_journey, resp_journey):
+    def fill_sections(self, stat_journey, resp_journey, tz):
         previous_section = None
         if 'sections' in resp_journey:
             for resp_section in resp_journey['sections']:
                 stat_section = stat_journey.sections.add()
-                self.fill_section(stat_section, resp_section, previous_section)
+                self.fill_section(stat_section, resp_section, previous_section, tz)
                 previous_section = stat_section
 
     def publish_request(self, api, pbf):
+        self.publish_requests([(api, pbf)])
+
+    def publish_requests(self, stats):
+        """
+        publish a list of (api, serialized stat)
+        In async mode, all the stats are published before waiting for the broker to confirm them.
+        """
         with self.lock:
             try:
                 if self.producer is None:
                     # if the initialization failed we have to retry the creation of the objects
                     self._init_rabbitmq()
-                self.producer.publish(pbf, routing_key=api)
+                # the late confirms of a previous batch are ignored
+                self._unconfirmed, self._nb_rejected = set(), 0
+                for api, pbf in stats:
+                    self.producer.publish(pbf, routing_key=api)
+                    if self.async_publish:
+                        self._delivery_tag += 1
+                        self._unconfirmed.add(self._delivery_tag)
+                self._wait_for_confirms()
             except self.connection.connection_errors + self.connection.channel_errors:
                 logging.getLogger(__name__).exception('Server went away, will be reconnected..')
                 # Relese and close the previous connection
@@ -510,6 +773,24 @@ class StatManager(object):
                 self.producer = None
                 raise
 
+    def _wait_for_confirms(self):
+        while self._unconfirmed:
+            self.connection.drain_events(timeout=self.connection_timeout)
+        if self._nb_rejected:
+            raise StatNotConfirmed('{} stats rejected by the broker'.format(self._nb_rejected))
+
+    def _on_confirm(self, delivery_tag, multiple, rejected=False):
+        if multiple:
+            confirmed = {tag for tag in self._unconfirmed if tag <= delivery_tag}
+        else:
+            confirmed = self._unconfirmed & {delivery_tag}
+        self._unconfirmed -= confirmed
+        if rejected:
+            self._nb_rejected += len(confirmed)
+
+    def _on_reject(self, delivery_tag, multiple):
+        self._on_confirm(delivery_tag, multiple, rejected=True)
+
     def fill_admin_from(self, stat_section, admin):
         if admin[0]:
             stat_section.from_admin_id = admin[0]
@@ -0,0 +1,190 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+from collections import defaultdict
+from math import asin, cos, floor, radians, sin, sqrt
+from navitiacommon import request_pb2, type_pb2
+from jormungandr import app
+import gevent
+import logging
+
+# same constants as kraken, for the distances to be the same
+EARTH_RADIUS_IN_METERS = 6372797.560856
+N_DEG_TO_RAD = 0.01745329238
+METERS_BY_DEGREE = 111320.0
+
+
+def project_coord(lon, lat):
+    """
+    project the coord in 3D space, the distance between two places is the euclidean distance between them
+    """
+    lat_rad = lat * N_DEG_TO_RAD
+    lon_rad = lon * N_DEG_TO_RAD
+    return (
+        EARTH_RADIUS_IN_METERS * cos(lat_rad) * sin(lon_rad),
+        EARTH_RADIUS_IN_METERS * cos(lat_rad) * cos(lon_rad),
+        EARTH_RADIUS_IN_METERS * sin(lat_rad),
+    )
+
+
+def _get_cell(lon, lat, cell_size):
+    return int(floor(lat / cell_size)), int(floor(lon / cell_size))
+
+
+def _search_radius(radius):
+    """
+    the radius is an arc, for the big ones we search within the chord
+    """
+    radius = min(radius, 2 * EARTH_RADIUS_IN_METERS)
+    if radius < EARTH_RADIUS_IN_METERS * 0.01:
+        return radius
+    return 2 * EARTH_RADIUS_IN_METERS * asin(radius / (2.0 * EARTH_RADIUS_IN_METERS))
+
+
+class StopPointIndex(object):
+    """
+    Stop points of an instance, indexed on a grid to find the stop points around a place without calling kraken
+
+    The stop points (with their stop area, and their access points at depth 3) are loaded from the ptref of
+    kraken, in background, each time a new publication date is seen. The places nearby are computed as kraken
+    does: the same distances, sorted the same way. Until the index of the current data is loaded, the index
+    doesn't answer and kraken is called.
+    """
+
+    def __init__(self, instance_name):
+        self.instance_name = instance_name
+        # publication date of the loaded stop points
+        self.publication_date = None
+        self.depth = None
+        # size of the cells in degrees, (lat cell, lon cell) -> [(x, y, z, pt_object)]
+        self._index = (None, {})
+        self._loading_publication_date = None
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def is_enabled():
+        return app.config.get(str('STOP_POINT_INDEX'), False)
+
+    def __len__(self):
+        return sum(len(items) for items in self._index[1].values())
+
+    def update_publication_date(self, instance):
+        """
+        listener of the publication date of the instance
+        """
+        if not self.is_enabled() or self._loading_publication_date == instance.publication_date:
+            return
+        self._loading_publication_date = instance.publication_date
+        gevent.spawn(self.load, instance, instance.publication_date)
+
+    def _get_stop_points_page(self, instance, depth, start_page, count):
+        req = request_pb2.Request()
+        req.requested_api = type_pb2.PTREFERENTIAL
+        req.ptref.requested_type = type_pb2.STOP_POINT
+        req.ptref.count = count
+        req.ptref.start_page = start_page
+        req.ptref.depth = depth
+        req.disable_feedpublisher = True
+        return instance.send_and_receive(req)
+
+    def load(self, instance, publication_date):
+        depth = app.config.get(str('STOP_POINT_INDEX_DEPTH'), 2)
+        page_size = app.config.get(str('STOP_POINT_INDEX_PAGE_SIZE'), 1000)
+        cell_size = app.config.get(str('STOP_POINT_INDEX_CELL_SIZE_M'), 1000) / METERS_BY_DEGREE
+        self.logger.info('loading the stop point index of %s', self.instance_name)
+        grid = defaultdict(list)
+        try:
+            start_page = 0
+            while True:
+                resp = self._get_stop_points_page(instance, depth, start_page, page_size)
+                for stop_point in resp.stop_points:
+                    # like kraken, the stop points without coord can't be found
+                    if not stop_point.coord.lon and not stop_point.coord.lat:
+                        continue
+                    pt_object = type_pb2.PtObject(
+                        name=stop_point.label, uri=stop_point.uri, embedded_type=type_pb2.STOP_POINT
+                    )
+                    pt_object.stop_point.CopyFrom(stop_point)
+                    x, y, z = project_coord(stop_point.coord.lon, stop_point.coord.lat)
+                    grid[_get_cell(stop_point.coord.lon, stop_point.coord.lat, cell_size)].append(
+                        (x, y, z, pt_object)
+                    )
+                start_page += 1
+                if not resp.stop_points or start_page * page_size >= resp.pagination.totalResult:
+                    break
+        except Exception:
+            self.logger.exception('impossible to load the stop point index of %s', self.instance_name)
+            self._loading_publication_date = None
+            return
+
+        if publication_date != instance.publication_date:
+            # the data have changed during the loading, the next publication date will load them
+            return
+        self._index = (cell_size, dict(grid))
+        self.depth = depth
+        self.publication_date = publication_date
+        self.logger.info('%s stop points loaded in the index of %s', len(self), self.instance_name)
+
+    def get_stop_points_nearby(self, publication_date, coord, radius, count, depth):
+        """
+        the stop points within `radius` meters of `coord`, as kraken's places_nearby: sorted by distance, with
+        their distance
+        return: a list of PtObject, None if the index can't answer
+        """
+        if not self.is_enabled() or publication_date != self.publication_date or depth != self.depth:
+            return None
+        if radius <= 0 or count <= 0:
+            return []
+        cell_size, grid = self._index
+        search_radius = _search_radius(radius)
+        x, y, z = project_coord(coord.lon, coord.lat)
+        # the cells intersecting the bounding box of the circle
+        delta_lat = radius / METERS_BY_DEGREE
+        cos_lat = cos(radians(min(abs(coord.lat) + delta_lat, 89.0)))
+        delta_lon = min(radius / (METERS_BY_DEGREE * cos_lat), 180.0)
+        min_lat_cell, min_lon_cell = _get_cell(coord.lon - delta_lon, coord.lat - delta_lat, cell_size)
+        max_lat_cell, max_lon_cell = _get_cell(coord.lon + delta_lon, coord.lat + delta_lat, cell_size)
+
+        sqr_search_radius = search_radius * search_radius
+        found = []
+        for lat_cell in range(min_lat_cell, max_lat_cell + 1):
+            for lon_cell in range(min_lon_cell, max_lon_cell + 1):
+                for sp_x, sp_y, sp_z, pt_object in grid.get((lat_cell, lon_cell), ()):
+                    sqr_distance = (sp_x - x) ** 2 + (sp_y - y) ** 2 + (sp_z - z) ** 2
+                    if sqr_distance <= sqr_search_radius:
+                        found.append((sqr_distance, pt_object))
+        found.sort(key=lambda e: e[0])
+
+        result = []
+        for sqr_distance, pt_object in found[:count]:
+            place = type_pb2.PtObject()
+            place.CopyFrom(pt_object)
+            place.distance = int(sqrt(sqr_distance))
+            result.append(place)
+        return result
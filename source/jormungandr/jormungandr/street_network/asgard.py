@@ -34,7 +34,7 @@ from jormungandr import app
 from jormungandr.transient_socket import TransientSocket
 from jormungandr.fallback_modes import FallbackModes
 from jormungandr.street_network.kraken import Kraken
-from jormungandr.utils import get_pt_object_coord
+from jormungandr.utils import get_pt_object_coord, get_remaining_time
 from jormungandr.street_network.utils import (
     make_speed_switcher,
     crowfly_distance_between,
@@ -162,6 +162,10 @@ DIRECT_PATH_ALTERNATIVES_PROFILES = [BALANCED, COMFORT, SHORTEST]
 
 
 class Asgard(TransientSocket, Kraken):
+    # unlike kraken, asgard's matrices aren't known to have one row by origin: it is only asked for 1-n and n-1
+    # matrices
+    handles_many_to_many_matrix = False
+
     def __init__(
         self,
         instance,
@@ -179,6 +183,9 @@ class Asgard(TransientSocket, Kraken):
             zmq_context=instance.context,
             zmq_socket=app.config.get(str("ASGARD_ZMQ_SOCKET")) or asgard_socket,
             socket_ttl=socket_ttl,
+            multiplexed=app.config.get(str('ZMQ_MULTIPLEXED_CHANNEL'), False),
+            max_in_flight_requests=app.config.get(str('ZMQ_MAX_IN_FLIGHT_REQUESTS'), 64),
+            nb_channels=app.config.get(str('ZMQ_NB_CHANNELS'), 2),
             instance=instance,
             service_url=service_url,
             modes=modes or [],
@@ -476,7 +483,7 @@ class Asgard(TransientSocket, Kraken):
     def _call_asgard(self, request, request_id):
         def _request():
             request.request_id = request_id
-            pb = self.call(request.SerializeToString(), self.timeout)
+            pb = self.call(request.SerializeToString(), get_remaining_time(self.timeout))
             resp = response_pb2.Response()
             resp.ParseFromString(pb)
             return resp
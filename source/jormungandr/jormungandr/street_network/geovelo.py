@@ -36,6 +36,7 @@ import six
 
 import itertools
 import sys
+import gevent.pool
 from navitiacommon import response_pb2
 from jormungandr import app
 from jormungandr.exceptions import GeoveloTechnicalError, InvalidArguments, UnableToParse
@@ -44,9 +45,18 @@ from jormungandr.street_network.street_network import (
     StreetNetworkPathKey,
     StreetNetworkPathType,
 )
-from jormungandr.utils import get_pt_object_coord, is_url, decode_polyline, mps_to_kmph
+from jormungandr.utils import (
+    get_pt_object_coord,
+    is_url,
+    decode_polyline,
+    mps_to_kmph,
+    get_remaining_time,
+    get_deadline,
+    deadline_scope,
+)
 from jormungandr.street_network.utils import add_cycle_lane_length
 from jormungandr.ptref import FeedPublisher
+from jormungandr.http_client import get_http_client
 
 from navitiacommon.response_pb2 import StreetInformation
 
@@ -57,8 +67,17 @@ DEFAULT_GEOVELO_FEED_PUBLISHER = {
     'url': 'https://geovelo.fr/a-propos/cgu/',
 }
 
+# max number of durations (nb starts * nb ends) asked in a single call, the bigger matrices are split
+DEFAULT_MAX_MATRIX_SIZE = 100
+# max number of calls done concurrently for a matrix
+DEFAULT_MATRIX_CONCURRENCY = 4
+# max number of places in isochrone, the places of the most important physical modes are kept
+DEFAULT_MAX_PLACES_ISOCHRONE = 50
+
 
 class Geovelo(AbstractStreetNetworkService):
+    handles_many_to_many_matrix = True
+
     def __init__(
         self,
         instance,
@@ -69,6 +88,9 @@ class Geovelo(AbstractStreetNetworkService):
         api_key=None,
         feed_publisher=DEFAULT_GEOVELO_FEED_PUBLISHER,
         verify=True,
+        max_matrix_size=DEFAULT_MAX_MATRIX_SIZE,
+        matrix_concurrency=DEFAULT_MATRIX_CONCURRENCY,
+        max_places_isochrone=DEFAULT_MAX_PLACES_ISOCHRONE,
         **kwargs
     ):
         self.instance = instance
@@ -79,12 +101,16 @@ class Geovelo(AbstractStreetNetworkService):
         self.api_key = api_key
         self.timeout = timeout
         self.modes = modes
+        self.http_client = get_http_client('geovelo')
         self.breaker = pybreaker.CircuitBreaker(
             fail_max=app.config['CIRCUIT_BREAKER_MAX_GEOVELO_FAIL'],
             reset_timeout=app.config['CIRCUIT_BREAKER_GEOVELO_TIMEOUT_S'],
         )
         self._feed_publisher = FeedPublisher(**feed_publisher) if feed_publisher else None
         self.verify = verify
+        self.max_matrix_size = max(1, max_matrix_size)
+        self.matrix_concurrency = max(1, matrix_concurrency)
+        self.max_places_isochrone = max_places_isochrone
 
     def status(self):
         return {
@@ -92,6 +118,7 @@ class Geovelo(AbstractStreetNetworkService):
             'class': self.__class__.__name__,
             'modes': self.modes,
             'timeout': self.timeout,
+            'max_matrix_size': self.max_matrix_size,
             'circuit_breaker': {
                 'current_state': self.breaker.current_state,
                 'fail_counter': self.breaker.fail_counter,
@@ -102,7 +129,8 @@ class Geovelo(AbstractStreetNetworkService):
     @classmethod
     def _pt_object_summary_isochrone(cls, pt_object):
         coord = get_pt_object_coord(pt_object)
-        return [coord.lat, coord.lon, None]
+        # the uri is the reference of the place in the durations of the matrix
+        return [coord.lat, coord.lon, pt_object.uri]
 
     @classmethod
     def _make_request_arguments_bike_details(cls, bike_speed_mps):
@@ -158,13 +186,14 @@ class Geovelo(AbstractStreetNetworkService):
             'bikeDetails': cls._make_request_arguments_bike_details(bike_speed_mps),
         }
 
-    def _call_geovelo(self, url, method=requests.post, data=None):
+    def _call_geovelo(self, url, method=None, data=None):
+        method = method or self.http_client.post
         logging.getLogger(__name__).debug('Geovelo routing service , call url : {}'.format(url))
         try:
             return self.breaker.call(
                 method,
                 url,
-                timeout=self.timeout,
+                timeout=get_remaining_time(self.timeout),
                 data=data,
                 headers={
                     'content-type': 'application/json',
@@ -211,25 +240,31 @@ class Geovelo(AbstractStreetNetworkService):
             return response_pb2.SeparatedCycleWay
 
     @classmethod
-    def _get_matrix(cls, json_response):
+    def _get_routing_elements(cls, json_response, origins, destinations):
         '''
-        build the 1-n response matrix from geovelo table
-        each element is ["start", "end", duration] (first being the header)
-        as it is ordered, we only consider the third
+        read the durations of a geovelo table
+        each element is ["start_reference", "end_reference", duration] (first being the header), the references
+        being the uris of the places
+        return: a list of (duration, routing_status), ordered by origin then by destination
         '''
-        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
-        row = sn_routing_matrix.rows.add()
         # checking header of geovelo's response
         if json_response[0] != ["start_reference", "end_reference", "duration"]:
             logging.getLogger(__name__).error('Geovelo parsing error. Response: {}'.format(json_response))
             raise UnableToParse('Geovelo parsing error. Response: {}'.format(json_response))
 
-        add_ = row.routing_response.add
-        for e in itertools.islice(json_response, 1, sys.maxsize):
-            duration, routing_status = (e[2], response_pb2.reached) if e[2] else (-1, response_pb2.unknown)
-            add_(duration=duration, routing_status=routing_status)
-
-        return sn_routing_matrix
+        durations = {(e[0], e[1]): e[2] for e in itertools.islice(json_response, 1, sys.maxsize)}
+        routing_elements = []
+        for origin in origins:
+            for destination in destinations:
+                key = (origin.uri, destination.uri)
+                if key not in durations:
+                    logging.getLogger(__name__).error('Geovelo, no duration from {} to {}'.format(*key))
+                    raise UnableToParse('Geovelo, no duration from {} to {}'.format(*key))
+                duration = durations[key]
+                routing_elements.append(
+                    (duration, response_pb2.reached) if duration else (-1, response_pb2.unknown)
+                )
+        return routing_elements
 
     @classmethod
     def _check_response(cls, response):
@@ -246,30 +281,90 @@ class Geovelo(AbstractStreetNetworkService):
         if street_network_mode != "bike":
             logging.getLogger(__name__).error('Geovelo, mode {} not implemented'.format(street_network_mode))
             raise InvalidArguments('Geovelo, mode {} not implemented'.format(street_network_mode))
-        if len(origins) != 1 and len(destinations) != 1:
-            logging.getLogger(__name__).error(
-                'Geovelo, managing only 1-n in connector, requested {}-{}'.format(
-                    len(origins), len(destinations)
-                )
-            )
-            raise InvalidArguments(
-                'Geovelo, managing only 1-n in connector, requested {}-{}'.format(
-                    len(origins), len(destinations)
+        if not origins or not destinations:
+            return response_pb2.StreetNetworkRoutingMatrix()
+
+        chunks = self._split_matrix(len(origins), len(destinations))
+        bike_speed = request['bike_speed']
+        deadline = get_deadline()
+        if len(chunks) == 1:
+            chunks_elements = [self._get_matrix_chunk(deadline, origins, destinations, bike_speed)]
+        else:
+            # the chunks are computed concurrently, within the budget of the request
+            pool = gevent.pool.Pool(self.matrix_concurrency)
+            greenlets = [
+                pool.spawn(
+                    self._get_matrix_chunk,
+                    deadline,
+                    origins[o_start:o_end],
+                    destinations[d_start:d_end],
+                    bike_speed,
                 )
-            )
+                for (o_start, o_end), (d_start, d_end) in chunks
+            ]
+            try:
+                gevent.joinall(greenlets, raise_error=True)
+            finally:
+                # the other chunks are useless if one of them fails
+                pool.kill()
+            chunks_elements = [g.value for g in greenlets]
+
+        # durations[i][j]: from the i-th origin to the j-th destination
+        durations = [[None] * len(destinations) for _ in origins]
+        for ((o_start, o_end), (d_start, d_end)), elements in zip(chunks, chunks_elements):
+            elements = iter(elements)
+            for i in range(o_start, o_end):
+                for j in range(d_start, d_end):
+                    durations[i][j] = next(elements)
 
-        data = self._make_request_arguments_isochrone(origins, destinations, request['bike_speed'])
-        r = self._call_geovelo(
-            '{}/{}'.format(self.service_url, 'api/v2/routes_m2m'), requests.post, ujson.dumps(data)
-        )
-        self._check_response(r)
-        resp_json = ujson.loads(r.text)
+        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+        if len(origins) == 1 or len(destinations) == 1:
+            # the 1-n and n-1 matrices are returned in a single row
+            rows = [[e for row in durations for e in row]]
+        else:
+            rows = durations
+        for row in rows:
+            add_ = sn_routing_matrix.rows.add().routing_response.add
+            for duration, routing_status in row:
+                add_(duration=duration, routing_status=routing_status)
+        return sn_routing_matrix
+
+    def _split_matrix(self, nb_origins, nb_destinations):
+        '''
+        split a matrix in chunks of at most max_matrix_size durations: batches of origins with all the
+        destinations, or a single origin with batches of destinations if there are too many of them
+        return: a list of ((origins start, origins end), (destinations start, destinations end))
+        '''
+        if nb_destinations <= self.max_matrix_size:
+            batch_size = self.max_matrix_size // nb_destinations
+            return [
+                ((start, min(start + batch_size, nb_origins)), (0, nb_destinations))
+                for start in range(0, nb_origins, batch_size)
+            ]
+        return [
+            ((o, o + 1), (start, min(start + self.max_matrix_size, nb_destinations)))
+            for o in range(nb_origins)
+            for start in range(0, nb_destinations, self.max_matrix_size)
+        ]
+
+    def _get_matrix_chunk(self, deadline, origins, destinations, bike_speed):
+        '''
+        return: the (duration, routing_status) from the origins to the destinations, ordered by origin then by
+        destination
+        '''
+        with deadline_scope(deadline):
+            data = self._make_request_arguments_isochrone(origins, destinations, bike_speed)
+            r = self._call_geovelo(
+                '{}/{}'.format(self.service_url, 'api/v2/routes_m2m'), self.http_client.post, ujson.dumps(data)
+            )
+            self._check_response(r)
+            resp_json = ujson.loads(r.text)
 
-        if len(resp_json) - 1 != len(data.get('starts', [])) * len(data.get('ends', [])):
+        if len(resp_json) - 1 != len(origins) * len(destinations):
             logging.getLogger(__name__).error('Geovelo nb response != nb requested')
             raise UnableToParse('Geovelo nb response != nb requested')
 
-        return self._get_matrix(resp_json)
+        return self._get_routing_elements(resp_json, origins, destinations)
 
     @classmethod
     def _get_response(cls, json_response, pt_object_origin, pt_object_destination, fallback_extremity):
@@ -409,7 +504,7 @@ class Geovelo(AbstractStreetNetworkService):
                 'bike_stations=false&'
                 'objects_as_ids=true&'.format(single_result),
             ),
-            requests.post,
+            self.http_client.post,
             ujson.dumps(data),
         )
         self._check_response(r)
@@ -439,4 +534,4 @@ class Geovelo(AbstractStreetNetworkService):
 
     def filter_places_isochrone(self, places_isochrone):
         ordered_isochrone = self.sort_by_mode(places_isochrone)
-        return ordered_isochrone[:50]
+        return ordered_isochrone[: self.max_places_isochrone]
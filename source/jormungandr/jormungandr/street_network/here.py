@@ -45,10 +45,11 @@ from jormungandr.street_network.street_network import (
 )
 from jormungandr.ptref import FeedPublisher
 from jormungandr.fallback_modes import FallbackModes as fm
-from jormungandr.utils import is_coord, get_lon_lat
+from jormungandr.utils import is_coord, get_lon_lat, get_remaining_time
+from jormungandr.http_client import get_http_client
+from jormungandr.street_network.here_matrix_poller import HereMatrixPoller
 from six import text_type
 from enum import Enum
-from retrying import retry
 import itertools
 import ujson
 
@@ -58,6 +59,8 @@ HERE_MAX_LIMIT_AVOID_AREAS = 20
 
 # time beetween calls to fetch matrix result with GET method
 DEFAULT_LAPSE_TIME_MATRIX_TO_RETRY = 0.1  # in secs
+# max time between calls to fetch matrix result, the time between calls is increased while the matrix is computed
+DEFAULT_MAX_LAPSE_TIME_MATRIX_TO_RETRY = 1  # in secs
 
 # max nb points for matrix request
 MAX_MATRIX_POINTS_VALUES = 100
@@ -136,6 +139,7 @@ class Here(AbstractStreetNetworkService):
         apiKey=None,
         max_matrix_points=MAX_MATRIX_POINTS_VALUES,
         lapse_time_matrix_to_retry=DEFAULT_LAPSE_TIME_MATRIX_TO_RETRY,
+        max_lapse_time_matrix_to_retry=DEFAULT_MAX_LAPSE_TIME_MATRIX_TO_RETRY,
         language="english",
         feed_publisher=DEFAULT_HERE_FEED_PUBLISHER,
         **kwargs
@@ -154,10 +158,18 @@ class Here(AbstractStreetNetworkService):
         self.max_matrix_points = self._get_max_matrix_points(max_matrix_points)
         self.lapse_time_matrix_to_retry = self._get_lapse_time_matrix_to_retry(lapse_time_matrix_to_retry)
         self.language = self._get_language(language.lower())
+        self.http_client = get_http_client('here')
         self.breaker = pybreaker.CircuitBreaker(
             fail_max=app.config['CIRCUIT_BREAKER_MAX_HERE_FAIL'],
             reset_timeout=app.config['CIRCUIT_BREAKER_HERE_TIMEOUT_S'],
         )
+        self.matrix_poller = HereMatrixPoller(
+            self.http_client,
+            self.breaker,
+            min_lapse_time=self.lapse_time_matrix_to_retry,
+            max_lapse_time=max_lapse_time_matrix_to_retry,
+            timeout=self.timeout,
+        )
 
         self.log.debug(
             'Here, load configuration max_matrix_points={} - timeout={} - lapse_time_matrix_to_retry={} - language={}'.format(
@@ -174,6 +186,7 @@ class Here(AbstractStreetNetworkService):
             'timeout': self.timeout,
             'max_matrix_points': self.max_matrix_points,
             'lapse_time_matrix_to_retry': self.lapse_time_matrix_to_retry,
+            'max_lapse_time_matrix_to_retry': self.matrix_poller.max_lapse_time,
             'language': self.language.value,
             'circuit_breaker': {
                 'current_state': self.breaker.current_state,
@@ -182,11 +195,17 @@ class Here(AbstractStreetNetworkService):
             },
         }
 
-    def _call_here(self, url, params={}, http_method=requests.get, data={}, headers={}):
+    def _call_here(self, url, params={}, http_method=None, data={}, headers={}):
+        http_method = http_method or self.http_client.get
         self.log.debug('Here routing service, url: {}'.format(url))
         try:
             r = self.breaker.call(
-                http_method, url, timeout=self.timeout, params=params, data=data, headers=headers
+                http_method,
+                url,
+                timeout=get_remaining_time(self.timeout),
+                params=params,
+                data=data,
+                headers=headers,
             )
             self.record_call('ok')
             return r
@@ -559,7 +578,11 @@ class Here(AbstractStreetNetworkService):
         params = {'apiKey': self.apiKey}
         headers = {'Content-Type': 'application/json'}
         post_resp = self._call_here(
-            self.matrix_service_url, params=params, http_method=requests.post, data=post_data, headers=headers
+            self.matrix_service_url,
+            params=params,
+            http_method=self.http_client.post,
+            data=post_data,
+            headers=headers,
         )
         post_resp.raise_for_status()
 
@@ -569,26 +592,16 @@ class Here(AbstractStreetNetworkService):
         return post_resp.json()
 
     def get_matrix_response(self, origins, destinations, post_resp):
-
-        headers = {'Content-Type': 'application/json'}
         matrix_id = post_resp.get('matrixId', None)
         if matrix_id == None:
             raise TechnicalError('Here, invalid matrixId inside matrix POST response')
 
         # Here just expose a get to retreive matrix but you have to wait for the result to be available.
-        # It is your own waiting loop !
+        # The matrices of all the requests are polled by the matrix poller of the service
 
         get_url = self.matrix_service_url + '/' + str(matrix_id) + '?apiKey=' + str(self.apiKey)
-
-        @retry(stop_max_delay=self.timeout * 1000, wait_fixed=self.lapse_time_matrix_to_retry * 1000)
-        def _get_matrix_response(get_url):
-            matrix_resp = requests.request("GET", get_url, headers=headers)
-            if matrix_resp.status_code == 200:
-                return self._create_matrix_response(matrix_resp.json(), origins, destinations)
-            else:
-                raise TechnicalError('Here, impossible to get matrix data. Should retry')
-
-        return _get_matrix_response(get_url)
+        json_response = self.matrix_poller.wait(matrix_id, get_url, get_remaining_time(self.timeout))
+        return self._create_matrix_response(json_response, origins, destinations)
 
     def _get_street_network_routing_matrix(
         self, instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
@@ -0,0 +1,171 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+import logging
+import time
+
+import gevent
+import gevent.event
+import gevent.pool
+import pybreaker
+import requests
+
+from jormungandr.exceptions import TechnicalError
+
+# weight of the last matrix in the estimation of the time needed by HERE to compute a matrix
+COMPLETION_TIME_SMOOTHING = 0.2
+# the first poll of a matrix is done after this ratio of the estimated time
+FIRST_POLL_RATIO = 0.8
+# factor applied to the time between two polls of a matrix not computed yet
+BACKOFF_FACTOR = 1.5
+
+
+class MatrixJob(object):
+    __slots__ = ('matrix_id', 'url', 'result', 'created_at', 'next_poll_at', 'lapse_time', 'in_flight')
+
+    def __init__(self, matrix_id, url, created_at, first_lapse_time, lapse_time):
+        self.matrix_id = matrix_id
+        self.url = url
+        self.result = gevent.event.AsyncResult()
+        self.created_at = created_at
+        self.next_poll_at = created_at + first_lapse_time
+        # time before the next poll if the matrix isn't computed yet
+        self.lapse_time = lapse_time
+        # True while the matrix is being polled
+        self.in_flight = False
+
+
+class HereMatrixPoller(object):
+    """
+    Fetch the matrices computed asynchronously by HERE, for all the requests of a HERE service
+
+    Instead of each request polling its own matrix at a fixed rate, the matrices are polled by a single greenlet
+    when they are expected to be ready: the first poll is done after the time usually needed by HERE to compute a
+    matrix (learned from the previous matrices), then the time between two polls is increased until the
+    matrix is computed.
+    The polls of the matrices are done concurrently, with the pooled http client and the circuit breaker of the
+    service: a slow poll doesn't delay the polls of the other matrices.
+
+    :param http_client: pooled http client of the service
+    :param breaker: circuit breaker of the service
+    :param min_lapse_time: min time in seconds between two polls of a matrix
+    :param max_lapse_time: max time in seconds between two polls of a matrix
+    :param timeout: timeout in seconds of a poll
+    """
+
+    def __init__(self, http_client, breaker, min_lapse_time, max_lapse_time, timeout, pool_size=10):
+        self.http_client = http_client
+        self.breaker = breaker
+        self.min_lapse_time = min_lapse_time
+        self.max_lapse_time = max(min_lapse_time, max_lapse_time)
+        self.timeout = timeout
+        self.completion_time = None
+        self._jobs = {}
+        self._pool = gevent.pool.Pool(pool_size)
+        self._wakeup = gevent.event.Event()
+        self._greenlet = None
+        self.logger = logging.getLogger(__name__)
+
+    def _first_lapse_time(self):
+        # a bit before the matrix is expected to be computed
+        if self.completion_time is None:
+            return self.min_lapse_time
+        return max(self.completion_time * FIRST_POLL_RATIO, self.min_lapse_time)
+
+    def wait(self, matrix_id, url, timeout):
+        """
+        wait for the matrix computed by HERE
+        return: the json of the matrix
+        """
+        job = MatrixJob(matrix_id, url, time.time(), self._first_lapse_time(), self.min_lapse_time)
+        self._jobs[matrix_id] = job
+        if self._greenlet is None or self._greenlet.dead:
+            self._greenlet = gevent.spawn(self._run)
+        self._wakeup.set()
+        try:
+            return job.result.get(timeout=timeout)
+        except gevent.Timeout:
+            raise TechnicalError('Here, impossible to get matrix data, timeout reached')
+        finally:
+            self._jobs.pop(matrix_id, None)
+
+    def _run(self):
+        while self._jobs:
+            self._wakeup.clear()
+            now = time.time()
+            waiting_jobs = [job for job in self._jobs.values() if not job.in_flight]
+            due_jobs = [job for job in waiting_jobs if job.next_poll_at <= now]
+            if due_jobs:
+                for job in due_jobs:
+                    job.in_flight = True
+                    self._pool.spawn(self._poll, job)
+                continue
+            # a new job, or the end of a poll, wakes the poller up
+            timeout = min(job.next_poll_at for job in waiting_jobs) - now if waiting_jobs else None
+            self._wakeup.wait(timeout=timeout)
+
+    def _poll(self, job):
+        try:
+            self._do_poll(job)
+        finally:
+            job.in_flight = False
+            self._wakeup.set()
+
+    def _do_poll(self, job):
+        headers = {'Content-Type': 'application/json'}
+        try:
+            response = self.breaker.call(self.http_client.get, job.url, headers=headers, timeout=self.timeout)
+        except pybreaker.CircuitBreakerError:
+            self._jobs.pop(job.matrix_id, None)
+            job.result.set_exception(TechnicalError('HERE service not available'))
+            return
+        except requests.RequestException as e:
+            self.logger.warning('Here, error while polling matrix %s: %s', job.matrix_id, e)
+            response = None
+
+        if response is not None and response.status_code == 200:
+            self._jobs.pop(job.matrix_id, None)
+            self._update_completion_time(time.time() - job.created_at)
+            try:
+                job.result.set(response.json())
+            except ValueError:
+                job.result.set_exception(TechnicalError('Here, invalid matrix response'))
+            return
+
+        job.next_poll_at = time.time() + job.lapse_time
+        job.lapse_time = min(job.lapse_time * BACKOFF_FACTOR, self.max_lapse_time)
+
+    def _update_completion_time(self, completion_time):
+        if self.completion_time is None:
+            self.completion_time = completion_time
+        else:
+            self.completion_time = (
+                COMPLETION_TIME_SMOOTHING * completion_time
+                + (1 - COMPLETION_TIME_SMOOTHING) * self.completion_time
+            )
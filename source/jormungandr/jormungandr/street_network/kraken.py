@@ -51,6 +51,9 @@ from jormungandr.fallback_modes import FallbackModes
 
 
 class Kraken(AbstractStreetNetworkService):
+    # one row by origin
+    handles_many_to_many_matrix = True
+
     def __init__(self, instance, service_url, modes=None, id=None, timeout=10, api_key=None, **kwargs):
         self.instance = instance
         self.modes = modes or []
@@ -219,13 +222,9 @@ class Kraken(AbstractStreetNetworkService):
         # TODO: reverse is not handled as so far
         speed_switcher = jormungandr.street_network.utils.make_speed_switcher(request)
 
-        # kraken can only manage 1-n request, so we reverse request if needed
-        if len(origins) > 1:
-            if len(destinations) > 1:
-                logging.getLogger(__name__).error('routing matrix error, no unique center point')
-                raise TechnicalError('routing matrix error, no unique center point')
-            else:
-                origins, destinations = destinations, origins
+        # kraken computes a row by origin, a n-1 request is reversed to be computed in a single row
+        if len(origins) > 1 and len(destinations) == 1:
+            origins, destinations = destinations, origins
 
         req = self._create_sn_routing_matrix_request(
             origins, destinations, street_network_mode, max_duration, speed_switcher, request, **kwargs
@@ -0,0 +1,292 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+"""
+Cache of the street network routing matrices, shared by the requests
+
+Thousands of /journeys start from the same stations, pois or neighbouring addresses towards the same stop
+points. The cells of the one-to-many (and many-to-one) routing matrices are cached individually so that only
+the missing targets are sent to the street network service.
+
+The places are quantized on a grid of ROUTING_MATRIX_CACHE_GRID_SIZE_M meters: two places in the same cell
+share their durations.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+from collections import namedtuple
+import hashlib
+import logging
+import math
+
+from navitiacommon import response_pb2
+from jormungandr import app, cache
+from jormungandr.caching import is_cache_enabled
+from jormungandr.lru_cache import LruCache
+from jormungandr.utils import get_pt_object_coord
+
+# length in meters of a degree of latitude
+METERS_BY_DEGREE = 111320.0
+
+# the request parameters changing the durations computed by the street network services
+_PROFILE_PARAMETERS_PREFIXES = (
+    'walking_',
+    'bike_',
+    'bicycle_type',
+    'bss_',
+    'car_',
+    'taxi_',
+    'ridesharing_',
+    'additional_time_',
+    'traveler_type',
+    'wheelchair',
+    '_asgard_max_',
+    '_car_park_duration',
+)
+
+# a cell of the matrix, max_duration is the max duration of the request which computed it: an unreached place
+# may be reached with a greater max duration
+CachedRoutingElement = namedtuple('CachedRoutingElement', ['duration', 'routing_status', 'max_duration'])
+
+
+def get_backend_name(service):
+    return getattr(service, 'sn_system_id', None) or type(service).__name__.lower()
+
+
+def get_ttl(service):
+    """
+    Time to live of the matrices computed by a street network service, 0 if they are not cached
+
+    ROUTING_MATRIX_CACHE_TTL_BY_BACKEND is looked up by the id of the service, then by its class name
+    (ex: "asgard")
+    """
+    ttl_by_backend = app.config.get(str('ROUTING_MATRIX_CACHE_TTL_BY_BACKEND'), {})
+    default_ttl = app.config.get(str('ROUTING_MATRIX_CACHE_DEFAULT_TTL_S'), 0)
+    for name in (get_backend_name(service), type(service).__name__.lower()):
+        if name in ttl_by_backend:
+            return ttl_by_backend[name]
+    return default_ttl
+
+
+def quantize(pt_object, grid_size):
+    """
+    The cell of the grid containing the pt_object
+
+    The cells are grid_size meters high, and a bit narrower than that out of the equator
+    """
+    try:
+        coord = get_pt_object_coord(pt_object)
+    except Exception:
+        return pt_object.uri
+    if grid_size <= 0:
+        return coord.lon, coord.lat
+    step = grid_size / METERS_BY_DEGREE
+    return int(math.floor(coord.lon / step)), int(math.floor(coord.lat / step))
+
+
+def make_profile(mode, request, speed):
+    return (mode, speed) + tuple(
+        sorted(
+            (k, request[k])
+            for k in request.keys()
+            if k.startswith(_PROFILE_PARAMETERS_PREFIXES) and request[k] is not None
+        )
+    )
+
+
+class RoutingMatrixCache(object):
+    """
+    Two tiers cache of the cells of the routing matrices: an in-process LRU cache in front of the shared cache
+    (redis)
+    """
+
+    def __init__(self):
+        self._local_cache = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def local_cache(self):
+        size = app.config.get(str('ROUTING_MATRIX_CACHE_LOCAL_SIZE'), 0)
+        if size <= 0:
+            return None
+        if self._local_cache is None:
+            self._local_cache = LruCache(max_size=size)
+        return self._local_cache
+
+    def make_keys(self, instance, service, mode, request, speed, center, places, center_is_origin):
+        grid_size = app.config.get(str('ROUTING_MATRIX_CACHE_GRID_SIZE_M'), 20)
+        prefix = repr(
+            (
+                instance.name,
+                type(service).__name__,
+                get_backend_name(service),
+                make_profile(mode, request, speed),
+                center_is_origin,
+                quantize(center, grid_size),
+            )
+        )
+        return [
+            'routing_matrix:{}'.format(
+                hashlib.md5('{}{}'.format(prefix, quantize(p, grid_size)).encode('utf-8')).hexdigest()
+            )
+            for p in places
+        ]
+
+    def get_many(self, keys):
+        result = {}
+        local_cache = self.local_cache
+        if local_cache is not None:
+            for key in keys:
+                cached = local_cache.get(key)
+                if cached is not None:
+                    result[key] = cached
+        missing_keys = [k for k in keys if k not in result]
+        if not missing_keys or not is_cache_enabled():
+            return result
+        try:
+            values = cache.get_many(*missing_keys)
+        except Exception as e:
+            # a dead redis should only make us slower
+            self.logger.warning('impossible to read the routing matrix cache (error: {})'.format(e))
+            return result
+        for key, value in zip(missing_keys, values):
+            if isinstance(value, CachedRoutingElement):
+                result[key] = value
+                if local_cache is not None:
+                    local_cache.set(key, value)
+        return result
+
+    def set_many(self, elements, ttl):
+        local_cache = self.local_cache
+        if local_cache is not None:
+            for key, value in elements.items():
+                local_cache.set(key, value, ttl=ttl)
+        if not is_cache_enabled():
+            return
+        try:
+            cache.set_many(elements, timeout=ttl)
+        except Exception as e:
+            self.logger.warning('impossible to write the routing matrix cache (error: {})'.format(e))
+
+    @staticmethod
+    def _to_routing_element(cached, max_duration):
+        if cached is None:
+            return None
+        if cached.routing_status == response_pb2.unreached:
+            # it may be reachable within a greater max duration
+            if cached.max_duration < max_duration:
+                return None
+            return cached.duration, cached.routing_status
+        if cached.routing_status == response_pb2.reached and cached.duration > max_duration:
+            return cached.duration, response_pb2.unreached
+        return cached.duration, cached.routing_status
+
+    def get_street_network_routing_matrix(
+        self, service, instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
+    ):
+        """
+        Same as service.get_street_network_routing_matrix, only the cells missing in the cache are computed
+        by the service
+
+        The kwargs are the speeds by mode (see make_speed_switcher)
+        """
+        ttl = get_ttl(service)
+        if ttl <= 0 or (len(origins) != 1 and len(destinations) != 1):
+            return service.get_street_network_routing_matrix(
+                instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
+            )
+
+        center_is_origin = len(origins) == 1
+        center, places = (origins[0], destinations) if center_is_origin else (destinations[0], origins)
+        keys = self.make_keys(
+            instance, service, mode, request, kwargs.get(mode), center, places, center_is_origin
+        )
+        cached = self.get_many(keys)
+        elements = [self._to_routing_element(cached.get(k), max_duration) for k in keys]
+        missing = [i for i, e in enumerate(elements) if e is None]
+        self.logger.debug(
+            'routing matrix cache of %s by %s: %s hits, %s misses',
+            get_backend_name(service),
+            mode,
+            len(places) - len(missing),
+            len(missing),
+        )
+
+        if missing:
+            missing_places = [places[i] for i in missing]
+            if center_is_origin:
+                origins_to_compute, destinations_to_compute = [center], missing_places
+            else:
+                origins_to_compute, destinations_to_compute = missing_places, [center]
+            sn_routing_matrix = service.get_street_network_routing_matrix(
+                instance,
+                origins_to_compute,
+                destinations_to_compute,
+                mode,
+                max_duration,
+                request,
+                request_id,
+                **kwargs
+            )
+            computed = self._store(sn_routing_matrix, keys, missing, max_duration, ttl)
+            if len(missing) == len(places):
+                return sn_routing_matrix
+            for i, element in zip(missing, computed):
+                elements[i] = element
+
+        result = response_pb2.StreetNetworkRoutingMatrix()
+        row = result.rows.add()
+        for element in elements:
+            # a place not computed by the service (an error occurred) has its duration estimated by the caller
+            duration, routing_status = element or (-1, response_pb2.unknown)
+            row.routing_response.add(duration=duration, routing_status=routing_status)
+        return result
+
+    def _store(self, sn_routing_matrix, keys, indexes, max_duration, ttl):
+        """
+        Cache the computed cells, the routing_responses being in the same order than the places `indexes`
+
+        :return: the (duration, routing_status) of the places, None for the places not computed
+        """
+        if (
+            not sn_routing_matrix
+            or not len(sn_routing_matrix.rows)
+            or len(sn_routing_matrix.rows[0].routing_response) != len(indexes)
+        ):
+            return [None] * len(indexes)
+        computed = []
+        to_cache = {}
+        for i, r in zip(indexes, sn_routing_matrix.rows[0].routing_response):
+            computed.append((r.duration, r.routing_status))
+            # the unknown status comes from errors of the services, it is not worth keeping
+            if r.routing_status in (response_pb2.reached, response_pb2.unreached):
+                to_cache[keys[i]] = CachedRoutingElement(r.duration, r.routing_status, max_duration)
+        if to_cache:
+            self.set_many(to_cache, ttl)
+        return computed
+
+
+routing_matrix_cache = RoutingMatrixCache()
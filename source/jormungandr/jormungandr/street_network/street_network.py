@@ -34,6 +34,7 @@ from jormungandr import utils, new_relic
 
 import abc
 from enum import Enum
+import gevent
 import six
 
 # Using abc.ABCMeta in a way it is compatible both with Python 2.7 and Python 3.x
@@ -56,6 +57,10 @@ StreetNetworkPathKey = namedtuple(
 
 
 class AbstractStreetNetworkService(ABC):  # type: ignore
+    # True if the service computes n-m routing matrices (one row by origin) in a single call, the others only
+    # compute 1-n and n-1 matrices (in a single row)
+    handles_many_to_many_matrix = False
+
     def get_street_network_routing_matrix(
         self, instance, origins, destinations, street_network_mode, max_duration, request, request_id, **kwargs
     ):
@@ -72,6 +77,76 @@ class AbstractStreetNetworkService(ABC):  # type: ignore
     ):
         pass
 
+    def get_many_to_many_routing_matrix(
+        self, instance, origins, destinations, street_network_mode, max_duration, request, request_id, **kwargs
+    ):
+        """
+        The durations from all the origins to all the destinations
+
+        The services not handling n-m matrices are called once by origin
+
+        :return: a list of rows (one by origin) of response_pb2.RoutingElement (one by destination), None if the
+                 matrix returned by the service is incomplete
+        """
+
+        def get_matrix(matrix_origins, matrix_destinations):
+            return self.get_street_network_routing_matrix(
+                instance,
+                matrix_origins,
+                matrix_destinations,
+                street_network_mode,
+                max_duration,
+                request,
+                request_id,
+                **kwargs
+            )
+
+        if len(origins) > 1 and len(destinations) == 1:
+            # the n-1 matrices are returned in a single row
+            matrix = get_matrix(origins, destinations)
+            if not matrix or len(matrix.rows) != 1 or len(matrix.rows[0].routing_response) != len(origins):
+                return None
+            return [[r] for r in matrix.rows[0].routing_response]
+
+        if self.handles_many_to_many_matrix or len(origins) == 1:
+            matrix = get_matrix(origins, destinations)
+            rows = [list(row.routing_response) for row in matrix.rows] if matrix else []
+            if len(rows) != len(origins) or any(len(row) != len(destinations) for row in rows):
+                return None
+            return rows
+
+        # a 1-n matrix by origin, computed concurrently
+        deadline = utils.get_deadline()
+        greenlets = [
+            gevent.spawn(
+                self._get_many_to_many_routing_matrix_with_deadline,
+                deadline,
+                instance,
+                [origin],
+                destinations,
+                street_network_mode,
+                max_duration,
+                request,
+                request_id,
+                **kwargs
+            )
+            for origin in origins
+        ]
+        try:
+            gevent.joinall(greenlets, raise_error=True)
+        finally:
+            gevent.killall(greenlets)
+        rows = []
+        for greenlet in greenlets:
+            if greenlet.value is None:
+                return None
+            rows.extend(greenlet.value)
+        return rows
+
+    def _get_many_to_many_routing_matrix_with_deadline(self, deadline, *args, **kwargs):
+        with utils.deadline_scope(deadline):
+            return self.get_many_to_many_routing_matrix(*args, **kwargs)
+
     @abc.abstractmethod
     def status(self):
         pass
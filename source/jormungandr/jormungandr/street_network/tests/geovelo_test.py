@@ -34,6 +34,7 @@ import pybreaker
 from mock import MagicMock
 from .streetnetwork_test_utils import make_pt_object, make_pt_object_with_sp_mode
 from jormungandr.utils import str_to_time_stamp, PeriodExtremity
+import gevent
 import requests_mock
 import ujson
 import pytest
@@ -216,7 +217,7 @@ def pt_object_summary_test():
     summary = Geovelo._pt_object_summary_isochrone(
         make_pt_object(type_pb2.ADDRESS, lon=1.12, lat=13.15, uri='toto')
     )
-    assert summary == [13.15, 1.12, None]
+    assert summary == [13.15, 1.12, 'toto']
 
 
 def make_data_test():
@@ -228,7 +229,7 @@ def make_data_test():
     data = Geovelo._make_request_arguments_isochrone(origins, destinations)
     assert ujson.loads(ujson.dumps(data)) == ujson.loads(
         '''{
-            "starts": [[48.2, 2.0, null]], "ends": [[48.3, 3.0, null], [48.4, 4.0, null]],
+            "starts": [[48.2, 2.0, "refStart1"]], "ends": [[48.3, 3.0, "refEnd1"], [48.4, 4.0, "refEnd2"]],
             "transportMode": "BIKE",
             "bikeDetails": {"profile": "MEDIAN", "averageSpeed": 12, "bikeType": "TRADITIONAL"}}'''
     )
@@ -252,13 +253,22 @@ def call_geovelo_func_with_unknown_exception_test():
         geovelo._call_geovelo(geovelo.service_url)
 
 
-def get_matrix_test():
+def get_routing_elements_test():
+    origins = [make_pt_object(type_pb2.ADDRESS, lon=2, lat=48.2, uri='refStart1')]
+    destinations = [
+        make_pt_object(type_pb2.ADDRESS, lon=3, lat=48.3, uri='refEnd1'),
+        make_pt_object(type_pb2.ADDRESS, lon=4, lat=48.4, uri='refEnd2'),
+    ]
     resp_json = isochrone_response_valid()
-    matrix = Geovelo._get_matrix(resp_json)
-    assert matrix.rows[0].routing_response[0].duration == 1051
-    assert matrix.rows[0].routing_response[0].routing_status == response_pb2.reached
-    assert matrix.rows[0].routing_response[1].duration == 1656
-    assert matrix.rows[0].routing_response[1].routing_status == response_pb2.reached
+    # the durations are mapped by their references, whatever their order
+    resp_json[1:] = reversed(resp_json[1:])
+    assert Geovelo._get_routing_elements(resp_json, origins, destinations) == [
+        (1051, response_pb2.reached),
+        (1656, response_pb2.reached),
+    ]
+
+    with pytest.raises(jormungandr.exceptions.UnableToParse):
+        Geovelo._get_routing_elements(resp_json[:2], origins, destinations)
 
 
 def direct_path_geovelo_test():
@@ -374,6 +384,110 @@ def isochrone_geovelo_test():
         assert geovelo_response.rows[0].routing_response[1].routing_status == response_pb2.reached
 
 
+def m2m_response(request, context):
+    """
+    the duration from a start to an end is the longitude of the start * 100 + the longitude of the end
+    """
+    data = ujson.loads(request.body)
+    resp = [["start_reference", "end_reference", "duration"]]
+    for start in data['starts']:
+        for end in data['ends']:
+            resp.append([start[2], end[2], int(start[1] * 100 + end[1])])
+    return resp
+
+
+def many_to_many_matrix_test():
+    instance = MagicMock()
+    geovelo = Geovelo(instance=instance, service_url='http://bob.com', max_matrix_size=4)
+    origins = [make_pt_object(type_pb2.ADDRESS, lon=o, lat=48, uri='o{}'.format(o)) for o in range(1, 4)]
+    destinations = [make_pt_object(type_pb2.ADDRESS, lon=d, lat=48, uri='d{}'.format(d)) for d in range(1, 3)]
+
+    with requests_mock.Mocker() as req:
+        req.post('http://bob.com/api/v2/routes_m2m', json=m2m_response, status_code=200)
+        matrix = geovelo.get_street_network_routing_matrix(
+            instance, origins, destinations, 'bike', 13371337, MOCKED_REQUEST, None
+        )
+        # 2 origins with all the destinations, then the last origin
+        assert req.call_count == 2
+
+    assert [[r.duration for r in row.routing_response] for row in matrix.rows] == [
+        [101, 102],
+        [201, 202],
+        [301, 302],
+    ]
+    assert all(r.routing_status == response_pb2.reached for row in matrix.rows for r in row.routing_response)
+
+
+def one_to_many_matrix_split_test():
+    instance = MagicMock()
+    geovelo = Geovelo(instance=instance, service_url='http://bob.com', max_matrix_size=2)
+    origins = [make_pt_object(type_pb2.ADDRESS, lon=1, lat=48, uri='o1')]
+    destinations = [make_pt_object(type_pb2.ADDRESS, lon=d, lat=48, uri='d{}'.format(d)) for d in range(1, 6)]
+
+    with requests_mock.Mocker() as req:
+        req.post('http://bob.com/api/v2/routes_m2m', json=m2m_response, status_code=200)
+        matrix = geovelo.get_street_network_routing_matrix(
+            instance, origins, destinations, 'bike', 13371337, MOCKED_REQUEST, None
+        )
+        assert req.call_count == 3
+
+    assert len(matrix.rows) == 1
+    assert [r.duration for r in matrix.rows[0].routing_response] == [101, 102, 103, 104, 105]
+
+
+def many_to_one_matrix_test():
+    instance = MagicMock()
+    geovelo = Geovelo(instance=instance, service_url='http://bob.com', max_matrix_size=2)
+    origins = [make_pt_object(type_pb2.ADDRESS, lon=o, lat=48, uri='o{}'.format(o)) for o in range(1, 4)]
+    destinations = [make_pt_object(type_pb2.ADDRESS, lon=1, lat=48, uri='d1')]
+
+    with requests_mock.Mocker() as req:
+        req.post('http://bob.com/api/v2/routes_m2m', json=m2m_response, status_code=200)
+        matrix = geovelo.get_street_network_routing_matrix(
+            instance, origins, destinations, 'bike', 13371337, MOCKED_REQUEST, None
+        )
+
+    # the n-1 matrices are returned in a single row
+    assert len(matrix.rows) == 1
+    assert [r.duration for r in matrix.rows[0].routing_response] == [101, 201, 301]
+
+
+def failing_matrix_chunk_test():
+    instance = MagicMock()
+    geovelo = Geovelo(instance=instance, service_url='http://bob.com', max_matrix_size=1)
+    origins = [make_pt_object(type_pb2.ADDRESS, lon=o, lat=48, uri='o{}'.format(o)) for o in range(1, 4)]
+    destinations = [make_pt_object(type_pb2.ADDRESS, lon=1, lat=48, uri='d1')]
+    computed_chunks = []
+
+    def get_matrix_chunk(deadline, chunk_origins, chunk_destinations, bike_speed):
+        if chunk_origins[0].uri == 'o1':
+            raise jormungandr.exceptions.UnableToParse('Geovelo nb response != nb requested')
+        gevent.sleep(1)
+        computed_chunks.append(chunk_origins[0].uri)
+        return [(100, response_pb2.reached)]
+
+    geovelo._get_matrix_chunk = get_matrix_chunk
+    with pytest.raises(jormungandr.exceptions.UnableToParse):
+        geovelo.get_street_network_routing_matrix(
+            instance, origins, destinations, 'bike', 13371337, MOCKED_REQUEST, None
+        )
+    # the other chunks are killed
+    gevent.sleep(1.1)
+    assert computed_chunks == []
+
+
+def split_matrix_test():
+    geovelo = Geovelo(instance=None, service_url='http://bob.com', max_matrix_size=4)
+    assert geovelo._split_matrix(1, 3) == [((0, 1), (0, 3))]
+    assert geovelo._split_matrix(5, 2) == [((0, 2), (0, 2)), ((2, 4), (0, 2)), ((4, 5), (0, 2))]
+    assert geovelo._split_matrix(2, 5) == [
+        ((0, 1), (0, 4)),
+        ((0, 1), (4, 5)),
+        ((1, 2), (0, 4)),
+        ((1, 2), (4, 5)),
+    ]
+
+
 def distances_durations_test():
     """
     Check that the response from geovelo is correctly formatted with 'distances' and 'durations' sections
@@ -420,7 +534,7 @@ def status_test():
         timeout=56,
     )
     status = geovelo.status()
-    assert len(status) == 5
+    assert len(status) == 6
     assert status['id'] == u'tata-é$~#@"*!\'`§èû'
     assert status['class'] == "Geovelo"
     assert status['modes'] == ["walking", "bike", "car"]
@@ -0,0 +1,143 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import gevent
+import pybreaker
+import pytest
+import requests
+
+from jormungandr.exceptions import TechnicalError
+from jormungandr.street_network.here_matrix_poller import HereMatrixPoller
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, json=None):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+
+class FakeHttpClient(object):
+    """
+    The matrix of the url 'matrix_<n>' is computed after <n> polls
+    """
+
+    def __init__(self):
+        self.polls = []
+
+    def get(self, url, **kwargs):
+        self.polls.append(url)
+        if self.polls.count(url) >= int(url.split('_')[1]):
+            return FakeResponse(200, {'matrix': url})
+        return FakeResponse(202)
+
+
+def make_poller(http_client):
+    return HereMatrixPoller(
+        http_client, pybreaker.CircuitBreaker(), min_lapse_time=0.01, max_lapse_time=0.02, timeout=1
+    )
+
+
+def concurrent_matrices_test():
+    http_client = FakeHttpClient()
+    poller = make_poller(http_client)
+
+    jobs = [gevent.spawn(poller.wait, n, 'matrix_{}'.format(n), 1) for n in (1, 3)]
+    gevent.joinall(jobs, raise_error=True)
+
+    assert [job.value for job in jobs] == [{'matrix': 'matrix_1'}, {'matrix': 'matrix_3'}]
+    assert http_client.polls.count('matrix_1') == 1
+    assert http_client.polls.count('matrix_3') == 3
+    assert not poller._jobs
+
+
+def completion_time_learned_test():
+    poller = make_poller(FakeHttpClient())
+    assert poller.completion_time is None
+
+    poller.wait(1, 'matrix_1', 1)
+    assert poller.completion_time >= 0.01
+    assert poller._first_lapse_time() >= 0.01
+
+
+def matrix_timeout_test():
+    poller = make_poller(FakeHttpClient())
+    with pytest.raises(TechnicalError):
+        poller.wait(1, 'matrix_1000', 0.05)
+    assert not poller._jobs
+
+
+def poll_errors_retried_test():
+    class FailingOnceHttpClient(FakeHttpClient):
+        def get(self, url, **kwargs):
+            if not self.polls:
+                self.polls.append(url)
+                raise requests.Timeout()
+            return super(FailingOnceHttpClient, self).get(url, **kwargs)
+
+    poller = make_poller(FailingOnceHttpClient())
+    assert poller.wait(1, 'matrix_2', 1) == {'matrix': 'matrix_2'}
+
+
+def circuit_breaker_open_test():
+    class DeadHttpClient(object):
+        def get(self, url, **kwargs):
+            raise requests.ConnectionError()
+
+    poller = HereMatrixPoller(
+        DeadHttpClient(),
+        pybreaker.CircuitBreaker(fail_max=1),
+        min_lapse_time=0.01,
+        max_lapse_time=0.02,
+        timeout=1,
+    )
+    with pytest.raises(TechnicalError):
+        poller.wait(1, 'matrix_1', 1)
+
+
+def slow_poll_not_blocking_test():
+    class SlowHttpClient(FakeHttpClient):
+        def get(self, url, **kwargs):
+            if url == 'slow_1':
+                gevent.sleep(0.5)
+            return super(SlowHttpClient, self).get(url, **kwargs)
+
+    http_client = SlowHttpClient()
+    poller = make_poller(http_client)
+
+    slow_job = gevent.spawn(poller.wait, 1, 'slow_1', 1)
+    gevent.sleep(0)
+    # the matrix is polled several times while the slow one is polled
+    assert poller.wait(3, 'matrix_3', 0.3) == {'matrix': 'matrix_3'}
+    assert not slow_job.ready()
+    assert slow_job.get() == {'matrix': 'slow_1'}
+    assert http_client.polls.count('slow_1') == 1
@@ -407,13 +407,14 @@ def status_test():
         timeout=89,
     )
     status = here.status()
-    assert len(status) == 8
+    assert len(status) == 9
     assert status['id'] == u'tata-é$~#@"*!\'`§èû'
     assert status['class'] == "Here"
     assert status['modes'] == ["walking", "bike", "car"]
     assert status['timeout'] == 89
     assert status['max_matrix_points'] == 100
     assert status['lapse_time_matrix_to_retry'] == 0.1
+    assert status['max_lapse_time_matrix_to_retry'] == 1
     assert status['language'] == "en-gb"
     assert len(status['circuit_breaker']) == 3
     assert status['circuit_breaker']['current_state'] == 'closed'
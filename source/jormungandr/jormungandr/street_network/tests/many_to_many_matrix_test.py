@@ -0,0 +1,127 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr.street_network.asgard import Asgard
+from jormungandr.street_network.kraken import Kraken
+from jormungandr.street_network.street_network import AbstractStreetNetworkService
+from jormungandr.street_network.tests.streetnetwork_test_utils import make_pt_object
+
+
+class FakeInstance(object):
+    name = 'bob'
+
+
+class FakeStreetNetworkService(AbstractStreetNetworkService):
+    """
+    The duration between two places is the sum of their longitudes
+
+    Like kraken, the n-1 matrices are returned in a single row
+    """
+
+    def __init__(self, handles_many_to_many_matrix):
+        self.handles_many_to_many_matrix = handles_many_to_many_matrix
+        self.calls = []
+
+    def _get_street_network_routing_matrix(
+        self, instance, origins, destinations, street_network_mode, max_duration, request, request_id, **kwargs
+    ):
+        self.calls.append((len(origins), len(destinations)))
+        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+        if len(destinations) == 1:
+            row = sn_routing_matrix.rows.add()
+            for o in origins:
+                row.routing_response.add(
+                    duration=int(o.address.coord.lon + destinations[0].address.coord.lon),
+                    routing_status=response_pb2.reached,
+                )
+            return sn_routing_matrix
+        for o in origins:
+            row = sn_routing_matrix.rows.add()
+            for d in destinations:
+                row.routing_response.add(
+                    duration=int(o.address.coord.lon + d.address.coord.lon), routing_status=response_pb2.reached
+                )
+        return sn_routing_matrix
+
+    def status(self):
+        return None
+
+    def _direct_path(self, *args, **kwargs):
+        return None
+
+    def make_path_key(self, mode, orig_uri, dest_uri, streetnetwork_path_type, period_extremity):
+        return None
+
+
+def make_places(*lons):
+    return [make_pt_object(type_pb2.ADDRESS, lon, 1.0, 'place:{}'.format(lon)) for lon in lons]
+
+
+def get_durations(service, origins, destinations):
+    rows = service.get_many_to_many_routing_matrix(
+        FakeInstance(), origins, destinations, 'walking', 3600, {}, 'request_id'
+    )
+    if rows is None:
+        return None
+    return [[r.duration for r in row] for row in rows]
+
+
+def many_to_many_in_a_single_call_test():
+    service = FakeStreetNetworkService(handles_many_to_many_matrix=True)
+    assert get_durations(service, make_places(1, 2), make_places(10, 20, 30)) == [[11, 21, 31], [12, 22, 32]]
+    assert service.calls == [(2, 3)]
+
+
+def many_to_many_by_origin_test():
+    service = FakeStreetNetworkService(handles_many_to_many_matrix=False)
+    assert get_durations(service, make_places(1, 2), make_places(10, 20, 30)) == [[11, 21, 31], [12, 22, 32]]
+    assert service.calls == [(1, 3), (1, 3)]
+
+
+def many_to_one_test():
+    service = FakeStreetNetworkService(handles_many_to_many_matrix=True)
+    assert get_durations(service, make_places(1, 2, 3), make_places(10)) == [[11], [12], [13]]
+    assert service.calls == [(3, 1)]
+
+
+def incomplete_matrix_test():
+    service = FakeStreetNetworkService(handles_many_to_many_matrix=True)
+    service._get_street_network_routing_matrix = (
+        lambda *args, **kwargs: response_pb2.StreetNetworkRoutingMatrix()
+    )
+    assert get_durations(service, make_places(1, 2), make_places(10, 20)) is None
+
+
+def handles_many_to_many_matrix_by_service_test():
+    # kraken computes one row by origin, asgard is only asked for 1-n and n-1 matrices
+    assert Kraken.handles_many_to_many_matrix
+    assert not Asgard.handles_many_to_many_matrix
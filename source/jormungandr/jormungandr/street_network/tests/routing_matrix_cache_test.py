@@ -0,0 +1,209 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+from navitiacommon import type_pb2, response_pb2
+
+from jormungandr import app
+from jormungandr.street_network.routing_matrix_cache import RoutingMatrixCache, quantize
+from jormungandr.street_network.tests.streetnetwork_test_utils import make_pt_object
+
+
+class FakeInstance(object):
+    name = 'bob'
+
+
+class FakeStreetNetworkService(object):
+    """
+    The duration to a place is its longitude * 1000, the places whose latitude is 0 are unreached
+    """
+
+    sn_system_id = 'asgard'
+
+    def __init__(self):
+        self.calls = []
+
+    def get_street_network_routing_matrix(
+        self, instance, origins, destinations, mode, max_duration, request, request_id, **kwargs
+    ):
+        self.calls.append((origins, destinations))
+        places = destinations if len(origins) == 1 else origins
+        sn_routing_matrix = response_pb2.StreetNetworkRoutingMatrix()
+        row = sn_routing_matrix.rows.add()
+        for p in places:
+            if p.stop_point.coord.lat == 0:
+                row.routing_response.add(duration=-1, routing_status=response_pb2.unreached)
+            else:
+                row.routing_response.add(
+                    duration=int(p.stop_point.coord.lon * 1000), routing_status=response_pb2.reached
+                )
+        return sn_routing_matrix
+
+
+@pytest.fixture
+def config(mocker):
+    mocker.patch.dict(
+        app.config,
+        {
+            'CACHE_CONFIGURATION': {},
+            'ROUTING_MATRIX_CACHE_TTL_BY_BACKEND': {'asgard': 60},
+            'ROUTING_MATRIX_CACHE_DEFAULT_TTL_S': 0,
+            'ROUTING_MATRIX_CACHE_GRID_SIZE_M': 20,
+            'ROUTING_MATRIX_CACHE_LOCAL_SIZE': 100,
+        },
+    )
+
+
+def make_stop_point(lon, lat=1.0):
+    return make_pt_object(type_pb2.STOP_POINT, lon, lat, uri='stop_point:{}'.format(lon))
+
+
+def get_durations(cache, service, origins, destinations, max_duration=1000, request=None):
+    matrix = cache.get_street_network_routing_matrix(
+        service,
+        FakeInstance(),
+        origins,
+        destinations,
+        'walking',
+        max_duration,
+        request or {'walking_speed': 1.12},
+        'request_id',
+        walking=1.12,
+    )
+    return [(r.duration, r.routing_status) for r in matrix.rows[0].routing_response]
+
+
+def quantize_test():
+    a = make_pt_object(type_pb2.ADDRESS, 2.3522, 48.8566)
+    b = make_pt_object(type_pb2.ADDRESS, 2.35221, 48.85661)
+    c = make_pt_object(type_pb2.ADDRESS, 2.3532, 48.8566)
+    assert quantize(a, 20) == quantize(b, 20)
+    assert quantize(a, 20) != quantize(c, 20)
+    assert quantize(a, 0) == (2.3522, 48.8566)
+
+
+def only_the_missing_places_are_computed_test(config):
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    sp1, sp2, sp3 = make_stop_point(0.1), make_stop_point(0.2), make_stop_point(0.3)
+
+    assert get_durations(cache, service, [center], [sp1, sp2]) == [
+        (100, response_pb2.reached),
+        (200, response_pb2.reached),
+    ]
+    assert get_durations(cache, service, [center], [sp3, sp2, sp1]) == [
+        (300, response_pb2.reached),
+        (200, response_pb2.reached),
+        (100, response_pb2.reached),
+    ]
+    assert len(service.calls) == 2
+    # only sp3 was missing
+    assert service.calls[1] == ([center], [sp3])
+
+    # a neighbour of the center shares its durations
+    neighbour = make_pt_object(type_pb2.ADDRESS, 2.00001, 48.00001)
+    assert get_durations(cache, service, [neighbour], [sp1]) == [(100, response_pb2.reached)]
+    assert len(service.calls) == 2
+
+
+def many_to_one_test(config):
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    sp1 = make_stop_point(0.1)
+
+    # with a single origin, the fake service computes the durations from the destinations
+    assert get_durations(cache, service, [sp1], [center]) == [(2000, response_pb2.reached)]
+    # the direction matters
+    assert get_durations(cache, service, [center], [sp1]) == [(100, response_pb2.reached)]
+    assert get_durations(cache, service, [sp1], [center]) == [(2000, response_pb2.reached)]
+    assert len(service.calls) == 2
+
+
+def profile_in_key_test(config):
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    sp1 = make_stop_point(0.1)
+
+    get_durations(cache, service, [center], [sp1], request={'walking_speed': 1.12})
+    get_durations(cache, service, [center], [sp1], request={'walking_speed': 1.5})
+    get_durations(cache, service, [center], [sp1], request={'walking_speed': 1.12, 'datetime': 42})
+    assert len(service.calls) == 2
+
+
+def unreached_with_greater_max_duration_test(config):
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    far = make_stop_point(0.5, lat=0)
+    sp1 = make_stop_point(0.1)
+
+    assert get_durations(cache, service, [center], [far, sp1], max_duration=600) == [
+        (-1, response_pb2.unreached),
+        (100, response_pb2.reached),
+    ]
+    # a lower max duration: everything is known
+    assert get_durations(cache, service, [center], [far, sp1], max_duration=50) == [
+        (-1, response_pb2.unreached),
+        (100, response_pb2.unreached),
+    ]
+    assert len(service.calls) == 1
+    # a greater max duration: the unreached place is computed again
+    get_durations(cache, service, [center], [far, sp1], max_duration=1200)
+    assert service.calls[1] == ([center], [far])
+
+
+def backend_without_ttl_test(config):
+    app.config['ROUTING_MATRIX_CACHE_TTL_BY_BACKEND'] = {}
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    sp1 = make_stop_point(0.1)
+
+    get_durations(cache, service, [center], [sp1])
+    get_durations(cache, service, [center], [sp1])
+    assert len(service.calls) == 2
+
+
+def failed_computation_test(config):
+    cache = RoutingMatrixCache()
+    service = FakeStreetNetworkService()
+    center = make_pt_object(type_pb2.ADDRESS, 2.0, 48.0)
+    sp1, sp2 = make_stop_point(0.1), make_stop_point(0.2)
+    get_durations(cache, service, [center], [sp1])
+
+    service.get_street_network_routing_matrix = lambda *args, **kwargs: None
+    # the places not computed are left to the caller
+    assert get_durations(cache, service, [center], [sp1, sp2]) == [
+        (100, response_pb2.reached),
+        (-1, response_pb2.unknown),
+    ]
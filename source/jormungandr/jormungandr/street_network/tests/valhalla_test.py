@@ -37,7 +37,7 @@ from navitiacommon import type_pb2, response_pb2
 import pybreaker
 from mock import MagicMock
 from .streetnetwork_test_utils import make_pt_object
-from jormungandr.utils import str_to_time_stamp, PeriodExtremity
+from jormungandr.utils import str_to_time_stamp, PeriodExtremity, request_budget
 import requests_mock
 import json
 
@@ -296,6 +296,21 @@ def call_valhalla_func_with_circuit_breaker_error_test():
     assert valhalla._call_valhalla(valhalla.service_url) == None
 
 
+def call_valhalla_func_with_request_budget_test():
+    instance = MagicMock()
+    valhalla = Valhalla(
+        instance=instance, service_url='http://bob.com', costing_options={'bib': 'bom'}, timeout=10
+    )
+    valhalla.breaker = MagicMock()
+    with request_budget(0.5):
+        valhalla._call_valhalla(valhalla.service_url)
+    # the timeout of the call is bounded by what remains of the budget of the request
+    assert valhalla.breaker.call.call_args[1]['timeout'] <= 0.5
+
+    valhalla._call_valhalla(valhalla.service_url)
+    assert valhalla.breaker.call.call_args[1]['timeout'] == 10
+
+
 def call_valhalla_func_with_unknown_exception_test():
     instance = MagicMock()
     valhalla = Valhalla(instance=instance, service_url='http://bob.com', costing_options={'bib': 'bom'})
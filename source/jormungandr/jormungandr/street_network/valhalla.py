@@ -35,13 +35,20 @@ import requests as requests
 from jormungandr import app
 import json
 from jormungandr.exceptions import TechnicalError, InvalidArguments, ApiNotFound
-from jormungandr.utils import is_url, kilometers_to_meters, get_pt_object_coord, decode_polyline
+from jormungandr.utils import (
+    is_url,
+    kilometers_to_meters,
+    get_pt_object_coord,
+    decode_polyline,
+    get_remaining_time,
+)
 from copy import deepcopy
 from jormungandr.street_network.street_network import (
     AbstractStreetNetworkService,
     StreetNetworkPathKey,
     StreetNetworkPathType,
 )
+from jormungandr.http_client import get_http_client
 import six
 
 
@@ -68,6 +75,7 @@ class Valhalla(AbstractStreetNetworkService):
         self.costing_options = kwargs.get('costing_options', None)
         # kilometres is default units
         self.directions_options = {'units': 'kilometers'}
+        self.http_client = get_http_client('valhalla')
         self.breaker = pybreaker.CircuitBreaker(
             fail_max=app.config['CIRCUIT_BREAKER_MAX_VALHALLA_FAIL'],
             reset_timeout=app.config['CIRCUIT_BREAKER_VALHALLA_TIMEOUT_S'],
@@ -90,14 +98,17 @@ class Valhalla(AbstractStreetNetworkService):
             },
         }
 
-    def _call_valhalla(self, url, method=requests.post, data=None):
+    def _call_valhalla(self, url, method=None, data=None):
+        method = method or self.http_client.post
         logging.getLogger(__name__).debug('Valhalla routing service , call url : {}'.format(url))
         logging.getLogger(__name__).debug('data : {}'.format(data))
         headers = {}
         if self.api_key:
             headers['api_key'] = self.api_key
         try:
-            return self.breaker.call(method, url, timeout=self.timeout, data=data, headers=headers)
+            return self.breaker.call(
+                method, url, timeout=get_remaining_time(self.timeout), data=data, headers=headers
+            )
         except pybreaker.CircuitBreakerError as e:
             logging.getLogger(__name__).error('Valhalla routing service dead (error: {})'.format(e))
             self.record_external_failure('circuit breaker open')
@@ -297,7 +308,7 @@ class Valhalla(AbstractStreetNetworkService):
         data = self._make_request_arguments(
             mode, [pt_object_origin], [pt_object_destination], request, api='route'
         )
-        r = self._call_valhalla('{}/{}'.format(self.service_url, 'route'), requests.post, data)
+        r = self._call_valhalla('{}/{}'.format(self.service_url, 'route'), self.http_client.post, data)
         if r is not None and r.status_code == 400 and r.json()['error_code'] == 442:
             # error_code == 442 => No path could be found for input
             resp = response_pb2.Response()
@@ -345,7 +356,9 @@ class Valhalla(AbstractStreetNetworkService):
                 raise TechnicalError('routing matrix error, no unique center point')
 
         data = self._make_request_arguments(mode, origins, destinations, request, api='sources_to_targets')
-        r = self._call_valhalla('{}/{}'.format(self.service_url, 'sources_to_targets'), requests.post, data)
+        r = self._call_valhalla(
+            '{}/{}'.format(self.service_url, 'sources_to_targets'), self.http_client.post, data
+        )
         self._check_response(r)
         resp_json = r.json()
         return self._get_matrix(resp_json, mode_park_cost=self.mode_park_cost.get(mode))
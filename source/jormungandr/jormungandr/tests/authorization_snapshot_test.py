@@ -0,0 +1,208 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import datetime
+import threading
+import pytest
+from navitiacommon.models import User, EndPoint
+
+from jormungandr import app
+from jormungandr.authorization_snapshot import AuthorizationSnapshot
+
+NOW = datetime.datetime(2022, 3, 1, 10, 0)
+
+
+def make_user(user_id, login, user_type):
+    user = User(login=login, email='{}@example.com'.format(login))
+    user.id = user_id
+    user.type = user_type
+    user.end_point = EndPoint(name='navitia.io')
+    return user
+
+
+INSTANCES = [(1, 'fr-idf', False, 'kraken'), (2, 'fr-bre', True, 'bragi'), (3, 'fr-nw', False, 'bragi')]
+APIS = [(1, 'ALL'), (2, 'journeys')]
+
+
+@pytest.fixture
+def snapshot(mocker):
+    mocker.patch.dict(
+        app.config,
+        {
+            'AUTHORIZATION_SNAPSHOT': True,
+            'PUBLIC': False,
+            'DISABLE_DATABASE': False,
+            'AUTHORIZATION_SNAPSHOT_BROKER_URL': None,
+        },
+    )
+    snapshot = AuthorizationSnapshot()
+    users = [
+        make_user(1, 'bob', 'with_free_instances'),
+        make_user(2, 'bobette', 'super_user'),
+        make_user(3, 'bobitto', 'without_free_instances'),
+    ]
+    keys = [('bob-key', 1, None), ('bob-old-key', 1, datetime.date(2022, 3, 1)), ('bobitto-key', 3, None)]
+    authorizations = [(1, 1, 1), (3, 3, 2)]
+    mocker.patch.object(snapshot, '_query_instances', return_value=INSTANCES)
+    mocker.patch.object(snapshot, '_query_apis', return_value=APIS)
+    mocker.patch.object(snapshot, '_query_users', return_value=users)
+    mocker.patch.object(snapshot, '_query_keys', return_value=keys)
+    mocker.patch.object(snapshot, '_query_authorizations', return_value=authorizations)
+    return snapshot
+
+
+def refresh(snapshot):
+    """
+    start the refresh of the snapshot and wait for it
+    """
+    snapshot.update()
+    if snapshot._refresh_thread is not None:
+        snapshot._refresh_thread.join()
+    return snapshot._tables is not None
+
+
+def get_user_test(snapshot):
+    assert snapshot.is_enabled()
+    assert refresh(snapshot)
+
+    assert snapshot.get_user('bob-key', NOW).login == 'bob'
+    assert snapshot.get_user('bobitto-key', NOW).login == 'bobitto'
+    # the key is valid until the day before its valid_until
+    assert snapshot.get_user('bob-old-key', NOW) is None
+    assert snapshot.get_user('bob-old-key', NOW - datetime.timedelta(days=1)).login == 'bob'
+    assert snapshot.get_user('unknown-key', NOW) is None
+
+
+def has_access_test(snapshot):
+    refresh(snapshot)
+    bob = snapshot.get_user('bob-key', NOW)
+    bobitto = snapshot.get_user('bobitto-key', NOW)
+    idf, nw = snapshot.get_instance('fr-idf'), snapshot.get_instance('fr-nw')
+    assert snapshot.get_instance('fr-sw') is None
+
+    assert snapshot.has_access(bob, idf, 'ALL')
+    assert not snapshot.has_access(bob, idf, 'journeys')
+    assert not snapshot.has_access(bob, nw, 'ALL')
+    assert snapshot.has_access(bobitto, nw, 'journeys')
+    assert not snapshot.has_access(bobitto, nw, 'unknown_api')
+    bobette = snapshot._tables.users[2]
+    assert snapshot.has_access(bobette, nw, 'ALL')
+
+
+def get_all_available_instances_names_test(snapshot):
+    refresh(snapshot)
+    bob = snapshot.get_user('bob-key', NOW)
+    bobitto = snapshot.get_user('bobitto-key', NOW)
+    bobette = snapshot._tables.users[2]
+
+    assert sorted(snapshot.get_all_available_instances_names(bob)) == ['fr-bre', 'fr-idf']
+    assert snapshot.get_all_available_instances_names(bob, exclude_backend='kraken') == ['fr-bre']
+    assert snapshot.get_all_available_instances_names(bobitto) == ['fr-nw']
+    assert sorted(snapshot.get_all_available_instances_names(bobette)) == ['fr-bre', 'fr-idf', 'fr-nw']
+
+
+def user_events_test(snapshot, mocker):
+    refresh(snapshot)
+    assert snapshot._query_users.call_count == 1
+
+    # bob is renamed and gets access to fr-nw, bobitto is deleted
+    bobby = make_user(1, 'bobby', 'with_free_instances')
+    snapshot._query_users.side_effect = lambda end_point, logins: [bobby] if 'bobby' in logins else []
+    snapshot._query_keys.return_value = [('bob-key', 1, None)]
+    snapshot._query_authorizations.return_value = [(1, 3, 1)]
+    update_bob = {
+        'event': 'update_user',
+        'data': {'username': 'bobby', 'last_username': 'bob', 'origin': {'name': 'navitia.io'}},
+    }
+    delete_bobitto = {'event': 'delete_user', 'data': {'username': 'bobitto', 'origin': {'name': 'navitia.io'}}}
+    snapshot.on_event(update_bob)
+    snapshot.on_event(delete_bobitto)
+    assert refresh(snapshot)
+
+    bob = snapshot.get_user('bob-key', NOW)
+    assert bob is bobby
+    assert snapshot.has_access(bob, snapshot.get_instance('fr-nw'), 'ALL')
+    assert not snapshot.has_access(bob, snapshot.get_instance('fr-idf'), 'ALL')
+    # the keys that are not valid anymore are removed with the outdated users
+    assert snapshot.get_user('bob-old-key', NOW - datetime.timedelta(days=1)) is None
+    assert snapshot.get_user('bobitto-key', NOW) is None
+    assert snapshot.get_user('bob-key', NOW) is bobby
+
+
+def end_point_events_test(snapshot):
+    refresh(snapshot)
+    snapshot.on_event({'event': 'update_end_point', 'data': {'name': 'navitia.io', 'last_name': 'navitia'}})
+    refresh(snapshot)
+    assert snapshot._query_users.call_count == 2
+
+
+def load_failure_test(snapshot):
+    snapshot._query_instances.side_effect = Exception('no database')
+    assert not refresh(snapshot)
+
+    # the previous snapshot is kept if a reload fails
+    snapshot._query_instances.side_effect = None
+    snapshot._reload_needed = True
+    assert refresh(snapshot)
+    snapshot._query_instances.side_effect = Exception('no database')
+    snapshot._reload_needed = True
+    assert refresh(snapshot)
+    assert snapshot.get_user('bob-key', NOW).login == 'bob'
+
+
+def refreshed_in_background_test(snapshot):
+    loading = threading.Event()
+    loaded = threading.Event()
+
+    def query_instances():
+        loading.set()
+        loaded.wait(5)
+        return INSTANCES[: 3 if snapshot._tables is None else 1]
+
+    snapshot._query_instances.side_effect = query_instances
+    # the requests don't wait for the first load
+    assert not snapshot.update()
+    assert loading.wait(5)
+    assert not snapshot.update()
+    loaded.set()
+    snapshot._refresh_thread.join()
+    assert snapshot.update()
+
+    # the requests use the current snapshot while it is reloaded
+    loading.clear()
+    loaded.clear()
+    snapshot._reload_needed = True
+    assert snapshot.update()
+    assert loading.wait(5)
+    assert snapshot.update()
+    assert snapshot.get_instance('fr-nw') is not None
+    loaded.set()
+    snapshot._refresh_thread.join()
+    assert snapshot.get_instance('fr-nw') is None
@@ -0,0 +1,148 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pickle
+
+import pytest
+
+from navitiacommon import type_pb2
+from jormungandr import cache_codecs
+from jormungandr.cache_codecs import CacheSerializer, CachedValue
+from jormungandr.customrediscache import CustomRedisCache
+
+
+def make_pt_object():
+    pt_object = type_pb2.PtObject()
+    pt_object.name = 'Gare de Lyon'
+    pt_object.uri = 'stop_area:gare_de_lyon'
+    pt_object.embedded_type = type_pb2.STOP_AREA
+    pt_object.stop_area.uri = 'stop_area:gare_de_lyon'
+    pt_object.stop_area.name = 'Gare de Lyon ' * 200
+    return pt_object
+
+
+def protobuf_codec_test():
+    serializer = CacheSerializer()
+    pt_object = make_pt_object()
+    dump = serializer.dumps(pt_object)
+    assert dump[:4] == b'#\x01b-'
+    assert len(dump) < len(pickle.dumps(pt_object))
+    assert serializer.loads(dump) == pt_object
+
+
+def pickle_codec_test():
+    serializer = CacheSerializer()
+    value = {'a': [1, 2, 3], 'b': ('c', None)}
+    dump = serializer.dumps(value)
+    assert dump[:4] == b'#\x01p-'
+    assert serializer.loads(dump) == value
+
+
+@pytest.mark.parametrize('compression', ['lz4', 'zstd'])
+def compression_test(compression):
+    if not cache_codecs.COMPRESSORS[compression].is_available():
+        pytest.skip('{} is not installed'.format(compression))
+    serializer = CacheSerializer(compression=compression, compression_threshold=100)
+    pt_object = make_pt_object()
+    dump = serializer.dumps(pt_object)
+    assert dump[3:4] == cache_codecs.COMPRESSORS[compression].id
+    assert len(dump) < len(CacheSerializer().dumps(pt_object))
+    assert serializer.loads(dump) == pt_object
+
+    # small values are not compressed
+    assert serializer.dumps('abc')[3:4] == cache_codecs.NO_COMPRESSION
+
+    # the values written before the activation of the compression can still be read, and vice versa
+    assert serializer.loads(CacheSerializer().dumps(pt_object)) == pt_object
+    assert CacheSerializer().loads(dump) == pt_object
+
+
+def cached_protobuf_codec_test():
+    serializer = CacheSerializer()
+    cached = CachedValue(make_pt_object(), 1234567890.5)
+    dump = serializer.dumps(cached)
+    # the protobuf wrapped in a CachedValue isn't pickled
+    assert dump[:4] == b'#\x01c-'
+    assert len(dump) < len(pickle.dumps(cached))
+    loaded = serializer.loads(dump)
+    assert isinstance(loaded, CachedValue)
+    assert loaded == cached
+
+    # the other CachedValues are pickled
+    assert serializer.dumps(CachedValue({'a': 1}, 42.0))[:4] == b'#\x01p-'
+
+
+def unknown_format_test():
+    serializer = CacheSerializer()
+    dump = serializer.dumps('abc')
+    # a value written with another version or an unknown codec is a cache miss
+    assert serializer.loads(b'#\x02' + dump[2:]) is None
+    assert serializer.loads(dump[:2] + b'x' + dump[3:]) is None
+    assert serializer.loads(dump[:3] + b'x' + dump[4:]) is None
+
+
+def unknown_compression_test():
+    with pytest.raises(ValueError):
+        CacheSerializer(compression='gzip')
+
+
+def custom_redis_cache_dump_test():
+    cache = CustomRedisCache(write_client=object(), read_client=object())
+    # integers are kept readable by redis for incr/decr
+    assert cache.dump_object(42) == b'42'
+    assert cache.load_object(b'42') == 42
+
+    pt_object = make_pt_object()
+    assert cache.load_object(cache.dump_object(pt_object)) == pt_object
+    assert cache.load_object(None) is None
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value):
+        self.values[name] = value
+
+
+def custom_redis_cache_key_namespace_test():
+    redis = FakeRedis()
+    cache = CustomRedisCache(write_client=redis, read_client=redis, key_prefix='bob:', default_timeout=0)
+    cache.set('key', ['a', 'b'])
+    # the values are written under a namespace of their format, the workers using the previous format (pickle)
+    # don't read them, and their values aren't read either
+    assert list(redis.values) == ['bob:' + cache_codecs.KEY_NAMESPACE + 'key']
+    assert cache.get('key') == ['a', 'b']
+    redis.values.clear()
+    redis.values['bob:key'] = b'!' + pickle.dumps(['c'])
+    assert cache.get('key') is None
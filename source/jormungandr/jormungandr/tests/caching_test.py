@@ -0,0 +1,196 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import time
+
+import gevent
+import pytest
+
+from jormungandr import app
+from jormungandr.caching import coalescing_memoize
+from jormungandr.exceptions import TechnicalError
+
+
+class FakeSharedCache(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+
+
+@pytest.fixture
+def shared_cache(mocker):
+    shared_cache = FakeSharedCache()
+    mocker.patch('jormungandr.caching.cache', shared_cache)
+    mocker.patch.dict(
+        app.config,
+        {
+            'CACHE_CONFIGURATION': {'CACHE_TYPE': 'redis'},
+            'LOCAL_CACHE_SIZE': 10,
+            'CACHE_STALE_WHILE_REVALIDATE_S': 0,
+            'CACHE_COALESCED_CALL_WAIT_TIMEOUT_S': 10,
+        },
+    )
+    return shared_cache
+
+
+def make_counted_function(timeout=60, stale_timeout=None, result=lambda x: x * 2, sleep=0, local_timeout=None):
+    calls = []
+
+    @coalescing_memoize(timeout, stale_timeout, local_timeout)
+    def f(x):
+        calls.append(x)
+        if sleep:
+            gevent.sleep(sleep)
+        return result(x)
+
+    return f, calls
+
+
+def coalescing_memoize_concurrent_calls_test(shared_cache):
+    f, calls = make_counted_function(sleep=0.05)
+    greenlets = [gevent.spawn(f, 21) for _ in range(10)]
+    gevent.joinall(greenlets)
+    assert [g.value for g in greenlets] == [42] * 10
+    assert calls == [21]
+
+
+def coalescing_memoize_two_tiers_test(shared_cache):
+    f, calls = make_counted_function()
+    assert f(1) == 2
+    assert len(shared_cache.values) == 1
+
+    # served by the local cache
+    shared_cache.values.clear()
+    assert f(1) == 2
+    assert calls == [1]
+
+    # another process filled the shared cache: we don't call the function either
+    g, other_calls = make_counted_function()
+    f(2)
+    assert g(2) == 4
+    assert calls == [1, 2]
+    assert other_calls == []
+
+
+def coalescing_memoize_none_not_cached_test(shared_cache):
+    f, calls = make_counted_function(result=lambda x: None)
+    assert f(1) is None
+    assert f(1) is None
+    assert calls == [1, 1]
+    assert shared_cache.values == {}
+
+
+def coalescing_memoize_exception_test(shared_cache):
+    def fail(x):
+        raise ValueError('oops')
+
+    f, calls = make_counted_function(result=fail, sleep=0.05)
+    greenlets = [gevent.spawn(f, 1) for _ in range(3)]
+    gevent.joinall(greenlets)
+    assert all(isinstance(g.exception, ValueError) for g in greenlets)
+    assert calls == [1]
+
+
+def coalescing_memoize_killed_leader_test(shared_cache):
+    f, calls = make_counted_function(sleep=1)
+    leader = gevent.spawn(f, 1)
+    gevent.sleep(0)
+    followers = [gevent.spawn(f, 1) for _ in range(3)]
+    gevent.sleep(0)
+
+    # the greenlet calling the function is killed, the greenlets waiting for it get an error right away
+    leader.kill()
+    gevent.joinall(followers, timeout=0.5)
+    assert all(isinstance(g.exception, TechnicalError) for g in followers)
+    assert calls == [1]
+
+    # nothing is left in flight, the next call calls the function again
+    with gevent.Timeout(0.01, False):
+        f(1)
+    assert calls == [1, 1]
+
+
+def coalescing_memoize_wait_timeout_test(shared_cache, mocker):
+    mocker.patch.dict(app.config, {'CACHE_COALESCED_CALL_WAIT_TIMEOUT_S': 0.01})
+    f, calls = make_counted_function(sleep=0.1)
+    leader = gevent.spawn(f, 1)
+    gevent.sleep(0)
+
+    # the call is too long, the follower stops waiting and calls the function itself
+    assert f(1) == 2
+    assert calls == [1, 1]
+    assert leader.get() == 2
+
+
+def coalescing_memoize_local_timeout_test(shared_cache, mocker):
+    now = time.time()
+    mock_time = mocker.patch('jormungandr.caching.time.time', return_value=now)
+    mocker.patch('jormungandr.lru_cache.time.time', mock_time)
+    f, calls = make_counted_function(timeout=300, local_timeout=30)
+    assert f(1) == 2
+
+    # the local tier expires before the shared cache, which is read again
+    (key,) = shared_cache.values.keys()
+    shared_cache.values[key] = shared_cache.values[key]._replace(value=3)
+    mock_time.return_value = now + 20
+    assert f(1) == 2
+    mock_time.return_value = now + 40
+    assert f(1) == 3
+    assert calls == [1]
+
+
+def coalescing_memoize_stale_while_revalidate_test(shared_cache, mocker):
+    now = time.time()
+    mock_time = mocker.patch('jormungandr.caching.time.time', return_value=now)
+    mocker.patch('jormungandr.lru_cache.time.time', mock_time)
+    results = iter(['first', 'second'])
+    f, calls = make_counted_function(timeout=10, stale_timeout=50, result=lambda x: next(results))
+    assert f(1) == 'first'
+
+    # the value is stale: it is served while being refreshed in background
+    mock_time.return_value = now + 20
+    assert f(1) == 'first'
+    gevent.sleep(0)
+    assert calls == [1, 1]
+    assert f(1) == 'second'
+
+
+def coalescing_memoize_cache_disabled_test(shared_cache, mocker):
+    mocker.patch.dict(app.config, {'CACHE_CONFIGURATION': {'CACHE_TYPE': 'null'}})
+    f, calls = make_counted_function()
+    assert f(1) == 2
+    assert f(1) == 2
+    assert calls == [1, 1]
+    assert shared_cache.values == {}
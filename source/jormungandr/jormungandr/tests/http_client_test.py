@@ -0,0 +1,137 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+import requests
+import requests_mock
+from requests.cookies import MockRequest, MockResponse
+from six.moves import http_client as http_client_module
+
+from jormungandr import app, http_client
+from jormungandr.http_client import HttpClient, get_http_client
+
+
+@pytest.fixture
+def clients(mocker):
+    mocker.patch.object(http_client, '_clients', {})
+    mocker.patch.dict(
+        app.config,
+        {
+            'HTTP_CLIENT_POOL_MAXSIZE': 5,
+            'HTTP_CLIENT_POOL_MAXSIZE_BY_CONNECTOR': {'valhalla': 42},
+            'HTTP_CLIENT_REPORT_CALLS': True,
+        },
+    )
+
+
+def get_http_client_shared_by_connector_test(clients):
+    client = get_http_client('timeo')
+    assert get_http_client('timeo') is client
+    assert get_http_client('here') is not client
+
+
+def get_http_client_pool_maxsize_test(clients):
+    assert get_http_client('timeo').pool_maxsize == 5
+    assert get_http_client('valhalla').pool_maxsize == 42
+
+
+def http_client_get_test(clients, mocker):
+    record_custom_event = mocker.patch('jormungandr.new_relic.record_custom_event')
+    client = HttpClient('bob')
+    with requests_mock.Mocker() as m:
+        m.get('http://bob.com/stop', json={'stop': 'bob'})
+        response = client.get('http://bob.com/stop', params={'id': 42}, timeout=1)
+
+    assert response.status_code == 200
+    assert response.json() == {'stop': 'bob'}
+    assert m.last_request.qs == {'id': ['42']}
+    assert record_custom_event.call_count == 1
+    event_type, params = record_custom_event.call_args[0]
+    assert event_type == 'http_call'
+    assert params['connector'] == 'bob'
+    assert params['method'] == 'GET'
+    assert params['host'] == 'bob.com'
+    assert params['status_code'] == 200
+    assert params['duration'] >= params['transfer_duration'] >= 0
+
+
+def http_client_post_test(clients):
+    client = HttpClient('bob')
+    with requests_mock.Mocker() as m:
+        m.post('http://bob.com/matrix', status_code=201)
+        response = client.post('http://bob.com/matrix', json={'sources': [1, 2]})
+
+    assert response.status_code == 201
+    assert m.last_request.json() == {'sources': [1, 2]}
+
+
+def http_client_no_report_test(clients, mocker):
+    app.config['HTTP_CLIENT_REPORT_CALLS'] = False
+    record_custom_event = mocker.patch('jormungandr.new_relic.record_custom_event')
+    with requests_mock.Mocker() as m:
+        m.get('http://bob.com', text='bob')
+        assert HttpClient('bob').get('http://bob.com').text == 'bob'
+
+    assert record_custom_event.call_count == 0
+
+
+def get_http_client_pool_connections_test(clients):
+    app.config['HTTP_CLIENT_POOL_CONNECTIONS_BY_CONNECTOR'] = {'ridesharing': 100}
+    assert get_http_client('timeo').adapter._pool_connections == 10
+    assert get_http_client('ridesharing').adapter._pool_connections == 100
+
+
+def http_client_cookies_not_kept_test(clients):
+    client = HttpClient('bob')
+    request = requests.Request('GET', 'http://bob.com/login').prepare()
+    headers = http_client_module.HTTPMessage()
+    headers['Set-Cookie'] = 'session=bob; Path=/'
+    client.session.cookies.extract_cookies(MockResponse(headers), MockRequest(request))
+    assert len(client.session.cookies) == 0
+
+    with requests_mock.Mocker() as m:
+        m.get('http://bob.com/stop', text='bob')
+        client.get('http://bob.com/stop', cookies={'user': 'bob'})
+    assert m.last_request.headers['Cookie'] == 'user=bob'
+
+
+def http_client_nb_connections_test(clients):
+    client = HttpClient('bob')
+    client.adapter.poolmanager.connection_from_url('https://bob.com/stop')
+    client.adapter.poolmanager.connection_from_host(
+        'bob.com', port=443, scheme='https', pool_kwargs={'cert_reqs': 'CERT_NONE'}
+    )
+    client.adapter.poolmanager.connection_from_url('https://bobette.com/stop')
+    for pool in client.adapter.poolmanager.pools._container.values():
+        pool.num_connections = 2
+
+    assert client._nb_connections('https://bob.com/journeys') == 4
+    assert client._nb_connections('https://bob.com:8080/journeys') == 0
+    assert client._nb_connections('http://bob.com/journeys') == 0
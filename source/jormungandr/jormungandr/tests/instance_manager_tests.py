@@ -30,11 +30,14 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 from jormungandr import InstanceManager
-from pytest import fixture
+from pytest import fixture, raises
 from pytest_mock import mocker
+from shapely import wkt
 
 from jormungandr import app
-from jormungandr.instance_manager import choose_best_instance
+from jormungandr.exceptions import RegionNotFound, DeadSocketException
+from jormungandr.instance import Instance
+from jormungandr.instance_manager import choose_best_instance, CoverageIndex
 
 
 class FakeInstance:
@@ -42,6 +45,14 @@ class FakeInstance:
         self.name = name
         self.is_free = is_free
         self.priority = priority
+        self.publication_date = 1
+
+
+class FakeInstanceWithGeom(Instance):
+    def __init__(self, name, geom):
+        self.name = name
+        self.geom = wkt.loads(geom) if geom else None
+        self._update_prepared_geom()
 
 
 @fixture
@@ -114,3 +125,87 @@ def choose_best_instance_test():
 
     instances_list.append(FakeInstance('fr-bre', is_free=True, priority=1000))
     assert choose_best_instance(instances_list).name == 'fr-bre'
+
+
+def coverage_index_test():
+    paris = FakeInstanceWithGeom('paris', 'POLYGON((2.2 48.8, 2.5 48.8, 2.5 48.9, 2.2 48.9, 2.2 48.8))')
+    idf = FakeInstanceWithGeom('idf', 'POLYGON((1.4 48.1, 3.5 48.1, 3.5 49.2, 1.4 49.2, 1.4 48.1))')
+    # a triangle whose bounding box contains the point tested below, but not the triangle itself
+    triangle = FakeInstanceWithGeom('triangle', 'POLYGON((2.0 48.0, 3.0 48.0, 3.0 49.0, 2.0 48.0))')
+    no_geom = FakeInstanceWithGeom('no_geom', None)
+
+    index = CoverageIndex([paris, idf, triangle, no_geom])
+    assert {i.name for i in index.query(wkt.loads('POINT(2.3 48.85)'))} == {'paris', 'idf'}
+    assert {i.name for i in index.query(wkt.loads('POINT(3.4 49.1)'))} == {'idf'}
+    assert index.query(wkt.loads('POINT(-4.0 48.0)')) == []
+
+    assert CoverageIndex([]).query(wkt.loads('POINT(2.3 48.85)')) == []
+
+
+def all_keys_of_coord_in_instances_test():
+    manager = InstanceManager(None)
+    manager.instances['paris'] = FakeInstanceWithGeom(
+        'paris', 'POLYGON((2.2 48.8, 2.5 48.8, 2.5 48.9, 2.2 48.9, 2.2 48.8))'
+    )
+    manager.instances['idf'] = FakeInstanceWithGeom(
+        'idf', 'POLYGON((1.4 48.1, 3.5 48.1, 3.5 49.2, 1.4 49.2, 1.4 48.1))'
+    )
+    manager._update_coverage_index()
+
+    instances = manager._all_keys_of_coord_in_instances(list(manager.instances.values()), 2.3, 48.85)
+    assert {i.name for i in instances} == {'paris', 'idf'}
+
+    # only the authorized instances are returned
+    instances = manager._all_keys_of_coord_in_instances([manager.instances['idf']], 2.3, 48.85)
+    assert [i.name for i in instances] == ['idf']
+
+    with raises(RegionNotFound):
+        manager._all_keys_of_coord_in_instances([manager.instances['paris']], 3.4, 49.1)
+
+
+def all_keys_of_id_in_instances_test(manager, mocker):
+    mock = mocker.patch.object(
+        manager,
+        '_exists_id_in_instance',
+        side_effect=lambda instance, object_id, publication_date: instance.name == 'pdl',
+    )
+    instances = [manager.instances['paris'], manager.instances['pdl']]
+    with app.test_request_context('/'):
+        valid_instances = manager._all_keys_of_id_in_instances(instances, 'sa:pdl')
+        assert [i.name for i in valid_instances] == ['pdl']
+        assert mock.call_count == 2
+
+        # the ids found and not found are both cached
+        valid_instances = manager._all_keys_of_id_in_instances(instances, 'sa:pdl')
+        assert [i.name for i in valid_instances] == ['pdl']
+        assert mock.call_count == 2
+
+        # a new publication date only invalidates the cache of its instance
+        manager._clear_id_cache(manager.instances['paris'])
+        valid_instances = manager._all_keys_of_id_in_instances(instances, 'sa:pdl')
+        assert [i.name for i in valid_instances] == ['pdl']
+        assert mock.call_count == 3
+
+        with raises(RegionNotFound):
+            manager._all_keys_of_id_in_instances([manager.instances['paris']], 'sa:pdl')
+        assert mock.call_count == 3
+
+
+def all_keys_of_id_in_instances_dead_instance_test(manager, mocker):
+    def exists_id(instance, object_id, publication_date):
+        if instance.name == 'pdl' and mock.call_count == 1:
+            raise DeadSocketException(instance.name, 'bob_socket')
+        return instance.name == 'pdl'
+
+    mock = mocker.patch.object(manager, '_exists_id_in_instance', side_effect=exists_id)
+    instances = [manager.instances['pdl']]
+    with app.test_request_context('/'):
+        # a dead instance is considered as not having the id
+        with raises(RegionNotFound):
+            manager._all_keys_of_id_in_instances(instances, 'sa:pdl')
+        assert mock.call_count == 1
+
+        # but the answer isn't cached, the instance is asked again
+        valid_instances = manager._all_keys_of_id_in_instances(instances, 'sa:pdl')
+        assert [i.name for i in valid_instances] == ['pdl']
+        assert mock.call_count == 2
@@ -0,0 +1,115 @@
+# coding=utf-8
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+import ujson
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from jormungandr import app
+from jormungandr.json_stream import (
+    iter_json_chunks,
+    should_be_streamed,
+    make_streamed_json_response,
+    ENCODING_ERROR_MARKER,
+)
+
+DATA = {
+    'pagination': {'start_page': 0, 'items_on_page': 3},
+    'vehicle_journeys': [{'id': 'vj:{}'.format(i), 'name': 'é {}'.format(i), 'codes': []} for i in range(300)],
+    'disruptions': [],
+    'links': [{'href': 'http://a/b', 'templated': False}],
+}
+
+
+@pytest.mark.parametrize('data', [DATA, {}, [1, 2, {'a': None}], 'abc', {'a': ()}])
+def iter_json_chunks_test(data):
+    chunks = list(iter_json_chunks(data, chunk_size=100))
+    assert b''.join(chunks) == ujson.dumps(data).encode('utf-8')
+
+
+def iter_json_chunks_size_test():
+    chunks = list(iter_json_chunks(DATA, chunk_size=1000))
+    assert len(chunks) > 1
+    assert all(len(chunk) < 1100 for chunk in chunks)
+
+
+def should_be_streamed_test(mocker):
+    mocker.patch.dict(app.config, {'JSON_STREAMING_MIN_ITEMS': 300})
+    assert should_be_streamed(DATA)
+    assert not should_be_streamed({'vehicle_journeys': DATA['vehicle_journeys'][:299]})
+    assert not should_be_streamed([1] * 1000)
+    mocker.patch.dict(app.config, {'JSON_STREAMING_MIN_ITEMS': 0})
+    assert not should_be_streamed(DATA)
+
+
+def make_streamed_json_response_test():
+    expected = ujson.dumps(DATA).encode('utf-8')
+    with app.test_request_context():
+        resp = make_streamed_json_response(DATA, 200, headers={'a': 'b'})
+        assert resp.is_streamed
+        assert resp.headers['a'] == 'b'
+        assert b''.join(resp.response) == expected
+
+        resp = make_streamed_json_response(DATA, 200, content_limit=len(expected))
+        assert resp.is_streamed
+        assert resp.content_length == len(expected)
+        assert b''.join(resp.response) == expected
+
+        with pytest.raises(RequestEntityTooLarge):
+            make_streamed_json_response(DATA, 200, content_limit=len(expected) - 1)
+
+
+class NotSerializable(object):
+    pass
+
+
+def make_streamed_json_response_encoding_error_test(mocker):
+    real_dumps = ujson.dumps
+
+    def dumps(value):
+        if isinstance(value, NotSerializable):
+            raise OverflowError('bob')
+        return real_dumps(value)
+
+    mocker.patch('jormungandr.json_stream.ujson.dumps', side_effect=dumps)
+    # bigger than a chunk
+    items = DATA['vehicle_journeys'] * 10
+    with app.test_request_context():
+        # the first chunk is encoded eagerly: the error is raised before anything is sent
+        with pytest.raises(OverflowError):
+            make_streamed_json_response({'vehicle_journeys': [NotSerializable()] + items}, 200)
+
+        # once the first chunk is sent, the body is terminated by the marker
+        resp = make_streamed_json_response({'vehicle_journeys': items + [NotSerializable()]}, 200)
+        body = b''.join(resp.response)
+        assert body.endswith(ENCODING_ERROR_MARKER)
+        with pytest.raises(ValueError):
+            ujson.loads(body)
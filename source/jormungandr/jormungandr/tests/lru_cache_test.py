@@ -0,0 +1,74 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+from jormungandr.lru_cache import LruCache
+import time
+
+
+def lru_cache_eviction_test():
+    cache = LruCache(max_size=3)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key.upper())
+    # 'a' becomes the most recently used entry
+    assert cache.get('a') == 'A'
+    cache.set('d', 'D')
+    assert 'b' not in cache
+    assert {k: cache.get(k) for k in ('a', 'c', 'd')} == {'a': 'A', 'c': 'C', 'd': 'D'}
+    assert len(cache) == 3
+
+
+def lru_cache_falsy_values_test():
+    cache = LruCache()
+    cache.set('not_found', False)
+    assert cache.get('not_found') is False
+    assert 'not_found' in cache
+    assert cache.get('unknown') is None
+
+
+def lru_cache_ttl_test(mocker):
+    now = time.time()
+    mocker.patch('jormungandr.lru_cache.time.time', return_value=now)
+    cache = LruCache(ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=100)
+
+    mocker.patch('jormungandr.lru_cache.time.time', return_value=now + 11)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+
+def lru_cache_clear_test():
+    cache = LruCache()
+    cache.set('a', 1)
+    cache.delete('a')
+    assert cache.get('a') is None
+    cache.set('b', 2)
+    cache.clear()
+    assert len(cache) == 0
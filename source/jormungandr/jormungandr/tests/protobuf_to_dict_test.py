@@ -0,0 +1,72 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+
+from navitiacommon import type_pb2, response_pb2
+from jormungandr.protobuf_to_dict import protobuf_to_dict, TYPE_CALLABLE_MAP
+
+
+def make_response():
+    response = response_pb2.Response()
+    for i in range(3):
+        pt_object = response.places.add()
+        pt_object.uri = 'stop_area:{}'.format(i)
+        pt_object.name = 'stop area {}'.format(i)
+        pt_object.embedded_type = type_pb2.STOP_AREA
+        pt_object.quality = i
+        pt_object.stop_area.uri = pt_object.uri
+        pt_object.stop_area.coord.lon = 2.3
+        pt_object.stop_area.coord.lat = 48.8
+        code = pt_object.stop_area.codes.add()
+        code.type = 'source'
+        code.value = str(i)
+    return response
+
+
+@pytest.mark.parametrize('use_enum_labels', [False, True])
+def protobuf_to_dict_test(use_enum_labels):
+    response = make_response()
+    res = protobuf_to_dict(response, use_enum_labels=use_enum_labels)
+
+    # a copy of the map is converted by the generic path, without cache
+    assert res == protobuf_to_dict(response, dict(TYPE_CALLABLE_MAP), use_enum_labels=use_enum_labels)
+    # the converters are cached, the result stays the same
+    assert protobuf_to_dict(response, use_enum_labels=use_enum_labels) == res
+
+    assert len(res['places']) == 3
+    place = res['places'][1]
+    assert place['embedded_type'] == ('STOP_AREA' if use_enum_labels else type_pb2.STOP_AREA)
+    assert place['stop_area']['coord'] == {'lon': 2.3, 'lat': 48.8}
+    assert place['stop_area']['codes'] == [{'type': 'source', 'value': '1'}]
+
+
+def protobuf_to_dict_empty_message_test():
+    assert protobuf_to_dict(response_pb2.Response()) == {}
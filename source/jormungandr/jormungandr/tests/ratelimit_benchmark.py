@@ -0,0 +1,101 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+"""
+Benchmark of the throughput of the RateLimiter modes, with several workers sharing the same key.
+It needs a redis server:
+
+    python -m jormungandr.tests.ratelimit_benchmark [redis_host] [redis_port]
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+import logging
+import sys
+import threading
+import time
+import uuid
+
+from navitiacommon.ratelimit import RateLimiter
+
+MODES = [
+    ('lock', {}),
+    ('lock free', {'lock_free': True}),
+    ('lock free, reservations of 10', {'lock_free': True, 'reservation_size': 10}),
+]
+
+
+def run_worker(rate_limiter, key, until, results):
+    nb_calls = nb_acquired = 0
+    while time.time() < until:
+        nb_calls += 1
+        if rate_limiter.acquire(key, block=False):
+            nb_acquired += 1
+    results.append((nb_calls, nb_acquired))
+
+
+def benchmark(redis_host='localhost', redis_port=6379, nb_workers=8, duration=5, requests_by_second=1000):
+    """
+    :return: a list of (mode, number of calls by second, number of acquired requests by second)
+    """
+    res = []
+    for mode, kwargs in MODES:
+        key = 'benchmark_{}'.format(uuid.uuid4())
+        results = []
+        until = time.time() + duration
+        workers = [
+            threading.Thread(
+                target=run_worker,
+                args=(
+                    RateLimiter(
+                        conditions=[{'requests': requests_by_second, 'seconds': 1}],
+                        redis_host=redis_host,
+                        redis_port=redis_port,
+                        redis_namespace='jormungandr.tests.ratelimit_benchmark',
+                        **kwargs
+                    ),
+                    key,
+                    until,
+                    results,
+                ),
+            )
+            for _ in range(nb_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        res.append((mode, sum(r[0] for r in results) / duration, sum(r[1] for r in results) / duration))
+    return res
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 6379
+    for mode, calls, acquired in benchmark(host, port):
+        print('{}: {:.0f} calls/s, {:.0f} acquired/s'.format(mode, calls, acquired))
@@ -0,0 +1,176 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import os
+import uuid
+
+import pytest
+import redis
+
+from navitiacommon.ratelimit import RateLimiter
+
+REDIS_HOST = os.getenv('JORMUNGANDR_TEST_REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('JORMUNGANDR_TEST_REDIS_PORT', 6379))
+
+
+class FakeClock(object):
+    def __init__(self, now=1672567200.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = FakeClock()
+    mocker.patch('navitiacommon.ratelimit.time', clock)
+    return clock
+
+
+@pytest.fixture
+def make_rate_limiter():
+    try:
+        redis.Redis(host=REDIS_HOST, port=REDIS_PORT).ping()
+    except redis.ConnectionError:
+        pytest.skip('no redis server on {}:{}'.format(REDIS_HOST, REDIS_PORT))
+    namespace = 'ratelimit_test_{}'.format(uuid.uuid4())
+
+    def make(conditions, **kwargs):
+        return RateLimiter(
+            conditions=conditions,
+            redis_host=REDIS_HOST,
+            redis_port=REDIS_PORT,
+            redis_namespace=namespace,
+            **kwargs
+        )
+
+    return make
+
+
+def nb_logged_requests(rate_limiter, key):
+    return rate_limiter.redis.llen(':'.join((rate_limiter.namespace, key, 'log')))
+
+
+@pytest.mark.parametrize('lock_free', [False, True])
+def limit_test(make_rate_limiter, clock, lock_free):
+    rate_limiter = make_rate_limiter([(3, 10)], lock_free=lock_free)
+    for _ in range(3):
+        assert rate_limiter.acquire('key', block=False)
+        clock.now += 1
+    assert not rate_limiter.acquire('key', block=False)
+    # the other keys are not limited
+    assert rate_limiter.acquire('other_key', block=False)
+
+
+@pytest.mark.parametrize('lock_free', [False, True])
+def window_expiry_test(make_rate_limiter, clock, lock_free):
+    rate_limiter = make_rate_limiter([(3, 10)], lock_free=lock_free)
+    for _ in range(3):
+        assert rate_limiter.acquire('key', block=False)
+        clock.now += 1
+
+    success, wait = rate_limiter._make_ping('key')
+    assert not success
+    # the first request has been made 3s ago
+    assert wait == pytest.approx(7)
+
+    clock.now += 7.5
+    assert rate_limiter.acquire('key', block=False)
+    # only the first request is out of the time period
+    assert not rate_limiter.acquire('key', block=False)
+    clock.now += 1
+    assert rate_limiter.acquire('key', block=False)
+
+
+@pytest.mark.parametrize('lock_free', [False, True])
+def manual_block_test(make_rate_limiter, clock, lock_free):
+    rate_limiter = make_rate_limiter([(3, 10)], lock_free=lock_free)
+    assert rate_limiter.block('key', seconds=10) == 10
+
+    success, wait = rate_limiter._make_ping('key')
+    assert not success
+    assert 0 < float(wait) <= 10
+    assert rate_limiter.acquire('other_key', block=False)
+
+
+def lock_free_parity_test(make_rate_limiter, clock):
+    """
+    both modes acquire the same requests when they are made at the same times
+    """
+    conditions = [(2, 1), (5, 10)]
+    start = clock.now
+    results = {}
+    for lock_free in (False, True):
+        rate_limiter = make_rate_limiter(conditions, lock_free=lock_free)
+        key = 'key_{}'.format(lock_free)
+        results[lock_free] = []
+        for i in range(60):
+            clock.now = start + 0.3 * i
+            success, wait = rate_limiter._make_ping(key)
+            results[lock_free].append((success, round(float(wait), 3)))
+
+    assert results[True] == results[False]
+    assert any(success for success, _ in results[True])
+    assert not all(success for success, _ in results[True])
+
+
+def lock_free_reservations_test(make_rate_limiter, clock):
+    rate_limiter = make_rate_limiter([(6, 10)], lock_free=True, reservation_size=4, reservation_ttl=1)
+
+    # the first acquire reserves 4 requests, the next ones are acquired without calling redis
+    for _ in range(4):
+        assert rate_limiter.acquire('key', block=False)
+        assert nb_logged_requests(rate_limiter, 'key') == 4
+
+    # only 2 requests are left to reserve
+    for _ in range(2):
+        assert rate_limiter.acquire('key', block=False)
+        assert nb_logged_requests(rate_limiter, 'key') == 6
+
+    assert not rate_limiter.acquire('key', block=False)
+
+
+def lock_free_reservations_expiry_test(make_rate_limiter, clock):
+    rate_limiter = make_rate_limiter([(6, 10)], lock_free=True, reservation_size=4, reservation_ttl=1)
+    assert rate_limiter.acquire('key', block=False)
+
+    # the 3 requests left in the reservation are lost once it has expired
+    clock.now += 2
+    for _ in range(2):
+        assert rate_limiter.acquire('key', block=False)
+        assert nb_logged_requests(rate_limiter, 'key') == 6
+    assert not rate_limiter.acquire('key', block=False)
+
+    # the time period is extended by the lifetime of the reservations
+    clock.now += 8.5
+    assert not rate_limiter.acquire('key', block=False)
+    clock.now += 1
+    assert rate_limiter.acquire('key', block=False)
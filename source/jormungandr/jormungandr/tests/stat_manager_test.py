@@ -0,0 +1,230 @@
+# encoding: utf-8
+
+#  Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+from flask import g
+from jormungandr import app
+from jormungandr.stat_manager import StatManager, StatNotConfirmed
+from navitiacommon import stat_pb2
+import mock
+import pytest
+import pytz
+import time
+
+
+def make_async_stat_manager(queue_size=10, batch_size=2, queue_max_size=1000):
+    config = {
+        'SAVE_STAT': False,
+        'STAT_ASYNC_PUBLISH': True,
+        'STAT_QUEUE_SIZE': queue_size,
+        'STAT_QUEUE_MAX_SIZE': queue_max_size,
+    }
+    with mock.patch.dict(app.config, config):
+        stat_manager = StatManager()
+    stat_manager.save_stat = True
+    stat_manager.batch_size = batch_size
+    # the stats are published by the test, not by a background worker
+    stat_manager._worker = mock.MagicMock(dead=False)
+    stat_manager.publish_requests = mock.MagicMock()
+    return stat_manager
+
+
+def anonymous_request():
+    return mock.patch.multiple(
+        'jormungandr.stat_manager',
+        get_user=mock.Mock(return_value=None),
+        get_app_name=mock.Mock(return_value=None),
+    )
+
+
+def make_place(uri, admin_uri):
+    return {
+        'id': uri,
+        'name': uri,
+        'embedded_type': 'stop_point',
+        'stop_point': {
+            'id': uri,
+            'name': uri,
+            'coord': {'lat': '48.8', 'lon': '2.3'},
+            'lines': [{'id': 'line:1', 'name': 'line 1', 'routes': [{'id': 'route:1'}]}],
+            'administrative_regions': [
+                {'id': admin_uri, 'insee': '75056', 'name': 'Paris', 'level': 8, 'coord': {'lat': 0, 'lon': 0}}
+            ],
+        },
+        'quality': 0,
+    }
+
+
+def make_journey():
+    return {
+        'departure_date_time': '20151015T120000',
+        'arrival_date_time': '20151015T123000',
+        'duration': 1800,
+        'nb_transfers': 0,
+        'type': 'best',
+        'co2_emission': {'value': 12, 'unit': 'gEC'},
+        'sections': [
+            {
+                'type': 'public_transport',
+                'departure_date_time': '20151015T120000',
+                'arrival_date_time': '20151015T123000',
+                'duration': 1800,
+                'from': make_place('stop_point:A', 'admin:A'),
+                'to': make_place('stop_point:B', 'admin:B'),
+                'links': [{'type': 'line', 'id': 'line:1', 'templated': False}],
+                'display_informations': {'code': '1', 'network': 'bob', 'headsign': 'B', 'color': '000000'},
+                'geojson': {'type': 'LineString', 'coordinates': [[2.3, 48.8]] * 100},
+                'stop_date_times': [{'stop_point': make_place('stop_point:A', 'admin:A')}] * 10,
+            }
+        ],
+    }
+
+
+def async_stat_is_built_outside_of_the_request_test():
+    stat_manager = make_async_stat_manager()
+    response = ({"places_nearby": None, "error": {"id": "bad_filter"}}, 400)
+    with app.test_request_context('/v1/places', query_string='q=toto&count=2', headers={'Authorization': 'key'}):
+        with anonymous_request():
+            stat_manager.manage_stat(time.time(), response)
+    assert not stat_manager.publish_requests.called
+    assert stat_manager._queued_size == 1
+
+    assert stat_manager.publish_pending_stats() == 1
+    assert stat_manager.nb_published == 1
+    assert stat_manager._queued_size == 0
+    stat_manager.publish_requests.assert_called_once_with([('v1.places', mock.ANY)])
+    stat = stat_pb2.StatRequest()
+    stat.ParseFromString(stat_manager.publish_requests.call_args[0][0][0][1])
+    assert stat.api == 'v1.places'
+    assert stat.path == '/v1/places'
+    assert stat.token == 'key'
+    assert stat.error.id == 'bad_filter'
+    assert [(p.key, p.value) for p in stat.parameters] == [('q', 'toto'), ('count', '2')]
+
+
+def async_journeys_stat_is_built_from_a_compact_snapshot_test():
+    stat_manager = make_async_stat_manager()
+    response = ({'journeys': [make_journey()], 'error': None}, 200)
+    with app.test_request_context('/v1/journeys', query_string='from=A&to=B'):
+        g.timezone = pytz.utc
+        with anonymous_request():
+            stat_manager.manage_stat(time.time(), response)
+    context, size = stat_manager._queue.peek()
+    # the stat counts for itself and its section
+    assert size == 2
+    # only what the stat reads is kept
+    section = context.journeys[0]['sections'][0]
+    assert 'geojson' not in section and 'stop_date_times' not in section
+    assert 'lines' not in section['from']['stop_point']
+    assert 'co2_emission' not in context.journeys[0]
+
+    assert stat_manager.publish_pending_stats() == 1
+    stat = stat_pb2.StatRequest()
+    stat.ParseFromString(stat_manager.publish_requests.call_args[0][0][0][1])
+    assert stat.journey_request.departure_admin == 'admin:A'
+    assert stat.journey_request.arrival_admin == 'admin:B'
+    stat_journey = stat.journeys[0]
+    assert stat_journey.duration == 1800
+    assert stat_journey.first_pt_id == 'stop_point:A'
+    assert stat_journey.first_pt_admin_insee == '75056'
+    assert stat_journey.last_pt_admin_id == 'admin:B'
+    stat_section = stat_journey.sections[0]
+    assert stat_section.from_id == 'stop_point:A'
+    assert stat_section.to_admin_id == 'admin:B'
+    assert stat_section.line_id == 'line:1'
+    assert stat_section.line_code == '1'
+    assert stat_section.network_name == 'bob'
+
+
+def async_stats_are_published_in_batches_and_dropped_when_queue_is_full_test():
+    stat_manager = make_async_stat_manager(queue_size=3, batch_size=2)
+    response = ({"places_nearby": None, "error": None}, 200)
+    with app.test_request_context('/v1/places'):
+        with anonymous_request():
+            for _ in range(4):
+                stat_manager.manage_stat(time.time(), response)
+    assert stat_manager.nb_dropped == 1
+
+    # a batch is published at once and retried once
+    stat_manager.publish_requests.side_effect = [None, Exception('rabbitmq down'), Exception('rabbitmq down')]
+    assert stat_manager.publish_pending_stats() == 2
+    assert len(stat_manager.publish_requests.call_args[0][0]) == 2
+    assert stat_manager.publish_pending_stats() == 1
+    assert stat_manager.publish_requests.call_count == 3
+    assert stat_manager.publish_pending_stats() == 0
+    assert stat_manager.nb_published == 2
+    assert stat_manager.nb_failed == 1
+
+
+def async_stats_are_dropped_when_queue_is_too_big_test():
+    stat_manager = make_async_stat_manager(queue_size=10, queue_max_size=3)
+    with app.test_request_context('/v1/journeys', query_string='from=A&to=B'):
+        g.timezone = pytz.utc
+        with anonymous_request():
+            for _ in range(2):
+                stat_manager.manage_stat(time.time(), ({'journeys': [make_journey()]}, 200))
+            stat_manager.manage_stat(time.time(), ({'journeys': []}, 200))
+    assert stat_manager.nb_dropped == 1
+    assert stat_manager._queued_size == 3
+
+
+def make_confirmed_stat_manager():
+    with mock.patch.dict(app.config, {'SAVE_STAT': False, 'STAT_ASYNC_PUBLISH': True}):
+        stat_manager = StatManager()
+    stat_manager.producer = mock.MagicMock()
+    stat_manager.connection = mock.MagicMock(connection_errors=(), channel_errors=())
+    return stat_manager
+
+
+def async_batch_is_confirmed_at_once_test():
+    stat_manager = make_confirmed_stat_manager()
+    # the broker confirms both messages at once
+    stat_manager.connection.drain_events.side_effect = lambda timeout: stat_manager._on_confirm(2, True)
+
+    stat_manager.publish_requests([('v1.places', b'1'), ('v1.journeys', b'2')])
+    assert stat_manager.producer.publish.call_args_list == [
+        mock.call(b'1', routing_key='v1.places'),
+        mock.call(b'2', routing_key='v1.journeys'),
+    ]
+    assert stat_manager.connection.drain_events.call_count == 1
+
+    # the delivery tags go on with the next batch, the late confirms are ignored
+    confirms = iter([(2, False), (3, False)])
+    stat_manager.connection.drain_events.side_effect = lambda timeout: stat_manager._on_confirm(*next(confirms))
+    stat_manager.publish_requests([('v1.places', b'3')])
+    assert stat_manager.connection.drain_events.call_count == 3
+
+
+def async_batch_rejected_test():
+    stat_manager = make_confirmed_stat_manager()
+    stat_manager.connection.drain_events.side_effect = lambda timeout: stat_manager._on_reject(1, False)
+    with pytest.raises(StatNotConfirmed):
+        stat_manager.publish_requests([('v1.places', b'1')])
@@ -0,0 +1,133 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import pytest
+from navitiacommon import response_pb2, type_pb2
+
+from jormungandr import app, stop_point_index
+from jormungandr.stop_point_index import StopPointIndex
+
+# about 111m between two stop points
+STOP_POINTS = [('sp{}'.format(i), 2.0 + 0.001 * i, 48.0) for i in range(10)]
+
+
+class FakeInstance(object):
+    def __init__(self, stop_points=STOP_POINTS):
+        self.publication_date = 1
+        self.stop_points = stop_points
+        self.requests = []
+
+    def send_and_receive(self, req):
+        self.requests.append(req)
+        start = req.ptref.start_page * req.ptref.count
+        resp = response_pb2.Response()
+        for uri, lon, lat in self.stop_points[start : start + req.ptref.count]:
+            resp.stop_points.add(uri=uri, label=uri, coord=type_pb2.GeographicalCoord(lon=lon, lat=lat))
+        resp.pagination.totalResult = len(self.stop_points)
+        resp.pagination.startPage = req.ptref.start_page
+        resp.pagination.itemsPerPage = req.ptref.count
+        resp.pagination.itemsOnPage = len(resp.stop_points)
+        return resp
+
+
+@pytest.fixture
+def index_enabled(mocker):
+    mocker.patch.dict(
+        app.config,
+        {
+            'STOP_POINT_INDEX': True,
+            'STOP_POINT_INDEX_DEPTH': 2,
+            'STOP_POINT_INDEX_PAGE_SIZE': 4,
+            'STOP_POINT_INDEX_CELL_SIZE_M': 200,
+        },
+    )
+    # the index is loaded right away instead of in background
+    mocker.patch.object(stop_point_index.gevent, 'spawn', lambda f, *args: f(*args))
+
+
+def make_index(instance):
+    index = StopPointIndex('bob')
+    index.update_publication_date(instance)
+    return index
+
+
+def index_loaded_by_pages_test(index_enabled):
+    instance = FakeInstance()
+    index = make_index(instance)
+    assert len(index) == 10
+    assert [r.ptref.start_page for r in instance.requests] == [0, 1, 2]
+    assert all(r.ptref.depth == 2 for r in instance.requests)
+
+
+def stop_points_nearby_test(index_enabled):
+    index = make_index(FakeInstance())
+    coord = type_pb2.GeographicalCoord(lon=2.0044, lat=48.0)
+
+    places = index.get_stop_points_nearby(1, coord, 300, 100, 2)
+    # sorted by distance, like kraken
+    assert [p.uri for p in places] == ['sp4', 'sp5', 'sp3', 'sp6', 'sp2', 'sp7', 'sp1', 'sp8']
+    assert places[0].embedded_type == type_pb2.STOP_POINT
+    assert places[0].name == 'sp4'
+    assert places[0].stop_point.uri == 'sp4'
+    assert places[0].distance == 29
+    assert places[-1].distance == 267
+
+    places = index.get_stop_points_nearby(1, coord, 300, 2, 2)
+    assert [p.uri for p in places] == ['sp4', 'sp5']
+    assert index.get_stop_points_nearby(1, coord, 0, 100, 2) == []
+
+
+def index_not_used_for_other_data_test(index_enabled):
+    instance = FakeInstance()
+    index = make_index(instance)
+    coord = type_pb2.GeographicalCoord(lon=2.0, lat=48.0)
+
+    # another depth
+    assert index.get_stop_points_nearby(1, coord, 300, 100, 3) is None
+    # the data have changed, the index isn't loaded yet
+    assert index.get_stop_points_nearby(2, coord, 300, 100, 2) is None
+
+    instance.publication_date = 2
+    instance.stop_points = [('new_sp', 2.0, 48.0)]
+    index.update_publication_date(instance)
+    assert [p.uri for p in index.get_stop_points_nearby(2, coord, 300, 100, 2)] == ['new_sp']
+
+
+def index_disabled_test(index_enabled, mocker):
+    mocker.patch.dict(app.config, {'STOP_POINT_INDEX': False})
+    instance = FakeInstance()
+    index = make_index(instance)
+    assert not instance.requests
+    assert index.get_stop_points_nearby(1, type_pb2.GeographicalCoord(lon=2.0, lat=48.0), 300, 100, 2) is None
+
+
+def stop_points_without_coord_ignored_test(index_enabled):
+    index = make_index(FakeInstance([('sp1', 2.0, 48.0), ('no_coord', 0.0, 0.0)]))
+    assert len(index) == 1
@@ -0,0 +1,214 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import os
+import pytest
+from navitiacommon import response_pb2, type_pb2
+
+from jormungandr import app, transfer_store
+from jormungandr.transfer_store import TransferStore, make_transfer_key
+
+
+class FakeInstance(object):
+    def __init__(self, publication_date):
+        self.publication_date = publication_date
+
+
+@pytest.fixture
+def store_dir(mocker, tmpdir):
+    mocker.patch.dict(app.config, {'TRANSFER_PATH_CACHE_SIZE': 10, 'TRANSFER_PATH_STORE_DIR': str(tmpdir)})
+    # the store is loaded right away instead of in background
+    mocker.patch.object(transfer_store.gevent, 'spawn', lambda f, *args: f(*args))
+    return tmpdir
+
+
+@pytest.fixture
+def memory_store(mocker):
+    mocker.patch.dict(app.config, {'TRANSFER_PATH_CACHE_SIZE': 3, 'TRANSFER_PATH_STORE_DIR': None})
+
+
+def make_transfer():
+    direct_path = response_pb2.Response()
+    direct_path.journeys.add().sections.add().street_network.path_items.add(name='rue bob')
+    origin = type_pb2.PtObject(uri='sp1', embedded_type=type_pb2.STOP_POINT)
+    destination = type_pb2.PtObject(uri='ap1', embedded_type=type_pb2.ACCESS_POINT)
+    destination.access_point.uri = 'ap1'
+    return direct_path, origin, destination
+
+
+def set_and_get_transfer_test(memory_store):
+    store = TransferStore('bob')
+    key = make_transfer_key(('walking', 1.12), 'sp1', 'sp2')
+    assert store.get_transfer(1, key) is None
+
+    store.set_transfer(1, key, *make_transfer())
+    direct_path, origin, destination = store.get_transfer(1, key)
+    assert direct_path.journeys[0].sections[0].street_network.path_items[0].name == 'rue bob'
+    assert origin.uri == 'sp1'
+    assert destination.access_point.uri == 'ap1'
+
+
+def set_and_get_stop_point_test(memory_store):
+    store = TransferStore('bob')
+    assert store.get_stop_point(1, 'sp1') is None
+
+    stop_point = type_pb2.StopPoint(uri='sp1')
+    stop_point.access_points.add(uri='ap1', is_exit=True)
+    store.set_stop_point(1, 'sp1', stop_point.access_points)
+    store.set_stop_point(1, 'sp2', [])
+
+    assert [ap.uri for ap in store.get_stop_point(1, 'sp1').access_points] == ['ap1']
+    assert len(store.get_stop_point(1, 'sp2').access_points) == 0
+
+
+def store_reset_on_new_publication_test(memory_store):
+    store = TransferStore('bob')
+    store.set_stop_point(1, 'sp1', [])
+
+    store.update_publication_date(FakeInstance(2))
+    assert store.get_stop_point(2, 'sp1') is None
+
+    # the results computed on the previous data are ignored
+    store.set_stop_point(1, 'sp1', [])
+    assert store.get_stop_point(1, 'sp1') is None
+    assert store.get_stop_point(2, 'sp1') is None
+
+
+def store_max_size_test(memory_store):
+    store = TransferStore('bob')
+    for uri in ('sp1', 'sp2', 'sp3', 'sp4'):
+        store.set_stop_point(1, uri, [])
+    assert len(store) == 3
+    assert store.get_stop_point(1, 'sp4') is None
+
+
+def store_full_refusals_counted_test(memory_store, mocker):
+    store = TransferStore('bob')
+    warning = mocker.patch.object(store.logger, 'warning')
+    for uri in ('sp1', 'sp2', 'sp3', 'sp4', 'sp5'):
+        store.set_stop_point(1, uri, [])
+    assert store.nb_refused == 2
+    # the warning is logged once per publication date
+    assert warning.call_count == 1
+
+    store.update_publication_date(FakeInstance(2))
+    assert store.nb_refused == 0
+    # the number of refused entries of the previous publication date is logged
+    assert warning.call_count == 2
+    assert warning.call_args[0][1] == 2
+    for uri in ('sp1', 'sp2', 'sp3', 'sp4'):
+        store.set_stop_point(2, uri, [])
+    assert store.nb_refused == 1
+    assert warning.call_count == 3
+
+
+def store_loaded_by_other_workers_test(store_dir):
+    key = make_transfer_key('sp1', 'sp2')
+    worker = TransferStore('bob')
+    worker.set_transfer(1, key, *make_transfer())
+    worker.set_stop_point(1, 'sp1', [])
+
+    other_worker = TransferStore('bob')
+    other_worker.update_publication_date(FakeInstance(1))
+    assert len(other_worker) == 2
+    assert other_worker.get_transfer(1, key)[1].uri == 'sp1'
+    assert other_worker.get_stop_point(1, 'sp1') is not None
+
+
+def store_incomplete_record_test(store_dir):
+    worker = TransferStore('bob')
+    worker.set_stop_point(1, 'sp1', [])
+    worker.set_stop_point(1, 'sp2', [])
+    file_path = str(store_dir.join('bob_1.transfers'))
+    with open(file_path, 'rb+') as f:
+        f.truncate(os.path.getsize(file_path) - 1)
+
+    other_worker = TransferStore('bob')
+    other_worker.update_publication_date(FakeInstance(1))
+    assert other_worker.get_stop_point(1, 'sp1') is not None
+    assert other_worker.get_stop_point(1, 'sp2') is None
+
+
+def store_corrupted_record_test(store_dir):
+    worker = TransferStore('bob')
+    for uri in ('sp1', 'sp2', 'sp3'):
+        worker.set_stop_point(1, uri, [])
+    file_path = str(store_dir.join('bob_1.transfers'))
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    with open(file_path, 'wb') as f:
+        f.write(data.replace(b'sp2', b'sp4', 1))
+
+    other_worker = TransferStore('bob')
+    other_worker.update_publication_date(FakeInstance(1))
+    assert other_worker.get_stop_point(1, 'sp1') is not None
+    assert other_worker.get_stop_point(1, 'sp2') is None
+    assert other_worker.get_stop_point(1, 'sp4') is None
+    assert other_worker.get_stop_point(1, 'sp3') is not None
+
+
+def store_interleaved_records_test(store_dir):
+    worker = TransferStore('bob')
+    worker.set_stop_point(1, 'sp1', [])
+    file_path = str(store_dir.join('bob_1.transfers'))
+    with open(file_path, 'rb') as f:
+        record = f.read()
+    # the beginning of a record of another worker
+    with open(file_path, 'ab') as f:
+        f.write(record[: len(record) // 2])
+    worker.set_stop_point(1, 'sp2', [])
+
+    other_worker = TransferStore('bob')
+    other_worker.update_publication_date(FakeInstance(1))
+    assert len(other_worker) == 2
+    assert other_worker.get_stop_point(1, 'sp1') is not None
+    assert other_worker.get_stop_point(1, 'sp2') is not None
+
+
+def corrupted_entries_are_missing_test(memory_store):
+    store = TransferStore('bob')
+    key = make_transfer_key('sp1', 'sp2')
+    store.set_transfer(1, key, *make_transfer())
+    store.set_stop_point(1, 'sp1', [])
+    # a truncated message
+    store._transfers[key] = store._transfers[key][:-1]
+    store._stop_points[b'sp1'] = b'\x0a\x05sp'
+
+    assert store.get_transfer(1, key) is None
+    assert store.get_stop_point(1, 'sp1') is None
+    assert len(store) == 0
+
+
+def old_stores_removed_test(store_dir):
+    TransferStore('bob').set_stop_point(1, 'sp1', [])
+    TransferStore('bobette').set_stop_point(1, 'sp1', [])
+
+    TransferStore('bob').set_stop_point(2, 'sp1', [])
+    assert sorted(os.listdir(str(store_dir))) == ['bob_2.transfers', 'bobette_1.transfers']
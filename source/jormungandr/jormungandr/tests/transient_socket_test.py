@@ -0,0 +1,196 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import time
+import pytest
+import gevent
+from gevent.event import AsyncResult
+from zmq import green as zmq
+
+from jormungandr.exceptions import DeadSocketException
+from jormungandr.transient_socket import TransientSocket
+
+
+class FakeServer(object):
+    """
+    A ROUTER socket standing for kraken: the requests are kept until the test decides to answer them
+    """
+
+    def __init__(self, context, address):
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.bind(address)
+        self.requests = []
+
+    def wait_requests(self, nb_requests, timeout=1):
+        with gevent.Timeout(timeout):
+            while len(self.requests) < nb_requests:
+                self.requests.append(self.socket.recv_multipart())
+
+    def reply(self, request, content):
+        # the envelope (the identity of the DEALER, the request id and the delimiter) is sent back untouched
+        self.socket.send_multipart(request[:-1] + [content])
+
+    def close(self):
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.close()
+
+
+@pytest.fixture
+def server():
+    context = zmq.Context()
+    server = FakeServer(context, 'inproc://kraken')
+    yield context, server
+    server.close()
+
+
+def make_transient_socket(context, **kwargs):
+    params = dict(socket_ttl=60, multiplexed=True, max_in_flight_requests=10, nb_channels=1)
+    params.update(kwargs)
+    return TransientSocket('bob', context, 'inproc://kraken', **params)
+
+
+def multiplexed_replies_out_of_order_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context)
+    calls = [gevent.spawn(transient_socket.call, content, timeout=1) for content in (b'first', b'second')]
+
+    server.wait_requests(2)
+    assert len(transient_socket._channels) == 1
+    # the replies are sent in the reverse order, each one must reach the greenlet that sent the request
+    for request in reversed(server.requests):
+        server.reply(request, request[-1] + b'_reply')
+
+    gevent.joinall(calls, timeout=1, raise_error=True)
+    assert [c.value for c in calls] == [b'first_reply', b'second_reply']
+    assert not transient_socket._channels[0].pending
+    transient_socket.close_channels()
+
+
+def multiplexed_in_flight_bound_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context, max_in_flight_requests=1)
+    first_call = gevent.spawn(transient_socket.call, b'first', timeout=1)
+    server.wait_requests(1)
+
+    # the only slot is taken by the first request, the second one can't be sent before its deadline
+    with pytest.raises(DeadSocketException):
+        transient_socket.call(b'second', timeout=0.05)
+    assert len(server.requests) == 1
+
+    server.reply(server.requests[0], b'first_reply')
+    assert first_call.get(timeout=1) == b'first_reply'
+
+    # the slot is released, a new request can be sent
+    second_call = gevent.spawn(transient_socket.call, b'second', timeout=1)
+    server.wait_requests(2)
+    server.reply(server.requests[1], b'second_reply')
+    assert second_call.get(timeout=1) == b'second_reply'
+    transient_socket.close_channels()
+
+
+def multiplexed_deadline_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context)
+    slow_call = gevent.spawn(transient_socket.call, b'slow', timeout=1)
+    start = time.time()
+    with pytest.raises(DeadSocketException):
+        transient_socket.call(b'fast', timeout=0.05)
+    # only the request without reply has failed, and it failed at its own deadline
+    assert time.time() - start < 0.5
+    assert not slow_call.ready()
+
+    server.wait_requests(2)
+    channel = transient_socket._channels[0]
+    assert len(channel.pending) == 1
+    # the late reply of the failed request is dropped
+    fast_request, slow_request = sorted(server.requests, key=lambda r: r[-1])
+    server.reply(fast_request, b'fast_reply')
+    server.reply(slow_request, b'slow_reply')
+    assert slow_call.get(timeout=1) == b'slow_reply'
+    assert not channel.pending
+    transient_socket.close_channels()
+
+
+def multiplexed_channel_ttl_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context, socket_ttl=0.1)
+    pending_call = gevent.spawn(transient_socket.call, b'first', timeout=1)
+    server.wait_requests(1)
+    old_channel = transient_socket._channels[0]
+
+    gevent.sleep(0.15)
+    new_channel = transient_socket.get_channel()
+    # the old channel is retired but not closed while a reply is expected on it
+    assert new_channel is not old_channel
+    assert transient_socket._channels == [new_channel]
+    assert old_channel.retired
+    assert not old_channel.closed
+
+    server.reply(server.requests[0], b'first_reply')
+    assert pending_call.get(timeout=1) == b'first_reply'
+    # its last reply has been received, the old channel is closed
+    assert old_channel.closed
+    transient_socket.close_channels()
+
+
+def multiplexed_reader_failure_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context)
+    channel = transient_socket.get_channel()
+    results = {b'bob': AsyncResult(), b'bobette': AsyncResult()}
+    channel.pending.update(results)
+    calls = [gevent.spawn(transient_socket.call, content, timeout=1) for content in (b'first', b'second')]
+    server.wait_requests(2)
+    assert len(channel.pending) == 4
+
+    # the socket is closed under the reader's feet: recv_multipart raises
+    channel.socket.close(linger=0)
+    gevent.sleep(0.05)
+
+    # every waiter is woken up with an error, without waiting for its deadline
+    for result in results.values():
+        assert isinstance(result.exception, DeadSocketException)
+    for call in calls:
+        assert call.ready()
+        assert isinstance(call.exception, DeadSocketException)
+    assert channel.retired and channel.closed
+    assert transient_socket._channels == []
+
+
+def multiplexed_close_channels_test(server):
+    context, server = server
+    transient_socket = make_transient_socket(context)
+    call = gevent.spawn(transient_socket.call, b'first', timeout=1)
+    server.wait_requests(1)
+
+    # the reader is killed, the pending request fails right away
+    transient_socket.close_channels()
+    with pytest.raises(DeadSocketException):
+        call.get(timeout=0.5)
@@ -0,0 +1,298 @@
+# Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+# https://groups.google.com/d/forum/navitia
+# www.navitia.io
+from __future__ import absolute_import, print_function, unicode_literals, division
+from navitiacommon import response_pb2, type_pb2
+from jormungandr import app
+from google.protobuf.message import DecodeError
+import gevent
+import hashlib
+import logging
+import os
+import re
+import struct
+import zlib
+
+# kind of the records of the store
+_TRANSFER = 0
+_STOP_POINT = 1
+
+# start of the records, to find the next record after a corrupted one
+_RECORD_MAGIC = b'\xa5\x5a\xc3\x3c'
+# kind, key length, value length
+_RECORD_SIZES = struct.Struct(str('>BII'))
+# magic, kind, key length, value length, checksum of the sizes, the key and the value
+_RECORD_HEADER = struct.Struct(str('>4sBIII'))
+_BLOB_HEADER = struct.Struct(str('>I'))
+# the file of a store is read by chunks, the other greenlets run in between
+_LOAD_CHUNK_SIZE = 1 << 20
+# number of records loaded in the store between two switches to the other greenlets
+_LOAD_BATCH_SIZE = 1000
+
+
+def make_transfer_key(*args):
+    """
+    compact key of a transfer, stable between the processes
+    """
+    return hashlib.sha1(repr(args).encode('utf-8')).digest()
+
+
+def _pack_blobs(*blobs):
+    return b''.join(_BLOB_HEADER.pack(len(b)) + b for b in blobs)
+
+
+def _checksum(kind, key, value):
+    return zlib.crc32(_RECORD_SIZES.pack(kind, len(key), len(value)) + key + value) & 0xFFFFFFFF
+
+
+def _make_record(kind, key, value):
+    return (
+        _RECORD_HEADER.pack(_RECORD_MAGIC, kind, len(key), len(value), _checksum(kind, key, value)) + key + value
+    )
+
+
+def _read_records(data):
+    """
+    yield the (kind, key, value) of the records, the corrupted or incomplete ones are skipped
+    """
+    offset = 0
+    while True:
+        start = data.find(_RECORD_MAGIC, offset)
+        if start < 0 or start + _RECORD_HEADER.size > len(data):
+            return
+        _, kind, key_size, value_size, checksum = _RECORD_HEADER.unpack_from(data, start)
+        key_start = start + _RECORD_HEADER.size
+        value_start = key_start + key_size
+        end = value_start + value_size
+        key = data[key_start:value_start]
+        value = data[value_start:end]
+        if end > len(data) or _checksum(kind, key, value) != checksum:
+            # the record is corrupted (or still being written), the next one is searched after its magic
+            offset = start + 1
+            continue
+        yield kind, key, value
+        offset = end
+
+
+def _unpack_blobs(data):
+    blobs = []
+    offset = 0
+    while offset < len(data):
+        (size,) = _BLOB_HEADER.unpack_from(data, offset)
+        offset += _BLOB_HEADER.size
+        blobs.append(data[offset : offset + size])
+        offset += size
+    return blobs
+
+
+class TransferStore(object):
+    """
+    Walking paths of the transfers and access points of the stop points of an instance
+
+    They only depend on the published data (and the walking profile of the request): the store is filled as the
+    transfers are computed and emptied each time a new publication date is seen.
+    The entries are kept serialized in memory. If TRANSFER_PATH_STORE_DIR is set, they are also appended to a
+    file per publication date, loaded in background by the other workers (and after a restart) so they don't
+    compute them again. Each entry is appended by a single write, with a checksum: the entries corrupted by
+    concurrent writes of the workers are skipped when the file is loaded.
+    Once TRANSFER_PATH_CACHE_SIZE entries are stored, the new ones are refused until the next publication date:
+    they are counted in nb_refused and a warning is logged on the first one.
+    """
+
+    def __init__(self, instance_name):
+        self.instance_name = instance_name
+        self.publication_date = -1
+        self._transfers = {}
+        self._stop_points = {}
+        # number of entries refused because the store is full, for the current publication date
+        self.nb_refused = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def max_size(self):
+        return app.config.get(str('TRANSFER_PATH_CACHE_SIZE'), 0)
+
+    @property
+    def directory(self):
+        return app.config.get(str('TRANSFER_PATH_STORE_DIR'), None)
+
+    def __len__(self):
+        return len(self._transfers) + len(self._stop_points)
+
+    def _get_file_path(self, publication_date):
+        return os.path.join(self.directory, '{}_{}.transfers'.format(self.instance_name, publication_date))
+
+    def update_publication_date(self, instance):
+        """
+        listener of the publication date of the instance
+        """
+        self._is_current(instance.publication_date)
+
+    def _is_current(self, publication_date):
+        """
+        the entries of the requests on older data are ignored, a newer publication date resets the store
+        """
+        if publication_date > self.publication_date:
+            self._reset(publication_date)
+        return publication_date == self.publication_date
+
+    def _reset(self, publication_date):
+        self.logger.info('reset the transfer store of %s for %s', self.instance_name, publication_date)
+        if self.nb_refused:
+            self.logger.warning(
+                '%s entries refused by the full transfer store of %s for %s',
+                self.nb_refused,
+                self.instance_name,
+                self.publication_date,
+            )
+        self.publication_date = publication_date
+        self._transfers = {}
+        self._stop_points = {}
+        self.nb_refused = 0
+        if self.directory:
+            self._remove_old_files(publication_date)
+            gevent.spawn(self.load, publication_date)
+
+    def _remove_old_files(self, publication_date):
+        pattern = re.compile(r'^{}_(-?\d+)\.transfers$'.format(re.escape(self.instance_name)))
+        try:
+            for file_name in os.listdir(self.directory):
+                match = pattern.match(file_name)
+                if match and int(match.group(1)) < publication_date:
+                    os.remove(os.path.join(self.directory, file_name))
+        except OSError as e:
+            self.logger.warning('impossible to remove the old transfer stores of %s: %s', self.instance_name, e)
+
+    def load(self, publication_date):
+        """
+        load the entries saved by the workers for this publication date, switching to the other greenlets while
+        the file is read and its entries are added
+        """
+        chunks = []
+        try:
+            with open(self._get_file_path(publication_date), 'rb') as f:
+                for chunk in iter(lambda: f.read(_LOAD_CHUNK_SIZE), b''):
+                    chunks.append(chunk)
+                    gevent.sleep(0)
+        except IOError:
+            return
+        nb_records = 0
+        for kind, key, value in _read_records(b''.join(chunks)):
+            if not self._add(publication_date, kind, key, value):
+                break
+            nb_records += 1
+            if nb_records % _LOAD_BATCH_SIZE == 0:
+                gevent.sleep(0)
+        self.logger.info('%s entries loaded in the transfer store of %s', nb_records, self.instance_name)
+
+    def _add(self, publication_date, kind, key, value):
+        if publication_date != self.publication_date:
+            return False
+        if len(self) >= self.max_size:
+            if not self.nb_refused:
+                self.logger.warning(
+                    'the transfer store of %s is full (%s entries) for %s, the new entries are not stored',
+                    self.instance_name,
+                    self.max_size,
+                    publication_date,
+                )
+            self.nb_refused += 1
+            return False
+        entries = self._transfers if kind == _TRANSFER else self._stop_points
+        entries[key] = value
+        return True
+
+    def _save(self, publication_date, kind, key, value):
+        if not self._add(publication_date, kind, key, value) or not self.directory:
+            return
+        record = _make_record(kind, key, value)
+        try:
+            # a single write in append mode, not split by a buffered file
+            fd = os.open(self._get_file_path(publication_date), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                written = os.write(fd, record)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.logger.warning('impossible to save the transfer store of %s: %s', self.instance_name, e)
+            return
+        if written != len(record):
+            self.logger.warning('the transfer store of %s is partially saved', self.instance_name)
+
+    def get_transfer(self, publication_date, key):
+        """
+        return: (direct_path, origin, destination) of the transfer or None if it's not in the store
+        """
+        if not self._is_current(publication_date):
+            return None
+        value = self._transfers.get(key)
+        if value is None:
+            return None
+        try:
+            direct_path, origin, destination = _unpack_blobs(value)
+            return (
+                response_pb2.Response.FromString(direct_path),
+                type_pb2.PtObject.FromString(origin),
+                type_pb2.PtObject.FromString(destination),
+            )
+        except (DecodeError, ValueError, struct.error):
+            self.logger.warning('corrupted transfer in the transfer store of %s', self.instance_name)
+            self._transfers.pop(key, None)
+            return None
+
+    def set_transfer(self, publication_date, key, direct_path, origin, destination):
+        if not self._is_current(publication_date):
+            return
+        value = _pack_blobs(
+            direct_path.SerializeToString(), origin.SerializeToString(), destination.SerializeToString()
+        )
+        self._save(publication_date, _TRANSFER, key, value)
+
+    def get_stop_point(self, publication_date, uri):
+        """
+        return: the stop point with only its access points or None if it's not in the store
+        """
+        if not self._is_current(publication_date):
+            return None
+        key = uri.encode('utf-8')
+        value = self._stop_points.get(key)
+        if value is None:
+            return None
+        try:
+            return type_pb2.StopPoint.FromString(value)
+        except DecodeError:
+            self.logger.warning('corrupted stop point %s in the transfer store of %s', uri, self.instance_name)
+            self._stop_points.pop(key, None)
+            return None
+
+    def set_stop_point(self, publication_date, uri, access_points):
+        if not self._is_current(publication_date):
+            return
+        stop_point = type_pb2.StopPoint(uri=uri)
+        stop_point.access_points.extend(access_points)
+        self._save(publication_date, _STOP_POINT, uri.encode('utf-8'), stop_point.SerializeToString())
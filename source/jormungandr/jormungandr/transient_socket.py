@@ -31,10 +31,13 @@
 
 import zmq
 import time
+import itertools
 from contextlib import contextmanager
 import logging
 import six
 import flask
+import gevent
+from gevent.event import AsyncResult
 from gevent.lock import BoundedSemaphore
 from collections import namedtuple
 from sortedcontainers import SortedList
@@ -48,6 +51,29 @@ zmq_version = [int(n) for n in zmq.zmq_version().split(".")[:2]]
 SET_ZMQ_HANDSHAKE_IVL = zmq_version[0] > 4 or (zmq_version[0] == 4 and zmq_version[1] >= 2)
 
 
+class MultiplexedChannel(object):
+    """
+    A DEALER socket shared by several greenlets.
+
+    Each request is sent as [request_id, '', content]. The empty delimiter makes the request look like a REQ
+    envelope for the server, which sends back every frame before the delimiter untouched, so the request_id
+    frame is echoed in the reply and is used to wake up the greenlet waiting for it.
+    Any broker between jormungandr and the server must pass this frame through, which is checked against kraken by
+    the integration tests of the multiplexed mode.
+    """
+
+    def __init__(self, t, socket):
+        self.t = t
+        self.socket = socket
+        # request_id -> AsyncResult of the greenlet waiting for the reply
+        self.pending = {}
+        self.send_lock = BoundedSemaphore(1)
+        self.reader = None
+        # a retired channel doesn't accept new requests and is closed once all its pending requests are done
+        self.retired = False
+        self.closed = False
+
+
 class TransientSocket(object):
     """
     With this class, sockets will be shut down and reopened if the TTL run out.
@@ -59,6 +85,14 @@ class TransientSocket(object):
     despite the auto balancer, sockets created previously will still stick to the old instance. We have to close the
     socket and reopen one so that traffic will be lead to new instances.
 
+    In multiplexed mode, instead of checking out a REQ socket per call, the greenlets share a few long-lived DEALER
+    sockets (channels) on which several requests can be in flight at the same time. Replies are matched to their
+    request with a request id, the number of in-flight requests is bounded and each request waits for its reply
+    until its own deadline. Channels are renewed when the TTL runs out, just like the REQ sockets, a retired channel
+    being closed once its last pending reply has been received.
+
+    The multiplexed mode needs a gevent-compatible zmq context (zmq.green), since a reader greenlet is spawned per
+    channel.
     """
 
     # TODO: use dataclass in python > 3.7
@@ -69,7 +103,18 @@ class TransientSocket(object):
     # one.
     _logger = logging.getLogger(__name__)
 
-    def __init__(self, name, zmq_context, zmq_socket, socket_ttl, *args, **kwargs):
+    def __init__(
+        self,
+        name,
+        zmq_context,
+        zmq_socket,
+        socket_ttl,
+        multiplexed=False,
+        max_in_flight_requests=64,
+        nb_channels=2,
+        *args,
+        **kwargs
+    ):
         super(TransientSocket, self).__init__(*args, **kwargs)
         self.name = name
         self._zmq_context = zmq_context
@@ -78,9 +123,15 @@ class TransientSocket(object):
         self._semaphore = BoundedSemaphore(1)
         self._sockets = SortedList([], key=lambda s: -s.t)
 
-    def make_new_socket(self):
+        self._multiplexed = multiplexed
+        self._nb_channels = max(nb_channels, 1)
+        self._in_flight = BoundedSemaphore(max(max_in_flight_requests, 1))
+        self._channels = []
+        self._request_ids = itertools.count()
+
+    def make_new_socket(self, socket_type=zmq.REQ):
         start = time.time()
-        socket = self._zmq_context.socket(zmq.REQ)
+        socket = self._zmq_context.socket(socket_type)
         # During the migration to debian 11, the socket was closed by server because of HANDSHAKE_FAILED_NO_DETAIL
         # exception.
         # This is very likely due to the fact that jormungandr(client) and kraken(server) are not using the same version
@@ -140,6 +191,9 @@ class TransientSocket(object):
         return self.make_new_socket()
 
     def call(self, content, timeout, debug_cb=lambda: "", quiet=False):
+        if self._multiplexed:
+            return self._call_multiplexed(content, timeout, debug_cb=debug_cb, quiet=quiet)
+
         timed_socket = self.get_socket()
 
         try:
@@ -174,3 +228,106 @@ class TransientSocket(object):
             socket.close()
         except:
             self._logger.exception("")
+
+    def get_channel(self):
+        """
+        Return the least loaded alive channel, the channels whose TTL has run out are retired and new ones are
+        opened on demand, up to nb_channels.
+        """
+        with self._semaphore:
+            now = time.time()
+            alive_channels = []
+            for channel in self._channels:
+                if now - channel.t < self._ttl:
+                    alive_channels.append(channel)
+                else:
+                    channel.retired = True
+                    if not channel.pending:
+                        self.close_channel(channel)
+            self._channels = alive_channels
+
+            if len(self._channels) < self._nb_channels:
+                t, socket = self.make_new_socket(zmq.DEALER)
+                channel = MultiplexedChannel(t, socket)
+                channel.reader = gevent.spawn(self._read_replies, channel)
+                self._channels.append(channel)
+                return channel
+
+            return min(self._channels, key=lambda c: len(c.pending))
+
+    def _read_replies(self, channel):
+        try:
+            while True:
+                frames = channel.socket.recv_multipart()
+                if len(frames) < 3:
+                    self._logger.warning('malformed reply of %s frames received on %s', len(frames), self.name)
+                    continue
+                result = channel.pending.pop(frames[0], None)
+                if result is None:
+                    # the request has already reached its deadline, nobody is waiting for this reply anymore
+                    self._logger.debug('late reply received on %s, dropped', self.name)
+                    continue
+                result.set(frames[-1])
+        except gevent.GreenletExit:
+            pass
+        except Exception:
+            if not channel.closed:
+                self._logger.exception('error while reading replies on %s', self.name)
+        finally:
+            # whatever stopped the reader, nobody will receive the replies of this channel anymore: the channel is
+            # dropped and every pending request is woken up with an error
+            self.fail_channel(channel)
+
+    def fail_channel(self, channel):
+        with self._semaphore:
+            if channel in self._channels:
+                self._channels.remove(channel)
+        channel.retired = True
+        pending, channel.pending = channel.pending, {}
+        for result in pending.values():
+            result.set_exception(DeadSocketException(self.name, self._zmq_socket))
+        self.close_channel(channel, kill_reader=False)
+
+    def _call_multiplexed(self, content, timeout, debug_cb=lambda: "", quiet=False):
+        deadline = time.time() + timeout
+
+        if not self._in_flight.acquire(timeout=timeout):
+            if not quiet:
+                self._logger.error(
+                    'request on %s failed, too many requests in flight: %s', self._zmq_socket, debug_cb()
+                )
+            raise DeadSocketException(self.name, self._zmq_socket)
+
+        try:
+            channel = self.get_channel()
+            request_id = six.ensure_binary(str(next(self._request_ids)))
+            result = AsyncResult()
+            channel.pending[request_id] = result
+            try:
+                with channel.send_lock:
+                    channel.socket.send_multipart([request_id, b'', content])
+                return result.get(timeout=max(deadline - time.time(), 0))
+            except gevent.Timeout:
+                if not quiet:
+                    self._logger.error('request on %s failed: %s', self._zmq_socket, debug_cb())
+                raise DeadSocketException(self.name, self._zmq_socket)
+            finally:
+                channel.pending.pop(request_id, None)
+                if channel.retired and not channel.pending:
+                    self.close_channel(channel)
+        finally:
+            self._in_flight.release()
+
+    def close_channel(self, channel, kill_reader=True):
+        if channel.closed:
+            return
+        channel.closed = True
+        if kill_reader and channel.reader is not None and channel.reader is not gevent.getcurrent():
+            channel.reader.kill(block=False)
+        self.close_socket(channel.socket)
+
+    def close_channels(self):
+        with self._semaphore:
+            channels, self._channels = self._channels, []
+        for channel in channels:
+            self.close_channel(channel)
@@ -48,6 +48,8 @@ import re
 import flask
 from contextlib import contextmanager
 import functools
+import time
+import gevent.local
 import sys
 import six
 import csv
@@ -774,6 +776,53 @@ def copy_context_in_greenlet_stack(request_context):
     flask.globals._request_ctx_stack.pop()
 
 
+# smallest timeout given to a call once the budget is exhausted, it will fail as a usual timeout
+MIN_REMAINING_TIME = 0.01
+
+# deadline (timestamp) of the budget of the current greenlet
+_budget = gevent.local.local()
+
+
+def get_deadline():
+    return getattr(_budget, 'deadline', None)
+
+
+def get_remaining_time(timeout):
+    """
+    Time in seconds a call can use: its own timeout, bounded by what remains of the budget of the greenlet
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return timeout
+    return max(min(timeout, deadline - time.time()), MIN_REMAINING_TIME)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """
+    Set the deadline (timestamp, None for no deadline) of the budget of the current greenlet
+    """
+    previous = get_deadline()
+    _budget.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _budget.deadline = previous
+
+
+def request_budget(timeout):
+    """
+    Give a budget of `timeout` seconds to the current greenlet and to the futures created in it
+
+    A budget can only be narrowed, an enclosing budget ending sooner is kept.
+    A None timeout keeps the current budget.
+    """
+    deadline = get_deadline()
+    if timeout is not None:
+        deadline = time.time() + timeout if deadline is None else min(time.time() + timeout, deadline)
+    return deadline_scope(deadline)
+
+
 def compose(*funs):
     """
     compose functions and return a callable object
@@ -1175,16 +1224,24 @@ def ceil_by_half(f):
     return 0.5 * math.ceil(2.0 * float(f))
 
 
-def content_is_too_large(instance, endpoint, response):
+def get_content_limit(instance, endpoint):
+    """
+    max size in bytes of the responses of the endpoint for this instance, None if there is no limit
+    """
     if not instance:
-        return False
-    if instance.resp_content_limit_bytes is None:
-        return False
+        return None
     if endpoint in instance.resp_content_limit_endpoints_whitelist:
+        return None
+    return instance.resp_content_limit_bytes
+
+
+def content_is_too_large(instance, endpoint, response):
+    limit = get_content_limit(instance, endpoint)
+    if limit is None:
         return False
     if response.content_length is None:
         return False
-    if response.content_length <= instance.resp_content_limit_bytes:
+    if response.content_length <= limit:
         return False
 
     return True
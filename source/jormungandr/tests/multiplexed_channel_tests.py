@@ -0,0 +1,75 @@
+# encoding: utf-8
+
+#  Copyright (c) 2001-2022, Hove and/or its affiliates. All rights reserved.
+#
+# This file is part of Navitia,
+#     the software to build cool stuff with public transport.
+#
+# Hope you'll enjoy and contribute to this project,
+#     powered by Hove (www.hove.com).
+# Help us simplify mobility and open public transport:
+#     a non ending quest to the responsive locomotion way of traveling!
+#
+# LICENCE: This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Stay tuned using
+# twitter @navitia
+# channel `#navitia` on riot https://riot.im/app/#/room/#navitia:matrix.org
+
+from __future__ import absolute_import, print_function, unicode_literals, division
+from .tests_mechanism import AbstractTestFixture, dataset
+from jormungandr import app, i_manager
+import gevent
+import mock
+
+
+@dataset({"main_routing_test": {}})
+class TestMultiplexedChannel(AbstractTestFixture):
+    """
+    In multiplexed mode the requests are sent to kraken on a DEALER socket with a [request_id, '', content]
+    envelope: kraken's broker has to send the request_id frame back unchanged for the replies to be matched to
+    their requests
+    """
+
+    @classmethod
+    def setup_class(cls):
+        # the instances read the configuration of their sockets when they are created
+        cls.config_patch = mock.patch.dict(app.config, {'ZMQ_MULTIPLEXED_CHANNEL': True, 'ZMQ_NB_CHANNELS': 1})
+        cls.config_patch.start()
+        super(TestMultiplexedChannel, cls).setup_class()
+
+    @classmethod
+    def teardown_class(cls):
+        super(TestMultiplexedChannel, cls).teardown_class()
+        cls.config_patch.stop()
+
+    def test_replies_are_matched_to_their_requests(self):
+        instance = i_manager.instances['main_routing_test']
+        assert instance._multiplexed
+
+        uris = [sa['id'] for sa in self.query_region('stop_areas')['stop_areas']]
+        uris += [sp['id'] for sp in self.query_region('stop_points')['stop_points']]
+        assert len(uris) > 1
+        # all the requests are in flight at the same time on the same channel
+        uris *= 5
+        greenlets = [gevent.spawn(instance.get_id, uri) for uri in uris]
+        gevent.joinall(greenlets, raise_error=True)
+
+        for uri, greenlet in zip(uris, greenlets):
+            assert [place.uri for place in greenlet.value.places] == [uri]
+        assert len(instance._channels) == 1
+
+    def test_journeys(self):
+        response = self.query_region("journeys?from=stopA&to=stopB&datetime=20120614T080000")
+        assert response['journeys']
@@ -35,6 +35,69 @@ import redis
 import time
 from builtins import zip
 
+try:
+    # the blocking acquire must not block the whole process when used with gevent
+    from gevent import sleep
+except ImportError:
+    from time import sleep
+
+
+# Lock-free version of _make_ping: the conditions are checked and the request is recorded in a single atomic call.
+# It reserves up to ARGV[2] requests at once, as many as the conditions allow. Since reserved requests are acquired
+# later, until ARGV[4] seconds after their reservation, the time periods of the conditions are extended by ARGV[4]
+# when checked: this way no more than 'requests' requests are ever acquired in any period of 'seconds'.
+#   KEYS: log key, block key
+#   ARGV: timestamp, number of requests to reserve, ttl of the log, lifetime of the reservations, then the
+#         (requests, seconds) of every condition
+#   returns: the number of reserved tokens, and the time to wait (as a string) if none could be reserved
+ATOMIC_PING_SCRIPT = '''
+local log_key, block_key = KEYS[1], KEYS[2]
+local timestamp = tonumber(ARGV[1])
+local count = tonumber(ARGV[2])
+local list_ttl = tonumber(ARGV[3])
+local reservation_ttl = tonumber(ARGV[4])
+
+if redis.call('EXISTS', block_key) == 1 then
+    local block_ttl = redis.call('TTL', block_key)
+    if block_ttl < 0 then
+        block_ttl = 0.5
+    end
+    return {-1, tostring(block_ttl)}
+end
+
+local granted = count
+local wait = 0
+local max_requests = 0
+for i = 5, #ARGV, 2 do
+    local requests, seconds = tonumber(ARGV[i]), tonumber(ARGV[i + 1]) + reservation_ttl
+    max_requests = math.max(max_requests, requests)
+    -- the timestamps are sorted from the newest, k more requests are allowed if the (requests - k)th one is outside
+    -- of the time period
+    local allowed = 0
+    while allowed < granted and allowed < requests do
+        local boundry_timestamp = redis.call('LINDEX', log_key, requests - allowed - 1)
+        if boundry_timestamp and tonumber(boundry_timestamp) + seconds > timestamp then
+            if allowed == 0 then
+                wait = math.max(wait, tonumber(boundry_timestamp) + seconds - timestamp)
+            end
+            break
+        end
+        allowed = allowed + 1
+    end
+    granted = allowed
+end
+
+if granted == 0 then
+    return {0, tostring(wait)}
+end
+for _ = 1, granted do
+    redis.call('LPUSH', log_key, ARGV[1])
+end
+redis.call('LTRIM', log_key, 0, max_requests - 1)
+redis.call('EXPIRE', log_key, list_ttl)
+return {granted, '0'}
+'''
+
 
 class RateLimiter(object):
     """
@@ -52,6 +115,9 @@ class RateLimiter(object):
         redis_db=0,
         redis_password=None,
         redis_namespace='ratelimiter',
+        lock_free=False,
+        reservation_size=1,
+        reservation_ttl=0.1,
     ):
         """
         Initalize an instance of a RateLimiter
@@ -62,6 +128,10 @@ class RateLimiter(object):
         redis_db   - Redis DB to use (if different than 0)
         redis_password - Redis password (if needed)
         redis_namespace - Redis key namespace
+        lock_free - Check and record the requests in a single atomic lua script instead of behind a lock
+        reservation_size - In lock free mode, number of requests reserved at once and then acquired locally
+        reservation_ttl - Time in seconds during which reserved requests can be acquired, those not acquired are
+                          lost. The time periods of the conditions are extended by this time to never exceed them.
         """
 
         self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db, password=redis_password)
@@ -69,6 +139,12 @@ class RateLimiter(object):
         self.namespace = redis_namespace
         self.conditions = []
         self.list_ttl = 0
+        self.lock_free = lock_free
+        self.reservation_size = max(int(reservation_size), 1)
+        self.reservation_ttl = reservation_ttl if self.reservation_size > 1 else 0
+        # key -> (number of reserved requests, time until which they can be acquired)
+        self._reservations = {}
+        self._atomic_ping = self.redis.register_script(ATOMIC_PING_SCRIPT) if lock_free else None
 
         if conditions:
             self.add_condition(*conditions)
@@ -170,7 +246,7 @@ class RateLimiter(object):
                 if success:
                     return True
                 self.log.debug('blocking acquire sleeping for %.1fs', wait)
-                time.sleep(wait)
+                sleep(wait)
         else:
             success, wait = self._make_ping(key)
             return success
@@ -190,6 +266,9 @@ class RateLimiter(object):
             self.log.warning('(%s) hit block all limit (%s/%s)', key, min_requests, min_request_seconds)
             return False, min_request_seconds
 
+        if self.lock_free:
+            return self._make_atomic_ping(key)
+
         log_key = ':'.join((self.namespace, key, 'log'))
         block_key = ':'.join((self.namespace, key, 'block'))
         lock_key = ':'.join((self.namespace, key, 'lock'))
@@ -242,6 +321,38 @@ class RateLimiter(object):
 
         return True, 0.0
 
+    def _make_atomic_ping(self, key):
+        timestamp = time.time()
+        # the requests reserved by a previous ping are acquired first
+        reserved, reserved_until = self._reservations.get(key, (0, 0))
+        if reserved and timestamp < reserved_until:
+            self._reservations[key] = (reserved - 1, reserved_until)
+            return True, 0.0
+
+        log_key = ':'.join((self.namespace, key, 'log'))
+        block_key = ':'.join((self.namespace, key, 'block'))
+        args = [
+            timestamp,
+            self.reservation_size,
+            self.list_ttl + int(math.ceil(self.reservation_ttl)),
+            self.reservation_ttl,
+        ]
+        for requests, seconds in self.conditions:
+            args.extend((requests, seconds))
+        granted, wait = self._atomic_ping(keys=[log_key, block_key], args=args)
+        wait = float(wait)
+
+        if granted < 0:
+            self.log.warning('(%s) hit manual block. %ss remaining', key, wait)
+            return False, wait
+        if granted == 0:
+            self.log.warning('(%s) hit limit, time to allow %.1fs', key, wait)
+            return False, wait
+
+        if granted > 1:
+            self._reservations[key] = (granted - 1, timestamp + self.reservation_ttl)
+        return True, 0.0
+
 
 if __name__ == '__main__':
     """